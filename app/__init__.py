@@ -129,6 +129,14 @@ def create_app():
     from app.utils.thumb_hooks import registrar_hooks
     registrar_hooks()
 
+    from app.loja.cache_hooks import registrar_hooks as registrar_hooks_cache
+    registrar_hooks_cache()
+
+    # Índice do autocomplete: atualização pós-commit (a construção na subida
+    # é agendada depois do cache, que guarda o token de versão)
+    from app.services.autocomplete import registrar_hooks as registrar_hooks_autocomplete, agendar_construcao
+    registrar_hooks_autocomplete()
+
     @app.route('/robots.txt')
     def robots_at_root():
         # Servir diretamente o robots.txt da raiz para evitar conflitos de blueprint
@@ -140,6 +148,11 @@ def create_app():
         from app.loja.routes import sitemap
         return sitemap()
 
+    @app.route('/sitemap-<string:segmento>.xml')
+    def sitemap_segmento_at_root(segmento):
+        from app.loja.routes import sitemap_segmento
+        return sitemap_segmento(segmento)
+
     @app.route('/llms.txt')
     def llms_txt_at_root():
         return send_from_directory(os.path.join(app.root_path, 'static'), 'llms.txt')
@@ -155,16 +168,28 @@ def create_app():
         return response
 
     # =========================================================
-    # INICIALIZAÇÃO DO CACHE (Ajuste para Render)
+    # INICIALIZAÇÃO DO CACHE (Redis compartilhado entre workers)
     # =========================================================
+    # Usa o Redis de app/utils/queue.py; sem Redis, cai para LRU local limitado.
     try:
-        app.config['CACHE_TYPE'] = 'SimpleCache'
+        app.config['CACHE_TYPE'] = 'app.utils.cache_backend.RedisLRUCache'
         app.config['CACHE_DEFAULT_TIMEOUT'] = 300
+        app.config['CACHE_KEY_PREFIX'] = os.getenv('CACHE_KEY_PREFIX', 'm4cache:')
+        app.config['CACHE_LRU_MAX_ITEMS'] = int(os.getenv('CACHE_LRU_MAX_ITEMS', 512))
         cache.init_app(app)
         app.logger.info("[CACHE] Sistema de cache inicializado.")
     except Exception as e:
         app.logger.warning(f"[CACHE] Erro ao inicializar cache: {e}")
 
+    # Construção do índice do autocomplete em background: só nos processos
+    # web (AUTOCOMPLETE_NA_SUBIDA=1) e com o cache pronto — sem ele o índice
+    # nasce sem token e é refeito no primeiro sugerir()
+    if app.config.get("AUTOCOMPLETE_NA_SUBIDA") and not app.config.get("TESTING"):
+        if cache in app.extensions.get("cache", {}):
+            agendar_construcao(app)
+        else:
+            app.logger.warning("[AUTOCOMPLETE] Cache indisponível; índice será construído no 1º uso.")
+
     # =========================================================
     # REGISTRO DE BLUEPRINTS (Roteamento Dinâmico M4)
     # =========================================================
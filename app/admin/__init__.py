@@ -12,4 +12,5 @@ admin_bp = Blueprint(
 from app.admin import routes
 from app.admin import usuarios_routes
 from app.admin import config_routes
-from app.admin import documentos_routes
\ No newline at end of file
+from app.admin import documentos_routes
+from app.admin import ocr_cache_routes
\ No newline at end of file
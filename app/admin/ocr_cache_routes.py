@@ -0,0 +1,45 @@
+# app/admin/ocr_cache_routes.py
+# Cache de OCR por SHA-256 (app/services/ocr_cache.py): resumo por versão do
+# pipeline e invalidação quando parsers/prompt mudarem.
+
+import re
+
+from flask import render_template, request, redirect, url_for, flash
+from flask_login import login_required
+from app.admin import admin_bp
+from app.services import ocr_cache
+
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+@admin_bp.route("/ocr-cache")
+@login_required
+def ocr_cache_index():
+    return render_template(
+        "admin/ocr_cache.html",
+        versoes=ocr_cache.resumo(),
+        versao_atual=ocr_cache.VERSAO_PIPELINE,
+    )
+
+
+@admin_bp.route("/ocr-cache/invalidar", methods=["POST"])
+@login_required
+def ocr_cache_invalidar():
+    escopo = request.form.get("escopo")
+    sha256 = (request.form.get("sha256") or "").strip().lower()
+
+    if escopo == "arquivo":
+        if not _SHA256.match(sha256):
+            flash("Informe o SHA-256 completo do arquivo (64 caracteres hexadecimais).", "warning")
+            return redirect(url_for("admin.ocr_cache_index"))
+        removidas = ocr_cache.invalidar(sha256=sha256)
+    elif escopo == "antigas":
+        removidas = ocr_cache.invalidar(somente_antigas=True)
+    elif escopo == "tudo":
+        removidas = ocr_cache.invalidar()
+    else:
+        flash("Escopo de invalidação inválido.", "danger")
+        return redirect(url_for("admin.ocr_cache_index"))
+
+    flash(f"{removidas} resultado(s) de OCR removido(s) do cache.", "success")
+    return redirect(url_for("admin.ocr_cache_index"))
@@ -5,8 +5,6 @@
 # Reutiliza 100% dos models, queries e utilitários existentes
 # ============================================================
 
-import re
-import unicodedata
 from flask import render_template, request, jsonify, abort, current_app
 from sqlalchemy import or_, func
 from sqlalchemy.orm import joinedload, subqueryload
@@ -15,12 +13,14 @@ from app.catalogo import catalogo_bp
 from app import db
 from app.produtos.models import Produto
 from app.produtos.categorias.models import CategoriaProduto
-from app.produtos.configs.models import MarcaProduto, CalibreProduto
+from app.produtos.categorias.arvore import arvore_categorias
 from app.models import Configuracao
 from app.utils.r2_helpers import gerar_link_r2
 # from app.utils.thumbnail_utils import get_thumb_url  # Substituído pelo proxy
 from app.utils.image_proxy import serve_image_with_fallback
 from app.catalogo.image_url_helper import convert_image_url, convert_thumb_url
+from app.services.busca_produtos import buscar_produtos, normalizar_termo
+from app.services.autocomplete import sugerir
 
 # ────────────────────────────────────────────────────────────
 # HELPER LOCAL: compatível com o padrão de loja/routes.py
@@ -50,51 +50,7 @@ def _gerador_link(path: str) -> str:
 # ────────────────────────────────────────────────────────────
 def _normalizar_termo(termo: str) -> str:
     """Remove acentos, converte para minúsculas, colapsa separadores."""
-    termo = unicodedata.normalize('NFKD', termo).encode('ascii', 'ignore').decode('ascii')
-    termo = termo.lower().strip()
-    # Colapsa espaços, hífens, pontos, underscores em espaço único
-    termo = re.sub(r'[\s\-_\.]+', ' ', termo)
-    return termo
-
-
-def _build_search_conditions(termo: str):
-    """
-    Monta condições OR tolerantes para busca.
-    Gera múltiplos padrões ILIKE para cobrir variações do termo.
-    """
-    normalizado = _normalizar_termo(termo)
-    # Gera variantes: com espaço, sem espaço, com hífen
-    variantes = {normalizado}
-    sem_espaco = normalizado.replace(' ', '')
-    if sem_espaco != normalizado:
-        variantes.add(sem_espaco)
-    com_hifen = normalizado.replace(' ', '-')
-    if com_hifen != normalizado:
-        variantes.add(com_hifen)
-
-    condicoes = []
-    for v in variantes:
-        filtro = f"%{v}%"
-        condicoes.extend([
-            Produto.nome.ilike(filtro),
-            Produto.nome_comercial.ilike(filtro),
-            Produto.codigo.ilike(filtro),
-            Produto.descricao.ilike(filtro),
-            Produto.tags_palavras_chave.ilike(filtro),
-            Produto.descricao_comercial.ilike(filtro),
-        ])
-
-    # Busca também no termo original (com acentos, case-insensitive)
-    filtro_original = f"%{termo}%"
-    condicoes.extend([
-        Produto.nome.ilike(filtro_original),
-        Produto.nome_comercial.ilike(filtro_original),
-        Produto.codigo.ilike(filtro_original),
-        Produto.descricao.ilike(filtro_original),
-        Produto.tags_palavras_chave.ilike(filtro_original),
-    ])
-
-    return condicoes
+    return normalizar_termo(termo)
 
 
 # ────────────────────────────────────────────────────────────
@@ -104,9 +60,7 @@ def _build_search_conditions(termo: str):
 def inject_catalogo_data():
     """Injeta categorias e configurações globais no contexto do catálogo."""
     try:
-        categorias = CategoriaProduto.query.filter_by(pai_id=None)\
-            .options(subqueryload(CategoriaProduto.subcategorias))\
-            .order_by(CategoriaProduto.ordem_exibicao.asc()).all()
+        categorias = list(arvore_categorias().raizes)
 
         config_objs = Configuracao.query.filter(
             Configuracao.chave.like('loja_%')
@@ -275,6 +229,24 @@ def produto_por_id(produto_id):
 # ============================================================
 # API: BUSCA INSTANTÂNEA (JSON)
 # ============================================================
+def _item_busca(id, slug, nome, codigo, categoria, calibre, marca,
+                preco, foto_url, estoque, promo_ativada):
+    return {
+        'id': id,
+        'slug': slug,
+        'nome': nome,
+        'codigo': codigo,
+        'categoria': categoria or '',
+        'calibre': calibre or '',
+        'marca': marca or '',
+        'preco': float(preco or 0),
+        # Usa thumbnail para performance no autocomplete
+        'foto': convert_thumb_url(foto_url, 't160') if foto_url else '/static/img/placeholder.jpg',
+        'disponivel': (estoque or 0) > 0,
+        'em_promocao': bool(promo_ativada),
+    }
+
+
 @catalogo_bp.route('/api/buscar')
 def api_buscar():
     """
@@ -289,56 +261,30 @@ def api_buscar():
         return jsonify({'produtos': [], 'total': 0})
 
     try:
-        condicoes = _build_search_conditions(termo)
-
-        # Busca por calibre (JOIN)
-        filtro_calibre = f"%{_normalizar_termo(termo)}%"
-        filtro_calibre_orig = f"%{termo}%"
-
-        produtos = Produto.query.outerjoin(Produto.calibre_rel)\
-            .outerjoin(Produto.marca_rel)\
-            .outerjoin(Produto.categoria)\
-            .filter(
-                Produto.visivel_loja == True,
-                or_(
-                    *condicoes,
-                    CalibreProduto.nome.ilike(filtro_calibre_orig),
-                    MarcaProduto.nome.ilike(filtro_calibre_orig),
-                    CategoriaProduto.nome.ilike(filtro_calibre_orig),
-                )
-            ).options(
-                joinedload(Produto.marca_rel),
-                joinedload(Produto.categoria),
-                joinedload(Produto.calibre_rel),
-            ).order_by(
-                Produto.destaque_home.desc(),
-                Produto.criado_em.desc()
-            ).limit(20).all()
-
-        resultado = []
-        for p in produtos:
-            foto_url = p.foto_url or ''
-            if foto_url and not foto_url.startswith('http'):
-                foto_url = _gerador_link(foto_url)
-            elif not foto_url:
-                foto_url = '/static/img/placeholder.jpg'
-
-            # Usa thumbnail para performance no autocomplete
-            thumb = convert_thumb_url(p.foto_url, 't160') if p.foto_url else foto_url
+        # Índice em memória (app/services/autocomplete.py): sem ida ao banco
+        sugestoes = sugerir(termo, limite=20)
+        if sugestoes is not None:
+            resultado = [_item_busca(
+                d.id, d.slug, d.nome, d.codigo, d.categoria, d.calibre, d.marca,
+                d.preco_a_vista, d.foto_url, d.estoque_disponivel, d.promo_ativada,
+            ) for d in sugestoes]
+            return jsonify({'produtos': resultado, 'total': len(resultado)})
+
+        # Índice frio: full-text + trigrama (nome, código, marca, calibre, tags,
+        # descrições), ranking único — ver app/services/busca_produtos.py
+        produtos = buscar_produtos(termo, limite=20, opcoes=(
+            joinedload(Produto.marca_rel),
+            joinedload(Produto.categoria),
+            joinedload(Produto.calibre_rel),
+        ))
 
-            resultado.append({
-                'id': p.id,
-                'slug': p.slug,
-                'nome': p.nome_comercial or p.nome,
-                'codigo': p.codigo,
-                'categoria': p.categoria.nome if p.categoria else '',
-                'calibre': p.calibre_rel.nome if p.calibre_rel else '',
-                'marca': p.marca_rel.nome if p.marca_rel else '',
-                'preco': float(p.preco_a_vista or 0),
-                'foto': thumb,
-                'disponivel': (p.estoque_disponivel or 0) > 0,
-                'em_promocao': bool(p.promo_ativada),
-            })
+        resultado = [_item_busca(
+            p.id, p.slug, p.nome_comercial or p.nome, p.codigo,
+            p.categoria.nome if p.categoria else '',
+            p.calibre_rel.nome if p.calibre_rel else '',
+            p.marca_rel.nome if p.marca_rel else '',
+            p.preco_a_vista, p.foto_url, p.estoque_disponivel, p.promo_ativada,
+        ) for p in produtos]
 
         return jsonify({'produtos': resultado, 'total': len(resultado)})
 
@@ -400,18 +346,20 @@ def api_relacionados(produto_id):
 def api_categorias():
     """Retorna categorias com contagem de produtos visíveis."""
     try:
-        categorias = CategoriaProduto.query\
-            .options(subqueryload(CategoriaProduto.subcategorias))\
-            .order_by(CategoriaProduto.ordem_exibicao.asc()).all()
+        arvore = arvore_categorias()
+        categorias = sorted(arvore.nos(), key=lambda c: (c.ordem_exibicao, c.nome or ''))
+
+        # Uma contagem por categoria_id; o total de cada categoria soma
+        # os descendentes (qualquer profundidade) a partir da árvore
+        por_categoria = dict(
+            db.session.query(Produto.categoria_id, func.count(Produto.id))
+            .filter(Produto.visivel_loja == True)
+            .group_by(Produto.categoria_id).all()
+        )
 
         resultado = []
         for cat in categorias:
-            # Conta produtos nesta categoria e subcategorias
-            ids = [cat.id] + [s.id for s in cat.subcategorias]
-            total = Produto.query.filter(
-                Produto.categoria_id.in_(ids),
-                Produto.visivel_loja == True,
-            ).count()
+            total = sum(por_categoria.get(cid, 0) for cid in arvore.descendentes(cat.id))
 
             if total > 0:
                 resultado.append({
@@ -435,11 +383,12 @@ def api_categorias():
 def api_categoria(slug):
     """Retorna produtos de uma categoria para os filtros de chip."""
     try:
-        cat = CategoriaProduto.query.filter_by(slug=slug)\
-            .options(subqueryload(CategoriaProduto.subcategorias))\
-            .first_or_404()
+        arvore = arvore_categorias()
+        cat = arvore.por_slug(slug)
+        if cat is None:
+            abort(404)
 
-        ids = [cat.id] + [s.id for s in cat.subcategorias]
+        ids = sorted(arvore.descendentes(cat.id))
         page = request.args.get('page', 1, type=int)
 
         pagination = Produto.query.filter(
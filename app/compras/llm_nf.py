@@ -5,21 +5,23 @@
 # - Faz fallback automático se o modelo estiver deprecado/indisponível
 # - Mantém saída em JSON (response_format=json_object)
 # - Loga de forma clara qual modelo foi selecionado
+# - Chamadas via app/utils/llm_gateway (a verificação do modelo e a chamada
+#   efetiva usam o mesmo prompt: a segunda sai do cache)
 # ============================================================
 
 import os
 import json
 import logging
-import requests
 from typing import List, Optional
 
+from app.utils import llm_gateway
+
 logger = logging.getLogger(__name__)
 
 GROQ_API_KEY_NF = os.getenv("GROQ_API_KEY_NF", os.getenv("GROQ_API_KEY"))
 # Você pode passar uma lista no .env separada por vírgulas para forçar ordem:
 # Ex.: GROQ_MODEL_NF="llama-3.3-70b-versatile,llama-3.3-8b-instant,gemma2-9b-it"
 GROQ_MODEL_NF_RAW = os.getenv("GROQ_MODEL_NF", "").strip()
-GROQ_ENDPOINT = "https://api.groq.com/openai/v1/chat/completions"
 
 # Cache do modelo selecionado para esta execução (evita re-tentar a cada chamada)
 _SELECTED_MODEL: Optional[str] = None
@@ -44,56 +46,42 @@ def _candidate_models() -> List[str]:
     ]
 
 
-def _post_chat_completion(model: str, prompt: str) -> dict:
-    if not GROQ_API_KEY_NF:
+def _post_chat_completion(model: str, prompt: str) -> str:
+    """Conteúdo da resposta do modelo (str)."""
+    if not GROQ_API_KEY_NF and not llm_gateway.configurado():
         raise RuntimeError("GROQ_API_KEY_NF não configurada no ambiente.")
 
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY_NF}",
-        "Content-Type": "application/json",
-    }
-
-    body = {
-        "model": model,
-        "messages": [
-            {
-                "role": "system",
-                "content": (
-                    "Você é um especialista em leitura de notas fiscais brasileiras (NF-e), "
-                    "com foco em produtos controlados: armas, munições e acessórios. "
-                    "Retorne SEMPRE um JSON válido."
-                ),
-            },
-            {"role": "user", "content": prompt},
-        ],
-        # Força a saída JSON (padrão Groq compatível com OpenAI)
-        "response_format": {"type": "json_object"},
-        "temperature": 0.3,
-    }
+    mensagens = [
+        {
+            "role": "system",
+            "content": (
+                "Você é um especialista em leitura de notas fiscais brasileiras (NF-e), "
+                "com foco em produtos controlados: armas, munições e acessórios. "
+                "Retorne SEMPRE um JSON válido."
+            ),
+        },
+        {"role": "user", "content": prompt},
+    ]
 
     logger.info(f"[LLM_NF] Chamando modelo '{model}' (prompt chars: {len(prompt)})")
-    resp = requests.post(GROQ_ENDPOINT, headers=headers, json=body, timeout=120)
-
-    # Caso de sucesso (200)
-    if resp.status_code == 200:
-        return resp.json()
-
-    # Tenta ler payload de erro para tomar decisão de fallback
     try:
-        err = resp.json()
-    except Exception:
-        err = {"error": {"message": resp.text or "Erro desconhecido"}}
-
-    code = (err.get("error") or {}).get("code") or ""
-    message = (err.get("error") or {}).get("message") or ""
-    logger.warning(f"[LLM_NF] Erro {resp.status_code} no modelo '{model}': {message}")
+        # Força a saída JSON (padrão Groq compatível com OpenAI)
+        return llm_gateway.completar(
+            mensagens, modelo=model, temperatura=0.3, json_obj=True,
+            chave_api=GROQ_API_KEY_NF, timeout=120, cache_ttl=0,  # NF tem dados do cliente: fora do cache
+        )
+    except llm_gateway.ErroLLM as e:
+        if e.status is None:
+            raise RuntimeError(f"Erro na chamada LLM: {e.mensagem}") from e
+        status, code, message = e.status, e.codigo, e.mensagem
+        logger.warning(f"[LLM_NF] Erro {status} no modelo '{model}': {message}")
 
     # Sinais claros para tentar fallback de modelo:
     # - model_decommissioned
     # - model_not_found
     # - invalid_request_error com texto indicando deprecado
     decommission_signals = ["model_decommissioned", "model_not_found"]
-    if resp.status_code in (400, 404) and (
+    if status in (400, 404) and (
         any(s in code for s in decommission_signals)
         or "decommissioned" in message.lower()
         or "does not exist" in message.lower()
@@ -102,11 +90,11 @@ def _post_chat_completion(model: str, prompt: str) -> dict:
         raise ModelUnavailableError(message)
 
     # 413/429/402: limites/contexto/tier — repassar para camada acima
-    if resp.status_code in (402, 413, 429):
-        raise RuntimeError(f"Limite/Contexto: {resp.status_code} - {message}")
+    if status in (402, 413, 429):
+        raise RuntimeError(f"Limite/Contexto: {status} - {message}")
 
     # Demais erros — repassar
-    raise RuntimeError(f"Erro na chamada LLM: {resp.status_code} - {message}")
+    raise RuntimeError(f"Erro na chamada LLM: {status} - {message}")
 
 
 class ModelUnavailableError(Exception):
@@ -126,10 +114,9 @@ def _select_model_with_fallback(prompt: str) -> str:
     for model in _candidate_models():
         try:
             # Faz uma requisição curta de verificação (barata) com o próprio prompt.
-            data = _post_chat_completion(model, prompt)
-            # Se chegou aqui com 200, apenas valida o shape mínimo
-            content = (data.get("choices") or [{}])[0].get("message", {}).get("content", "")
-            # Não vamos parsear aqui — a função principal fará isso.
+            # Se chegou aqui sem erro, o modelo está ativo; a resposta fica no
+            # cache do gateway e a chamada efetiva logo abaixo não paga de novo.
+            _post_chat_completion(model, prompt)
             _SELECTED_MODEL = model
             logger.info(f"[LLM_NF] Modelo selecionado (cache): {model}")
             return _SELECTED_MODEL
@@ -158,10 +145,7 @@ def call_nf_llm(prompt: str):
     model = _select_model_with_fallback(prompt)
 
     # Chamada efetiva agora que já sabemos um modelo válido
-    data = _post_chat_completion(model, prompt)
-
-    # Extrai conteúdo
-    content = (data.get("choices") or [{}])[0].get("message", {}).get("content", "")
+    content = _post_chat_completion(model, prompt)
 
     # Tenta decodificar JSON; se não for possível, devolve texto bruto
     try:
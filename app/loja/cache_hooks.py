@@ -0,0 +1,231 @@
+"""
+app/loja/cache_hooks.py
+─────────────────────────────────────────────────────────────────────────────
+Invalidação do cache da loja por dependência.
+
+Cada entrada gravada pela loja declara de quais dados depende
+(ex.: 'produto:166', 'categoria:4', 'vitrine', 'layout'). O backend
+(app/utils/cache_backend.py) mantém um índice dependência → chaves, e os
+hooks SQLAlchemy abaixo apagam exatamente as chaves afetadas quando um
+Produto, Banner, PrateleiraHome, CategoriaProduto, MarcaProduto, Taxa,
+Configuracao ou PaginaInstitucional é salvo.
+
+A invalidação roda no after_commit: se a transação for desfeita, nada é
+apagado. Updates em massa via Query.update() não disparam esses eventos.
+
+Dependências usadas:
+    layout         menu, rodapé e configs loja_* (toda página HTML)
+    vitrine        home, busca e sugestões (listas sem categoria fixa)
+    banners        carrossel da home
+    marcas         logos da home e sidebars de categoria
+    parcelamento   tabelas de parcelas (mudam com Taxa)
+    sitemap        sitemap.xml e seus segmentos (app/loja/sitemap.py);
+                   implícita em todo commit que invalida um produto:<id>
+    produto:<id>   página e preços de um produto
+    categoria:<id> páginas/sidebars que listam produtos da categoria
+    marca:<id>     páginas de produto que exibem a marca
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import logging
+from functools import wraps
+
+from flask import g, request
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+logger = logging.getLogger(__name__)
+
+_hooks_registered = False
+_INFO_KEY = "m4_cache_dependencias"
+_ouvintes = []
+
+
+# ── Gravação com dependências ──────────────────────────────────────────────
+
+def _cache():
+    from app.loja.routes import cache
+    return cache
+
+
+def guardar(chave, valor, timeout, *dependencias):
+    """cache.set() + registro da chave em cada dependência."""
+    cache = _cache()
+    cache.set(chave, valor, timeout=timeout)
+
+    indexar = getattr(getattr(cache, "cache", None), "indexar_chave", None)
+    if not indexar:
+        return
+    for dep in set(dependencias):
+        try:
+            indexar(dep, chave, timeout)
+        except Exception as e:
+            logger.warning(f"[CACHE] Falha ao indexar {chave} em {dep}: {e}")
+
+
+def depende_de(*dependencias):
+    """Dentro de uma view com @cache_pagina: declara dependências da página."""
+    deps = g.get("cache_dependencias")
+    if deps is not None:
+        deps.update(d for d in dependencias if d)
+
+
+def cache_pagina(timeout=3600, chave=None):
+    """
+    Substituto de @cache.cached para páginas da loja: guarda o HTML
+    renderizado e o indexa em 'layout' + o que a view declarar via
+    depende_de(). Respostas que não são HTML (redirects, abort) não entram.
+    """
+    def decorador(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            cache = _cache()
+            key = "view/" + (chave() if chave else request.full_path)
+
+            html = cache.get(key)
+            if html is not None:
+                return html
+
+            g.cache_dependencias = {"layout"}
+            resposta = f(*args, **kwargs)
+            deps = g.pop("cache_dependencias", {"layout"})
+            if isinstance(resposta, str):
+                guardar(key, resposta, timeout, *deps)
+            return resposta
+        return wrapper
+    return decorador
+
+
+def invalidar(*dependencias):
+    """Apaga todas as chaves registradas nas dependências informadas."""
+    cache = _cache()
+    backend = getattr(cache, "cache", None)
+    consumir = getattr(backend, "consumir_indice", None)
+    if not consumir:
+        return 0
+
+    chaves = set()
+    for dep in set(dependencias):
+        if dep:
+            chaves |= consumir(dep)
+    if chaves:
+        backend.delete_many(*chaves)
+        logger.info(f"[CACHE] {len(chaves)} chave(s) invalidada(s) por {sorted(set(dependencias))}")
+    return len(chaves)
+
+
+# ── Mapeamento linha alterada → dependências ──────────────────────────────
+
+def _valores_antigos(target, campo):
+    """Valor atual + valor anterior (se mudou nesta transação)."""
+    atual = getattr(target, campo, None)
+    hist = inspect(target).attrs[campo].history
+    return {atual, *hist.deleted}
+
+
+def _deps_produto(target):
+    deps = {f"produto:{target.id}"}
+    if any(_valores_antigos(target, "visivel_loja")):
+        deps |= {"vitrine", "sitemap"}
+        deps |= {f"categoria:{c}" for c in _valores_antigos(target, "categoria_id") if c}
+    return deps
+
+
+def _deps_categoria(target):
+    deps = {"layout", "vitrine", "sitemap", f"categoria:{target.id}"}
+    deps |= {f"categoria:{c}" for c in _valores_antigos(target, "pai_id") if c}
+    return deps
+
+
+def _deps_marca(target):
+    return {"marcas", "vitrine", f"marca:{target.id}"}
+
+
+def _deps_fixas(*deps):
+    return lambda target: set(deps)
+
+
+def _acumular(calcular):
+    def listener(mapper, connection, target):
+        sessao = object_session(target)
+        if sessao is None:
+            return
+        try:
+            sessao.info.setdefault(_INFO_KEY, set()).update(calcular(target))
+        except Exception as e:
+            logger.warning(f"[CACHE] Falha ao mapear dependências de {target!r}: {e}")
+    return listener
+
+
+def marcar_para_invalidar(sessao, *dependencias):
+    """
+    Para escritas que não passam pelo mapper (UPDATE em lote): agenda a
+    invalidação para o próximo commit da sessão, como os hooks fazem.
+    """
+    sessao.info.setdefault(_INFO_KEY, set()).update(d for d in dependencias if d)
+
+
+def ao_invalidar(funcao):
+    """
+    Registra funcao(dependencias) para rodar após cada commit que invalidou
+    algo (ex.: índice do autocomplete em app/services/autocomplete.py).
+    """
+    if funcao not in _ouvintes:
+        _ouvintes.append(funcao)
+
+
+def _apos_commit(sessao):
+    deps = sessao.info.pop(_INFO_KEY, None)
+    if not deps:
+        return
+    if any(d.startswith("produto:") for d in deps):
+        # slug e atualizado_em entram no lastmod/ETag do sitemap
+        deps.add("sitemap")
+    try:
+        invalidar(*deps)
+    except Exception as e:
+        logger.error(f"[CACHE] Falha ao invalidar {sorted(deps)}: {e}")
+    for funcao in _ouvintes:
+        try:
+            funcao(deps)
+        except Exception as e:
+            logger.error(f"[CACHE] Falha no ouvinte {funcao.__name__}: {e}")
+
+
+def _apos_rollback(sessao):
+    sessao.info.pop(_INFO_KEY, None)
+
+
+def registrar_hooks():
+    global _hooks_registered
+    if _hooks_registered: return
+
+    try:
+        from app.produtos.models import Produto
+        from app.produtos.categorias.models import CategoriaProduto
+        from app.produtos.configs.models import MarcaProduto
+        from app.loja.models_admin import Banner, PaginaInstitucional, PrateleiraHome
+        from app.models import Taxa, Configuracao
+
+        mapa = {
+            Produto: _deps_produto,
+            CategoriaProduto: _deps_categoria,
+            MarcaProduto: _deps_marca,
+            Banner: _deps_fixas("banners"),
+            PrateleiraHome: _deps_fixas("vitrine"),
+            Taxa: _deps_fixas("parcelamento"),
+            Configuracao: _deps_fixas("layout"),
+            PaginaInstitucional: _deps_fixas("layout", "sitemap"),
+        }
+        for modelo, calcular in mapa.items():
+            listener = _acumular(calcular)
+            for evento in ("after_insert", "after_update", "after_delete"):
+                event.listen(modelo, evento, listener)
+
+        event.listen(Session, "after_commit", _apos_commit)
+        event.listen(Session, "after_rollback", _apos_rollback)
+
+        _hooks_registered = True
+        logger.info("cache_hooks: invalidação por dependência registrada")
+    except ImportError as e:
+        logger.warning(f"cache_hooks: não foi possível registrar hooks: {e}")
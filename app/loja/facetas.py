@@ -0,0 +1,204 @@
+"""
+app/loja/facetas.py
+─────────────────────────────────────────────────────────────────────────────
+Filtros facetados da página de categoria (marca, calibre, tipo,
+funcionamento e faixa de preço), com contagem e seleção múltipla.
+
+Antes, a sidebar carregava MarcaProduto/CalibreProduto com
+`.produtos.any(...)` + subqueryload(produtos) — todos os produtos de cada
+marca em memória só para listar nomes, e sem contagem nenhuma.
+
+Agora a categoria tem um "cubo" pré-calculado com UM GROUP BY:
+
+    (marca_id, calibre_id, tipo_id, funcionamento_id, faixa) → nº de produtos
+
+guardado no cache por categoria. As contagens de qualquer combinação de
+filtros saem desse cubo em Python (contagem disjuntiva: cada faceta conta
+com os filtros das OUTRAS facetas), então marcar 3 marcas + 2 calibres não
+custa nenhuma query extra.
+
+Na URL cada faceta aceita vários valores: ?marca=3&marca=7&faixa=500-2000
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import logging
+from collections import Counter
+
+from sqlalchemy import and_, case, func, or_
+
+from app import db
+from app.produtos.models import Produto
+from app.produtos.configs.models import (
+    MarcaProduto, CalibreProduto, TipoProduto, FuncionamentoProduto,
+)
+
+logger = logging.getLogger(__name__)
+
+# (chave na URL, rótulo, mínimo inclusivo, máximo exclusivo)
+FAIXAS_PRECO = (
+    ("ate-500", "Até R$ 500", None, 500),
+    ("500-2000", "R$ 500 a R$ 2.000", 500, 2000),
+    ("2000-5000", "R$ 2.000 a R$ 5.000", 2000, 5000),
+    ("5000-10000", "R$ 5.000 a R$ 10.000", 5000, 10000),
+    ("10000-20000", "R$ 10.000 a R$ 20.000", 10000, 20000),
+    ("acima-20000", "Acima de R$ 20.000", 20000, None),
+)
+
+# preco_max dos links antigos vira o menor destes tetos que o cobre: a
+# listagem, o cubo e a chave do cubo usam o teto, então há no máximo
+# len(TETOS_PRECO_MAX) cubos por categoria (acima do último, sem filtro)
+TETOS_PRECO_MAX = (100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000,
+                   7500, 10000, 15000, 20000, 30000, 50000)
+
+# dimensão → (coluna de Produto, modelo do rótulo, título na sidebar)
+DIMENSOES = {
+    "marca": (Produto.marca_id, MarcaProduto, "Fabricantes"),
+    "calibre": (Produto.calibre_id, CalibreProduto, "Calibres"),
+    "tipo": (Produto.tipo_id, TipoProduto, "Tipo"),
+    "funcionamento": (Produto.funcionamento_id, FuncionamentoProduto, "Funcionamento"),
+}
+ORDEM = ("faixa", "marca", "calibre", "tipo", "funcionamento")
+
+
+def _preco():
+    return func.coalesce(Produto.preco_a_vista, 0)
+
+
+def _expressao_faixa():
+    return case(
+        *[(_preco() < fim, chave) for chave, _, _, fim in FAIXAS_PRECO if fim is not None],
+        else_=FAIXAS_PRECO[-1][0],
+    )
+
+
+def teto_preco_max(valor):
+    """preco_max da URL → teto fixo de TETOS_PRECO_MAX (None = sem filtro)."""
+    if not valor or valor <= 0:
+        return None
+    return next((teto for teto in TETOS_PRECO_MAX if valor <= teto), None)
+
+
+# ── Cubo da categoria (1 query) ───────────────────────────────────────────
+
+def carregar_cubo(cat_ids, preco_max=None):
+    """
+    {"linhas": [(marca, calibre, tipo, funcionamento, faixa, total)],
+     "rotulos": {"marca": {id: nome}, ...}} dos produtos visíveis.
+
+    preco_max: filtro legado (?preco_max= de links antigos), aplicado como
+    na listagem para as contagens baterem com os produtos exibidos.
+    """
+    colunas, rotulos_cols, juncoes = [], [], []
+    for dim, (coluna, modelo, _) in DIMENSOES.items():
+        colunas.append(coluna)
+        rotulos_cols.append(modelo.nome.label(f"nome_{dim}"))
+        juncoes.append((modelo, coluna == modelo.id))
+    faixa = _expressao_faixa().label("faixa")
+
+    query = db.session.query(*colunas, faixa, *rotulos_cols, func.count(Produto.id))
+    for modelo, condicao in juncoes:
+        query = query.outerjoin(modelo, condicao)
+    query = query.filter(Produto.categoria_id.in_(list(cat_ids)), Produto.visivel_loja == True)
+    if preco_max:
+        query = query.filter(Produto.preco_a_vista <= preco_max)
+    linhas = query.group_by(*colunas, faixa, *rotulos_cols).all()
+
+    n = len(DIMENSOES)
+    cubo = {"linhas": [], "rotulos": {dim: {} for dim in DIMENSOES}}
+    for linha in linhas:
+        ids, faixa_valor, nomes, total = linha[:n], linha[n], linha[n + 1:2 * n + 1], linha[-1]
+        cubo["linhas"].append((*ids, faixa_valor, total))
+        for dim, valor, nome in zip(DIMENSOES, ids, nomes):
+            if valor is not None:
+                cubo["rotulos"][dim][valor] = nome
+    return cubo
+
+
+# ── Seleção (querystring) ────────────────────────────────────────────────
+
+def ler_selecao(args):
+    """request.args → {dimensão: frozenset de valores marcados}."""
+    selecao = {dim: frozenset(args.getlist(dim, type=int)) for dim in DIMENSOES}
+    validas = {chave for chave, *_ in FAIXAS_PRECO}
+    selecao["faixa"] = frozenset(v for v in args.getlist("faixa") if v in validas)
+    return selecao
+
+
+def args_da_selecao(selecao, dimensao=None, valor=None):
+    """Parâmetros de URL da seleção, alternando (marca/desmarca) `valor` em `dimensao`."""
+    args = {}
+    for dim in ORDEM:
+        valores = set(selecao.get(dim, ()))
+        if dim == dimensao:
+            valores ^= {valor}
+        if valores:
+            args[dim] = sorted(valores)
+    return args
+
+
+def filtrar(query, selecao):
+    """Aplica a seleção à query de produtos (IN por faceta; OR entre faixas)."""
+    for dim, (coluna, _, _) in DIMENSOES.items():
+        if selecao.get(dim):
+            query = query.filter(coluna.in_(sorted(selecao[dim])))
+    if selecao.get("faixa"):
+        intervalos = []
+        for chave, _, minimo, maximo in FAIXAS_PRECO:
+            if chave in selecao["faixa"]:
+                limites = []
+                if minimo is not None:
+                    limites.append(_preco() >= minimo)
+                if maximo is not None:
+                    limites.append(_preco() < maximo)
+                intervalos.append(and_(*limites))
+        query = query.filter(or_(*intervalos))
+    return query
+
+
+# ── Contagem ──────────────────────────────────────────────────────────────
+
+def contar_facetas(cubo, selecao):
+    """
+    Lista de facetas para a sidebar:
+        [{"dimensao", "titulo", "opcoes": [{"valor", "rotulo", "total", "ativo"}]}]
+    Cada faceta conta com os filtros das demais; opções marcadas aparecem
+    mesmo com total 0 (para poderem ser desmarcadas).
+    """
+    dims = tuple(DIMENSOES) + ("faixa",)
+    contagens = {dim: Counter() for dim in dims}
+    for linha in cubo["linhas"]:
+        valores, total = linha[:-1], linha[-1]
+        fora = [i for i, dim in enumerate(dims) if selecao.get(dim) and valores[i] not in selecao[dim]]
+        if len(fora) > 1:
+            continue
+        for i, dim in enumerate(dims):
+            if valores[i] is not None and (not fora or fora == [i]):
+                contagens[dim][valores[i]] += total
+
+    facetas = []
+    for dim in ORDEM:
+        marcados = selecao.get(dim, frozenset())
+        if dim == "faixa":
+            titulo = "Faixa de Preço"
+            candidatos = [(chave, rotulo) for chave, rotulo, *_ in FAIXAS_PRECO]
+        else:
+            titulo = DIMENSOES[dim][2]
+            rotulos = cubo["rotulos"][dim]
+            candidatos = sorted(rotulos.items(), key=lambda item: (item[1] or "").lower())
+        opcoes = [
+            {"valor": valor, "rotulo": rotulo, "total": contagens[dim][valor], "ativo": valor in marcados}
+            for valor, rotulo in candidatos
+            if contagens[dim][valor] or valor in marcados
+        ]
+        if opcoes:
+            facetas.append({"dimensao": dim, "titulo": titulo, "opcoes": opcoes})
+    return facetas
+
+
+def total_selecao(cubo, selecao):
+    """Nº exato de produtos que atendem a seleção inteira, direto do cubo."""
+    dims = tuple(DIMENSOES) + ("faixa",)
+    return sum(
+        linha[-1] for linha in cubo["linhas"]
+        if all(not selecao.get(dim) or linha[i] in selecao[dim] for i, dim in enumerate(dims))
+    )
@@ -32,4 +32,25 @@ class PaginaInstitucional(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
-        return f"<Pagina {self.titulo}>"
\ No newline at end of file
+        return f"<Pagina {self.titulo}>"
+# =========================
+# Prateleiras da Home
+# =========================
+class PrateleiraHome(db.Model):
+    __tablename__ = "loja_prateleiras"
+
+    id = db.Column(db.Integer, primary_key=True)
+    titulo = db.Column(db.String(100), nullable=False)            # Ex: 'Pistolas'
+    categorias = db.Column(db.String(512), nullable=False)        # Slugs separados por vírgula (subcategorias entram sozinhas)
+    limite = db.Column(db.Integer, default=4)                     # Quantos produtos exibir
+    ordenacao = db.Column(db.String(20), default="recentes")      # recentes, lancamentos, menor_preco, maior_preco
+    ordem = db.Column(db.Integer, default=0)                      # Ordem na home
+    ativo = db.Column(db.Boolean, default=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def lista_categorias(self):
+        return [s.strip() for s in (self.categorias or "").split(",") if s.strip()]
+
+    def __repr__(self):
+        return f"<Prateleira {self.titulo}>"
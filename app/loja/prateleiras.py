@@ -0,0 +1,150 @@
+"""
+app/loja/prateleiras.py
+─────────────────────────────────────────────────────────────────────────────
+Prateleiras da home ("Pistolas", "Revólveres"...) montadas com UMA query.
+
+Antes, cada prateleira fazia um ILIKE em CategoriaProduto, um subqueryload
+das subcategorias e mais uma query de produtos (8+ idas ao Postgres remoto
+numa home fria). Agora:
+
+  1. A resolução slug/termo → ids (com todos os descendentes) acontece
+     em Python sobre o snapshot da árvore de categorias
+     (app/produtos/categorias/arvore.py), sem ILIKE por requisição.
+  2. Os produtos de todas as prateleiras vêm numa query só, com
+     row_number() OVER (PARTITION BY prateleira ORDER BY ...) e o corte
+     por limite no próprio SQL.
+
+A configuração fica em PrateleiraHome (loja_admin → Prateleiras). Sem
+nenhuma cadastrada, usa PRATELEIRAS_PADRAO (as quatro de sempre).
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import logging
+
+from sqlalchemy import case, func, literal, select, union_all
+from sqlalchemy.orm import joinedload
+
+from app import db
+from app.produtos.models import Produto
+from app.produtos.categorias.arvore import arvore_categorias
+
+logger = logging.getLogger(__name__)
+
+# Termos: slug exato ou trecho do slug/nome (como o antigo get_smart_cat)
+PRATELEIRAS_PADRAO = (
+    {"titulo": "Pistolas", "categorias": ["pistola"], "limite": 4, "ordenacao": "recentes"},
+    {"titulo": "Revólveres", "categorias": ["revolver"], "limite": 4, "ordenacao": "recentes"},
+    {"titulo": "Rifles", "categorias": ["rifle"], "limite": 4, "ordenacao": "recentes"},
+    {"titulo": "Munições", "categorias": ["muni"], "limite": 4, "ordenacao": "recentes"},
+)
+
+ORDENACOES = {
+    "recentes": "Mais recentes (cadastro)",
+    "lancamentos": "Lançamentos (data de criação)",
+    "menor_preco": "Menor preço",
+    "maior_preco": "Maior preço",
+}
+
+
+# ── Categorias ────────────────────────────────────────────────────────────
+
+def resolver_categorias(termos, arvore):
+    """Slugs/termos → ids de categoria, já com todos os descendentes."""
+    nos = [(n.id, (n.slug or "").lower(), (n.nome or "").lower()) for n in arvore.nos()]
+    ids = set()
+    for termo in termos:
+        termo = (termo or "").strip().lower()
+        if not termo:
+            continue
+        exatos = [cid for cid, slug, _ in nos if slug == termo]
+        achados = exatos or [cid for cid, slug, nome in nos if termo in slug or termo in nome]
+        for cid in achados:
+            ids |= arvore.descendentes(cid)
+    return ids
+
+
+# ── Configuração ──────────────────────────────────────────────────────────
+
+def configuracao_prateleiras():
+    from app.loja.models_admin import PrateleiraHome
+
+    cadastradas = PrateleiraHome.query.filter_by(ativo=True)\
+        .order_by(PrateleiraHome.ordem.asc(), PrateleiraHome.id.asc()).all()
+    if not cadastradas:
+        return [dict(p) for p in PRATELEIRAS_PADRAO]
+    return [{
+        "titulo": p.titulo,
+        "categorias": p.lista_categorias,
+        "limite": p.limite or 4,
+        "ordenacao": p.ordenacao if p.ordenacao in ORDENACOES else "recentes",
+    } for p in cadastradas]
+
+
+# ── Query única ───────────────────────────────────────────────────────────
+
+def _chave_ordenacao(ordenacao):
+    """Expressão numérica crescente para o ORDER BY da janela."""
+    if ordenacao == "lancamentos":
+        return -func.coalesce(func.extract("epoch", Produto.criado_em), 0)
+    if ordenacao == "menor_preco":
+        return func.coalesce(Produto.preco_a_vista, 0)
+    if ordenacao == "maior_preco":
+        return -func.coalesce(Produto.preco_a_vista, 0)
+    return -Produto.id
+
+
+def consulta_prateleiras(config, arvore):
+    """
+    Query única de todas as prateleiras: linhas (Produto, índice da
+    prateleira) já cortadas pelo limite de cada uma. None se nenhuma
+    prateleira tiver categoria.
+    """
+    alvos = []
+    for i, p in enumerate(config):
+        for cid in sorted(resolver_categorias(p["categorias"], arvore)):
+            alvos.append(select(literal(i).label("prateleira"), literal(cid).label("categoria_id")))
+    if not alvos:
+        return None
+
+    alvos = union_all(*alvos).cte("alvos")
+    ordem = case(
+        *[(alvos.c.prateleira == i, _chave_ordenacao(p["ordenacao"])) for i, p in enumerate(config)],
+        else_=-Produto.id,
+    )
+    limite = case(
+        *[(alvos.c.prateleira == i, int(p["limite"])) for i, p in enumerate(config)],
+        else_=0,
+    )
+    rn = func.row_number().over(
+        partition_by=alvos.c.prateleira, order_by=(ordem, Produto.id.desc())
+    )
+    ranqueados = select(
+        Produto.id.label("produto_id"),
+        alvos.c.prateleira.label("prateleira"),
+        rn.label("rn"),
+        limite.label("limite"),
+    ).join(alvos, Produto.categoria_id == alvos.c.categoria_id)\
+     .where(Produto.visivel_loja == True).subquery("ranqueados")
+
+    return db.session.query(Produto, ranqueados.c.prateleira)\
+        .join(ranqueados, Produto.id == ranqueados.c.produto_id)\
+        .filter(ranqueados.c.rn <= ranqueados.c.limite)\
+        .options(joinedload(Produto.marca_rel), joinedload(Produto.categoria))\
+        .order_by(ranqueados.c.prateleira, ranqueados.c.rn)
+
+
+def montar_prateleiras(config=None):
+    """
+    Retorna {titulo: [Produto, ...]} na ordem da configuração, com todas as
+    prateleiras carregadas numa única query (janela + joinedload).
+    """
+    config = config if config is not None else configuracao_prateleiras()
+    resultado = {p["titulo"]: [] for p in config}
+
+    consulta = consulta_prateleiras(config, arvore_categorias())
+    if consulta is None:
+        return resultado
+
+    for produto, i in consulta.all():
+        resultado[config[i]["titulo"]].append(produto)
+    return resultado
@@ -9,13 +9,23 @@ from app.produtos.models import Produto
 from app.produtos.categorias.models import CategoriaProduto
 from app.models import Taxa, Configuracao
 from app.utils.r2_helpers import gerar_link_r2
-from app.utils.thumbnail_utils import get_thumb_url
+from app.utils import llm_gateway
+from app.utils.thumbnail_utils import get_thumb_url, get_srcset, picture_tag
+from app.loja.cache_hooks import cache_pagina, depende_de, guardar
+from app.loja.prateleiras import montar_prateleiras
+from app.loja import sitemap as sitemap_loja
+from app.loja.facetas import (
+    args_da_selecao, carregar_cubo, contar_facetas, filtrar, ler_selecao, teto_preco_max, total_selecao,
+)
+from app.services.busca_produtos import buscar_produtos, paginar_busca
+from app.services.autocomplete import sugerir, precos_a_vista
+from app.produtos.categorias.arvore import arvore_categorias
+from app.utils.paginacao import ordem_por_data, ordem_por_preco, paginar_keyset, url_com_cursor
 import app.utils.parcelamento as parcelamento_logic
+from app.services.parcelamento import coeficientes_vigentes, parcela_em
 from sqlalchemy import or_, func
-from sqlalchemy.orm import joinedload, subqueryload
+from sqlalchemy.orm import joinedload
 import os
-from datetime import datetime
-import pytz
 
 # ============================================================
 # INTERCEPTADOR DE SEO: REDIRECIONAMENTO 301 (MIGRAÇÃO DE DOMÍNIO)
@@ -92,15 +102,14 @@ def limpar_caminho_r2(caminho):
 # ============================================================
 @loja_bp.app_context_processor
 def inject_loja_data():
-    cache_key = 'loja_data_v3'
+    cache_key = 'loja_data_v4'
     cached_res = cache.get(cache_key)
     if cached_res:
         return cached_res
 
     try:
-        categorias_menu = CategoriaProduto.query.filter_by(pai_id=None, exibir_no_menu=True)\
-            .options(subqueryload(CategoriaProduto.subcategorias))\
-            .order_by(CategoriaProduto.ordem_exibicao.asc()).all()
+        # Árvore inteira (qualquer profundidade) vem do snapshot em memória
+        categorias_menu = [c for c in arvore_categorias().raizes if c.exibir_no_menu]
         
         paginas_rodape = PaginaInstitucional.query.filter_by(visivel_rodape=True).all()
         
@@ -114,7 +123,7 @@ def inject_loja_data():
             loja['banner_despachante_link'] = None
 
         res = dict(categorias_menu=categorias_menu, loja=loja, paginas_rodape=paginas_rodape)
-        cache.set(cache_key, res, timeout=3600)
+        guardar(cache_key, res, 3600, 'layout')
         return res
 
     except Exception as e:
@@ -123,80 +132,71 @@ def inject_loja_data():
 
 @loja_bp.app_context_processor
 def inject_thumb_helper():
-    return dict(get_thumb_url=get_thumb_url)
+    return dict(get_thumb_url=get_thumb_url, get_srcset=get_srcset, picture_tag=picture_tag)
+
+@loja_bp.app_context_processor
+def inject_parcelamento_helper():
+    # "12x de R$…" dos cards: preço × coeficiente, sem query por card
+    return dict(parcela_em=parcela_em)
 
 # ============================================================
 # VITRINE PRINCIPAL (CIRURGIA A LASER: OPTIMIZED GET_SMART_CAT)
 # ============================================================
 @loja_bp.route('/api/buscar-fuzzy')
-@cache.cached(timeout=300, query_string=True)
 def buscar_fuzzy():
     termo = request.args.get('q', '').strip()
     if not termo or len(termo) < 2:
         return jsonify([])
 
+    # Índice em memória: sem ida ao banco enquanto estiver quente
+    sugestoes = sugerir(termo, limite=10)
+    if sugestoes is not None:
+        precos = precos_a_vista(sugestoes)
+        return jsonify([{
+            'id': d.id,
+            'nome': d.nome,
+            'slug': d.slug,
+            'preco': float(precos[i] or 0),
+            'parcela_12x': parcela_em(precos[i] or 0, 12),
+            'foto': get_thumb_url(d.foto_url, 't160') if d.foto_url else url_for('static', filename='img/sem-foto.jpg')
+        } for i, d in enumerate(sugestoes)])
+
+    busca_key = f'busca_fuzzy_v3_{termo.lower()}'
+    resultados = cache.get(busca_key)
+    if resultados is not None:
+        return jsonify(resultados)
+
     def serializar(produtos):
+        # Preços do lote numa passada só, sem sujar os objetos da sessão
+        from app.services.precificacao_lote import calcular_precos_lote, colunas_de_produtos
+        precos = calcular_precos_lote(colunas_de_produtos(produtos))
         resultados = []
-        for p in produtos:
-            precos = p.calcular_precos()
+        for i, p in enumerate(produtos):
             resultados.append({
                 'id': p.id,
                 'nome': p.nome_comercial or p.nome,
                 'slug': p.slug,
-                'preco': float(precos.get('preco_a_vista', 0)),
-                'foto': get_thumb_url(p.foto_url, size='small') if p.foto_url else url_for('static', filename='img/sem-foto.jpg')
+                'preco': float(precos['preco_a_vista'][i] or 0),
+                'parcela_12x': parcela_em(precos['preco_a_vista'][i] or 0, 12),
+                'foto': get_thumb_url(p.foto_url, 't160') if p.foto_url else url_for('static', filename='img/sem-foto.jpg')
             })
         return resultados
 
-    # Busca Fuzzy usando pg_trgm similarity
-    # Priorizamos nome_comercial, nome e codigo
+    # Full-text + trigrama com ranking único (app/services/busca_produtos.py);
+    # sem Postgres/migration, o próprio serviço cai para ILIKE
     try:
-        # Usamos similarity() do PostgreSQL via func
-        # Nota: pg_trgm deve estar ativo no banco (ver migration 20260802_fuzzy_search_trgm)
-        sim_nome = func.similarity(Produto.nome, termo)
-        sim_comercial = func.similarity(Produto.nome_comercial, termo)
-        sim_codigo = func.similarity(Produto.codigo, termo)
-
-        # Maior similaridade entre os campos
-        max_sim = func.greatest(sim_nome, sim_comercial, sim_codigo)
-
-        produtos = Produto.query.filter(
-            Produto.visivel_loja == True,
-            or_(
-                Produto.nome.op('%')(termo), # Operador de similaridade trigrama
-                Produto.nome_comercial.op('%')(termo),
-                Produto.codigo.op('%')(termo)
-            )
-        ).order_by(max_sim.desc()).limit(10).all()
-
-        return jsonify(serializar(produtos))
+        produtos = buscar_produtos(termo, limite=10)
     except Exception as e:
-        current_app.logger.error(f"Erro na busca fuzzy (pg_trgm indisponível?): {e}")
-
-        # CRÍTICO: sem isso, a transação do Postgres fica "abortada" e TODA
-        # query seguinte nessa mesma conexão falha também — inclusive de
-        # outras rotas (ex.: comparador), até a conexão ser reciclada.
+        current_app.logger.error(f"Erro na busca fuzzy: {e}")
         db.session.rollback()
+        return jsonify([])
 
-        # Fallback para busca simples se o pg_trgm falhar ou não estiver disponível
-        busca_like = f"%{termo}%"
-        try:
-            produtos = Produto.query.filter(
-                Produto.visivel_loja == True,
-                or_(
-                    Produto.nome.ilike(busca_like),
-                    Produto.nome_comercial.ilike(busca_like),
-                    Produto.codigo.ilike(busca_like)
-                )
-            ).limit(10).all()
-            return jsonify(serializar(produtos))
-        except Exception as e2:
-            current_app.logger.error(f"Erro no fallback da busca: {e2}")
-            db.session.rollback()
-            return jsonify([])
+    resultados = serializar(produtos)
+    guardar(busca_key, resultados, 300, 'vitrine', 'parcelamento')
+    return jsonify(resultados)
 
 @loja_bp.route('/')
-@cache.cached(timeout=60, query_string=True, key_prefix='index_v9')
+@cache_pagina(timeout=3600)
 def index():
     termo_busca = request.args.get('q', '').strip()
     from app.produtos.configs.models import MarcaProduto
@@ -204,110 +204,52 @@ def index():
     gerador_limpo = lambda path: gerar_link_r2(limpar_caminho_r2(path))
 
     if termo_busca:
-        busca_like = f"%{termo_busca}%"
-
-        try:
-            # Mesma lógica de similaridade usada no /api/buscar-fuzzy: sem isso,
-            # esta página (resultado final da busca) nunca "perdoa" erros de
-            # digitação, mesmo que o dropdown de sugestões funcione.
-            sim_nome = func.similarity(Produto.nome, termo_busca)
-            sim_marca = func.similarity(MarcaProduto.nome, termo_busca)
-            max_sim = func.greatest(sim_nome, sim_marca)
-
-            query = Produto.query.join(Produto.marca_rel).filter(
-                Produto.visivel_loja == True
-            ).filter(
-                or_(
-                    Produto.nome.ilike(busca_like),
-                    Produto.codigo.ilike(busca_like),
-                    MarcaProduto.nome.ilike(busca_like),
-                    Produto.nome.op('%')(termo_busca),
-                    MarcaProduto.nome.op('%')(termo_busca)
-                )
-            ).options(joinedload(Produto.marca_rel), joinedload(Produto.categoria))
-
-            pagination = query.order_by(max_sim.desc(), Produto.criado_em.desc()).paginate(
-                page=request.args.get('page', 1, type=int),
-                per_page=12
-            )
-        except Exception as e:
-            current_app.logger.error(f"Erro na busca com pg_trgm na vitrine (fallback p/ ilike): {e}")
-            db.session.rollback()
-
-            query = Produto.query.join(Produto.marca_rel).filter(
-                Produto.visivel_loja == True
-            ).filter(
-                or_(
-                    Produto.nome.ilike(busca_like),
-                    Produto.codigo.ilike(busca_like),
-                    MarcaProduto.nome.ilike(busca_like)
-                )
-            ).options(joinedload(Produto.marca_rel), joinedload(Produto.categoria))
-
-            pagination = query.order_by(Produto.criado_em.desc()).paginate(
-                page=request.args.get('page', 1, type=int),
-                per_page=12
-            )
+        # Mesma busca/ranking do /api/buscar-fuzzy (app/services/busca_produtos.py)
+        pagination = paginar_busca(
+            termo_busca,
+            page=request.args.get('page', 1, type=int),
+            per_page=12,
+            opcoes=(joinedload(Produto.marca_rel), joinedload(Produto.categoria)),
+        )
 
+        depende_de('vitrine', 'parcelamento')
         return render_template('loja/index.html', 
                                produtos=pagination.items, 
                                pagination=pagination, 
                                gerar_link=gerador_limpo, 
                                termo_busca=termo_busca)
 
+    depende_de('vitrine', 'banners', 'marcas', 'parcelamento')
+
     lancamentos = cache.get('lancamentos_home_v5')
     if lancamentos is None:
         lancamentos = Produto.query.filter_by(visivel_loja=True)\
             .options(joinedload(Produto.marca_rel), joinedload(Produto.categoria))\
             .order_by(Produto.criado_em.desc()).limit(4).all()
-        cache.set('lancamentos_home_v5', lancamentos, timeout=300)
+        guardar('lancamentos_home_v5', lancamentos, 3600, 'vitrine')
 
     destaques = cache.get('destaques_home_v5')
     if destaques is None:
         destaques = Produto.query.filter_by(visivel_loja=True)\
             .options(joinedload(Produto.marca_rel), joinedload(Produto.categoria))\
             .order_by(Produto.id.desc()).limit(4).all()
-        cache.set('destaques_home_v5', destaques, timeout=300)
+        guardar('destaques_home_v5', destaques, 3600, 'vitrine')
 
-    prateleiras = cache.get('prateleiras_home_v9')
+    prateleiras = cache.get('prateleiras_home_v10')
     if prateleiras is None:
-        def get_smart_cat(termo, limite=4):
-            # CIRURGIA A LASER: subqueryload resolve o Timeout empacotando os dados numa viagem só
-            cats = CategoriaProduto.query.filter(
-                or_(CategoriaProduto.slug.ilike(f"%{termo}%"), CategoriaProduto.nome.ilike(f"%{termo}%"))
-            ).options(subqueryload(CategoriaProduto.subcategorias)).all()
-            
-            if not cats: return []
-            
-            ids_alvo = list(set(
-                [cat.id for cat in cats] + [s.id for cat in cats for s in cat.subcategorias]
-            ))
-            
-            resultado = Produto.query.filter(
-                Produto.visivel_loja == True,
-                Produto.categoria_id.in_(ids_alvo)
-            ).options(joinedload(Produto.marca_rel), joinedload(Produto.categoria))\
-             .order_by(Produto.id.desc()).limit(limite).all()
-             
-            return resultado
-
-        prateleiras = {
-            "Pistolas":   get_smart_cat("pistola"),
-            "Revólveres": get_smart_cat("revolver"),
-            "Rifles":     get_smart_cat("rifle"),
-            "Munições":   get_smart_cat("muni"),
-        }
-        cache.set('prateleiras_home_v9', prateleiras, timeout=300)
+        # Todas as prateleiras numa query só (ver app/loja/prateleiras.py)
+        prateleiras = montar_prateleiras()
+        guardar('prateleiras_home_v10', prateleiras, 3600, 'vitrine')
 
     banners = cache.get('banners_home_v2')
     if banners is None:
         banners = Banner.query.filter_by(ativo=True).order_by(Banner.ordem.asc()).all()
-        cache.set('banners_home_v2', banners, timeout=300)
+        guardar('banners_home_v2', banners, 3600, 'banners')
 
     marcas_home = cache.get('marcas_home_v2')
     if marcas_home is None:
         marcas_home = MarcaProduto.query.filter(MarcaProduto.logo_url != None).all()
-        cache.set('marcas_home_v2', marcas_home, timeout=3600)
+        guardar('marcas_home_v2', marcas_home, 3600, 'marcas')
 
     return render_template('loja/index.html', 
                            lancamentos=lancamentos, 
@@ -322,25 +264,23 @@ def index():
 # DETALHE DO PRODUTO
 # ============================================================
 @loja_bp.route('/produto/<string:slug>')
-@cache.cached(timeout=300, make_cache_key=lambda *args, **kwargs: request.path)
+@cache_pagina(timeout=3600, chave=lambda: request.path)
 def detalhe_produto(slug):
     produto = Produto.query.filter_by(slug=slug, visivel_loja=True)\
         .options(joinedload(Produto.marca_rel), joinedload(Produto.categoria))\
         .first_or_404()
+    depende_de(f'produto:{produto.id}', f'categoria:{produto.categoria_id}',
+               f'marca:{produto.marca_id}', 'parcelamento')
     
     precos_key = f'precos_v2_{produto.id}'
-    opcoes_parcelamento_key = f'opcoes_parcelamento_v2_{produto.id}'
-
     precos = cache.get(precos_key)
-    opcoes_parcelamento = cache.get(opcoes_parcelamento_key)
-
-    if precos is None or opcoes_parcelamento is None:
+    if precos is None:
         precos = produto.calcular_precos()
-        valor_base = float(precos.get('preco_a_vista') or 0.0)
-        taxas = Taxa.query.order_by(Taxa.numero_parcelas).all()
-        opcoes_parcelamento = parcelamento_logic.gerar_linhas_parcelas(valor_base, taxas)
-        cache.set(precos_key, precos, timeout=3600)
-        cache.set(opcoes_parcelamento_key, opcoes_parcelamento, timeout=3600)
+        guardar(precos_key, precos, 3600, f'produto:{produto.id}')
+
+    # Tabela de parcelas = preço × vetor de coeficientes (cacheado por versão das taxas)
+    valor_base = float(precos.get('preco_a_vista') or 0.0)
+    opcoes_parcelamento = parcelamento_logic.linhas_por_coeficientes(valor_base, coeficientes_vigentes())
     
     parcela_12x = next((item for item in opcoes_parcelamento if item["rotulo"] == "12x"), None)
     
@@ -356,7 +296,7 @@ def detalhe_produto(slug):
             joinedload(Produto.marca_rel), 
             joinedload(Produto.categoria)
         ).limit(4).all()
-        cache.set(relacionados_key, relacionados, timeout=3600)
+        guardar(relacionados_key, relacionados, 3600, f'categoria:{produto.categoria_id}')
 
     gerador_limpo = lambda path: gerar_link_r2(limpar_caminho_r2(path))
 
@@ -375,76 +315,83 @@ def detalhe_produto(slug):
 # PÁGINA DE CATEGORIA
 # ============================================================
 @loja_bp.route('/categoria/<string:slug_categoria>')
-@cache.cached(timeout=300, make_cache_key=lambda *args, **kwargs: request.full_path)
+@cache_pagina(timeout=3600)
 def categoria(slug_categoria):
-    categoria_obj = CategoriaProduto.query.filter_by(slug=slug_categoria)\
-        .options(subqueryload(CategoriaProduto.subcategorias)).first_or_404()
+    arvore = arvore_categorias()
+    categoria_obj = arvore.por_slug(slug_categoria)
+    if categoria_obj is None:
+        abort(404)
     
-    marca_id = request.args.get('marca', type=int)
-    calibre_id = request.args.get('calibre', type=int)
-    preco_max = request.args.get('preco_max', type=float)
+    selecao = ler_selecao(request.args)
+    # Links antigos; arredondado para um teto fixo (chave do cubo limitada)
+    preco_max = teto_preco_max(request.args.get('preco_max', type=float))
     sort = request.args.get('sort', 'novidades') 
-    page = request.args.get('page', 1, type=int)
+
+    # Paginação por cursor: ?page=N antigo (links indexados, robôs) volta
+    # para o início da listagem com os mesmos filtros. 302: a página N não
+    # "virou" a 1 para sempre (301 ficaria no cache do navegador/robô)
+    if request.args.get('page', 1, type=int) > 1 and not request.args.get('cursor'):
+        return redirect(url_com_cursor(None), code=302)
     
-    cat_ids = [categoria_obj.id] + [sub.id for sub in categoria_obj.subcategorias]
+    cat_ids = sorted(arvore.descendentes(categoria_obj.id))
+    deps_categoria = [f'categoria:{cid}' for cid in cat_ids]
+    depende_de('marcas', 'parcelamento', *deps_categoria)
     
     query = Produto.query.filter(Produto.categoria_id.in_(cat_ids), Produto.visivel_loja == True)\
                          .options(joinedload(Produto.marca_rel), joinedload(Produto.categoria))
 
-    if marca_id: query = query.filter(Produto.marca_id == marca_id)
-    if calibre_id: query = query.filter(Produto.calibre_id == calibre_id)
+    query = filtrar(query, selecao)
     if preco_max: query = query.filter(Produto.preco_a_vista <= preco_max)
 
     if sort == 'menor_preco':
-        query = query.order_by(Produto.preco_a_vista.asc())
+        ordem = ordem_por_preco(Produto.preco_a_vista, Produto.id)
     elif sort == 'maior_preco':
-        query = query.order_by(Produto.preco_a_vista.desc())
+        ordem = ordem_por_preco(Produto.preco_a_vista, Produto.id, descendente=True)
     else:
-        query = query.order_by(Produto.criado_em.desc())
+        ordem = ordem_por_data(Produto.criado_em, Produto.id)
 
-    try:
-        pagination = query.paginate(page=page, per_page=12, error_out=False)
-    except Exception:
-        abort(404)
+    pagina = paginar_keyset(query, ordem, request.args.get('cursor'), por_pagina=12)
 
-    from app.produtos.configs.models import MarcaProduto, CalibreProduto
-    
-    marcas_vivas_key = f'marcas_sidebar_{categoria_obj.id}'
-    calibres_vivas_key = f'calibres_sidebar_{categoria_obj.id}'
-    
-    marcas_vivas = cache.get(marcas_vivas_key)
-    calibres_vivos = cache.get(calibres_vivas_key)
-
-    if not marcas_vivas:
-        marcas_vivas = MarcaProduto.query.filter(
-            MarcaProduto.produtos.any(Produto.categoria_id.in_(cat_ids))
-        ).options(subqueryload(MarcaProduto.produtos)).all()
-        cache.set(marcas_vivas_key, marcas_vivas, timeout=600)
-    
-    if not calibres_vivos:
-        calibres_vivos = CalibreProduto.query.filter(
-            CalibreProduto.produtos.any(Produto.categoria_id.in_(cat_ids))
-        ).options(subqueryload(CalibreProduto.produtos)).all()
-        cache.set(calibres_vivas_key, calibres_vivos, timeout=600)
+    # Cubo de facetas da categoria: 1 GROUP BY, contagens de qualquer
+    # combinação de filtros calculadas em memória (app/loja/facetas.py)
+    # (o filtro legado preco_max entra no cubo, com chave própria)
+    cubo_key = f'facetas_categoria_v1_{categoria_obj.id}' + (f'_max{preco_max}' if preco_max else '')
+    cubo = cache.get(cubo_key)
+    if cubo is None:
+        cubo = carregar_cubo(cat_ids, preco_max)
+        guardar(cubo_key, cubo, 3600, 'marcas', *deps_categoria)
+
+    # Total exato saído do cubo, sem COUNT
+    total = total_selecao(cubo, selecao)
+
+    filtros_args = args_da_selecao(selecao)
+    if preco_max:
+        filtros_args['preco_max'] = preco_max
+
+    def url_faceta(dimensao, valor):
+        return url_for('loja.categoria', slug_categoria=categoria_obj.slug, sort=sort,
+                       **args_da_selecao(selecao, dimensao, valor),
+                       **({'preco_max': preco_max} if preco_max else {}))
 
     gerador_limpo = lambda path: gerar_link_r2(limpar_caminho_r2(path))
 
     return render_template('loja/categoria.html', 
-                           produtos=pagination.items, pagination=pagination,
-                           categoria_ativa=categoria_obj, marcas=marcas_vivas, 
-                           calibres=calibres_vivos, sort_atual=sort,
-                           filtros={'marca': marca_id, 'calibre': calibre_id, 'preco_max': preco_max},
+                           produtos=pagina.itens, pagina=pagina, total=total,
+                           categoria_ativa=categoria_obj,
+                           facetas=contar_facetas(cubo, selecao),
+                           url_faceta=url_faceta, sort_atual=sort,
+                           filtros_args=filtros_args,
                            gerar_link=gerador_limpo)
 
 
 @loja_bp.route('/p/<string:slug>')
-@cache.cached(timeout=3600, make_cache_key=lambda *args, **kwargs: request.path)
+@cache_pagina(timeout=3600, chave=lambda: request.path)
 def exibir_pagina(slug):
     pagina = PaginaInstitucional.query.filter_by(slug=slug).first_or_404()
     return render_template('loja/pagina_institucional.html', pagina=pagina)
 
 @loja_bp.route('/fale-conosco')
-@cache.cached(timeout=3600)
+@cache_pagina(timeout=3600, chave=lambda: request.path)
 def fale_conosco():
     return render_template('loja/fale_conosco.html', title="Fale Conosco - M4 Tática")
 
@@ -454,35 +401,13 @@ def google_verification():
     return send_from_directory(static_dir, 'google8fe23db2fb19380f.html')
 
 @loja_bp.route('/sitemap.xml', strict_slashes=False)
-@cache.cached(timeout=86400, key_prefix='sitemap_xml_v3')
 def sitemap():
-    # 1. Configuração do fuso horário e domínio base blindado contra o proxy do Render
-    tz = pytz.timezone('America/Sao_Paulo')
-    hoje = datetime.now(tz).strftime('%Y-%m-%d')
-    base_url = "https://loja.m4tatica.com.br"
-    
-    xml = ['<?xml version="1.0" encoding="UTF-8"?>']
-    xml.append('<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">')
-    
-    # 2. Rota Principal (Home)
-    xml.append(f'  <url>\n    <loc>{base_url}/</loc>\n    <lastmod>{hoje}</lastmod>\n    <changefreq>daily</changefreq>\n    <priority>1.0</priority>\n  </url>')
-    
-    # 3. Rotas de Categorias
-    categorias = CategoriaProduto.query.with_entities(CategoriaProduto.slug).all()
-    for cat in categorias:
-        xml.append(f'  <url>\n    <loc>{base_url}/categoria/{cat.slug}</loc>\n    <changefreq>weekly</changefreq>\n    <priority>0.8</priority>\n  </url>')
-        
-    # 4. Rotas de Produtos
-    produtos = Produto.query.filter_by(visivel_loja=True).with_entities(Produto.slug).all()
-    for prod in produtos:
-        xml.append(f'  <url>\n    <loc>{base_url}/produto/{prod.slug}</loc>\n    <changefreq>weekly</changefreq>\n    <priority>0.9</priority>\n  </url>')
-        
-    xml.append('</urlset>')
-    
-    # 5. Gera a resposta forçando o cabeçalho correto para o Google ler como XML puro
-    response = make_response('\n'.join(xml))
-    response.headers["Content-Type"] = "application/xml; charset=utf-8"
-    return response
+    # Índice dos segmentos, em streaming e com GET condicional (app/loja/sitemap.py)
+    return sitemap_loja.resposta_indice()
+
+@loja_bp.route('/sitemap-<string:segmento>.xml')
+def sitemap_segmento(segmento):
+    return sitemap_loja.resposta_segmento(segmento)
 
 @loja_bp.route('/robots.txt')
 def robots_txt():
@@ -518,18 +443,27 @@ def otimizar_banco():
 @login_required
 def limpar_cache():
     try:
-        cache.delete('prateleiras_home_v6')
-        cache.delete('prateleiras_home_v7')
-        cache.delete('prateleiras_home_v8')
-        cache.delete('lancamentos_home_v4')
-        cache.delete('destaques_home_v4')
-        cache.delete('banners_home')
-        cache.delete('marcas_home')
-        cache.delete('loja_data_v3')
+        # Edições já invalidam o que dependem (app/loja/cache_hooks.py);
+        # aqui é o "botão de pânico": zera todo o cache da loja.
+        cache.clear()
         return "✅ Cache limpo com sucesso! As prateleiras serão reconstruídas no próximo acesso."
     except Exception as e:
         return f"❌ Erro ao limpar cache: {str(e)}"
 
+@loja_bp.route('/sistema/cache-stats')
+@login_required
+def cache_stats():
+    # Contadores de hit/miss por prefixo (por worker) do backend em app/utils/cache_backend.py
+    backend = getattr(cache, 'cache', None) if cache_enabled else None
+    estatisticas = getattr(backend, 'estatisticas', None)
+    if not estatisticas:
+        return jsonify({'backend': type(backend).__name__ if backend else None, 'prefixos': {}})
+    return jsonify({
+        'backend': backend.backend_ativo,
+        'pid': os.getpid(),
+        'prefixos': estatisticas()
+    })
+
 @loja_bp.route('/comparador')
 def comparador():
     return render_template('loja/comparador.html')
@@ -624,27 +558,27 @@ def gerar_analise_local(produtos_data):
     return analise
 
 def gerar_analise_comparativa(produtos_data):
-    api_key = os.getenv('GROQ_API_KEY')
     model_name = os.getenv('GROQ_MODEL', 'llama-3.1-8b-instant')
     
-    if not api_key: return gerar_analise_local(produtos_data)
+    if not llm_gateway.configurado(): return gerar_analise_local(produtos_data)
     
     try:
-        from groq import Groq
-        client = Groq(api_key=api_key)
         produtos_info = "\n\n".join([f"[ARMAMENTO: {p['nome'].upper()}]\nCategoria: {p['categoria']}\nCalibre: {p['calibre']}\nPreço: R$ {p['preco_vista']:.2f}\nMarca: {p['especificacoes']['marca']}" for p in produtos_data])
         
         prompt = f"Atue como um Engenheiro de Armamento e Instrutor Tático de nível Sênior. Abaixo estão os dados de armamentos. Utilize sua base de conhecimento real sobre os modelos para preencher dimensões, peso e capacidade padrão.\n\nDADOS COMERCIAIS:\n{produtos_info}\n\nESTRUTURA: 1. Resumo Técnico | 2. Comparação de Desempenho | 3. Adequação Operacional | 4. Veredito. Limite-se a 450 palavras. Não use emojis. Use os nomes reais das armas."
         
-        chat_completion = client.chat.completions.create(
-            messages=[
+        # Mesma comparação (mesmos produtos e preços) sai do cache do gateway.
+        # Sem ficha no limite de taxa falha na hora e cai na análise local
+        return llm_gateway.completar(
+            [
                 {"role": "system", "content": "Você é um perito em armamento tático. Responda em PT-BR, tom estritamente formal. Não use emojis."},
                 {"role": "user", "content": prompt}
             ],
-            model=model_name,
-            temperature=0.3,
+            modelo=model_name,
+            temperatura=0.3,
             max_tokens=1024,
+            timeout=20,
+            espera_max=0,
         )
-        return chat_completion.choices[0].message.content
     except Exception:
         return gerar_analise_local(produtos_data)
\ No newline at end of file
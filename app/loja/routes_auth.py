@@ -2,7 +2,7 @@
 import os
 from datetime import date
 from urllib.parse import urlparse, urljoin
-from flask import render_template, request, redirect, url_for, flash, send_file, abort, current_app
+from flask import render_template, request, redirect, url_for, flash, send_file, abort, current_app, jsonify
 from werkzeug.utils import secure_filename
 from app import db
 import sqlalchemy as sa
@@ -15,7 +15,8 @@ from app.extensions import limiter
 
 # 🛠️ Storage tático M4: uploads do cliente agora vão direto pro R2,
 # nunca mais para o disco local (que é efêmero no Render).
-from app.utils.r2_helpers import upload_file_to_r2, gerar_link_r2
+from app.utils.r2_helpers import upload_file_to_r2, gerar_link_r2, BUCKET_PRIVADO
+from app.utils import upload_direto as direto
 from app.utils.storage import deletar_arquivo
 
 EXTENSOES_OK  = {'pdf', 'jpg', 'jpeg', 'png'}
@@ -309,26 +310,61 @@ def excluir_arma(arma_id):
     flash('Arma removida do arsenal.', 'info')
     return redirect(url_for('loja.meus_documentos'))
 
+@loja_bp.route('/meus-documentos/upload/emitir', methods=['POST'])
+@cliente_logado_required
+def emitir_upload_documento():
+    """
+    URL PUT pré-assinada para o navegador mandar o documento direto ao R2
+    (app/utils/upload_direto.py); o formulário depois é enviado só com o ticket.
+    """
+    cliente = get_cliente_logado()
+    dados = request.get_json(silent=True) or {}
+    nome = dados.get('nome') or ''
+    if not _ext_ok(nome):
+        return jsonify({'error': 'Selecione um arquivo válido (PDF, JPG, PNG).'}), 400
+    try:
+        content_type, tamanho = direto.validar('documento', nome, dados.get('content_type'), dados.get('tamanho'))
+        key = f"clientes/{cliente.id}/docs/{direto.nome_unico(nome)}"
+        return jsonify(direto.emitir('documento', BUCKET_PRIVADO, key, content_type, tamanho,
+                                     nome=nome, cliente_id=cliente.id))
+    except direto.UploadInvalido as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        current_app.logger.exception(f"[LOJA] Falha ao emitir upload direto: {e}")
+        return jsonify({'error': 'Erro ao preparar o envio para o storage.'}), 500
+
+
 @loja_bp.route('/meus-documentos/upload', methods=['POST'])
 @cliente_logado_required
 def upload_documento():
     cliente = get_cliente_logado()
-    arquivo = request.files.get('arquivo')
-    if not arquivo or not _ext_ok(arquivo.filename):
-        flash('Selecione um arquivo válido (PDF, JPG, PNG).', 'warning')
-        return redirect(url_for('loja.meus_documentos'))
-    if not _magic_ok(arquivo):
-        flash('O conteúdo do arquivo é inválido ou está corrompido.', 'danger')
-        return redirect(url_for('loja.meus_documentos'))
-    
-    caminho = upload_file_to_r2(arquivo, folder=f"clientes/{cliente.id}/docs")
-    if not caminho:
-        flash('Erro ao enviar arquivo para o storage.', 'danger')
-        return redirect(url_for('loja.meus_documentos'))
-    
+    ticket = request.form.get('upload_ticket')
+    if ticket:
+        # Arquivo já enviado direto ao R2 pelo navegador: só confirma
+        try:
+            arquivo_r2 = direto.confirmar(ticket, 'documento', cliente_id=cliente.id)
+        except direto.UploadInvalido as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('loja.meus_documentos'))
+        caminho, nome_arquivo = arquivo_r2['key'], arquivo_r2['nome_original']
+    else:
+        arquivo = request.files.get('arquivo')
+        if not arquivo or not _ext_ok(arquivo.filename):
+            flash('Selecione um arquivo válido (PDF, JPG, PNG).', 'warning')
+            return redirect(url_for('loja.meus_documentos'))
+        if not _magic_ok(arquivo):
+            flash('O conteúdo do arquivo é inválido ou está corrompido.', 'danger')
+            return redirect(url_for('loja.meus_documentos'))
+
+        caminho = upload_file_to_r2(arquivo, folder=f"clientes/{cliente.id}/docs")
+        if not caminho:
+            flash('Erro ao enviar arquivo para o storage.', 'danger')
+            return redirect(url_for('loja.meus_documentos'))
+        nome_arquivo = arquivo.filename
+
     doc = Documento(
         cliente_id=cliente.id,
-        nome=request.form.get('nome') or arquivo.filename,
+        nome=request.form.get('nome') or nome_arquivo,
         tipo=request.form.get('tipo') or 'Outros',
         caminho=caminho,
         categoria=CATEGORIA_LOJA,
@@ -0,0 +1,245 @@
+"""
+app/loja/sitemap.py
+─────────────────────────────────────────────────────────────────────────────
+Sitemap da loja: índice + sitemaps filhos, gerados em streaming.
+
+Antes era um único XML montado numa lista em memória, sem <lastmod> nos
+produtos e cacheado 24h por processo — o crawler baixava tudo de novo a
+cada visita. Agora:
+
+    /sitemap.xml                  <sitemapindex> com o lastmod de cada segmento
+    /sitemap-paginas.xml          home, fale conosco e páginas institucionais
+    /sitemap-categorias.xml       categorias (lastmod = última mudança nela ou
+                                  em qualquer produto dela)
+    /sitemap-produtos-<n>.xml     produtos com id em [n·5000, (n+1)·5000)
+
+Os segmentos de produto são faixas FIXAS de id: editar um produto muda o
+lastmod/ETag só do segmento dele, então o crawler (If-None-Match /
+If-Modified-Since) recebe 304 em todos os outros.
+
+Os metadados dos segmentos (lastmod, nº de URLs) saem de poucos GROUP BY e
+ficam no cache com a dependência 'sitemap'; os corpos não são cacheados —
+cada filho é uma consulta por faixa de PK escrita direto na resposta.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import hashlib
+import logging
+from datetime import timezone, timedelta
+from xml.sax.saxutils import escape
+
+from flask import Response, abort, current_app, request, stream_with_context
+from sqlalchemy import case, func
+from werkzeug.http import is_resource_modified
+
+from app import db
+from app.loja.cache_hooks import guardar
+from app.loja.models_admin import PaginaInstitucional
+from app.produtos.models import Produto
+from app.produtos.categorias.models import CategoriaProduto
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_SEGMENTO = 5000
+CHAVE_SEGMENTOS = "sitemap_segmentos_v1"
+URL_BASE_PADRAO = "https://loja.m4tatica.com.br"
+
+_UTC_3 = timezone(timedelta(hours=-3))
+_LOTE = 1000
+
+
+def _url_base():
+    return current_app.config.get("LOJA_URL_BASE", URL_BASE_PADRAO).rstrip("/")
+
+
+def _utc(valor, fuso_padrao=_UTC_3):
+    """Datas do banco → UTC com fuso (naive = fuso padrão da coluna)."""
+    if valor is None:
+        return None
+    if valor.tzinfo is None:
+        valor = valor.replace(tzinfo=fuso_padrao)
+    return valor.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def _w3c(valor):
+    return valor.strftime("%Y-%m-%dT%H:%M:%S+00:00") if valor else None
+
+
+def _maior(*valores):
+    validos = [v for v in valores if v is not None]
+    return max(validos) if validos else None
+
+
+# ── Metadados dos segmentos ───────────────────────────────────────────────
+
+def _calcular_segmentos():
+    """{nome: {"lastmod": datetime UTC | None, "total": n, "assinatura": str}}"""
+    segmentos = {}
+
+    # Produtos por faixa de id: lastmod inclui os ocultos (esconder um
+    # produto também muda o segmento); assinatura = contagem + soma de ids
+    faixa = (Produto.id // TAMANHO_SEGMENTO).label("faixa")
+    visivel = case((Produto.visivel_loja == True, 1), else_=0)
+    linhas = db.session.query(
+        faixa,
+        func.max(Produto.atualizado_em),
+        func.sum(visivel),
+        func.sum(visivel * Produto.id),
+    ).group_by(faixa).all()
+    ultimo_produto = None
+    for numero, atualizado, total, soma_ids in linhas:
+        atualizado = _utc(atualizado)
+        ultimo_produto = _maior(ultimo_produto, atualizado)
+        if total:
+            segmentos[f"produtos-{int(numero)}"] = {
+                "lastmod": atualizado, "total": int(total), "assinatura": f"{total}:{soma_ids}",
+            }
+
+    categorias = db.session.query(
+        func.max(CategoriaProduto.atualizado_em), func.count(CategoriaProduto.id),
+    ).one()
+    lastmod_categorias = _maior(_utc(categorias[0]), ultimo_produto)
+    segmentos["categorias"] = {
+        "lastmod": lastmod_categorias, "total": categorias[1], "assinatura": str(categorias[1]),
+    }
+
+    paginas = db.session.query(
+        func.max(PaginaInstitucional.updated_at), func.count(PaginaInstitucional.id),
+    ).one()
+    segmentos["paginas"] = {
+        "lastmod": _maior(_utc(paginas[0], timezone.utc), ultimo_produto),
+        "total": paginas[1] + 2, "assinatura": str(paginas[1]),
+    }
+    return segmentos
+
+
+def segmentos():
+    from app.loja.routes import cache
+    dados = cache.get(CHAVE_SEGMENTOS)
+    if dados is None:
+        dados = _calcular_segmentos()
+        guardar(CHAVE_SEGMENTOS, dados, 86400, "sitemap")
+    return dados
+
+
+def _etag(*partes):
+    return hashlib.sha1("|".join(str(p) for p in partes).encode()).hexdigest()[:20]
+
+
+# ── Corpos (geradores) ────────────────────────────────────────────────────
+
+def _url(loc, lastmod=None, changefreq=None, priority=None):
+    linhas = [f"  <url>\n    <loc>{escape(loc)}</loc>\n"]
+    if lastmod:
+        linhas.append(f"    <lastmod>{_w3c(lastmod)}</lastmod>\n")
+    if changefreq:
+        linhas.append(f"    <changefreq>{changefreq}</changefreq>\n")
+    if priority:
+        linhas.append(f"    <priority>{priority}</priority>\n")
+    linhas.append("  </url>\n")
+    return "".join(linhas)
+
+
+_CABECALHO_URLSET = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                     '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+
+
+def gerar_indice(dados):
+    base = _url_base()
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+    for nome in sorted(dados, key=_ordem_segmento):
+        lastmod = dados[nome]["lastmod"]
+        yield f"  <sitemap>\n    <loc>{base}/sitemap-{nome}.xml</loc>\n"
+        if lastmod:
+            yield f"    <lastmod>{_w3c(lastmod)}</lastmod>\n"
+        yield "  </sitemap>\n"
+    yield "</sitemapindex>\n"
+
+
+def _ordem_segmento(nome):
+    if nome.startswith("produtos-"):
+        return (2, int(nome.rsplit("-", 1)[1]))
+    return (0 if nome == "paginas" else 1, 0)
+
+
+def gerar_paginas(lastmod_home):
+    base = _url_base()
+    yield _CABECALHO_URLSET
+    yield _url(f"{base}/", lastmod_home, "daily", "1.0")
+    yield _url(f"{base}/fale-conosco", None, "monthly", "0.3")
+    paginas = db.session.query(PaginaInstitucional.slug, PaginaInstitucional.updated_at)\
+        .order_by(PaginaInstitucional.id)
+    for slug, atualizado in paginas:
+        yield _url(f"{base}/p/{slug}", _utc(atualizado, timezone.utc), "monthly", "0.3")
+    yield "</urlset>\n"
+
+
+def gerar_categorias():
+    base = _url_base()
+    yield _CABECALHO_URLSET
+    # Última mudança de produto por categoria direta (1 GROUP BY)
+    por_categoria = dict(
+        db.session.query(Produto.categoria_id, func.max(Produto.atualizado_em))
+        .filter(Produto.categoria_id.isnot(None)).group_by(Produto.categoria_id).all()
+    )
+    categorias = db.session.query(CategoriaProduto.id, CategoriaProduto.slug, CategoriaProduto.atualizado_em)\
+        .filter(CategoriaProduto.slug.isnot(None)).order_by(CategoriaProduto.id)
+    for cat_id, slug, atualizado in categorias:
+        lastmod = _maior(_utc(atualizado), _utc(por_categoria.get(cat_id)))
+        yield _url(f"{base}/categoria/{slug}", lastmod, "weekly", "0.8")
+    yield "</urlset>\n"
+
+
+def gerar_produtos(numero):
+    base = _url_base()
+    inicio = numero * TAMANHO_SEGMENTO
+    yield _CABECALHO_URLSET
+    linhas = db.session.query(Produto.slug, Produto.atualizado_em)\
+        .filter(Produto.visivel_loja == True, Produto.slug.isnot(None),
+                Produto.id >= inicio, Produto.id < inicio + TAMANHO_SEGMENTO)\
+        .order_by(Produto.id).execution_options(yield_per=_LOTE)
+    for slug, atualizado in linhas:
+        yield _url(f"{base}/produto/{slug}", _utc(atualizado), "weekly", "0.9")
+    yield "</urlset>\n"
+
+
+# ── Respostas HTTP ────────────────────────────────────────────────────────
+
+def _responder(gerador, etag, lastmod):
+    """304 se o crawler já tem esta versão; senão XML em streaming."""
+    if not is_resource_modified(request.environ, etag=etag, last_modified=lastmod):
+        resposta = Response(status=304)
+    else:
+        resposta = Response(stream_with_context(gerador()), mimetype="application/xml")
+        resposta.headers["Content-Type"] = "application/xml; charset=utf-8"
+    resposta.set_etag(etag)
+    if lastmod:
+        resposta.last_modified = lastmod
+    resposta.cache_control.public = True
+    resposta.cache_control.max_age = 3600
+    return resposta
+
+
+def resposta_indice():
+    dados = segmentos()
+    lastmod = _maior(*(d["lastmod"] for d in dados.values()))
+    etag = _etag(*(f"{nome}:{d['lastmod']}:{d['assinatura']}" for nome, d in sorted(dados.items())))
+    return _responder(lambda: gerar_indice(dados), etag, lastmod)
+
+
+def resposta_segmento(nome):
+    dados = segmentos()
+    info = dados.get(nome)
+    if info is None:
+        abort(404)
+    etag = _etag(nome, info["lastmod"], info["assinatura"])
+
+    if nome == "paginas":
+        gerador = lambda: gerar_paginas(info["lastmod"])
+    elif nome == "categorias":
+        gerador = gerar_categorias
+    else:
+        numero = int(nome.rsplit("-", 1)[1])
+        gerador = lambda: gerar_produtos(numero)
+    return _responder(gerador, etag, info["lastmod"])
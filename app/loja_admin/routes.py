@@ -7,7 +7,7 @@ from flask_login import login_required, current_user
 from sqlalchemy import or_, and_ 
 from app.produtos.models import Produto
 from app.loja_admin import loja_admin_bp
-from app.loja.models_admin import Banner, PaginaInstitucional
+from app.loja.models_admin import Banner, PaginaInstitucional, PrateleiraHome
 from app.models import Configuracao
 from app.carrinho.models import Pedido
 from app.extensions import db
@@ -83,14 +83,9 @@ def gerenciar_banner(id=None):
         if not id:
             db.session.add(banner)
         
+        # O commit já invalida a home via app/loja/cache_hooks.py
         db.session.commit()
         
-        # 🚀 LIMPEZA DE CACHE TÁTICA
-        # Limpa o cache da home para o novo banner aparecer imediatamente
-        from app.loja.routes import cache
-        cache.delete('banners_home')
-        cache.delete('index_v7') # Versão que configuramos no routes.py
-        
         flash(f"Banner {'atualizado' if id else 'publicado'} com sucesso!", "success")
         return redirect(url_for('loja_admin.banners'))
 
@@ -108,13 +103,61 @@ def excluir_banner(id):
     db.session.delete(banner)
     db.session.commit()
     
-    # Limpa cache após exclusão
-    from app.loja.routes import cache
-    cache.delete('banners_home')
-    
     flash("Banner removido do arsenal!", "success")
     return redirect(url_for('loja_admin.banners'))
 
+# =========================================================
+# GERENCIAR PRATELEIRAS DA HOME
+# =========================================================
+@loja_admin_bp.route('/prateleiras')
+@login_required
+def prateleiras():
+    from app.loja.prateleiras import PRATELEIRAS_PADRAO
+    lista = PrateleiraHome.query.order_by(PrateleiraHome.ordem.asc(), PrateleiraHome.id.asc()).all()
+    return render_template('loja_admin/prateleiras/lista.html', prateleiras=lista, padrao=PRATELEIRAS_PADRAO)
+
+@loja_admin_bp.route('/prateleiras/nova', methods=['GET', 'POST'])
+@loja_admin_bp.route('/prateleiras/editar/<int:id>', methods=['GET', 'POST'])
+@login_required
+def gerenciar_prateleira(id=None):
+    from app.loja.prateleiras import ORDENACOES
+    prateleira = PrateleiraHome.query.get_or_404(id) if id else PrateleiraHome()
+
+    if request.method == 'POST':
+        prateleira.titulo = (request.form.get('titulo') or '').strip()
+        prateleira.categorias = ','.join(
+            s.strip().lower() for s in (request.form.get('categorias') or '').split(',') if s.strip()
+        )
+        prateleira.limite = max(1, min(request.form.get('limite', 4, type=int) or 4, 24))
+        ordenacao = request.form.get('ordenacao')
+        prateleira.ordenacao = ordenacao if ordenacao in ORDENACOES else 'recentes'
+        prateleira.ordem = request.form.get('ordem', 0, type=int)
+        prateleira.ativo = 'ativo' in request.form
+
+        if not prateleira.titulo or not prateleira.categorias:
+            flash("❌ Informe o título e ao menos uma categoria.", "danger")
+            return render_template('loja_admin/prateleiras/form.html', prateleira=prateleira, ordenacoes=ORDENACOES)
+
+        if not id:
+            db.session.add(prateleira)
+
+        # O commit já invalida a home via app/loja/cache_hooks.py
+        db.session.commit()
+
+        flash(f"Prateleira {'atualizada' if id else 'criada'} com sucesso!", "success")
+        return redirect(url_for('loja_admin.prateleiras'))
+
+    return render_template('loja_admin/prateleiras/form.html', prateleira=prateleira, ordenacoes=ORDENACOES)
+
+@loja_admin_bp.route('/prateleiras/excluir/<int:id>')
+@login_required
+def excluir_prateleira(id):
+    prateleira = PrateleiraHome.query.get_or_404(id)
+    db.session.delete(prateleira)
+    db.session.commit()
+    flash("Prateleira removida!", "success")
+    return redirect(url_for('loja_admin.prateleiras'))
+
 # =========================================================
 # GERENCIAR PÁGINAS (CRUD COMPLETO COM EDITOR RICO)
 # =========================================================
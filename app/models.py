@@ -179,4 +179,59 @@ class ModeloDocumento(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
-        return f"<ModeloDocumento {self.titulo}>"
\ No newline at end of file
+        return f"<ModeloDocumento {self.titulo}>"
+
+# =========================
+# Variantes responsivas de imagens (R2)
+# =========================
+class ImagemVariantes(db.Model):
+    """
+    Quais larguras/formatos já foram gerados para uma imagem original do R2
+    (app/utils/thumbnail_utils.py). Uma linha por imagem; os arquivos ficam
+    em <stem>_w<largura>.<formato> ao lado do original.
+    """
+    __tablename__ = "imagem_variantes"
+
+    id = db.Column(db.Integer, primary_key=True)
+    chave = db.Column(db.String(512), unique=True, nullable=False, index=True)  # r2_key do original
+    largura = db.Column(db.Integer, nullable=True)    # dimensões do original
+    altura = db.Column(db.Integer, nullable=True)
+    larguras = db.Column(db.String(100), nullable=False, default="")   # ex: '160,280,480,800'
+    formatos = db.Column(db.String(50), nullable=False, default="")    # ex: 'avif,webp'
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def lista_larguras(self):
+        return [int(l) for l in self.larguras.split(",") if l]
+
+    @property
+    def lista_formatos(self):
+        return [f for f in self.formatos.split(",") if f]
+
+    def __repr__(self):
+        return f"<ImagemVariantes {self.chave} {self.larguras} {self.formatos}>"
+
+
+# =========================
+# Cache de OCR por conteúdo
+# =========================
+class OcrCache(db.Model):
+    """
+    Saída de processar_documento() (texto, motor, campos interpretados) por
+    SHA-256 do arquivo + versão do pipeline (app/services/ocr_cache.py).
+    Reenvio do mesmo CRAF/CR/CNH não paga OCR + LLM de novo.
+    """
+    __tablename__ = "ocr_cache"
+    __table_args__ = (db.UniqueConstraint("sha256", "versao", name="uq_ocr_cache_sha256_versao"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False, index=True)
+    versao = db.Column(db.String(32), nullable=False)   # VERSAO_PIPELINE de quando foi gerado
+    categoria = db.Column(db.String(30), nullable=True)  # CRAF, CR, CNH, RG...
+    resultado = db.Column(db.JSON, nullable=False)
+    acertos = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    ultimo_acesso = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<OcrCache {self.sha256[:12]} v{self.versao}>"
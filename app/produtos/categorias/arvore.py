@@ -0,0 +1,208 @@
+"""
+app/produtos/categorias/arvore.py
+─────────────────────────────────────────────────────────────────────────────
+Snapshot imutável da árvore de categorias, em memória.
+
+Loja (menu, página de categoria, prateleiras) e catálogo andavam a árvore
+um nível só, com subqueryload de `subcategorias` a cada cache miss. Aqui a
+árvore inteira é carregada de uma vez (categorias + closure table
+categoria_produto_fechamento) e congelada:
+
+    arvore = arvore_categorias()
+    arvore.por_slug("pistolas")          → NoCategoria (ou None)
+    arvore.descendentes(4)               → frozenset de ids, O(1), qualquer profundidade
+    Produto.categoria_id.in_(arvore.descendentes(4))
+
+Cada processo guarda um snapshot próprio; a validade é controlada por um
+token no cache compartilhado, indexado na dependência 'layout' — que o
+hook de CategoriaProduto (app/loja/cache_hooks.py) apaga a cada alteração.
+Enquanto o token não muda, nenhuma query é feita.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import logging
+import threading
+import uuid
+from dataclasses import dataclass
+from types import MappingProxyType
+
+from flask import g, has_app_context
+from sqlalchemy import select
+
+from app import db
+from app.produtos.categorias.models import CategoriaProduto, CategoriaFechamento
+
+logger = logging.getLogger(__name__)
+
+CHAVE_VERSAO = "arvore_categorias_versao_v1"
+
+_snapshot = None  # (token, ArvoreCategorias)
+_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class NoCategoria:
+    """Categoria congelada, com os mesmos atributos usados pelos templates."""
+    id: int
+    nome: str
+    slug: str
+    pai_id: int
+    icone_loja: str
+    ordem_exibicao: int
+    exibir_no_menu: bool
+    subcategorias: tuple = ()
+
+
+class ArvoreCategorias:
+    """Árvore somente-leitura: nós, filhos ordenados e descendentes pré-calculados."""
+
+    __slots__ = ("_nos", "_por_slug", "_descendentes", "_ancestrais", "raizes")
+
+    def __init__(self, linhas, pares=None):
+        """
+        linhas: (id, nome, slug, pai_id, icone_loja, ordem_exibicao, exibir_no_menu)
+        pares:  (ancestral_id, descendente_id, profundidade) da closure table;
+                se None/vazio, o fechamento é calculado a partir de pai_id.
+        """
+        dados = {l[0]: l for l in linhas}
+        filhos = {}
+        for cid, l in dados.items():
+            filhos.setdefault(l[3], []).append(cid)
+        for lista in filhos.values():
+            lista.sort(key=lambda c: (dados[c][5] or 0, dados[c][1] or ""))
+
+        if not pares:
+            pares = self._fechar(filhos, dados)
+        descendentes, ancestrais = {}, {}
+        for anc, desc, prof in pares:
+            if anc in dados and desc in dados:
+                descendentes.setdefault(anc, set()).add(desc)
+                ancestrais.setdefault(desc, []).append((prof, anc))
+
+        nos = {}
+
+        def montar(cid):
+            if cid not in nos:
+                l = dados[cid]
+                nos[cid] = NoCategoria(
+                    id=cid, nome=l[1], slug=l[2], pai_id=l[3], icone_loja=l[4],
+                    ordem_exibicao=l[5] or 0, exibir_no_menu=bool(l[6]),
+                    subcategorias=tuple(montar(f) for f in filhos.get(cid, [])),
+                )
+            return nos[cid]
+
+        for cid in dados:
+            montar(cid)
+
+        self._nos = MappingProxyType(nos)
+        self._por_slug = MappingProxyType({n.slug: n for n in nos.values() if n.slug})
+        self._descendentes = MappingProxyType({c: frozenset(s) for c, s in descendentes.items()})
+        self._ancestrais = MappingProxyType({
+            c: tuple(a for _, a in sorted(lst, reverse=True) if a != c) for c, lst in ancestrais.items()
+        })
+        self.raizes = tuple(nos[c] for c in filhos.get(None, []))
+
+    @staticmethod
+    def _fechar(filhos, dados):
+        pares = []
+        for raiz in dados:
+            pendentes = [(raiz, 0)]
+            vistos = set()
+            while pendentes:
+                cid, prof = pendentes.pop()
+                if cid in vistos:
+                    continue
+                vistos.add(cid)
+                pares.append((raiz, cid, prof))
+                pendentes.extend((f, prof + 1) for f in filhos.get(cid, []))
+        return pares
+
+    def __len__(self):
+        return len(self._nos)
+
+    def no(self, categoria_id):
+        return self._nos.get(categoria_id)
+
+    def por_slug(self, slug):
+        return self._por_slug.get((slug or "").lower())
+
+    def descendentes(self, categoria_id):
+        """Ids da categoria + todas as subcategorias, em qualquer profundidade."""
+        return self._descendentes.get(categoria_id, frozenset((categoria_id,)))
+
+    def ancestrais(self, categoria_id):
+        """Ids dos ancestrais, da raiz até a mãe direta."""
+        return self._ancestrais.get(categoria_id, ())
+
+    def nos(self):
+        return self._nos.values()
+
+
+def carregar_arvore():
+    """
+    Lê categorias e closure table (2 SELECTs) e monta o snapshot.
+
+    Usa uma conexão própria: uma falha aqui (closure table ausente) não pode
+    desfazer o que a sessão do request ainda tem pendente.
+    """
+    c = CategoriaProduto.__table__.c
+    f = CategoriaFechamento.__table__.c
+    with db.engine.connect() as conn:
+        linhas = conn.execute(select(
+            c.id, c.nome, c.slug, c.pai_id, c.icone_loja, c.ordem_exibicao, c.exibir_no_menu,
+        )).all()
+        try:
+            pares = conn.execute(select(f.ancestral_id, f.descendente_id, f.profundidade)).all()
+        except Exception as e:
+            # Migration ainda não aplicada: calcula o fechamento em Python
+            logger.warning(f"[CATEGORIAS] closure table indisponível, usando pai_id: {e}")
+            pares = None
+    if pares is not None and len(pares) < len(linhas):
+        # Tabela vazia ou incompleta (ex.: antes do backfill)
+        pares = None
+    return ArvoreCategorias(linhas, pares)
+
+
+def arvore_categorias():
+    """Snapshot atual (por processo), revalidado pelo token do cache."""
+    global _snapshot
+
+    if has_app_context() and "arvore_categorias" in g:
+        return g.arvore_categorias
+
+    from app.loja.routes import cache
+    from app.loja.cache_hooks import guardar
+
+    token = cache.get(CHAVE_VERSAO)
+    atual = _snapshot
+    if token is None or atual is None or atual[0] != token:
+        with _lock:
+            atual = _snapshot
+            if token is None or atual is None or atual[0] != token:
+                arvore = carregar_arvore()
+                if token is None:
+                    token = uuid.uuid4().hex
+                    guardar(CHAVE_VERSAO, token, 86400, "layout")
+                atual = _snapshot = (token, arvore)
+
+    if has_app_context():
+        g.arvore_categorias = atual[1]
+    return atual[1]
+
+
+def reconstruir_fechamento():
+    """Refaz a closure table inteira a partir de pai_id (backfill/reparo). Não faz commit."""
+    linhas = db.session.query(CategoriaProduto.id, CategoriaProduto.pai_id).all()
+    filhos, dados = {}, {}
+    for cid, pai_id in linhas:
+        dados[cid] = pai_id
+        filhos.setdefault(pai_id, []).append(cid)
+    pares = ArvoreCategorias._fechar(filhos, dados)
+
+    t = CategoriaFechamento.__table__
+    db.session.execute(t.delete())
+    if pares:
+        db.session.execute(t.insert(), [
+            {"ancestral_id": a, "descendente_id": d, "profundidade": p} for a, d, p in pares
+        ])
+    return len(pares)
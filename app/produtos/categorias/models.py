@@ -1,10 +1,14 @@
+import logging
+
 from app import db
 from datetime import datetime
 from app.utils.datetime import now_local
 import re
-from sqlalchemy import event
+from sqlalchemy import event, inspect, select, true
 import unicodedata
 
+logger = logging.getLogger(__name__)
+
 class CategoriaProduto(db.Model):
     __tablename__ = "categoria_produto"
 
@@ -57,4 +61,103 @@ def gera_slug_categoria(target, value, oldvalue, initiator):
         # 5. Remove hífens duplicados ou nas pontas
         target.slug = texto.strip('-')
 
-event.listen(CategoriaProduto.nome, 'set', gera_slug_categoria, retval=False)
\ No newline at end of file
+event.listen(CategoriaProduto.nome, 'set', gera_slug_categoria, retval=False)
+
+
+# =========================================================
+# FECHAMENTO TRANSITIVO (closure table) DA ÁRVORE DE CATEGORIAS
+# Uma linha por par (ancestral, descendente), inclusive (id, id, 0).
+# Mantida pelos eventos abaixo; o snapshot em memória fica em
+# app/produtos/categorias/arvore.py.
+# =========================================================
+class CategoriaFechamento(db.Model):
+    __tablename__ = "categoria_produto_fechamento"
+
+    ancestral_id = db.Column(db.Integer, db.ForeignKey("categoria_produto.id", ondelete="CASCADE"), primary_key=True)
+    descendente_id = db.Column(db.Integer, db.ForeignKey("categoria_produto.id", ondelete="CASCADE"), primary_key=True, index=True)
+    profundidade = db.Column(db.Integer, nullable=False, default=0)
+
+
+_fechamento_existe = False  # só o "existe" fica guardado: a migration pode rodar com o app no ar
+
+
+def _fechamento_disponivel(connection):
+    """
+    A closure table já foi criada? Sem a migration, os hooks não tocam nela
+    (no Postgres um erro aborta a transação do flush inteiro) e
+    carregar_arvore() calcula o fechamento a partir de pai_id.
+    """
+    global _fechamento_existe
+    if not _fechamento_existe:
+        _fechamento_existe = inspect(connection).has_table(CategoriaFechamento.__tablename__)
+        if not _fechamento_existe:
+            logger.warning("[CATEGORIAS] closure table ausente (migration pendente); fechamento não mantido")
+    return _fechamento_existe
+
+
+def _fechamento_ligar(connection, categoria_id, pai_id):
+    """Pendura a subárvore de categoria_id sob pai_id (todos os ancestrais de pai_id)."""
+    if not pai_id:
+        return
+    t = CategoriaFechamento.__table__
+    sup = t.alias("sup")
+    sub = t.alias("sub")
+    connection.execute(t.insert().from_select(
+        ["ancestral_id", "descendente_id", "profundidade"],
+        select(sup.c.ancestral_id, sub.c.descendente_id,
+               sup.c.profundidade + sub.c.profundidade + 1)
+        .select_from(sup.join(sub, true()))
+        .where(sup.c.descendente_id == pai_id, sub.c.ancestral_id == categoria_id),
+    ))
+
+
+def fechamento_apos_inserir(mapper, connection, target):
+    if not _fechamento_disponivel(connection):
+        return
+    t = CategoriaFechamento.__table__
+    connection.execute(t.insert().values(ancestral_id=target.id, descendente_id=target.id, profundidade=0))
+    _fechamento_ligar(connection, target.id, target.pai_id)
+
+
+def fechamento_antes_atualizar(mapper, connection, target):
+    # Impede ciclos: a nova mãe não pode estar dentro da própria subárvore
+    if not inspect(target).attrs.pai_id.history.has_changes() or not target.pai_id:
+        return
+    if not _fechamento_disponivel(connection):
+        return
+    t = CategoriaFechamento.__table__
+    ciclo = connection.execute(
+        select(t.c.descendente_id).where(t.c.ancestral_id == target.id, t.c.descendente_id == target.pai_id)
+    ).first()
+    if ciclo:
+        raise ValueError(f"Categoria '{target.nome}' não pode ficar dentro de uma das próprias subcategorias.")
+
+
+def fechamento_apos_atualizar(mapper, connection, target):
+    if not inspect(target).attrs.pai_id.history.has_changes() or not _fechamento_disponivel(connection):
+        return
+    t = CategoriaFechamento.__table__
+    subarvore = [r[0] for r in connection.execute(select(t.c.descendente_id).where(t.c.ancestral_id == target.id))]
+    ancestrais = [r[0] for r in connection.execute(
+        select(t.c.ancestral_id).where(t.c.descendente_id == target.id, t.c.ancestral_id != target.id)
+    )]
+    if ancestrais:
+        connection.execute(t.delete().where(
+            t.c.descendente_id.in_(subarvore), t.c.ancestral_id.in_(ancestrais)
+        ))
+    _fechamento_ligar(connection, target.id, target.pai_id)
+
+
+def fechamento_apos_excluir(mapper, connection, target):
+    if not _fechamento_disponivel(connection):
+        return
+    t = CategoriaFechamento.__table__
+    connection.execute(t.delete().where(
+        (t.c.ancestral_id == target.id) | (t.c.descendente_id == target.id)
+    ))
+
+
+event.listen(CategoriaProduto, "after_insert", fechamento_apos_inserir)
+event.listen(CategoriaProduto, "before_update", fechamento_antes_atualizar)
+event.listen(CategoriaProduto, "after_update", fechamento_apos_atualizar)
+event.listen(CategoriaProduto, "after_delete", fechamento_apos_excluir)
@@ -4,6 +4,7 @@
 
 from app import db
 from sqlalchemy import func, Index, event
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from datetime import datetime
 import pytz
 import re
@@ -33,6 +34,7 @@ class Produto(db.Model):
         Index("idx_produto_calibre", "calibre_id"),
         Index("idx_produto_tipo", "tipo_id"),
         Index("idx_produto_slug", "slug"),
+        Index("idx_produtos_busca_documento", "busca_documento", postgresql_using="gin"),
     )
 
     id = db.Column(db.Integer, primary_key=True)
@@ -78,6 +80,9 @@ class Produto(db.Model):
     descricao_longa = db.Column(db.Text, nullable=True) # HTML do Summernote
     especificacoes_tecnicas = db.Column(db.JSON, nullable=True)
 
+    # --- BUSCA (tsvector mantido por trigger no Postgres; ver app/services/busca_produtos.py) ---
+    busca_documento = db.deferred(db.Column(TSVECTOR().with_variant(db.Text(), "sqlite"), nullable=True))
+
     # --- RELACIONAMENTOS ---
     categoria_id = db.Column(db.Integer, db.ForeignKey("categoria_produto.id"), index=True)
     categoria = db.relationship("CategoriaProduto", backref="produtos")
@@ -13,4 +13,5 @@ from .tecnicos import *
 from .configs import *
 from .utils import *
 from .importar import *
+from .reprecificar import *
 from .api import * # <--- ESTA LINHA ESTAVA FALTANDO
\ No newline at end of file
@@ -134,13 +134,33 @@ def autosave_produto(produto_id):
 @produtos_bp.route("/autosave/lote", methods=["POST"])
 @login_required
 def autosave_lote():
+    from app.services.precificacao_lote import (
+        calcular_precos_lote, colunas_de_produtos, aplicar_em_objetos
+    )
+
     payload = request.get_json() or {}
     produtos_data = payload.get("produtos", [])
     resultados = []
+    alterados = []
 
+    # O front manda o id como número ou string ("166"); o dicionário abaixo é por int
+    ids_do_item = []
+    invalidos = []
     for item in produtos_data:
-        produto_id = item.get("id")
-        produto = Produto.query.get(produto_id)
+        bruto = item.get("id")
+        try:
+            ids_do_item.append(int(bruto) if bruto not in (None, "") else None)
+        except (TypeError, ValueError):
+            invalidos.append(bruto)
+    if invalidos:
+        return jsonify({"status": "error", "message": f"IDs inválidos: {invalidos}"}), 400
+
+    # Uma query para o lote inteiro (em vez de um get por id)
+    ids = sorted({i for i in ids_do_item if i})
+    produtos_por_id = {p.id: p for p in Produto.query.filter(Produto.id.in_(ids)).all()} if ids else {}
+
+    for item, produto_id in zip(produtos_data, ids_do_item):
+        produto = produtos_por_id.get(produto_id)
         if not produto:
             continue
 
@@ -169,11 +189,14 @@ def autosave_lote():
                 setattr(produto, campo, valor_final)
 
         if alteracoes:
-            if hasattr(produto, 'calcular_precos'):
-                produto.calcular_precos()
             produto.atualizado_em = datetime.utcnow()
             registrar_historico(produto, current_user, "autosave", alteracoes)
             resultados.append(produto.id)
+            alterados.append(produto)
+
+    # Recalcula os preços de todos os alterados numa passada só
+    if alterados:
+        aplicar_em_objetos(alterados, calcular_precos_lote(colunas_de_produtos(alterados)))
 
     db.session.commit()
     return jsonify({"status": "success", "ids": resultados}), 200
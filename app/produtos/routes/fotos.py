@@ -6,9 +6,19 @@ from sqlalchemy.exc import SQLAlchemyError
 from app import db
 from .. import produtos_bp
 from app.produtos.models import Produto
+from app.utils import upload_direto as direto
 # IMPORT ATUALIZADO: Usamos _r2_bucket_publico para garantir a sincronia
 from .utils import _r2_bucket, _r2_bucket_publico, _r2_client, _r2_public_base, _key_from_url, _guess_ext
 
+def _url_publica_foto(bucket, key):
+    base_public = _r2_public_base()
+    return (
+        f"{base_public.rstrip('/')}/{key}"
+        if base_public
+        else f"{current_app.config.get('R2_ENDPOINT_URL', '').rstrip('/')}/{bucket}/{key}"
+    )
+
+
 @produtos_bp.route('/api/upload_foto', methods=['POST'])
 @login_required
 def api_upload_foto():
@@ -48,12 +58,7 @@ def api_upload_foto():
             },
         )
 
-        base_public = _r2_public_base()
-        foto_url = (
-            f"{base_public.rstrip('/')}/{key}"
-            if base_public
-            else f"{current_app.config.get('R2_ENDPOINT_URL', '').rstrip('/')}/{bucket}/{key}"
-        )
+        foto_url = _url_publica_foto(bucket, key)
 
         current_app.logger.info(f"[M4] Upload R2 API concluído no bucket Público. URL: {foto_url}")
         
@@ -108,12 +113,7 @@ def upload_foto_produto(produto_id=None):
             },
         )
 
-        base_public = _r2_public_base()
-        foto_url = (
-            f"{base_public.rstrip('/')}/{key}"
-            if base_public
-            else f"{current_app.config.get('R2_ENDPOINT_URL', '').rstrip('/')}/{bucket}/{key}"
-        )
+        foto_url = _url_publica_foto(bucket, key)
 
         if not produto_id:
             foto_url_com_chave = f"{foto_url}#{key.split('/')[-1]}"
@@ -125,6 +125,61 @@ def upload_foto_produto(produto_id=None):
         current_app.logger.exception("[M4] Falha no upload da foto para o R2.")
         return jsonify({"success": False, "error": str(e)}), 500
 
+# ------------------------------------------------------------
+# Upload direto ao R2 (app/utils/upload_direto.py): o navegador faz o PUT,
+# o Flask só emite a URL e confirma — o arquivo não passa pelo worker
+# ------------------------------------------------------------
+@produtos_bp.route('/api/upload_foto/emitir', methods=['POST'])
+@login_required
+def emitir_upload_foto():
+    """JSON {nome, content_type, tamanho, produto_id} → URL PUT pré-assinada + ticket."""
+    dados = request.get_json(silent=True) or {}
+    produto_id_str = str(dados.get('produto_id') or '')
+    produto_id = int(produto_id_str) if produto_id_str.isdigit() else None
+
+    try:
+        content_type, tamanho = direto.validar("foto_produto", dados.get('nome'), dados.get('content_type'), dados.get('tamanho'))
+        pasta = produto_id or "temp"
+        key = f"produtos/fotos/{pasta}/{uuid.uuid4().hex}{direto.extensao('foto_produto', content_type)}"
+        upload = direto.emitir("foto_produto", _r2_bucket_publico(), key, content_type, tamanho,
+                               nome=dados.get('nome'), produto_id=produto_id)
+        return jsonify({"success": True, **upload}), 200
+    except direto.UploadInvalido as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        current_app.logger.exception("[M4] Falha ao emitir URL de upload direto da foto.")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@produtos_bp.route('/api/upload_foto/confirmar', methods=['POST'])
+@login_required
+def confirmar_upload_foto():
+    """JSON {ticket} → confere o objeto no R2 e enfileira os thumbnails."""
+    dados = request.get_json(silent=True) or {}
+    try:
+        arquivo = direto.confirmar(dados.get('ticket'), "foto_produto")
+    except direto.UploadInvalido as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        current_app.logger.exception("[M4] Falha ao confirmar upload direto da foto.")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    key = arquivo["key"]
+    foto_url = _url_publica_foto(arquivo["bucket"], key)
+    current_app.logger.info(f"[M4] Upload direto R2 confirmado. URL: {foto_url}")
+
+    if not arquivo["contexto"].get("produto_id"):
+        # Foto temporária: os thumbnails saem quando o produto for salvo
+        return jsonify({"success": True, "foto_url": f"{foto_url}#{key.split('/')[-1]}"}), 200
+
+    try:
+        from app.utils.thumb_hooks import enfileirar_thumbs
+        enfileirar_thumbs(foto_url)
+    except Exception as e:
+        current_app.logger.warning(f"[M4] Thumbnails de {key} não enfileirados: {e}")
+    return jsonify({"success": True, "foto_url": foto_url}), 200
+
+
 @produtos_bp.route("/foto-temp/<path:temp_key>", methods=["DELETE"])
 @login_required
 def remover_foto_temp(temp_key):
@@ -19,6 +19,7 @@ from app.produtos.configs.models import (
 
 from app.models import Taxa
 import app.utils.parcelamento as parc
+from app.services.parcelamento import gerar_linhas_por_valor
 from app.utils.datetime import now_local 
 
 from urllib.parse import urlparse
@@ -528,8 +529,7 @@ def visualizar_produto(produto_id):
         if key: url_imagem = url_for('main.imagem_proxy', key=key)
 
     valor_base = float(produto.preco_final or produto.preco_a_vista or 0.0)
-    taxas = Taxa.query.order_by(Taxa.numero_parcelas).all()
-    linhas_raw = parc.gerar_linhas_parcelas(valor_base, taxas)
+    linhas_raw = gerar_linhas_por_valor(valor_base)
 
     parcelas_fmt = []
     parcela_12x_val = None
@@ -0,0 +1,50 @@
+# ===========================================================
+# ROTAS — REPRECIFICAÇÃO POR REGRAS (tabela de distribuidor)
+# Simulação (dry-run) e aplicação em background
+# ===========================================================
+
+from flask import request, jsonify, current_app
+from flask_login import login_required, current_user
+
+from app.services.reprecificacao import (
+    RegraInvalida, simular_reprecificacao, enfileirar_reprecificacao,
+)
+from .. import produtos_bp
+
+
+def _regras_do_payload():
+    """Aceita {"regras": [dict ou texto, ...]} ou {"texto": "uma regra por linha"}."""
+    payload = request.get_json() or {}
+    regras = list(payload.get("regras") or [])
+    texto = payload.get("texto") or ""
+    regras += [linha for linha in texto.splitlines() if linha.strip()]
+    if not regras:
+        raise RegraInvalida("Nenhuma regra informada.")
+    return regras
+
+
+@produtos_bp.route("/reprecificar/simular", methods=["POST"])
+@login_required
+def reprecificar_simular():
+    """Diff antigo/novo de preco_a_vista para cada SKU afetado. Nada é gravado."""
+    try:
+        return jsonify(simular_reprecificacao(_regras_do_payload())), 200
+    except RegraInvalida as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+
+@produtos_bp.route("/reprecificar/aplicar", methods=["POST"])
+@login_required
+def reprecificar_aplicar():
+    """Envia a reprecificação para a fila (ou roda síncrono sem Redis)."""
+    usuario_nome = getattr(current_user, "nome", None) or getattr(current_user, "username", "Sistema")
+    try:
+        resultado = enfileirar_reprecificacao(
+            _regras_do_payload(), usuario_nome, getattr(current_user, "id", None)
+        )
+        return jsonify({"status": "success", **resultado}), 202
+    except RegraInvalida as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        current_app.logger.exception(f"[REPRECIFICACAO] Erro ao iniciar: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
@@ -2,29 +2,19 @@
 import os
 import uuid
 import mimetypes
-import boto3
 from urllib.parse import urlparse
 from flask import current_app
 
+from app.utils import r2_gateway
+
 # Buckets
 BUCKET_PUBLICO = "m4-loja-publico"
 BUCKET_PRIVADO = "m4-clientes-docs"
 
 
 def _r2_client():
-    """Inicializa o cliente S3 (R2) lendo variáveis do .env ou do app.config"""
-    endpoint = current_app.config.get("R2_ENDPOINT_URL") or os.getenv("R2_ENDPOINT_URL")
-    access_key = current_app.config.get("R2_ACCESS_KEY_ID") or os.getenv("R2_ACCESS_KEY_ID")
-    secret_key = current_app.config.get("R2_SECRET_ACCESS_KEY") or os.getenv("R2_SECRET_ACCESS_KEY")
-    region = current_app.config.get("R2_REGION_NAME") or "auto"
-
-    return boto3.client(
-        "s3",
-        endpoint_url=endpoint,
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
-        region_name=region,
-    )
+    """Cliente S3 (R2) compartilhado do processo (app.config ou .env — ver r2_gateway)"""
+    return r2_gateway.cliente()
 
 
 def _r2_bucket():
@@ -0,0 +1,394 @@
+"""
+app/services/autocomplete.py
+─────────────────────────────────────────────────────────────────────────────
+Índice em memória para o autocomplete (/api/buscar-fuzzy e
+/catalogo/api/buscar), sem ida ao Postgres a cada tecla.
+
+    sugerir("glock 1")   → [DocumentoBusca, ...]  (melhores primeiro)
+                         → None se o índice estiver frio/desatualizado;
+                           o chamador usa a busca SQL (busca_produtos)
+
+Conteúdo: produtos visíveis na loja, com palavras normalizadas
+(normalizar_termo, o mesmo do catálogo) de nome, nome_comercial, código,
+marca e calibre. Cada palavra casa por prefixo; sem nenhum acerto, cai
+para similaridade por trigramas (erros de digitação).
+
+Ciclo de vida:
+  - Construído em background na subida dos processos web (create_app com
+    AUTOCOMPLETE_NA_SUBIDA=1), com UMA query; nos demais, no primeiro uso.
+  - Atualizado incrementalmente após cada commit que invalida
+    'produto:<id>' / 'marca:<id>' (app/loja/cache_hooks.ao_invalidar) —
+    cobre os hooks do ORM e os UPDATEs em lote que chamam
+    marcar_para_invalidar.
+  - Entre processos: um token no cache compartilhado muda a cada
+    alteração; o processo que não fez a alteração reconstrói o índice em
+    background e, enquanto isso, responde pelo caminho SQL. O token é
+    conferido no máximo a cada INTERVALO_TOKEN segundos, não a cada tecla.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import bisect
+import logging
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+
+from sqlalchemy import select
+
+from app import db
+from app.produtos.models import Produto
+from app.produtos.categorias.models import CategoriaProduto
+from app.produtos.configs.models import MarcaProduto, CalibreProduto
+from app.services.busca_produtos import normalizar_termo
+from app.services.precificacao_lote import COLUNAS_ENTRADA, calcular_precos_lote
+
+logger = logging.getLogger(__name__)
+
+CHAVE_VERSAO = "autocomplete_versao_v1"
+IDADE_MAXIMA = 3600        # reconstrução periódica (ex.: calibre renomeado)
+SIMILARIDADE_MINIMA = 0.6  # fração dos trigramas do termo presentes no produto
+INTERVALO_RECONSTRUCAO = 5  # s entre tentativas (ex.: cache fora do ar)
+INTERVALO_TOKEN = 3         # s entre conferências do token compartilhado
+
+_hooks_registered = False
+_lock = threading.RLock()
+_estado = {"indice": None, "token": None, "construido_em": 0.0, "construindo": False, "tentativa_em": 0.0,
+           "token_conferido_em": 0.0}
+
+
+# ── Documento ─────────────────────────────────────────────────────────────
+
+@dataclass
+class DocumentoBusca:
+    """Produto como o autocomplete precisa dele (sem sessão, sem lazy load)."""
+    id: int
+    slug: str
+    nome: str
+    codigo: str
+    marca: str
+    calibre: str
+    categoria: str
+    foto_url: str
+    preco_a_vista: float
+    estoque_disponivel: int
+    promo_ativada: bool
+    destaque_home: bool
+    criado_ts: float
+    precificacao: dict = field(repr=False, default_factory=dict)
+    palavras: frozenset = field(repr=False, default=frozenset())
+    palavras_nome: frozenset = field(repr=False, default=frozenset())
+    codigo_normalizado: str = field(repr=False, default="")
+    trigramas: frozenset = field(repr=False, default=frozenset())
+
+
+def palavras_de(texto):
+    """Palavras normalizadas + pares vizinhos colados ("9 mm" → 9, mm, 9mm)."""
+    palavras = re.findall(r"[a-z0-9]+", normalizar_termo(texto or ""))
+    return palavras + [a + b for a, b in zip(palavras, palavras[1:])]
+
+
+def trigramas_de(palavras):
+    """Trigramas no estilo pg_trgm: cada palavra com dois espaços antes e um depois."""
+    tri = set()
+    for p in palavras:
+        p = f"  {p} "
+        tri.update(p[i:i + 3] for i in range(len(p) - 2))
+    return tri
+
+
+_COLUNAS = (
+    Produto.id, Produto.slug, Produto.nome, Produto.nome_comercial, Produto.codigo,
+    Produto.foto_url, Produto.preco_a_vista, Produto.estoque_disponivel,
+    Produto.destaque_home, Produto.criado_em,
+    MarcaProduto.nome.label("marca"), CalibreProduto.nome.label("calibre"),
+    CategoriaProduto.nome.label("categoria"),
+) + tuple(getattr(Produto, c).label(f"preco_{c}") for c in COLUNAS_ENTRADA if c != "id")
+
+
+def consulta_documentos(*filtros):
+    """SELECT único (produtos visíveis + nomes de marca/calibre/categoria)."""
+    return select(*_COLUNAS)\
+        .outerjoin(MarcaProduto, Produto.marca_id == MarcaProduto.id)\
+        .outerjoin(CalibreProduto, Produto.calibre_id == CalibreProduto.id)\
+        .outerjoin(CategoriaProduto, Produto.categoria_id == CategoriaProduto.id)\
+        .where(Produto.visivel_loja == True, *filtros)
+
+
+def documento_de_linha(linha):
+    m = linha._mapping
+    nome = m["nome_comercial"] or m["nome"] or ""
+    palavras_nome = palavras_de(f"{m['nome_comercial'] or ''} {m['nome'] or ''}")
+    palavras = set(palavras_nome)
+    for campo in ("codigo", "marca", "calibre"):
+        palavras.update(palavras_de(m[campo]))
+    codigo_normalizado = "".join(re.findall(r"[a-z0-9]+", normalizar_termo(m["codigo"] or "")))
+    if codigo_normalizado:
+        palavras.add(codigo_normalizado)
+    criado = m["criado_em"]
+    return DocumentoBusca(
+        id=m["id"], slug=m["slug"], nome=nome, codigo=m["codigo"] or "",
+        marca=m["marca"] or "", calibre=m["calibre"] or "", categoria=m["categoria"] or "",
+        foto_url=m["foto_url"] or "",
+        preco_a_vista=float(m["preco_a_vista"] or 0),
+        estoque_disponivel=m["estoque_disponivel"] or 0,
+        promo_ativada=bool(m["preco_promo_ativada"]),
+        destaque_home=bool(m["destaque_home"]),
+        criado_ts=criado.timestamp() if criado else 0.0,
+        precificacao={c: m["id"] if c == "id" else m[f"preco_{c}"] for c in COLUNAS_ENTRADA},
+        palavras=frozenset(palavras),
+        palavras_nome=frozenset(palavras_nome),
+        codigo_normalizado=codigo_normalizado,
+        trigramas=frozenset(trigramas_de(palavras)),
+    )
+
+
+def precos_a_vista(documentos):
+    """Preço à vista atual (promoções pela data de agora), como Produto.calcular_precos."""
+    documentos = list(documentos)
+    colunas = {c: [d.precificacao[c] for d in documentos] for c in COLUNAS_ENTRADA}
+    return calcular_precos_lote(colunas)["preco_a_vista"]
+
+
+# ── Índice ────────────────────────────────────────────────────────────────
+
+class IndiceAutocomplete:
+    """Palavra → ids (com busca por prefixo via bisect) + trigrama → ids."""
+
+    def __init__(self, documentos=()):
+        self._docs = {}
+        self._por_palavra = {}
+        self._palavras = []  # ordenada, para prefixo
+        self._por_trigrama = {}
+        for doc in documentos:
+            self._docs[doc.id] = doc
+            for p in doc.palavras:
+                self._por_palavra.setdefault(p, set()).add(doc.id)
+            for t in doc.trigramas:
+                self._por_trigrama.setdefault(t, set()).add(doc.id)
+        self._palavras = sorted(self._por_palavra)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _inserir(self, doc):
+        self._remover(doc.id)
+        self._docs[doc.id] = doc
+        for p in doc.palavras:
+            ids = self._por_palavra.get(p)
+            if ids is None:
+                ids = self._por_palavra[p] = set()
+                bisect.insort(self._palavras, p)
+            ids.add(doc.id)
+        for t in doc.trigramas:
+            self._por_trigrama.setdefault(t, set()).add(doc.id)
+
+    def _remover(self, produto_id):
+        doc = self._docs.pop(produto_id, None)
+        if doc is None:
+            return
+        for p in doc.palavras:
+            ids = self._por_palavra.get(p)
+            ids.discard(produto_id)
+            if not ids:
+                del self._por_palavra[p]
+                del self._palavras[bisect.bisect_left(self._palavras, p)]
+        for t in doc.trigramas:
+            ids = self._por_trigrama.get(t)
+            ids.discard(produto_id)
+            if not ids:
+                del self._por_trigrama[t]
+
+    def atualizar(self, ids, documentos):
+        """Substitui os produtos `ids` pelos `documentos` recarregados (ausentes saem)."""
+        for pid in ids:
+            self._remover(pid)
+        for doc in documentos:
+            self._inserir(doc)
+
+    def _com_prefixo(self, prefixo):
+        ids = set()
+        i = bisect.bisect_left(self._palavras, prefixo)
+        while i < len(self._palavras) and self._palavras[i].startswith(prefixo):
+            ids |= self._por_palavra[self._palavras[i]]
+            i += 1
+        return ids
+
+    def _casar(self, palavras):
+        candidatos = None
+        for p in palavras:
+            achados = self._com_prefixo(p)
+            candidatos = achados if candidatos is None else candidatos & achados
+            if not candidatos:
+                return set()
+        return candidatos or set()
+
+    def buscar(self, termo, limite=10):
+        palavras = re.findall(r"[a-z0-9]+", normalizar_termo(termo))
+        if not palavras:
+            return []
+        colado = "".join(palavras)
+
+        candidatos = self._casar(palavras)
+        if len(palavras) > 1:
+            candidatos |= self._casar([colado])
+
+        if candidatos:
+            def nota(pid):
+                doc = self._docs[pid]
+                exatas = sum(1 for p in palavras if p in doc.palavras)
+                no_nome = sum(1 for p in palavras if any(n.startswith(p) for n in doc.palavras_nome))
+                return len(palavras) + exatas + 0.5 * no_nome + (3 if doc.codigo_normalizado == colado else 0)
+            notas = {pid: nota(pid) for pid in candidatos}
+        else:
+            # Sem prefixo nenhum: tolerância a erro de digitação
+            tri = trigramas_de(palavras)
+            contagem = Counter(pid for t in tri for pid in self._por_trigrama.get(t, ()))
+            notas = {pid: n / len(tri) for pid, n in contagem.items() if n / len(tri) >= SIMILARIDADE_MINIMA}
+
+        melhores = sorted(
+            notas,
+            key=lambda pid: (-notas[pid], not self._docs[pid].destaque_home, -self._docs[pid].criado_ts, -pid),
+        )[:limite]
+        return [self._docs[pid] for pid in melhores]
+
+
+# ── Estado do processo ────────────────────────────────────────────────────
+
+def _cache():
+    from app.loja.routes import cache
+    return cache
+
+
+def _token_compartilhado(criar=False):
+    try:
+        token = _cache().get(CHAVE_VERSAO)
+        if token is None and criar:
+            token = uuid.uuid4().hex
+            _cache().set(CHAVE_VERSAO, token, timeout=0)
+        return token
+    except Exception as e:
+        logger.warning(f"[AUTOCOMPLETE] Cache indisponível para o token: {e}")
+        return None
+
+
+def _carregar(*filtros):
+    with db.engine.connect() as conexao:
+        return [documento_de_linha(l) for l in conexao.execute(consulta_documentos(*filtros))]
+
+
+def construir():
+    """Reconstrói o índice do processo (1 SELECT). Usado na subida e quando fica velho."""
+    token = _token_compartilhado(criar=True)
+    inicio = time.perf_counter()
+    indice = IndiceAutocomplete(_carregar())
+    with _lock:
+        _estado.update(indice=indice, token=token, construido_em=time.time(), token_conferido_em=time.time())
+    logger.info(f"[AUTOCOMPLETE] Índice com {len(indice)} produtos em {(time.perf_counter() - inicio) * 1000:.0f} ms")
+    return indice
+
+
+def agendar_construcao(app=None):
+    """Reconstrói em background (uma thread por vez)."""
+    from flask import current_app
+    app = app or current_app._get_current_object()
+    with _lock:
+        if _estado["construindo"] or time.time() - _estado["tentativa_em"] < INTERVALO_RECONSTRUCAO:
+            return
+        _estado.update(construindo=True, tentativa_em=time.time())
+
+    def trabalho():
+        try:
+            with app.app_context():
+                construir()
+        except Exception as e:
+            logger.error(f"[AUTOCOMPLETE] Falha ao construir o índice: {e}")
+        finally:
+            _estado["construindo"] = False
+
+    threading.Thread(target=trabalho, name="autocomplete-indice", daemon=True).start()
+
+
+def sugerir(termo, limite=10):
+    """Documentos mais relevantes, ou None se o índice não puder responder agora."""
+    agora = time.time()
+    with _lock:
+        indice, token, construido_em = _estado["indice"], _estado["token"], _estado["construido_em"]
+        conferir = agora - _estado["token_conferido_em"] >= INTERVALO_TOKEN
+        if conferir:
+            _estado["token_conferido_em"] = agora
+
+    desatualizado = conferir and token is not None and token != _token_compartilhado()
+    if indice is None or token is None or desatualizado or agora - construido_em > IDADE_MAXIMA:
+        if desatualizado:
+            with _lock:
+                _estado["token"] = None
+        agendar_construcao()
+        return None
+
+    with _lock:
+        return indice.buscar(termo, limite)
+
+
+# ── Atualização incremental (pós-commit) ─────────────────────────────────
+
+def _ao_invalidar(dependencias):
+    produtos, marcas, reconstruir = set(), set(), False
+    for dep in dependencias:
+        tipo, _, valor = dep.partition(":")
+        if tipo == "produto" and valor.isdigit():
+            produtos.add(int(valor))
+        elif tipo == "marca" and valor.isdigit():
+            marcas.add(int(valor))
+        elif tipo == "categoria" and "layout" in dependencias:
+            reconstruir = True  # categoria renomeada/movida (hook de CategoriaProduto)
+    if not (produtos or marcas or reconstruir):
+        return
+
+    # Se outro processo já publicou alterações que este índice não tem, a
+    # atualização incremental (só das nossas) não o deixa em dia: reconstrói
+    with _lock:
+        indice, token_local = _estado["indice"], _estado["token"]
+    atrasado = token_local is None or _token_compartilhado() != token_local
+
+    # Avisa os outros processos antes de tudo
+    novo = uuid.uuid4().hex
+    try:
+        _cache().set(CHAVE_VERSAO, novo, timeout=0)
+    except Exception as e:
+        logger.warning(f"[AUTOCOMPLETE] Falha ao publicar nova versão: {e}")
+
+    if indice is None:
+        return
+    if reconstruir or atrasado:
+        with _lock:
+            _estado["token"] = None
+        agendar_construcao()
+        return
+
+    try:
+        if marcas:
+            with db.engine.connect() as conexao:
+                produtos |= set(conexao.execute(
+                    select(Produto.id).where(Produto.marca_id.in_(marcas))
+                ).scalars())
+        documentos = _carregar(Produto.id.in_(produtos)) if produtos else []
+        with _lock:
+            indice.atualizar(produtos, documentos)
+            _estado["token"] = novo
+    except Exception as e:
+        logger.error(f"[AUTOCOMPLETE] Falha na atualização incremental, reconstruindo: {e}")
+        with _lock:
+            _estado["token"] = None
+
+
+def registrar_hooks():
+    global _hooks_registered
+    if _hooks_registered: return
+
+    from app.loja.cache_hooks import ao_invalidar
+    ao_invalidar(_ao_invalidar)
+    _hooks_registered = True
+    logger.info("autocomplete: atualização incremental registrada")
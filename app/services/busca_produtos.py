@@ -0,0 +1,213 @@
+"""
+app/services/busca_produtos.py
+─────────────────────────────────────────────────────────────────────────────
+Busca de produtos única para loja, catálogo e dashboard.
+
+Antes, cada endpoint montava o seu OR de ILIKE (o do catálogo chegava a
+~20 predicados sobre descricao/tags, sem índice nenhum). Agora todos
+chamam este módulo:
+
+    buscar_produtos("glock 19", limite=10)          → [Produto, ...]
+    paginar_busca("taurus", page=1, per_page=12)     → Pagination
+
+No PostgreSQL (migration 20261017_busca_produtos):
+  - produtos.busca_documento: tsvector mantido por trigger (nome,
+    nome_comercial, código, marca, calibre, tags e descrições), com
+    unaccent e pesos A/B/C; índice GIN.
+  - Índices GIN de trigrama sobre m4_unaccent(lower(...)) de nome,
+    nome_comercial, código, marca e calibre — tolerância a erro de
+    digitação e a variações como "9 mm" x "9mm".
+
+A ordem é sempre a de `expressao_rank` (ts_rank_cd + maior similaridade
++ bônus de código exato). Fora do Postgres, ou se a migration ainda não
+rodou, cai num ILIKE simples com os mesmos campos.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import logging
+import re
+import unicodedata
+
+from sqlalchemy import case, func, literal, or_, select
+from werkzeug.exceptions import HTTPException
+
+from app import db
+from app.produtos.models import Produto
+from app.produtos.categorias.models import CategoriaProduto
+from app.produtos.configs.models import MarcaProduto, CalibreProduto
+
+logger = logging.getLogger(__name__)
+
+DICIONARIO = "portuguese"
+TAMANHO_MINIMO = 2
+
+
+# ── Normalização ──────────────────────────────────────────────────────────
+
+def normalizar_termo(termo: str) -> str:
+    """Remove acentos, converte para minúsculas, colapsa separadores."""
+    termo = unicodedata.normalize('NFKD', termo or '').encode('ascii', 'ignore').decode('ascii')
+    termo = termo.lower().strip()
+    # Colapsa espaços, hífens, pontos, underscores em espaço único
+    return re.sub(r'[\s\-_\.]+', ' ', termo)
+
+
+def texto_tsquery(termo: str) -> str:
+    """
+    Termo → texto para to_tsquery, com prefixo em cada palavra:
+    "glock 19" → "(glock:* & 19:*) | glock19:*". A variante colada cobre
+    "9 mm" x "9mm". Vazio se não sobrar nenhuma palavra.
+    """
+    palavras = re.findall(r'[a-z0-9]+', normalizar_termo(termo))
+    if not palavras:
+        return ""
+    if len(palavras) == 1:
+        return f"{palavras[0]}:*"
+    return f"({' & '.join(p + ':*' for p in palavras)}) | {''.join(palavras)}:*"
+
+
+def escapar_like(texto: str) -> str:
+    """Escapa \\, % e _ do termo do usuário para LIKE/ILIKE com escape='\\'."""
+    return re.sub(r'([\\%_])', r'\\\1', texto or '')
+
+
+def _sem_acento(coluna):
+    # Mesma expressão dos índices de trigrama (precisa bater para o planner usá-los)
+    return func.m4_unaccent(func.lower(coluna))
+
+
+def _tsquery(texto):
+    # Texto em 'portuguese' (radicais) OU 'simple' (códigos, marcas, calibres)
+    return func.to_tsquery(DICIONARIO, texto).op("||")(func.to_tsquery("simple", texto))
+
+
+# ── Condição e ranking (PostgreSQL) ──────────────────────────────────────
+
+def condicao_busca(termo: str):
+    """Filtro: full-text OU trigrama (nome, código, marca, calibre) OU nome da categoria."""
+    t = normalizar_termo(termo)
+    like = f"%{escapar_like(t)}%"
+    condicoes = [
+        _sem_acento(Produto.nome).op("%")(t),
+        _sem_acento(Produto.nome_comercial).op("%")(t),
+        _sem_acento(Produto.codigo).like(like, escape="\\"),
+        Produto.marca_id.in_(select(MarcaProduto.id).where(or_(
+            _sem_acento(MarcaProduto.nome).op("%")(t),
+            _sem_acento(MarcaProduto.nome).like(like, escape="\\"),
+        ))),
+        Produto.calibre_id.in_(select(CalibreProduto.id).where(or_(
+            _sem_acento(CalibreProduto.nome).op("%")(t),
+            _sem_acento(CalibreProduto.nome).like(like, escape="\\"),
+        ))),
+        Produto.categoria_id.in_(select(CategoriaProduto.id).where(
+            _sem_acento(CategoriaProduto.nome).like(like, escape="\\"),
+        )),
+    ]
+    texto = texto_tsquery(termo)
+    if texto:
+        condicoes.insert(0, Produto.busca_documento.op("@@")(_tsquery(texto)))
+    return or_(*condicoes)
+
+
+def expressao_rank(termo: str):
+    """Ranking único de todas as buscas de produto (maior = melhor)."""
+    t = normalizar_termo(termo)
+    texto = texto_tsquery(termo)
+    # Normalização 32: rank / (rank + 1), fica entre 0 e 1 como a similaridade
+    texto_rank = func.ts_rank_cd(Produto.busca_documento, _tsquery(texto), 32) if texto else literal(0)
+    similaridade = func.greatest(
+        func.similarity(_sem_acento(Produto.nome), t),
+        func.similarity(_sem_acento(Produto.nome_comercial), t),
+        func.similarity(_sem_acento(Produto.codigo), t),
+    )
+    codigo_exato = case((func.lower(Produto.codigo) == (termo or "").strip().lower(), 1.0), else_=0.0)
+    return texto_rank + similaridade + codigo_exato
+
+
+def consulta_busca(termo: str, base=None, visiveis=True):
+    """Query (não executada) filtrada e ordenada pelo ranking."""
+    query = base if base is not None else Produto.query
+    if visiveis:
+        query = query.filter(Produto.visivel_loja == True)
+    return query.filter(condicao_busca(termo))\
+        .order_by(expressao_rank(termo).desc(), Produto.criado_em.desc(), Produto.id.desc())
+
+
+# ── Fallback (sem Postgres / sem migration) ──────────────────────────────
+
+def consulta_busca_simples(termo: str, base=None, visiveis=True):
+    """ILIKE nos mesmos campos, com as variantes do termo normalizado."""
+    normalizado = normalizar_termo(termo)
+    variantes = {normalizado, normalizado.replace(' ', ''), normalizado.replace(' ', '-'), (termo or '').strip()}
+    condicoes = []
+    for v in filter(None, variantes):
+        filtro = f"%{escapar_like(v)}%"
+        condicoes.extend([
+            Produto.nome.ilike(filtro, escape="\\"),
+            Produto.nome_comercial.ilike(filtro, escape="\\"),
+            Produto.codigo.ilike(filtro, escape="\\"),
+            Produto.tags_palavras_chave.ilike(filtro, escape="\\"),
+            Produto.marca_id.in_(select(MarcaProduto.id).where(MarcaProduto.nome.ilike(filtro, escape="\\"))),
+            Produto.calibre_id.in_(select(CalibreProduto.id).where(CalibreProduto.nome.ilike(filtro, escape="\\"))),
+            Produto.categoria_id.in_(select(CategoriaProduto.id).where(CategoriaProduto.nome.ilike(filtro, escape="\\"))),
+        ])
+
+    query = base if base is not None else Produto.query
+    if visiveis:
+        query = query.filter(Produto.visivel_loja == True)
+    return query.filter(or_(*condicoes)).order_by(Produto.criado_em.desc(), Produto.id.desc())
+
+
+# ── Termos curtos ─────────────────────────────────────────────────────────
+
+def consulta_prefixo(termo: str, base=None, visiveis=True):
+    """
+    Termo abaixo de TAMANHO_MINIMO ("9", "G"): trigrama e full-text não
+    servem, mas código, calibre e marca que começam com ele sim.
+    """
+    prefixo = f"{escapar_like((termo or '').strip())}%"
+    query = base if base is not None else Produto.query
+    if visiveis:
+        query = query.filter(Produto.visivel_loja == True)
+    return query.filter(or_(
+        Produto.codigo.ilike(prefixo, escape="\\"),
+        Produto.calibre_id.in_(select(CalibreProduto.id).where(CalibreProduto.nome.ilike(prefixo, escape="\\"))),
+        Produto.marca_id.in_(select(MarcaProduto.id).where(MarcaProduto.nome.ilike(prefixo, escape="\\"))),
+    )).order_by(func.length(Produto.codigo), Produto.criado_em.desc(), Produto.id.desc())
+
+
+# ── API ───────────────────────────────────────────────────────────────────
+
+def _usa_postgres():
+    return db.session.get_bind().dialect.name == "postgresql"
+
+
+def _executar(termo, base, visiveis, opcoes, executor):
+    if _usa_postgres():
+        try:
+            # SAVEPOINT: uma falha aqui desfaz só a busca, não o que a sessão
+            # do request ainda tem pendente (sem ele a transação fica abortada)
+            with db.session.begin_nested():
+                return executor(consulta_busca(termo, base, visiveis).options(*opcoes))
+        except HTTPException:
+            raise  # ex.: 404 de página fora do intervalo no paginate
+        except Exception as e:
+            logger.error(f"[BUSCA] Full-text/trigrama indisponível, usando ILIKE: {e}")
+    return executor(consulta_busca_simples(termo, base, visiveis).options(*opcoes))
+
+
+def buscar_produtos(termo: str, limite=20, base=None, visiveis=True, opcoes=()):
+    """Lista dos `limite` melhores produtos para o termo (prefixo se termo curto)."""
+    if not (termo or "").strip():
+        return []
+    if len(termo.strip()) < TAMANHO_MINIMO:
+        return consulta_prefixo(termo, base, visiveis).options(*opcoes).limit(limite).all()
+    return _executar(termo, base, visiveis, opcoes, lambda q: q.limit(limite).all())
+
+
+def paginar_busca(termo: str, page=1, per_page=12, base=None, visiveis=True, opcoes=()):
+    """Mesma busca, paginada (Flask-SQLAlchemy Pagination)."""
+    if len((termo or "").strip()) < TAMANHO_MINIMO:
+        return consulta_prefixo(termo, base, visiveis).options(*opcoes).paginate(page=page, per_page=per_page)
+    return _executar(termo, base, visiveis, opcoes,
+                     lambda q: q.paginate(page=page, per_page=per_page))
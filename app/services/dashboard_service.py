@@ -198,16 +198,20 @@ def global_search(termo):
     Motor de busca global unificado para o dashboard.
     Busca em Clientes, Documentos, Armas, Munições e Produtos.
     """
-    if not termo or len(termo) < 2:
+    if not termo or not termo.strip():
         return []
 
     from app.clientes.models import Documento, Arma
     from app.estoque.models import ItemEstoque
-    from app.produtos.configs.models import MarcaProduto, CalibreProduto
+    from app.services.busca_produtos import buscar_produtos
     busca_like = f"%{termo}%"
     
     resultados = []
 
+    # 1 caractere ("9", "G"): só produtos, por prefixo de código/calibre/marca
+    if len(termo.strip()) < 2:
+        return _produtos_da_busca(buscar_produtos(termo, limite=20, visiveis=False))
+
     # 1. Clientes (Nome, CPF, Apelido)
     clientes = Cliente.query.filter(
         or_(
@@ -266,30 +270,22 @@ def global_search(termo):
         })
 
     # 5. Produtos (Catálogo Geral) - PRIORIDADE MÁXIMA
-    # Buscamos em Nome, Código, Marca, Calibre e Palavras-chave
-    produtos = Produto.query.join(Produto.marca_rel, isouter=True)\
-                            .join(Produto.calibre_rel, isouter=True).filter(
-        or_(
-            Produto.nome.ilike(busca_like),
-            Produto.codigo.ilike(busca_like),
-            Produto.nome_comercial.ilike(busca_like),
-            Produto.tags_palavras_chave.ilike(busca_like),
-            MarcaProduto.nome.ilike(busca_like),
-            CalibreProduto.nome.ilike(busca_like)
-        )
-    ).limit(20).all()
-    
-    for p in produtos:
-        resultados.insert(0, {
-            "tipo": "produto",
-            "titulo": p.nome_comercial or p.nome,
-            "subtitulo": f"REF: {p.codigo} | R$ {p.preco_a_vista:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'),
-            "link": f"/produtos/{p.id}/editar"
-        })
+    # Mesma busca/ranking da loja (app/services/busca_produtos.py), incluindo
+    # produtos fora da vitrine; os mais relevantes vão para o topo
+    resultados[0:0] = _produtos_da_busca(buscar_produtos(termo, limite=20, visiveis=False))
 
     return resultados
 
 
+def _produtos_da_busca(produtos):
+    return [{
+        "tipo": "produto",
+        "titulo": p.nome_comercial or p.nome,
+        "subtitulo": f"REF: {p.codigo} | R$ {p.preco_a_vista or 0:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'),
+        "link": f"/produtos/{p.id}/editar"
+    } for p in produtos]
+
+
 # ============================
 # API: Timeline
 # ============================
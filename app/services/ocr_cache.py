@@ -0,0 +1,141 @@
+"""
+app/services/ocr_cache.py
+─────────────────────────────────────────────────────────────────────────────
+Cache do resultado de processar_documento() por conteúdo do arquivo.
+
+O mesmo scan de CRAF/CR/CNH costuma subir mais de uma vez (nova tentativa,
+documento anexado ao cliente e à venda, reenvio pela área do cliente na
+loja) e cada envio pagava OCR + LLM de novo. A chave é o SHA-256 dos bytes +
+VERSAO_PIPELINE; o valor (texto, motor, campos interpretados) fica na tabela
+ocr_cache do Postgres — sobrevive a deploys e não disputa a memória do Redis
+com o cache da loja.
+
+Quando parsers, prompt ou motor de OCR mudarem, aumente VERSAO_PIPELINE (as
+entradas antigas deixam de ser lidas) e limpe-as em /admin/ocr-cache.
+
+Falhas do cache nunca derrubam o OCR: sem banco, processa normalmente.
+Resultados com erro (sem texto, Groq fora do ar) não são gravados, nem os
+de leitura parcial: com `tipo`, o OCR local para nas páginas que já têm os
+campos daquele tipo, e o texto não serviria a um envio de outro tipo com o
+mesmo arquivo (a chave não inclui o tipo).
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import hashlib
+import logging
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.services.ocr_local import medir
+
+logger = logging.getLogger(__name__)
+
+VERSAO_PIPELINE = "2026.10.2"
+
+
+def chave(file_bytes: bytes) -> str:
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+def _cacheavel(resultado) -> bool:
+    if not resultado or resultado.get("erro") or resultado.get("parada_antecipada"):
+        return False
+    observacoes = (resultado.get("resultado") or {}).get("observacoes") or ""
+    return "Erro no processamento via Groq" not in observacoes
+
+
+def _tabela():
+    # Core direto na tabela: roda no worker RQ sem configurar os mappers do ORM
+    from app.models import OcrCache
+    return OcrCache.__table__
+
+
+def buscar(sha256: str):
+    """Resultado guardado para o arquivo na versão atual do pipeline, ou None."""
+    t = _tabela()
+    try:
+        with db.engine.begin() as conn:
+            linha = conn.execute(
+                select(t.c.id, t.c.resultado).where(t.c.sha256 == sha256, t.c.versao == VERSAO_PIPELINE)
+            ).first()
+            if linha is None:
+                return None
+            conn.execute(
+                update(t).where(t.c.id == linha.id)
+                .values(acertos=t.c.acertos + 1, ultimo_acesso=datetime.utcnow())
+            )
+            return linha.resultado
+    except Exception as e:
+        logger.warning(f"[OCR CACHE] Falha na leitura de {sha256[:12]}: {e}")
+        return None
+
+
+def gravar(sha256: str, resultado: dict) -> bool:
+    """Guarda a saída de processar_documento(); ignora erros e corridas."""
+    if not _cacheavel(resultado):
+        return False
+    categoria = ((resultado.get("resultado") or {}).get("categoria") or "")[:30] or None
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(insert(_tabela()).values(
+                sha256=sha256, versao=VERSAO_PIPELINE, categoria=categoria, resultado=resultado,
+            ))
+        return True
+    except IntegrityError:
+        return False  # outro worker gravou o mesmo arquivo antes
+    except Exception as e:
+        logger.warning(f"[OCR CACHE] Falha ao gravar {sha256[:12]}: {e}")
+        return False
+
+
+def processar_com_cache(file_bytes: bytes, filename: str, tempos: dict = None, tipo: str = None):
+    """
+    processar_documento() com cache. Retorna (resultado, veio_do_cache).
+    """
+    from app.services.ocr_pipeline import processar_documento
+
+    with medir(tempos, "cache"):
+        sha256 = chave(file_bytes)
+        resultado = buscar(sha256)
+    if resultado is not None:
+        logger.info(f"[OCR CACHE] Acerto {sha256[:12]} ({filename})")
+        return resultado, True
+
+    resultado = processar_documento(file_bytes, filename, tempos=tempos, tipo=tipo)
+    with medir(tempos, "cache"):
+        gravar(sha256, resultado)
+    return resultado, False
+
+
+def invalidar(sha256: str = None, somente_antigas: bool = False) -> int:
+    """
+    Apaga entradas: de um arquivo (sha256), só as de versões anteriores do
+    pipeline (somente_antigas) ou todas. Retorna quantas foram removidas.
+    """
+    t = _tabela()
+    comando = delete(t)
+    if sha256:
+        comando = comando.where(t.c.sha256 == sha256.strip().lower())
+    if somente_antigas:
+        comando = comando.where(t.c.versao != VERSAO_PIPELINE)
+    with db.engine.begin() as conn:
+        removidas = conn.execute(comando).rowcount
+    logger.info(f"[OCR CACHE] {removidas} entrada(s) invalidada(s) (sha256={sha256}, somente_antigas={somente_antigas})")
+    return removidas
+
+
+def resumo():
+    """[{versao, entradas, acertos, atual}] por versão do pipeline, atual primeiro."""
+    t = _tabela()
+    with db.engine.connect() as conn:
+        linhas = conn.execute(
+            select(t.c.versao, func.count(t.c.id), func.coalesce(func.sum(t.c.acertos), 0)).group_by(t.c.versao)
+        ).all()
+    versoes = [
+        {"versao": versao, "entradas": entradas, "acertos": int(acertos), "atual": versao == VERSAO_PIPELINE}
+        for versao, entradas, acertos in linhas
+    ]
+    return sorted(versoes, key=lambda v: (not v["atual"], v["versao"]))
@@ -3,24 +3,25 @@
 # =====================================
 # Interpreta textos OCR com Llama 3.1-8B (Groq)
 # Retorna um dicionário padronizado com campos de documento.
+# A chamada passa por app/utils/llm_gateway (sessão HTTP reaproveitada,
+# cache por prompt, limite de taxa).
 
 import os
 import json
 import re
-import requests
 from datetime import datetime
 
+from app.utils import llm_gateway
+
 
 # =====================================
 # Configurações
 # =====================================
 
-GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+# Sem GROQ_API_KEY o módulo importa normalmente; interpretar_documento()
+# devolve o resultado de erro padrão (que o cache de OCR não guarda).
 GROQ_MODEL = os.environ.get("GROQ_MODEL", "llama-3.1-8b-instant")
 
-if not GROQ_API_KEY:
-    raise RuntimeError("A variável de ambiente GROQ_API_KEY não está configurada.")
-
 
 # =====================================
 # Função utilitária: valida e inverte datas se necessário
@@ -44,6 +45,27 @@ def _corrigir_datas(data_emissao: str, data_validade: str) -> tuple[str, str]:
     return data_emissao, data_validade
 
 
+# =====================================
+# Função utilitária: JSON da resposta
+# =====================================
+
+def _extrair_json(content: str) -> dict:
+    """Dict do JSON da resposta (tolera cercas ```json``` e texto em volta)."""
+    content = re.sub(r"```(?:json)?", "", content)
+    content = content.replace("```", "").strip()
+
+    # Extrai trecho JSON bruto
+    if not content.strip().startswith("{"):
+        start = content.find("{")
+        end = content.rfind("}") + 1
+        content = content[start:end]
+
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        raise ValueError(f"Falha ao decodificar JSON: {content[:200]}")
+
+
 # =====================================
 # Função principal
 # =====================================
@@ -129,54 +151,24 @@ def interpretar_documento(texto_ocr: str) -> dict:
     )
 
     # ============================
-    # Payload para Groq
-    # ============================
-    payload = {
-        "model": GROQ_MODEL,
-        "temperature": 0,
-        "messages": [
-            {"role": "system", "content": prompt_sistema},
-            {"role": "user", "content": texto_ocr}
-        ]
-    }
-
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    # ============================
-    # Requisição
+    # Requisição (via gateway)
     # ============================
     try:
-        r = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=60
-        )
-
-        if r.status_code != 200:
-            raise RuntimeError(f"Erro {r.status_code}: {r.text}")
-
-        content = r.json()["choices"][0]["message"]["content"].strip()
+        content = llm_gateway.completar(
+            [
+                {"role": "system", "content": prompt_sistema},
+                {"role": "user", "content": texto_ocr}
+            ],
+            modelo=GROQ_MODEL,
+            temperatura=0,
+            timeout=60,
+            cache_ttl=0,  # texto de documento pessoal: nada no cache/Redis
+        ).strip()
 
         # ============================
         # Sanitização de resposta
         # ============================
-        content = re.sub(r"```(?:json)?", "", content)
-        content = content.replace("```", "").strip()
-
-        # Extrai trecho JSON bruto
-        if not content.strip().startswith("{"):
-            start = content.find("{")
-            end = content.rfind("}") + 1
-            content = content[start:end]
-
-        try:
-            data = json.loads(content)
-        except json.JSONDecodeError:
-            raise ValueError(f"Falha ao decodificar JSON: {content[:200]}")
+        data = _extrair_json(content)
 
         # ============================
         # Normaliza e corrige
@@ -10,6 +10,19 @@ Fluxo:
 3) Corrige orientação por página (OSD), quando possível.
 4) Retorna um dicionário padronizado com textos por página e metadados.
 
+Estratégia adaptativa (padrão; OCR_ESTRATEGIA=fixa volta ao fluxo antigo,
+300 dpi + OSD em toda página):
+- 1ª passada em OCR_DPI_INICIAL (200); só as páginas fracas (confiança <
+  OCR_CONF_MIN ou menos de OCR_MIN_CARACTERES caracteres) são refeitas em
+  `dpi` (300), com OSD.
+- OSD é dispensado quando a orientação já é conhecida: tag EXIF Orientation
+  na imagem, ou página de PDF sem /Rotate com texto embutido na vertical.
+- Páginas de PDF com texto embutido suficiente não são rasterizadas.
+- parar_quando(textos) encerra o documento assim que os campos obrigatórios
+  do tipo já estão no texto (ver app/uploads/parsers.campos_completos).
+
+scripts/benchmark_ocr.py compara tempo e acerto de campos das estratégias.
+
 Requisitos de sistema (zero custo):
 - Tesseract OCR instalado no sistema (ex.: Windows: choco install tesseract; Linux: apt-get install tesseract-ocr)
 - Poppler instalado para pdf2image (ex.: Windows: choco install poppler; Linux: apt-get install poppler-utils)
@@ -23,6 +36,19 @@ Dependências Python (requirements.txt):
 Config via ambiente (opcional):
 - POPPLER_PATH=/caminho/para/bin (no Windows pode ser necessário)
 - TESSERACT_CMD=/caminho/para/tesseract.exe (se pytesseract não localizar automaticamente)
+- OCR_WORKERS=4 (processos para OSD + Tesseract por página; 1 = sequencial)
+- OCR_LOTE_PAGINAS=4 (páginas rasterizadas por chamada ao Poppler)
+- OCR_ESTRATEGIA=adaptativa | fixa
+- OCR_DPI_INICIAL=200, OCR_CONF_MIN=70, OCR_MIN_CARACTERES=80 (estratégia adaptativa)
+
+Paralelismo: o Tesseract usa um núcleo por chamada, então as páginas vão
+para um pool de processos (OCR_WORKERS) e o texto volta na ordem das páginas.
+O pool só existe em quem chama iniciar_pool() — o worker da fila m4_ocr;
+nos workers web (OCR síncrono, sem Redis) as páginas rodam no próprio
+processo, sem abrir OCR_WORKERS processos por worker do gunicorn.
+O PDF é rasterizado em lotes (first_page/last_page) e no máximo
+2 × OCR_WORKERS páginas ficam em memória — 20 páginas a 300 dpi nunca são
+carregadas de uma vez.
 
 Interface de uso típica nas rotas:
 ----------------------------------
@@ -38,14 +64,25 @@ result = extract_text_local(
 )
 # result["texts"] -> lista de textos por página
 # passe o texto para o parser inteligente (app/uploads/parsers.py) na etapa seguinte
+
+Tempos por etapa: passe tempos={} e o dicionário volta somado em ms por etapa
+("texto_embutido", "rasterizacao", "osd", "preprocessamento", "tesseract") —
+o job de OCR (app/uploads/ocr_jobs.py) grava esses tempos no job.meta.
 """
 
 from __future__ import annotations
 
 import io
 import os
+import time
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
 
 from PIL import Image, ImageOps, ImageFilter, ImageSequence
 import pytesseract
@@ -57,13 +94,28 @@ except Exception:
     pdfplumber = None  # type: ignore
 
 try:
-    from pdf2image import convert_from_bytes  # type: ignore
+    from pdf2image import convert_from_bytes, pdfinfo_from_bytes  # type: ignore
 except Exception:
     convert_from_bytes = None  # type: ignore
+    pdfinfo_from_bytes = None  # type: ignore
 
 
 logger = logging.getLogger(__name__)
 
+OCR_WORKERS = max(1, int(os.environ.get("OCR_WORKERS") or min(4, os.cpu_count() or 1)))
+OCR_LOTE_PAGINAS = max(1, int(os.environ.get("OCR_LOTE_PAGINAS") or OCR_WORKERS))
+
+OCR_ESTRATEGIA = os.environ.get("OCR_ESTRATEGIA", "adaptativa")
+OCR_DPI_INICIAL = int(os.environ.get("OCR_DPI_INICIAL", 200))
+OCR_CONF_MIN = float(os.environ.get("OCR_CONF_MIN", 70))
+OCR_MIN_CARACTERES = int(os.environ.get("OCR_MIN_CARACTERES", 80))
+
+# Tag EXIF Orientation (0x0112)
+_EXIF_ORIENTACAO = 0x0112
+
+# (imagem, rodar OSD?) — unidade de trabalho do pool
+Pagina = Tuple[Image.Image, bool]
+
 
 # ======================
 # Helpers de detecção
@@ -82,6 +134,19 @@ def _safe_get_env(name: str, default: Optional[str] = None) -> Optional[str]:
         return default
 
 
+@contextmanager
+def medir(tempos: Optional[Dict[str, float]], etapa: str):
+    """Soma em tempos[etapa] os ms gastos no bloco (nada faz com tempos=None)."""
+    if tempos is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        tempos[etapa] = round(tempos.get(etapa, 0.0) + (time.perf_counter() - inicio) * 1000, 1)
+
+
 # ======================
 # Pré-processamento
 # ======================
@@ -172,39 +237,242 @@ def _ocr_image(
     psm: int = 6,
     oem: int = 3,
     compute_confidence: bool = False,
+    tempos: Optional[Dict[str, float]] = None,
+    osd: bool = True,
 ) -> Tuple[str, Optional[float]]:
     """
     Roda o OCR em uma imagem PIL.
     Retorna (texto, média_confiança|None)
     """
-    # Corrige orientação antes do OCR
-    img = _fix_orientation(img)
-    img = _preprocess_image(img)
+    # Corrige orientação antes do OCR (osd=False: orientação já conhecida)
+    if osd:
+        with medir(tempos, "osd"):
+            img = _fix_orientation(img)
+    with medir(tempos, "preprocessamento"):
+        img = _preprocess_image(img)
 
     config = f"--psm {psm} --oem {oem}"
     try:
-        if compute_confidence:
-            data = pytesseract.image_to_data(img, lang=lang, config=config, output_type=pytesseract.Output.DICT)
-            text = " ".join([w for w in data.get("text", []) if w and w.strip() != ""])
-            confs = [float(c) for c in data.get("conf", []) if c not in (-1, "-1", "", None)]
-            avg_conf = round(sum(confs) / len(confs), 2) if confs else None
-            return text.strip(), avg_conf
-        else:
-            text = pytesseract.image_to_string(img, lang=lang, config=config)
-            return text.strip(), None
+        with medir(tempos, "tesseract"):
+            return _tesseract(img, lang, config, compute_confidence)
     except Exception as e:
         logger.error(f"Erro no pytesseract: {e}")
         return "", None
 
 
+def _tesseract(img: Image.Image, lang: str, config: str, compute_confidence: bool) -> Tuple[str, Optional[float]]:
+    if compute_confidence:
+        data = pytesseract.image_to_data(img, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+        text = _texto_por_linhas(data)
+        confs = [float(c) for c in data.get("conf", []) if c not in (-1, "-1", "", None)]
+        avg_conf = round(sum(confs) / len(confs), 2) if confs else None
+        return text.strip(), avg_conf
+    text = pytesseract.image_to_string(img, lang=lang, config=config)
+    return text.strip(), None
+
+
+def _texto_por_linhas(data: Dict[str, list]) -> str:
+    """Remonta o texto do image_to_data preservando as quebras de linha (os parsers dependem delas)."""
+    linhas: Dict[Tuple[int, int, int], List[str]] = {}
+    for i, palavra in enumerate(data.get("text", [])):
+        if not palavra or not palavra.strip():
+            continue
+        chave = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        linhas.setdefault(chave, []).append(palavra.strip())
+    return "\n".join(" ".join(palavras) for palavras in linhas.values())
+
+
+def _pagina_fraca(texto: str, conf: Optional[float]) -> bool:
+    """Página que vale refazer em dpi maior (estratégia adaptativa)."""
+    if len((texto or "").strip()) < OCR_MIN_CARACTERES:
+        return True
+    return conf is not None and conf < OCR_CONF_MIN
+
+
+# ======================
+# Pool de processos (OCR por página)
+# ======================
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+_pool_habilitado = False  # ligado por iniciar_pool()
+
+
+def _iniciar_worker() -> None:
+    # Um processo por página já ocupa os núcleos: sem threads OpenMP do Tesseract
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Pool do processo atual (recriado após fork), ou None se iniciar_pool()
+    não foi chamado neste processo. O worker da fila m4_ocr roda os jobs no
+    próprio processo (workers/worker_ocr.py), então o mesmo pool atende
+    todos os jobs.
+    """
+    global _pool, _pool_pid
+    if OCR_WORKERS <= 1 or not _pool_habilitado:
+        return None
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # forkserver: os workers nascem de um processo limpo, sem as threads
+            # e conexões do worker web/RQ
+            metodo = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(
+                max_workers=OCR_WORKERS,
+                mp_context=multiprocessing.get_context(metodo),
+                initializer=_iniciar_worker,
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _descartar_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def iniciar_pool() -> None:
+    """
+    Habilita o pool neste processo e sobe os processos já (worker de OCR,
+    antes do primeiro job). Sem esta chamada o OCR é sequencial.
+    """
+    global _pool_habilitado
+    _pool_habilitado = True
+    pool = _get_pool()
+    if pool is not None:
+        for futuro in [pool.submit(os.getpid) for _ in range(OCR_WORKERS)]:
+            futuro.result()
+
+
+def encerrar_pool() -> None:
+    """Encerra o pool deste processo esperando os processos saírem."""
+    global _pool, _pool_habilitado
+    _pool_habilitado = False
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=True)
+        _pool = None
+
+
+def _ocr_pagina(
+    img: Image.Image,
+    lang: str,
+    compute_confidence: bool,
+    osd: bool = True,
+) -> Tuple[str, Optional[float], Dict[str, float]]:
+    """Executado no pool: OSD + pré-processamento + Tesseract de uma página."""
+    tempos: Dict[str, float] = {}
+    text, conf = _ocr_image(
+        img, lang=lang, psm=6, oem=3, compute_confidence=compute_confidence, tempos=tempos, osd=osd
+    )
+    return text, conf, tempos
+
+
+def _somar_tempos(tempos: Optional[Dict[str, float]], parciais: Dict[str, float]) -> None:
+    if tempos is None:
+        return
+    for etapa, ms in parciais.items():
+        tempos[etapa] = round(tempos.get(etapa, 0.0) + ms, 1)
+
+
+def _ocr_paginas(
+    paginas: Iterable[Pagina],
+    lang: str,
+    compute_confidence: bool,
+    tempos: Optional[Dict[str, float]] = None,
+    paralelo: bool = True,
+    parar_quando: Optional[Callable[[List[str]], bool]] = None,
+) -> Tuple[List[Tuple[str, Optional[float]]], bool]:
+    """
+    OCR de cada página, em paralelo no pool, na ordem das páginas.
+    Retorna ([(texto, confiança|None) por página], parou_antes).
+
+    Consome `paginas` aos poucos: com 2 × OCR_WORKERS páginas pendentes,
+    espera a mais antiga antes de pedir a próxima ao gerador (que rasteriza
+    sob demanda). Se o pool quebrar (worker morto por OOM, por exemplo), o
+    restante segue sequencial neste processo. Documento de uma página
+    (paralelo=False) não paga o envio ao pool.
+
+    parar_quando(textos até aqui) → True encerra: as páginas pendentes são
+    canceladas e o gerador não é mais consumido.
+    """
+    resultados: List[Tuple[str, Optional[float]]] = []
+
+    class _Parada(Exception):
+        pass
+
+    def registrar(text, conf, parciais):
+        resultados.append((text, conf))
+        _somar_tempos(tempos, parciais)
+        if parar_quando and parar_quando([t for t, _ in resultados]):
+            raise _Parada()
+
+    pool = None
+    try:
+        pool = _get_pool() if paralelo else None
+    except Exception as e:
+        logger.warning(f"Pool de OCR indisponível, seguindo sequencial: {e}")
+
+    pendentes: deque = deque()
+
+    def concluir_mais_antiga():
+        nonlocal pool
+        futuro, (img, osd) = pendentes.popleft()
+        try:
+            resultado = futuro.result()
+        except BrokenProcessPool as e:
+            logger.warning(f"Pool de OCR quebrou, seguindo sequencial: {e}")
+            _descartar_pool()
+            pool = None
+            resultado = _ocr_pagina(img, lang, compute_confidence, osd)
+        registrar(*resultado)
+
+    try:
+        for img, osd in paginas:
+            if pool is None:
+                while pendentes:
+                    concluir_mais_antiga()
+                registrar(*_ocr_pagina(img, lang, compute_confidence, osd))
+                continue
+            try:
+                pendentes.append((pool.submit(_ocr_pagina, img, lang, compute_confidence, osd), (img, osd)))
+            except (BrokenProcessPool, RuntimeError) as e:
+                logger.warning(f"Pool de OCR indisponível, seguindo sequencial: {e}")
+                _descartar_pool()
+                pool = None
+                while pendentes:
+                    concluir_mais_antiga()
+                registrar(*_ocr_pagina(img, lang, compute_confidence, osd))
+                continue
+            if len(pendentes) >= 2 * OCR_WORKERS:
+                concluir_mais_antiga()
+
+        while pendentes:
+            concluir_mais_antiga()
+    except _Parada:
+        for futuro, _ in pendentes:
+            futuro.cancel()
+        return resultados, True
+    return resultados, False
+
+
 # ======================
 # PDF: texto embutido
 # ======================
 
-def _pdf_textlayer_extract(file_bytes: bytes) -> List[str]:
+def _pdf_textlayer_extract(file_bytes: bytes, orientacao: Optional[List[bool]] = None) -> List[str]:
     """
     Extrai texto embutido por página com pdfplumber.
     Se pdfplumber não estiver disponível, retorna lista vazia.
+
+    Com `orientacao=[]`, preenche por página se a orientação já é conhecida
+    (sem /Rotate e com ≥ 90% dos caracteres na vertical) — o OSD pode ser
+    dispensado nessas páginas.
     """
     results: List[str] = []
     if not pdfplumber:
@@ -215,6 +483,12 @@ def _pdf_textlayer_extract(file_bytes: bytes) -> List[str]:
             for page in pdf.pages:
                 txt = page.extract_text(x_tolerance=2, y_tolerance=2) or ""
                 results.append(txt.strip())
+                if orientacao is not None:
+                    chars = page.chars
+                    em_pe = sum(1 for c in chars if c.get("upright", True))
+                    orientacao.append(
+                        not (page.rotation or 0) and len(chars) >= 20 and em_pe >= 0.9 * len(chars)
+                    )
     except Exception as e:
         logger.warning(f"Falha ao extrair texto embutido com pdfplumber: {e}")
 
@@ -256,6 +530,47 @@ def _pdf_to_images(
         return []
 
 
+def _pdf_page_count(file_bytes: bytes) -> Optional[int]:
+    """Total de páginas pelo pdfinfo do Poppler (None se indisponível)."""
+    if not pdfinfo_from_bytes:
+        return None
+    try:
+        return int(pdfinfo_from_bytes(file_bytes, poppler_path=_safe_get_env("POPPLER_PATH"))["Pages"])
+    except Exception as e:
+        logger.warning(f"Falha ao contar páginas do PDF: {e}")
+        return None
+
+
+def _pdf_paginas(
+    file_bytes: bytes,
+    dpi: int,
+    paginas: List[int],
+    lote: int,
+    tempos: Optional[Dict[str, float]] = None,
+    osd: Optional[Callable[[int], bool]] = None,
+) -> Iterator[Pagina]:
+    """
+    Rasteriza as páginas pedidas (números a partir de 1, em ordem) em lotes de
+    até `lote` páginas consecutivas, sob demanda: o lote seguinte só é
+    convertido quando o OCR consumir o anterior. osd(n) diz se a página n
+    precisa de OSD (padrão: todas).
+    """
+    i = 0
+    while i < len(paginas):
+        # lote = sequência de páginas consecutivas (first_page..last_page)
+        j = i + 1
+        while j < len(paginas) and j - i < lote and paginas[j] == paginas[j - 1] + 1:
+            j += 1
+        primeira, fim = paginas[i], paginas[j - 1]
+        with medir(tempos, "rasterizacao"):
+            images = _pdf_to_images(file_bytes, dpi=dpi, first_page=primeira, last_page=fim)
+        for n, img in zip(range(primeira, fim + 1), images):
+            yield img, (osd(n) if osd else True)
+        if len(images) < fim - primeira + 1:
+            return  # PDF acabou antes (contagem desconhecida) ou falha do Poppler
+        i = j
+
+
 # ======================
 # Imagens multi-frame (ex.: TIFF)
 # ======================
@@ -263,6 +578,8 @@ def _pdf_to_images(
 def _image_bytes_to_frames(file_bytes: bytes) -> List[Image.Image]:
     """
     Lê bytes de imagem (JPG/PNG/TIFF) e retorna frames (páginas).
+    Frames com tag EXIF Orientation já saem girados e marcados com
+    info["orientacao_exif"] = True (dispensa o OSD).
     """
     frames: List[Image.Image] = []
     try:
@@ -272,11 +589,54 @@ def _image_bytes_to_frames(file_bytes: bytes) -> List[Image.Image]:
             frames.append(frame.copy())
         if not frames:
             frames = [im]
+        for n, frame in enumerate(frames):
+            if frame.getexif().get(_EXIF_ORIENTACAO):
+                girado = ImageOps.exif_transpose(frame)
+                girado.info["orientacao_exif"] = True
+                frames[n] = girado
     except Exception as e:
         logger.error(f"Falha ao abrir imagem: {e}")
     return frames
 
 
+def _dpi_do_frame(frame: Image.Image, padrao: int) -> float:
+    try:
+        xdpi, ydpi = frame.info.get("dpi", (padrao, padrao))
+        return float(min(xdpi, ydpi)) or padrao
+    except Exception:
+        return padrao
+
+
+def _escalar_frame(frame: Image.Image, dpi_origem: float, dpi_alvo: int, tempos=None) -> Image.Image:
+    scale = dpi_alvo / max(1.0, dpi_origem)
+    new_size = (int(frame.width * scale), int(frame.height * scale))
+    with medir(tempos, "rasterizacao"):
+        return frame.resize(new_size, Image.LANCZOS)
+
+
+def _frames_normalizados(
+    frames: List[Image.Image],
+    dpi: int,
+    tempos: Optional[Dict[str, float]] = None,
+    dpi_alvo: Optional[int] = None,
+    pular_osd_exif: bool = False,
+) -> Iterator[Pagina]:
+    """
+    Fixa (dpi_alvo=None): upscale para 300 dpi quando o metadado for < 200.
+    Adaptativa: upscale só até dpi_alvo.
+    """
+    for frame in frames:
+        origem = _dpi_do_frame(frame, dpi)
+        osd = not (pular_osd_exif and frame.info.get("orientacao_exif"))
+        if dpi_alvo is None:
+            # Upscale leve quando DPI < 200 melhora legibilidade do OCR
+            if origem < 200:
+                frame = _escalar_frame(frame, origem, 300, tempos)
+        elif origem < dpi_alvo:
+            frame = _escalar_frame(frame, origem, dpi_alvo, tempos)
+        yield frame, osd
+
+
 # ======================
 # Função pública principal
 # ======================
@@ -289,6 +649,9 @@ def extract_text_local(
     max_pages: int = 20,
     try_pdf_textlayer: bool = True,
     compute_confidence: bool = False,
+    tempos: Optional[Dict[str, float]] = None,
+    estrategia: Optional[str] = None,
+    parar_quando: Optional[Callable[[List[str]], bool]] = None,
 ) -> Dict[str, Any]:
     """
     Executa OCR local em PDF ou imagem e retorna um dicionário padronizado:
@@ -303,13 +666,20 @@ def extract_text_local(
       "used_pdf_textlayer": true|false,
       "meta": {
          "truncated": false,
-         "pdf_textlayer_score": 0.87
+         "pdf_textlayer_score": 0.87,
+         "estrategia": "adaptativa",
+         "paginas_reprocessadas": 1,     # refeitas em `dpi` (adaptativa)
+         "osd_dispensado": 2,            # páginas com orientação já conhecida
+         "parada_antecipada": false      # parar_quando encerrou antes do fim
       }
     }
 
     Notas:
     - Se texto embutido do PDF for consistente, evitamos rasterização (mais rápido).
     - Se vier pouco texto (score baixo), caímos para rasterização + pytesseract.
+    - estrategia: "adaptativa" | "fixa" (padrão: OCR_ESTRATEGIA); `dpi` é o
+      teto da adaptativa e a resolução única da fixa.
+    - parar_quando(textos) → True encerra o documento (só na adaptativa).
     """
 
     if not file_bytes:
@@ -317,6 +687,12 @@ def extract_text_local(
 
     header = file_bytes[:8]
     is_pdf = _looks_like_pdf(header, filename or "")
+    adaptativa = (estrategia or OCR_ESTRATEGIA) == "adaptativa"
+    dpi_inicial = min(OCR_DPI_INICIAL, dpi) if adaptativa else dpi
+    if not adaptativa:
+        parar_quando = None
+    # A adaptativa precisa da confiança para decidir o que refazer
+    com_confianca = compute_confidence or adaptativa
 
     result: Dict[str, Any] = {
         "engine": "local",
@@ -329,24 +705,60 @@ def extract_text_local(
         "meta": {
             "truncated": False,
             "pdf_textlayer_score": None,
+            "estrategia": "adaptativa" if adaptativa else "fixa",
+            "paginas_reprocessadas": 0,
+            "osd_dispensado": 0,
+            "parada_antecipada": False,
         }
     }
 
+    def finalizar(por_pagina: Dict[int, Tuple[str, Optional[float]]]) -> Dict[str, Any]:
+        ordem = sorted(por_pagina)
+        result["texts"] = [por_pagina[n][0] for n in ordem]
+        result["pages"] = len(ordem)
+        confs = [por_pagina[n][1] for n in ordem if por_pagina[n][1] is not None]
+        if confs:
+            result["avg_confidence"] = round(sum(confs) / len(confs), 2)
+        return result
+
+    def refazer_fracas(por_pagina, dpi_da_pagina, gerar):
+        """2ª passada (adaptativa): páginas fracas em `dpi`, com OSD; fica o melhor texto."""
+        fracas = [n for n, (texto, conf) in sorted(por_pagina.items())
+                  if _pagina_fraca(texto, conf) and dpi_da_pagina(n) < dpi]
+        if not fracas:
+            return
+        refeitas, _ = _ocr_paginas(
+            gerar(fracas), lang=lang, compute_confidence=com_confianca, tempos=tempos,
+            paralelo=len(fracas) > 1,
+        )
+        for n, (texto, conf) in zip(fracas, refeitas):
+            texto_antes, conf_antes = por_pagina[n]
+            melhor = (conf or 0) > (conf_antes or 0) or len(texto.strip()) > len(texto_antes.strip()) * 1.2
+            if melhor:
+                por_pagina[n] = (texto, conf)
+        result["meta"]["paginas_reprocessadas"] = len(fracas)
+
     # ======================
     # Caso PDF
     # ======================
     if is_pdf:
         texts_embedded: List[str] = []
+        orientacao: List[bool] = []
         if try_pdf_textlayer and pdfplumber:
-            texts_embedded = _pdf_textlayer_extract(file_bytes)
+            with medir(tempos, "texto_embutido"):
+                texts_embedded = _pdf_textlayer_extract(file_bytes, orientacao)
             # score simples: proporção de páginas com >= 30 chars
             if texts_embedded:
                 rich_pages = sum(1 for t in texts_embedded if len((t or "").strip()) >= 30)
                 score = round(rich_pages / max(1, len(texts_embedded)), 4)
                 result["meta"]["pdf_textlayer_score"] = score
 
-        # Critério: se score >= 0.6, já aceitável; senão, rasteriza
-        if texts_embedded and (result["meta"]["pdf_textlayer_score"] or 0) >= 0.6:
+        # Critério: se score >= 0.6, já aceitável; senão, rasteriza.
+        # Na adaptativa, o texto embutido também basta se já tiver os campos do documento.
+        camada_suficiente = (result["meta"]["pdf_textlayer_score"] or 0) >= 0.6
+        if texts_embedded and not camada_suficiente and parar_quando:
+            camada_suficiente = result["meta"]["parada_antecipada"] = bool(parar_quando(texts_embedded))
+        if texts_embedded and camada_suficiente:
             result["used_pdf_textlayer"] = True
             # Limitar páginas se exceder max_pages
             if len(texts_embedded) > max_pages:
@@ -356,9 +768,43 @@ def extract_text_local(
             result["pages"] = len(texts_embedded)
             return result
 
-        # Rasterização (OCR)
-        images = _pdf_to_images(file_bytes, dpi=dpi)
-        if not images:
+        # Rasterização (OCR) em lotes, com as páginas indo para o pool
+        total_paginas = _pdf_page_count(file_bytes) or len(texts_embedded) or None
+        ultima = min(total_paginas, max_pages) if total_paginas else max_pages
+        if total_paginas and total_paginas > max_pages:
+            result["meta"]["truncated"] = True
+
+        # Adaptativa: página com texto embutido próprio não é rasterizada
+        por_pagina: Dict[int, Tuple[str, Optional[float]]] = {}
+        if adaptativa:
+            for n, texto in enumerate(texts_embedded[:ultima], start=1):
+                if len(texto.strip()) >= 30:
+                    por_pagina[n] = (texto, None)
+        alvo = [n for n in range(1, ultima + 1) if n not in por_pagina]
+
+        def osd_pdf(n: int) -> bool:
+            conhecida = adaptativa and n <= len(orientacao) and orientacao[n - 1]
+            if conhecida:
+                result["meta"]["osd_dispensado"] += 1
+            return not conhecida
+
+        def parar(textos: List[str]) -> bool:
+            return parar_quando([por_pagina[n][0] for n in sorted(por_pagina)] + textos)
+
+        primeira_passada, parou = _ocr_paginas(
+            _pdf_paginas(file_bytes, dpi_inicial, alvo, OCR_LOTE_PAGINAS, tempos, osd=osd_pdf),
+            lang=lang, compute_confidence=com_confianca, tempos=tempos, paralelo=len(alvo) > 1,
+            parar_quando=parar if parar_quando else None,
+        )
+        if parou:
+            result["meta"]["parada_antecipada"] = True
+            # páginas depois da que completou os campos ficam de fora
+            ultima_lida = alvo[len(primeira_passada) - 1]
+            por_pagina = {n: v for n, v in por_pagina.items() if n <= ultima_lida}
+        for n, resultado in zip(alvo, primeira_passada):
+            por_pagina[n] = resultado
+
+        if not primeira_passada and alvo:
             # Se falhou rasterizar, mas havia algum texto embutido, retorna-o
             if texts_embedded:
                 result["used_pdf_textlayer"] = True
@@ -369,34 +815,26 @@ def extract_text_local(
                 result["pages"] = len(texts_embedded)
                 return result
             # Sem saída viável
+            result["meta"]["truncated"] = False
             return result
 
-        if len(images) > max_pages:
-            images = images[:max_pages]
-            result["meta"]["truncated"] = True
-
-        page_texts: List[str] = []
-        confs: List[float] = []
-
-        for img in images:
-            text, conf = _ocr_image(
-                img, lang=lang, psm=6, oem=3, compute_confidence=compute_confidence
+        if adaptativa and not parou:
+            ocr_feito = set(alvo)
+            candidatas = {n: v for n, v in por_pagina.items() if n in ocr_feito}
+            refazer_fracas(
+                candidatas,
+                lambda n: dpi_inicial,
+                lambda fracas: _pdf_paginas(file_bytes, dpi, fracas, OCR_LOTE_PAGINAS, tempos),
             )
-            page_texts.append(text)
-            if conf is not None:
-                confs.append(conf)
-
-        result["texts"] = page_texts
-        result["pages"] = len(page_texts)
-        if confs:
-            result["avg_confidence"] = round(sum(confs) / len(confs), 2)
+            por_pagina.update(candidatas)
 
-        return result
+        return finalizar(por_pagina)
 
     # ======================
     # Caso Imagem
     # ======================
-    frames = _image_bytes_to_frames(file_bytes)
+    with medir(tempos, "rasterizacao"):
+        frames = _image_bytes_to_frames(file_bytes)
     if not frames:
         return result
 
@@ -404,35 +842,27 @@ def extract_text_local(
         frames = frames[:max_pages]
         result["meta"]["truncated"] = True
 
-    page_texts = []
-    confs: List[float] = []
+    if adaptativa:
+        result["meta"]["osd_dispensado"] = sum(1 for f in frames if f.info.get("orientacao_exif"))
 
-    for frame in frames:
-        # Opcional: normalizar para ~300DPI (quando metadados de DPI estiverem muito baixos)
-        try:
-            xdpi, ydpi = frame.info.get("dpi", (dpi, dpi))
-        except Exception:
-            xdpi, ydpi = (dpi, dpi)
-
-        # Upscale leve quando DPI < 200 melhora legibilidade do OCR
-        if min(xdpi, ydpi) < 200:
-            scale = 300.0 / max(1, min(xdpi, ydpi))
-            new_size = (int(frame.width * scale), int(frame.height * scale))
-            frame = frame.resize(new_size, Image.LANCZOS)
-
-        text, conf = _ocr_image(
-            frame, lang=lang, psm=6, oem=3, compute_confidence=compute_confidence
+    primeira_passada, parou = _ocr_paginas(
+        _frames_normalizados(frames, dpi, tempos,
+                             dpi_alvo=dpi_inicial if adaptativa else None, pular_osd_exif=adaptativa),
+        lang=lang, compute_confidence=com_confianca, tempos=tempos, paralelo=len(frames) > 1,
+        parar_quando=parar_quando,
+    )
+    por_pagina = dict(enumerate(primeira_passada, start=1))
+    result["meta"]["parada_antecipada"] = parou
+
+    if adaptativa and not parou:
+        # Só adianta refazer se a 1ª passada ficou abaixo de `dpi` (houve escala menor)
+        refazer_fracas(
+            por_pagina,
+            lambda n: max(_dpi_do_frame(frames[n - 1], dpi), dpi_inicial),
+            lambda fracas: _frames_normalizados([frames[n - 1] for n in fracas], dpi, tempos, dpi_alvo=dpi),
         )
-        page_texts.append(text)
-        if conf is not None:
-            confs.append(conf)
-
-    result["texts"] = page_texts
-    result["pages"] = len(page_texts)
-    if confs:
-        result["avg_confidence"] = round(sum(confs) / len(confs), 2)
 
-    return result
+    return finalizar(por_pagina)
 
 
 # ======================
@@ -1,5 +1,6 @@
 # app/services/parcelamento.py
 from typing import List, Tuple, Optional
+from flask import g, has_app_context
 from app.produtos.models import Produto
 from app.models import Taxa
 import app.utils.parcelamento as parc
@@ -15,13 +16,47 @@ def _valor_base_do_produto(produto: Produto) -> float:
     return produto.preco_final or produto.preco_a_vista or 0.0
 
 
+CHAVE_COEFICIENTES = "coeficientes_parcelamento_v1"
+
+
+def coeficientes_vigentes() -> List[dict]:
+    """
+    Vetor de coeficientes das taxas atuais (parc.coeficientes_parcelas).
+
+    Fica no cache compartilhado sob a dependência 'parcelamento', que o
+    hook de Taxa (app/loja/cache_hooks.py) apaga a cada alteração; ou seja,
+    é recalculado uma vez por versão das taxas. Dentro de uma mesma
+    requisição, a leitura do cache também é feita uma única vez (g), então
+    uma grade com dezenas de cards não gera nenhuma query extra.
+    """
+    if has_app_context() and "coeficientes_parcelamento" in g:
+        return g.coeficientes_parcelamento
+
+    from app.loja.routes import cache
+    from app.loja.cache_hooks import guardar
+
+    coeficientes = cache.get(CHAVE_COEFICIENTES)
+    if coeficientes is None:
+        taxas = Taxa.query.order_by(Taxa.numero_parcelas).all()
+        coeficientes = parc.coeficientes_parcelas(taxas)
+        guardar(CHAVE_COEFICIENTES, coeficientes, 86400, "parcelamento")
+
+    if has_app_context():
+        g.coeficientes_parcelamento = coeficientes
+    return coeficientes
+
+
+def parcela_em(valor_base: float, parcelas: int = 12) -> Optional[float]:
+    """Valor da parcela em N vezes (None se não houver taxa para N)."""
+    return parc.parcela_por_coeficientes(valor_base, coeficientes_vigentes(), parcelas)
+
+
 def gerar_linhas_por_valor(valor_base: float) -> List[dict]:
     """
     Gera as linhas de parcelamento para um valor avulso (modo 'rápido'),
-    usando exatamente o gerador já utilizado hoje e as taxas do BD.
+    a partir dos coeficientes vigentes (sem reconsultar as taxas).
     """
-    taxas = Taxa.query.order_by(Taxa.numero_parcelas).all()
-    return parc.gerar_linhas_parcelas(valor_base, taxas)
+    return parc.linhas_por_coeficientes(valor_base, coeficientes_vigentes())
 
 
 def gerar_linhas_por_produto(produto: Produto) -> Tuple[float, List[dict]]:
@@ -0,0 +1,242 @@
+# ================================================================
+# app/services/precificacao_lote.py
+# Precificação vetorizada — mesma regra de Produto.calcular_precos,
+# aplicada a milhares de SKUs de uma vez (NumPy).
+# ================================================================
+"""
+Fluxo típico:
+
+    cols = carregar_colunas(ids)              # 1 SELECT
+    res = calcular_precos_lote(cols)          # 1 passada NumPy
+    gravar_precos_lote(res, cols)             # 1 UPDATE em lote (só o que mudou)
+    db.session.commit()
+
+`colunas` pode ser um dict de arrays/listas ou um pandas.DataFrame com as
+colunas de COLUNAS_ENTRADA. Os resultados são idênticos aos do método
+escalar: as contas seguem a mesma ordem de operações em float64 e o
+arredondamento final usa o round() do Python, não o np.round.
+"""
+
+import numpy as np
+from sqlalchemy import update
+
+from app import db
+from app.produtos.models import Produto
+from app.utils.datetime import now_local
+
+COLUNAS_NUMERICAS = (
+    "preco_fornecedor", "desconto_fornecedor", "frete", "margem",
+    "ipi", "difal", "imposto_venda", "lucro_alvo", "preco_final",
+    "promo_preco_fornecedor",
+)
+COLUNAS_ENTRADA = ("id", "ipi_tipo", "promo_ativada", "promo_data_inicio",
+                   "promo_data_fim") + COLUNAS_NUMERICAS
+
+# Colunas extras usadas só para detectar mudança e invalidar o cache
+COLUNAS_ATUAIS = ("custo_total", "preco_a_vista", "lucro_liquido_real",
+                  "visivel_loja", "categoria_id")
+
+CAMPOS_PRECO = ("custo_total", "preco_a_vista", "lucro_liquido_real")
+
+
+# =====================================================
+# MONTAGEM DAS COLUNAS
+# =====================================================
+def _para_float(valores):
+    # float(x or 0): None e Decimal('0') viram 0.0, como no método escalar;
+    # NaN (None vindo de um DataFrame) também.
+    arr = np.array([float(v or 0) for v in valores], dtype=np.float64)
+    arr[np.isnan(arr)] = 0.0
+    return arr
+
+
+def _para_timestamp(valores):
+    # Datas sem timezone não são comparáveis com now_local() no método
+    # escalar (TypeError → promoção ignorada); aqui viram NaN.
+    return np.array(
+        [v.timestamp() if v is not None and getattr(v, "tzinfo", None) else np.nan
+         for v in valores],
+        dtype=np.float64,
+    )
+
+
+def colunas_de_produtos(produtos):
+    """Converte objetos Produto já carregados em colunas."""
+    produtos = list(produtos)
+    campos = COLUNAS_ENTRADA + COLUNAS_ATUAIS
+    return {c: [getattr(p, c) for p in produtos] for c in campos}
+
+
+def carregar_colunas(ids=None, query=None):
+    """
+    Carrega as colunas de precificação com um único SELECT.
+    `query` permite filtrar (ex.: Produto.query.filter_by(marca_id=3)).
+    """
+    campos = COLUNAS_ENTRADA + COLUNAS_ATUAIS
+    q = query if query is not None else Produto.query
+    if ids is not None:
+        q = q.filter(Produto.id.in_(list(ids)))
+    linhas = q.with_entities(*[getattr(Produto, c) for c in campos]).order_by(Produto.id).all()
+    return {c: [linha[i] for linha in linhas] for i, c in enumerate(campos)}
+
+
+# =====================================================
+# CÁLCULO
+# =====================================================
+def calcular_precos_lote(colunas, agora=None):
+    """
+    Versão vetorizada de Produto.calcular_precos.
+
+    Retorna um dict com listas alinhadas a colunas["id"]:
+        custo_total, preco_a_vista, lucro_liquido_real (float, 2 casas),
+        em_oferta (bool) e valido (False quando o preço daria divisão por
+        zero — ex.: margem 100% — caso em que o método escalar levanta erro).
+    """
+    ids = list(colunas["id"])
+    n = len(ids)
+    if n == 0:
+        return {"id": [], "custo_total": [], "preco_a_vista": [],
+                "lucro_liquido_real": [], "em_oferta": [], "valido": []}
+
+    v = {c: _para_float(colunas[c]) for c in COLUNAS_NUMERICAS}
+    ipi_tipo = np.array([(t or "%").strip() for t in colunas["ipi_tipo"]], dtype=object)
+    promo_ativada = np.array([bool(x) for x in colunas["promo_ativada"]], dtype=bool)
+    inicio = _para_timestamp(colunas["promo_data_inicio"])
+    fim = _para_timestamp(colunas["promo_data_fim"])
+
+    agora_ts = (agora or now_local()).timestamp()
+
+    # Divisões por zero viram inf/NaN e são marcadas como inválidas no fim
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # --- Promoção ---
+        em_oferta = (
+            promo_ativada
+            & (v["promo_preco_fornecedor"] > 0)
+            & (inicio <= agora_ts)
+            & (agora_ts <= fim)
+        )
+        preco_base = np.where(em_oferta, v["promo_preco_fornecedor"], v["preco_fornecedor"])
+
+        # --- Custos ---
+        ipi = v["ipi"]
+        base = preco_base * (1 - (v["desconto_fornecedor"] / 100))
+        base_sem_ipi = base / (1 + (ipi / 100))
+        valor_ipi = np.where(
+            ipi_tipo == "%_dentro", base - base_sem_ipi,
+            np.where(ipi_tipo == "%", base * (ipi / 100), ipi),
+        )
+
+        frete = v["frete"]
+        valor_difal = (base - valor_ipi + frete) * (v["difal"] / 100)
+        custo_total = base + valor_difal + frete
+
+        # --- Preço de venda ---
+        imposto_venda = v["imposto_venda"]
+        margem = v["margem"]
+        lucro_alvo = v["lucro_alvo"]
+        por_lucro = (custo_total + lucro_alvo) / (1 - (imposto_venda / 100))
+        por_margem = custo_total / (1 - (margem / 100))
+
+        preco_final = v["preco_final"]
+        calculado = np.where(lucro_alvo > 0, por_lucro, np.where(margem > 0, por_margem, custo_total))
+        preco_final = np.where(preco_final <= 0, calculado, preco_final)
+
+        imposto_venda_valor = preco_final * (imposto_venda / 100)
+        lucro_liquido = preco_final - custo_total - imposto_venda_valor
+
+    valido = np.isfinite(preco_final) & np.isfinite(lucro_liquido)
+
+    def _arredondar(arr):
+        return [round(float(x), 2) if ok else None for x, ok in zip(arr, valido)]
+
+    return {
+        "id": ids,
+        "custo_total": _arredondar(custo_total),
+        "preco_a_vista": _arredondar(preco_final),
+        "lucro_liquido_real": _arredondar(lucro_liquido),
+        "em_oferta": em_oferta.tolist(),
+        "valido": valido.tolist(),
+    }
+
+
+def aplicar_em_objetos(produtos, resultado):
+    """Copia o resultado para objetos Produto carregados na sessão."""
+    por_id = {pid: i for i, pid in enumerate(resultado["id"])}
+    for p in produtos:
+        i = por_id.get(p.id)
+        if i is None or not resultado["valido"][i]:
+            continue
+        for campo in CAMPOS_PRECO:
+            setattr(p, campo, resultado[campo][i])
+
+
+def linha_de_precos(resultado, i):
+    """Dict no formato de Produto.calcular_precos() para a linha i."""
+    return {
+        "custo_total": resultado["custo_total"][i],
+        "preco_a_vista": resultado["preco_a_vista"][i],
+        "lucro_liquido_real": resultado["lucro_liquido_real"][i],
+        "em_oferta": resultado["em_oferta"][i],
+    }
+
+
+# =====================================================
+# GRAVAÇÃO
+# =====================================================
+def _mudou(atual, novo):
+    return atual is None or round(float(atual), 2) != novo
+
+
+def linhas_alteradas(resultado, colunas=None):
+    """
+    Monta os parâmetros do UPDATE (um dict por produto). Com `colunas`
+    (as mesmas usadas no cálculo), só entram produtos cujo preço mudou.
+    """
+    agora = now_local()
+    linhas = []
+    for i, pid in enumerate(resultado["id"]):
+        if not resultado["valido"][i]:
+            continue
+        novos = {c: resultado[c][i] for c in CAMPOS_PRECO}
+        if colunas is not None and not any(_mudou(colunas[c][i], novos[c]) for c in CAMPOS_PRECO):
+            continue
+        linhas.append({"id": pid, "atualizado_em": agora, **novos})
+    return linhas
+
+
+def gravar_precos_lote(resultado, colunas=None):
+    """
+    Grava custo_total / preco_a_vista / lucro_liquido_real num único
+    UPDATE em lote por chave primária (executemany). Não faz commit.
+
+    Como UPDATE em lote não dispara os eventos do mapper, as dependências
+    de cache dos produtos afetados são marcadas aqui e apagadas no commit.
+    Retorna os ids gravados.
+    """
+    linhas = linhas_alteradas(resultado, colunas)
+    if not linhas:
+        return []
+
+    db.session.execute(update(Produto), linhas)
+
+    from app.loja.cache_hooks import marcar_para_invalidar
+    ids = [linha["id"] for linha in linhas]
+    deps = {f"produto:{pid}" for pid in ids}
+    if colunas is not None:
+        alterados = set(ids)
+        for i, pid in enumerate(resultado["id"]):
+            if pid in alterados and colunas["visivel_loja"][i]:
+                deps |= {"vitrine", f"categoria:{colunas['categoria_id'][i]}"}
+    else:
+        deps.add("vitrine")
+    marcar_para_invalidar(db.session, *deps)
+    return ids
+
+
+def recalcular_produtos(ids=None, query=None, agora=None):
+    """Atalho: carrega, calcula e grava. Retorna (ids gravados, ids inválidos)."""
+    colunas = carregar_colunas(ids=ids, query=query)
+    resultado = calcular_precos_lote(colunas, agora=agora)
+    gravados = gravar_precos_lote(resultado, colunas)
+    invalidos = [pid for pid, ok in zip(resultado["id"], resultado["valido"]) if not ok]
+    return gravados, invalidos
@@ -0,0 +1,395 @@
+# ================================================================
+# app/services/reprecificacao.py
+# Reprecificação por regras (tabela nova de distribuidor):
+# simulação (diff antigo/novo) + aplicação em lote, em background.
+# ================================================================
+"""
+Uma regra diz QUAIS produtos (marca e/ou categoria) e O QUE muda:
+
+    {"marca": "Taurus", "campo": "desconto_fornecedor", "operacao": "somar", "valor": 3}
+    {"categoria": "pistolas", "campo": "margem", "operacao": "definir", "valor": 28}
+
+ou no formato texto aceito pela tela/API:
+
+    marca=Taurus: desconto_fornecedor +3%
+    categoria pistolas: margem 28%
+
+Operações:
+    definir   campo = valor
+    somar     campo + valor            (pontos percentuais / reais)
+    percentual campo * (1 + valor/100) (ex.: preco_fornecedor +5%)
+
+No texto, "+N%" num campo de percentual (margem, desconto, ipi…) soma
+pontos; num campo em reais (preco_fornecedor, frete…) aplica percentual.
+Sem sinal, define o valor. Regras são aplicadas na ordem: se duas
+atingem o mesmo produto e campo, a última prevalece sobre a primeira.
+
+Fluxo:
+    diff = simular_reprecificacao(regras)         # nada é gravado
+    enfileirar_reprecificacao(regras, usuario)    # RQ, ou síncrono sem Redis
+        → aplicar_reprecificacao(): lotes de TAMANHO_LOTE com
+          1 SELECT + 1 UPDATE em lote + 1 INSERT em lote de histórico
+          e commit por lote; progresso numa Notificacao (tipo
+          'reprecificacao') atualizada a cada lote.
+"""
+
+import logging
+import re
+from datetime import datetime
+
+from sqlalchemy import insert, update
+
+from app import db
+from app.models import Notificacao
+from app.produtos.models import Produto, ProdutoHistorico
+from app.produtos.categorias.arvore import arvore_categorias
+from app.produtos.configs.models import MarcaProduto
+from app.services.precificacao_lote import (
+    CAMPOS_PRECO, calcular_precos_lote, carregar_colunas,
+)
+from app.utils.datetime import now_local
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_LOTE = 500
+ORIGEM_HISTORICO = "reprecificacao"
+TIPO_NOTIFICACAO = "reprecificacao"
+
+CAMPOS_PERCENTUAIS = ("desconto_fornecedor", "margem", "ipi", "difal", "imposto_venda")
+CAMPOS_MONETARIOS = ("preco_fornecedor", "frete", "lucro_alvo", "preco_final",
+                     "promo_preco_fornecedor")
+CAMPOS_REGRA = CAMPOS_PERCENTUAIS + CAMPOS_MONETARIOS
+OPERACOES = ("definir", "somar", "percentual")
+
+_REGEX_REGRA = re.compile(
+    r"^\s*(?P<alvo>marca|categoria)\s*[=:]?\s*(?P<nome>[^:]+?)\s*:\s*"
+    r"(?P<campo>\w+)\s*(?P<sinal>[+-])?\s*(?P<valor>\d+(?:[.,]\d+)?)\s*(?P<pct>%)?\s*$",
+    re.IGNORECASE,
+)
+
+
+class RegraInvalida(ValueError):
+    pass
+
+
+# =====================================================
+# REGRAS
+# =====================================================
+def interpretar_regra(texto):
+    """Converte 'marca=Taurus: desconto_fornecedor +3%' em dict de regra."""
+    m = _REGEX_REGRA.match(texto or "")
+    if not m:
+        raise RegraInvalida(f"Regra não reconhecida: {texto!r}")
+
+    campo = m["campo"].lower()
+    valor = float(m["valor"].replace(",", "."))
+    if m["sinal"] == "-":
+        valor = -valor
+
+    if not m["sinal"]:
+        operacao = "definir"
+    elif campo in CAMPOS_MONETARIOS and m["pct"]:
+        operacao = "percentual"
+    else:
+        operacao = "somar"
+
+    return normalizar_regra({m["alvo"].lower(): m["nome"], "campo": campo,
+                             "operacao": operacao, "valor": valor})
+
+
+def normalizar_regra(regra):
+    """Valida uma regra (dict ou texto) e devolve o dict canônico."""
+    if isinstance(regra, str):
+        return interpretar_regra(regra)
+
+    campo = (regra.get("campo") or "").strip()
+    operacao = (regra.get("operacao") or "definir").strip()
+    if campo not in CAMPOS_REGRA:
+        raise RegraInvalida(f"Campo não permitido em regra: {campo!r}")
+    if operacao not in OPERACOES:
+        raise RegraInvalida(f"Operação inválida: {operacao!r}")
+    if not regra.get("marca") and not regra.get("categoria"):
+        raise RegraInvalida("A regra precisa de marca e/ou categoria.")
+    try:
+        valor = float(str(regra.get("valor")).replace(",", "."))
+    except (TypeError, ValueError):
+        raise RegraInvalida(f"Valor inválido: {regra.get('valor')!r}")
+
+    return {
+        "marca": regra.get("marca"),
+        "categoria": regra.get("categoria"),
+        "campo": campo,
+        "operacao": operacao,
+        "valor": valor,
+    }
+
+
+def _marca_ids(ref):
+    if isinstance(ref, int) or str(ref).isdigit():
+        return {int(ref)}
+    marca = MarcaProduto.query.filter(db.func.lower(MarcaProduto.nome) == str(ref).strip().lower()).first()
+    if not marca:
+        raise RegraInvalida(f"Marca não encontrada: {ref!r}")
+    return {marca.id}
+
+
+def _categoria_ids(ref):
+    """Categoria (por id, slug ou nome) + todas as subcategorias."""
+    arvore = arvore_categorias()
+    texto = str(ref).strip()
+    if texto.isdigit():
+        raiz = arvore.no(int(texto))
+    else:
+        raiz = arvore.por_slug(texto.lower()) or next(
+            (n for n in arvore.nos() if (n.nome or "").lower() == texto.lower()), None
+        )
+    if not raiz:
+        raise RegraInvalida(f"Categoria não encontrada: {ref!r}")
+    return set(arvore.descendentes(raiz.id))
+
+
+def _resolver(regras):
+    """Normaliza as regras e troca nomes de marca/categoria por conjuntos de ids."""
+    resolvidas = []
+    for regra in regras:
+        r = normalizar_regra(regra)
+        r["marca_ids"] = _marca_ids(r["marca"]) if r["marca"] else None
+        r["categoria_ids"] = _categoria_ids(r["categoria"]) if r["categoria"] else None
+        resolvidas.append(r)
+    return resolvidas
+
+
+def _filtro(regra):
+    cond = []
+    if regra["marca_ids"] is not None:
+        cond.append(Produto.marca_id.in_(regra["marca_ids"]))
+    if regra["categoria_ids"] is not None:
+        cond.append(Produto.categoria_id.in_(regra["categoria_ids"]))
+    return db.and_(*cond)
+
+
+def ids_afetados(regras_resolvidas):
+    """Ids de todos os produtos atingidos por ao menos uma regra (1 SELECT)."""
+    if not regras_resolvidas:
+        return []
+    filtro = db.or_(*[_filtro(r) for r in regras_resolvidas])
+    return [pid for (pid,) in db.session.query(Produto.id).filter(filtro).order_by(Produto.id)]
+
+
+# =====================================================
+# CÁLCULO (sem gravar)
+# =====================================================
+def _novo_valor(atual, regra):
+    atual = float(atual or 0)
+    if regra["operacao"] == "definir":
+        novo = regra["valor"]
+    elif regra["operacao"] == "somar":
+        novo = atual + regra["valor"]
+    else:
+        novo = atual * (1 + regra["valor"] / 100)
+    return round(max(novo, 0.0), 2)
+
+
+def _aplicar_regras(colunas, marcas, regras):
+    """
+    Aplica as regras às colunas carregadas. Retorna (colunas novas,
+    alterações por índice: {i: {campo: (antigo, novo)}}).
+    """
+    novas = {c: list(v) for c, v in colunas.items()}
+    alteracoes = {}
+    for i in range(len(colunas["id"])):
+        for r in regras:
+            if r["marca_ids"] is not None and marcas[i] not in r["marca_ids"]:
+                continue
+            if r["categoria_ids"] is not None and colunas["categoria_id"][i] not in r["categoria_ids"]:
+                continue
+            campo = r["campo"]
+            antigo = colunas[campo][i]
+            novo = _novo_valor(novas[campo][i], r)
+            novas[campo][i] = novo
+            if antigo is None or round(float(antigo), 2) != novo:
+                alteracoes.setdefault(i, {})[campo] = (antigo, novo)
+            else:
+                alteracoes.get(i, {}).pop(campo, None)
+    return novas, {i: a for i, a in alteracoes.items() if a}
+
+
+def _calcular_lote(ids, regras):
+    colunas = carregar_colunas(ids=ids)
+    marcas = dict(db.session.query(Produto.id, Produto.marca_id).filter(Produto.id.in_(ids)))
+    marcas = [marcas.get(pid) for pid in colunas["id"]]
+    novas, alteracoes = _aplicar_regras(colunas, marcas, regras)
+    resultado = calcular_precos_lote(novas)
+    return colunas, alteracoes, resultado
+
+
+def _fatias(lista, tamanho):
+    for inicio in range(0, len(lista), tamanho):
+        yield lista[inicio:inicio + tamanho]
+
+
+def _float(valor):
+    return round(float(valor), 2) if valor is not None else None
+
+
+def simular_reprecificacao(regras, tamanho_lote=TAMANHO_LOTE):
+    """
+    Dry-run: diff de preco_a_vista (e dos campos tocados) de cada SKU
+    afetado. Nada é gravado.
+    """
+    resolvidas = _resolver(regras)
+    ids = ids_afetados(resolvidas)
+
+    itens = []
+    for fatia in _fatias(ids, tamanho_lote):
+        colunas, alteracoes, res = _calcular_lote(fatia, resolvidas)
+        info = {pid: (codigo, nome) for pid, codigo, nome in
+                db.session.query(Produto.id, Produto.codigo, Produto.nome).filter(Produto.id.in_(fatia))}
+        for i, pid in enumerate(colunas["id"]):
+            if i not in alteracoes:
+                continue
+            antigo = _float(colunas["preco_a_vista"][i])
+            novo = res["preco_a_vista"][i]
+            codigo, nome = info.get(pid, (None, None))
+            itens.append({
+                "id": pid,
+                "codigo": codigo,
+                "nome": nome,
+                "campos": {c: {"antigo": _float(a), "novo": n} for c, (a, n) in alteracoes[i].items()},
+                "preco_antigo": antigo,
+                "preco_novo": novo,
+                "diferenca": round(novo - (antigo or 0), 2) if novo is not None else None,
+                "valido": res["valido"][i],
+            })
+
+    validos = [it for it in itens if it["valido"]]
+    return {
+        "regras": [{k: r[k] for k in ("marca", "categoria", "campo", "operacao", "valor")} for r in resolvidas],
+        "itens": itens,
+        "resumo": {
+            "produtos_afetados": len(itens),
+            "invalidos": len(itens) - len(validos),
+            "preco_sobe": sum(1 for it in validos if it["diferenca"] > 0),
+            "preco_desce": sum(1 for it in validos if it["diferenca"] < 0),
+        },
+    }
+
+
+# =====================================================
+# APLICAÇÃO
+# =====================================================
+def _notificar(notificacao, mensagem, nivel="baixo"):
+    """Cria ou atualiza a notificação de progresso (commit próprio)."""
+    if notificacao is None:
+        notificacao = Notificacao(tipo=TIPO_NOTIFICACAO, meio="sistema", status="enviado")
+        db.session.add(notificacao)
+    notificacao.nivel = nivel
+    notificacao.mensagem = mensagem
+    notificacao.data_envio = datetime.utcnow()
+    db.session.commit()
+    return notificacao
+
+
+def _linhas_do_lote(colunas, alteracoes, res, agora):
+    """Parâmetros do UPDATE em lote e do INSERT de histórico."""
+    produtos, historico = [], []
+    for i, campos in alteracoes.items():
+        if not res["valido"][i]:
+            continue
+        pid = colunas["id"][i]
+        linha = {"id": pid, "atualizado_em": agora}
+        mudancas = dict(campos)
+        for c in CAMPOS_PRECO:
+            novo = res[c][i]
+            if colunas[c][i] is None or round(float(colunas[c][i]), 2) != novo:
+                mudancas[c] = (colunas[c][i], novo)
+            linha[c] = novo
+        for c, (antigo, novo) in mudancas.items():
+            linha[c] = novo
+            historico.append({"produto_id": pid, "campo": c,
+                              "valor_antigo": None if antigo is None else str(antigo),
+                              "valor_novo": str(novo)})
+        produtos.append(linha)
+    return produtos, historico
+
+
+def aplicar_reprecificacao(regras, usuario_nome="Sistema", usuario_id=None,
+                           tamanho_lote=TAMANHO_LOTE):
+    """
+    Aplica as regras em lotes. Cada lote: 1 SELECT, 1 UPDATE em lote por
+    chave primária, 1 INSERT em lote de ProdutoHistorico e commit.
+    O progresso fica numa única Notificacao, atualizada a cada lote.
+    """
+    from app.loja.cache_hooks import marcar_para_invalidar
+
+    resolvidas = _resolver(regras)
+    ids = ids_afetados(resolvidas)
+    total = len(ids)
+    notif = _notificar(None, f"Reprecificação iniciada: {total} produto(s) na seleção.")
+
+    gravados, invalidos, processados = 0, [], 0
+    try:
+        for fatia in _fatias(ids, tamanho_lote):
+            colunas, alteracoes, res = _calcular_lote(fatia, resolvidas)
+            agora = now_local()
+            produtos, historico = _linhas_do_lote(colunas, alteracoes, res, agora)
+            invalidos += [colunas["id"][i] for i in alteracoes if not res["valido"][i]]
+
+            if produtos:
+                db.session.execute(update(Produto), produtos)
+                for h in historico:
+                    h.update(usuario_id=usuario_id, usuario_nome=usuario_nome,
+                             data_modificacao=agora, origem=ORIGEM_HISTORICO)
+                db.session.execute(insert(ProdutoHistorico), historico)
+
+                # UPDATE em lote não passa pelos hooks do mapper
+                deps = {"vitrine"}
+                for i, pid in enumerate(colunas["id"]):
+                    if i in alteracoes:
+                        deps |= {f"produto:{pid}", f"categoria:{colunas['categoria_id'][i]}"}
+                marcar_para_invalidar(db.session, *deps)
+
+            db.session.commit()
+            gravados += len(produtos)
+            processados += len(fatia)
+            _notificar(notif, f"Reprecificação em andamento: {processados}/{total} analisados, "
+                              f"{gravados} atualizado(s).")
+    except Exception as e:
+        db.session.rollback()
+        logger.exception(f"[REPRECIFICACAO] Falha após {gravados} produto(s): {e}")
+        _notificar(notif, f"Reprecificação interrompida após {gravados} produto(s) "
+                          f"atualizado(s): {e}", nivel="alto")
+        raise
+
+    mensagem = f"Reprecificação concluída: {gravados} produto(s) atualizado(s)"
+    if invalidos:
+        mensagem += f", {len(invalidos)} ignorado(s) por preço inválido (ids {invalidos[:20]})"
+    _notificar(notif, mensagem + ".", nivel="médio" if invalidos else "baixo")
+    logger.info(f"[REPRECIFICACAO] {mensagem}")
+    return {"notificacao_id": notif.id, "total": total, "gravados": gravados, "invalidos": invalidos}
+
+
+# =====================================================
+# FILA
+# =====================================================
+def executar_reprecificacao(regras, usuario_nome="Sistema", usuario_id=None):
+    """Ponto de entrada do worker RQ (fila m4_precos)."""
+    return aplicar_reprecificacao(regras, usuario_nome=usuario_nome, usuario_id=usuario_id)
+
+
+def enfileirar_reprecificacao(regras, usuario_nome="Sistema", usuario_id=None):
+    """
+    Valida as regras e envia para a fila. Sem Redis, roda síncrono.
+    Retorna {"modo": "fila", "job_id": ...} ou {"modo": "sincrono", ...}.
+    """
+    regras = [normalizar_regra(r) for r in regras]
+    _resolver(regras)  # falha cedo (RegraInvalida) antes de enfileirar
+
+    from app.utils import queue
+    if queue.fila_precos is not None:
+        job = queue.fila_precos.enqueue(
+            executar_reprecificacao, regras, usuario_nome, usuario_id, job_timeout=1800
+        )
+        return {"modo": "fila", "job_id": job.id}
+
+    return {"modo": "sincrono", **aplicar_reprecificacao(regras, usuario_nome, usuario_id)}
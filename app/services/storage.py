@@ -1,18 +1,13 @@
-import boto3
 from flask import current_app
 from botocore.exceptions import ClientError
 import logging
 import uuid
 
+from app.utils import r2_gateway
+
 def get_s3_client():
-    """Cria cliente S3 para R2 Cloudflare"""
-    return boto3.client(
-        "s3",
-        endpoint_url=current_app.config["R2_ENDPOINT_URL"],
-        aws_access_key_id=current_app.config["R2_ACCESS_KEY_ID"],
-        aws_secret_access_key=current_app.config["R2_SECRET_ACCESS_KEY"],
-        region_name="auto",  # R2 ignora região, mas boto3 pede algo
-    )
+    """Cliente S3 do R2 Cloudflare (compartilhado — app/utils/r2_gateway.py)"""
+    return r2_gateway.cliente()
 
 def upload_file(file, filename=None):
     """Faz upload de um arquivo para o bucket"""
@@ -99,23 +99,8 @@ document.addEventListener('DOMContentLoaded', function () {
 
         showLoading(btnProcessarOcr);
 
-        const formData = new FormData();
-        formData.append('file', file);
-        const csrfInput = document.querySelector('input[name="csrf_token"]');
-        const csrfToken = csrfInput ? csrfInput.value : '';
-        if (csrfToken) formData.append('csrf_token', csrfToken);
-
-        fetch(`/uploads/${clienteId}/craf`, {
-            method: 'POST',
-            headers: csrfToken ? { 'X-CSRFToken': csrfToken, 'X-Requested-With': 'XMLHttpRequest' } : {},
-            body: formData,
-        })
-        .then(response => {
-            if (!response.ok) {
-                throw new Error(`Erro no servidor: ${response.statusText} (Status: ${response.status})`);
-            }
-            return response.json();
-        })
+        // Upload direto ao R2 + OCR na fila; consulta o job até concluir
+        window.M4UploadDireto.ocr(file, { clienteId, tipo: 'craf' })
         .then(data => {
             hideLoading(btnProcessarOcr);
             if (data.error) {
@@ -16,22 +16,20 @@ document.addEventListener("DOMContentLoaded", () => {
       if (!file) return;
 
       const clienteId = window.location.pathname.split("/")[2]; // extrai o cliente_id da URL
-      const formData = new FormData();
-      formData.append("arquivo", file);
 
       // Feedback visual
       btnUploadOCR.disabled = true;
-      btnUploadOCR.innerHTML = '<i class="fas fa-spinner fa-spin me-1"></i> Processando OCR...';
+      btnUploadOCR.innerHTML = '<i class="fas fa-spinner fa-spin me-1"></i> Enviando documento...';
 
       try {
-        const response = await fetch(`/uploads/${clienteId}/documento`, {
-          method: "POST",
-          body: formData,
+        // Upload direto ao R2 + OCR na fila; consulta o job até concluir
+        const data = await window.M4UploadDireto.ocr(file, {
+          clienteId,
+          tipo: "documento",
+          onEstado: () => {
+            btnUploadOCR.innerHTML = '<i class="fas fa-spinner fa-spin me-1"></i> Processando OCR...';
+          },
         });
-
-        if (!response.ok) throw new Error("Erro ao processar documento.");
-
-        const data = await response.json();
         console.log("[OCR] Retorno bruto:", data);
 
         // 🔧 Normaliza estrutura no nível 1 (apenas para log rápido)
@@ -214,17 +214,34 @@
     if (fotoProdutoOverlay) fotoProdutoOverlay.classList.remove("d-none"); // Mostra o spinner
 
     try {
-      // Endpoint que deve estar implementado no Flask (ex: app/produtos/routes/fotos.py)
-      const response = await fetch('/produtos/api/upload_foto', { 
-        method: 'POST',
-        body: formData
-      });
-
-      if (!response.ok) {
-        throw new Error(`Erro no servidor: ${response.status} ${response.statusText}`);
+      // 1º: envio direto ao R2 (URL pré-assinada — static/js/upload_direto.js)
+      let data = null;
+      if (window.M4UploadDireto) {
+        try {
+          data = await window.M4UploadDireto.enviar(file, {
+            emitir: '/produtos/api/upload_foto/emitir',
+            confirmar: '/produtos/api/upload_foto/confirmar',
+            extras: { produto_id: produtoId },
+          });
+        } catch (e) {
+          if (!e.recuperavel) throw e;
+          console.warn("[M4] Upload direto indisponível, enviando pelo servidor:", e.message);
+        }
       }
 
-      const data = await response.json();
+      // 2º: upload antigo pelo Flask (ex: bucket sem CORS)
+      if (!data) {
+        const response = await fetch('/produtos/api/upload_foto', { 
+          method: 'POST',
+          body: formData
+        });
+
+        if (!response.ok) {
+          throw new Error(`Erro no servidor: ${response.status} ${response.statusText}`);
+        }
+
+        data = await response.json();
+      }
       
       if (data.success && data.foto_url) {
         inputFotoUrl.value = data.foto_url; // <--- CHAVE PARA A PERSISTÊNCIA: Atualiza o campo que será enviado ao salvar.
@@ -0,0 +1,172 @@
+// ===========================
+// MÓDULO: UPLOAD DIRETO AO R2
+// ===========================
+// O navegador envia o arquivo direto ao R2 por uma URL PUT pré-assinada;
+// o Flask só emite a URL e confirma (app/utils/upload_direto.py).
+//
+//   M4UploadDireto.enviar(file, {
+//     emitir: "/produtos/api/upload_foto/emitir",
+//     confirmar: "/produtos/api/upload_foto/confirmar",   // opcional
+//     extras: { produto_id: 12 },          // vai junto no pedido de emissão
+//     extrasConfirmar: { ocr: "craf" },    // vai junto na confirmação
+//   })  →  Promise com o JSON da confirmação (ou {ticket, key} sem `confirmar`)
+//
+// Erros com `recuperavel = true` (rede, CORS do bucket, storage fora do ar)
+// indicam que vale cair no upload antigo via formulário.
+//
+// OCR de documentos do cliente (fila m4_ocr, app/uploads/ocr_jobs.py):
+//
+//   M4UploadDireto.ocr(file, { clienteId: 7, tipo: "craf", onEstado })
+//     →  Promise com o mesmo JSON que /uploads/<id>/<tipo> sempre devolveu
+//
+// Envia direto ao R2 (ou pelo formulário, se não der) e consulta
+// /uploads/<id>/ocr/<job_id> até o worker concluir.
+
+(function () {
+  "use strict";
+
+  function csrfToken() {
+    const meta = document.querySelector('meta[name="csrf-token"]');
+    if (meta) return meta.content;
+    const input = document.querySelector('input[name="csrf_token"]');
+    return input ? input.value : "";
+  }
+
+  function erro(mensagem, recuperavel) {
+    const e = new Error(mensagem);
+    e.recuperavel = recuperavel;
+    return e;
+  }
+
+  async function postJson(url, corpo) {
+    let response;
+    try {
+      response = await fetch(url, {
+        method: "POST",
+        credentials: "same-origin",
+        headers: {
+          "Content-Type": "application/json",
+          "X-CSRFToken": csrfToken(),
+          "X-Requested-With": "XMLHttpRequest",
+        },
+        body: JSON.stringify(corpo),
+      });
+    } catch (e) {
+      throw erro("Falha de comunicação com o servidor.", true);
+    }
+    let data = {};
+    try { data = await response.json(); } catch (_) { data = {}; }
+    if (!response.ok || data.success === false) {
+      // 4xx = arquivo recusado (mostrar ao usuário); 5xx/404 = rota/storage indisponível
+      const recuperavel = response.status >= 500 || response.status === 404;
+      throw erro(data.error || `Erro no servidor: ${response.status}`, recuperavel);
+    }
+    return data;
+  }
+
+  function put(upload, file, onProgresso) {
+    return new Promise((resolve, reject) => {
+      const xhr = new XMLHttpRequest();
+      xhr.open(upload.metodo || "PUT", upload.url, true);
+      Object.entries(upload.headers || {}).forEach(([nome, valor]) => xhr.setRequestHeader(nome, valor));
+      if (onProgresso && xhr.upload) {
+        xhr.upload.onprogress = (ev) => { if (ev.lengthComputable) onProgresso(ev.loaded / ev.total); };
+      }
+      xhr.onload = () => (xhr.status >= 200 && xhr.status < 300)
+        ? resolve()
+        : reject(erro(`Storage recusou o envio (HTTP ${xhr.status}).`, true));
+      // status 0 = bloqueado por CORS ou rede
+      xhr.onerror = () => reject(erro("Não foi possível enviar direto ao storage.", true));
+      xhr.send(file);
+    });
+  }
+
+  async function postArquivo(url, file) {
+    const formData = new FormData();
+    formData.append("arquivo", file);
+    formData.append("csrf_token", csrfToken());
+    let response;
+    try {
+      response = await fetch(url, {
+        method: "POST",
+        credentials: "same-origin",
+        headers: { "X-CSRFToken": csrfToken(), "X-Requested-With": "XMLHttpRequest" },
+        body: formData,
+      });
+    } catch (e) {
+      throw erro("Falha de comunicação com o servidor.", false);
+    }
+    let data = {};
+    try { data = await response.json(); } catch (_) { data = {}; }
+    if (!response.ok) throw erro(data.error || `Erro no servidor: ${response.status}`, false);
+    return data;
+  }
+
+  const esperar = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+  // Resolve a resposta de uma rota de OCR: resultado pronto (sem Redis) ou
+  // job na fila, consultado com intervalo crescente (1 s → 4 s, até 6 min).
+  async function aguardarOcr(resposta, opcoes) {
+    opcoes = opcoes || {};
+    let data = resposta.ocr || resposta;
+    if (data.modo === "erro") throw erro(data.erro || "Falha no OCR.", false);
+    if (data.modo === "sincrono") return data.resultado;
+    if (!data.job_id) return data;
+
+    const limite = Date.now() + 6 * 60 * 1000;
+    let intervalo = 1000;
+    while (Date.now() < limite) {
+      await esperar(intervalo);
+      intervalo = Math.min(intervalo * 1.5, 4000);
+      let response;
+      try {
+        response = await fetch(data.status_url, {
+          credentials: "same-origin",
+          headers: { "X-Requested-With": "XMLHttpRequest" },
+        });
+      } catch (_) {
+        continue;  // rede oscilou: tenta de novo na próxima volta
+      }
+      const situacao = await response.json().catch(() => ({}));
+      if (!response.ok) throw erro(situacao.error || "Processamento não encontrado.", false);
+      if (opcoes.onEstado) opcoes.onEstado(situacao.status);
+      if (situacao.status === "concluido") return situacao.resultado;
+      if (situacao.status === "erro") throw erro(situacao.erro || "Falha no OCR.", false);
+    }
+    throw erro("A leitura do documento demorou demais. Tente novamente.", false);
+  }
+
+  async function ocr(file, opcoes) {
+    const base = `/uploads/${opcoes.clienteId}`;
+    let resposta;
+    try {
+      resposta = await enviar(file, {
+        emitir: `${base}/direto/emitir`,
+        confirmar: `${base}/direto/confirmar`,
+        extras: { subpasta: opcoes.tipo === "craf" ? "armas" : "documentos" },
+        extrasConfirmar: { ocr: opcoes.tipo },
+        onProgresso: opcoes.onProgresso,
+      });
+    } catch (e) {
+      if (!e.recuperavel) throw e;
+      resposta = await postArquivo(`${base}/${opcoes.tipo}`, file);
+    }
+    if (opcoes.onEstado) opcoes.onEstado("fila");
+    return aguardarOcr(resposta, opcoes);
+  }
+
+  async function enviar(file, opcoes) {
+    const upload = await postJson(opcoes.emitir, Object.assign({
+      nome: file.name,
+      content_type: file.type || "application/octet-stream",
+      tamanho: file.size,
+    }, opcoes.extras || {}));
+
+    await put(upload, file, opcoes.onProgresso);
+
+    if (!opcoes.confirmar) return { ticket: upload.ticket, key: upload.key };
+    return postJson(opcoes.confirmar, Object.assign({ ticket: upload.ticket }, opcoes.extrasConfirmar || {}));
+  }
+
+  window.M4UploadDireto = { enviar, ocr, aguardarOcr };
+})();
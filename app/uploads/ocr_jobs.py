@@ -0,0 +1,193 @@
+"""
+app/uploads/ocr_jobs.py
+─────────────────────────────────────────────────────────────────────────────
+OCR de documentos já gravados no R2, como job da fila m4_ocr.
+
+Usado pela confirmação do upload direto (app/utils/upload_direto.py): o
+arquivo não passa pelo worker web, e o OCR (pdfplumber, rasterização,
+Tesseract, Groq) roda no worker da fila — o formulário consulta o resultado em
+GET /uploads/<cliente_id>/ocr/<job_id>. Sem Redis roda síncrono e o
+resultado volta na própria confirmação.
+
+As rotas /craf, /cr, /cnh, /rg e /documento (upload pelo formulário) também
+só gravam no R2 e enfileiram. montar_resposta() é o mesmo JSON que elas
+sempre devolveram, para o JS preencher os formulários igual.
+
+Arquivo já processado (mesmo SHA-256, app/services/ocr_cache.py) não passa
+de novo por OCR + LLM: o job responde do cache e, no upload pelo formulário,
+nem chega à fila.
+
+O job grava em job.meta["tempos_ms"] os ms de cada etapa (download, texto
+embutido, rasterização, OSD, Tesseract, LLM, regex — ver ocr_pipeline) e o
+status devolve esses tempos junto com o resultado.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import logging
+import time
+
+from werkzeug.utils import secure_filename
+
+from app.services.ocr_local import medir
+from app.utils import r2_gateway
+
+logger = logging.getLogger(__name__)
+
+TIPOS = ("documento", "craf", "cr", "cnh", "rg")
+JOB_TIMEOUT = 300
+RESULTADO_TTL = 3600
+ERRO_GENERICO = "Não foi possível ler o documento. Tente novamente ou preencha os dados manualmente."
+
+
+def montar_resposta(tipo, resultado, caminho, nome_original, tempos=None):
+    """JSON de resposta de cada rota de OCR a partir de processar_documento()."""
+    from app.uploads.parsers import parse_cr, parse_cnh, parse_rg
+
+    nome_original = secure_filename(nome_original or "")
+
+    if tipo == "documento":
+        return {
+            "dados": resultado,
+            "ocr_engine": resultado.get("ocr_engine", "local"),
+            "ia_engine": resultado.get("engine", "llama-3.1-8b-instant"),
+            "caminho_arquivo": caminho,
+            "nome_original": nome_original,
+        }
+
+    if tipo == "craf":
+        dados_raw = resultado.get("resultado", {}) or {}
+        return {
+            "tipo": dados_raw.get("tipo") or dados_raw.get("tipo_arma") or "",
+            "funcionamento": dados_raw.get("funcionamento") or "",
+            "marca": dados_raw.get("marca") or "",
+            "modelo": dados_raw.get("modelo") or "",
+            "calibre": dados_raw.get("calibre") or "",
+            "numero_serie": dados_raw.get("numero_serie") or "",
+            "numero_sigma": dados_raw.get("numero_sigma") or "",
+            "numero_documento": dados_raw.get("numero_documento") or "",
+            "emissor_craf": dados_raw.get("emissor") or "",
+            "categoria_adquirente": dados_raw.get("categoria_adquirente") or "",
+            "data_validade_craf": dados_raw.get("data_validade") or "",
+            "validade_indeterminada": dados_raw.get("validade_indeterminada", False),
+            "caminho_craf": caminho,
+            "nome_original": nome_original,
+        }
+
+    # CR / CNH / RG: se a IA não reconheceu, cai no parser de regex do tipo
+    parsers = {"cr": parse_cr, "cnh": parse_cnh, "rg": parse_rg}
+    dados = resultado.get("resultado", {})
+    if not dados.get("categoria") or dados.get("categoria") == "NÃO RECONHECIDO":
+        texto_bruto = "\n".join(resultado.get("resultado", {}).get("raw_text", []))
+        with medir(tempos, "regex"):
+            dados = parsers[tipo](texto_bruto)
+    dados["caminho"] = caminho
+    dados["nome_original"] = nome_original
+    return dados
+
+
+def _registrar_tempos(tempos):
+    """Grava os tempos por etapa no job RQ corrente (se houver) e no log."""
+    logger.info(f"[OCR] Tempos por etapa (ms): {tempos}")
+    try:
+        from rq import get_current_job
+        job = get_current_job()
+    except Exception:
+        job = None
+    if job is not None:
+        job.meta["tempos_ms"] = dict(tempos)
+        job.save_meta()
+
+
+def executar_ocr(bucket, key, nome_original, tipo="documento"):
+    """Ponto de entrada do worker RQ (fila m4_ocr): baixa do R2 e roda o pipeline."""
+    from app.services.ocr_cache import processar_com_cache
+
+    tempos = {}
+    inicio = time.perf_counter()
+    try:
+        with medir(tempos, "download"):
+            file_bytes = r2_gateway.get(bucket, key)
+        if file_bytes is None:
+            raise FileNotFoundError(f"{bucket}/{key} não encontrado no R2")
+
+        resultado, _ = processar_com_cache(file_bytes, nome_original, tempos=tempos, tipo=tipo)
+        if not resultado:
+            raise RuntimeError("Nenhum resultado retornado pelo pipeline OCR")
+        return montar_resposta(tipo, resultado, key, nome_original, tempos=tempos)
+    finally:
+        tempos["total"] = round((time.perf_counter() - inicio) * 1000, 1)
+        _registrar_tempos(tempos)
+
+
+def enfileirar_ocr(bucket, key, nome_original, tipo="documento", cliente_id=None, sha256=None):
+    """
+    Envia o OCR para a fila. Sem Redis, roda síncrono.
+    Retorna {"modo": "fila", "job_id": ...} ou {"modo": "sincrono", "resultado": ...}.
+
+    Com sha256 (quem já tem os bytes em mãos), um arquivo já processado
+    responde na hora, sem job: {"modo": "sincrono", "resultado", "cache": True}.
+    """
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de OCR desconhecido: {tipo}")
+
+    if sha256:
+        from app.services import ocr_cache
+        resultado = ocr_cache.buscar(sha256)
+        if resultado is not None:
+            logger.info(f"[OCR] Cache para {key}: sem job")
+            return {"modo": "sincrono", "cache": True,
+                    "resultado": montar_resposta(tipo, resultado, key, nome_original)}
+
+    from app.utils import queue
+    if queue.fila_ocr is not None:
+        try:
+            job = queue.fila_ocr.enqueue(
+                executar_ocr, bucket, key, nome_original, tipo,
+                job_timeout=JOB_TIMEOUT,
+                result_ttl=RESULTADO_TTL,
+                failure_ttl=RESULTADO_TTL,
+                meta={"cliente_id": cliente_id, "tipo": tipo},
+                description=f"ocr {tipo} {key}",
+            )
+            return {"modo": "fila", "job_id": job.id}
+        except Exception as e:
+            logger.warning(f"[OCR] Falha ao enfileirar {key}, processando agora: {e}")
+
+    return {"modo": "sincrono", "resultado": executar_ocr(bucket, key, nome_original, tipo)}
+
+
+def status_ocr(job_id, cliente_id=None):
+    """
+    {"status": "fila" | "processando" | "concluido" | "erro", "resultado"?, "erro"?}
+    ou None se o job não existir (expirou) ou for de outro cliente.
+    """
+    from app.utils import queue
+    if queue.redis_conn is None:
+        return None
+
+    from rq.exceptions import NoSuchJobError
+    from rq.job import Job
+
+    try:
+        job = Job.fetch(job_id, connection=queue.redis_conn)
+    except NoSuchJobError:
+        return None
+    if cliente_id is not None and str(job.meta.get("cliente_id")) != str(cliente_id):
+        return None
+
+    situacao = job.get_status()
+    if situacao == "finished":
+        return {"status": "concluido", "resultado": job.result, "tempos_ms": job.meta.get("tempos_ms", {})}
+    if situacao in ("failed", "stopped", "canceled"):
+        # O traceback fica no log (uma vez por job); o cliente recebe só a mensagem genérica
+        if not job.meta.get("erro_registrado"):
+            logger.error(f"[OCR] Job {job.id} terminou como {situacao}:\n{job.exc_info or '(sem traceback)'}")
+            job.meta["erro_registrado"] = True
+            try:
+                job.save_meta()
+            except Exception:
+                pass
+        return {"status": "erro", "erro": ERRO_GENERICO, "tempos_ms": job.meta.get("tempos_ms", {})}
+    if situacao == "started":
+        return {"status": "processando"}
+    return {"status": "fila"}
@@ -343,6 +343,34 @@ def parse_rg(texto: str) -> dict:
         "uf": uf
     }
 
+
+# =======================================
+# CAMPOS OBRIGATÓRIOS (parada antecipada do OCR)
+# =======================================
+CAMPOS_OBRIGATORIOS = {
+    "craf": ("numero_serie", "numero_sigma", "marca", "modelo", "calibre"),
+    "cr": ("numero_cr", "validade"),
+    "cnh": ("registro", "validade"),
+}
+
+PARSERS_POR_TIPO = {"craf": parse_craf, "cr": parse_cr, "cnh": parse_cnh}
+
+
+def campos_completos(tipo: str, textos) -> bool:
+    """
+    True quando o regex do tipo já acha todos os campos obrigatórios no texto
+    lido até aqui — o OCR local pode parar de ler páginas.
+    Tipos sem campos definidos nunca param antes.
+    """
+    campos = CAMPOS_OBRIGATORIOS.get(tipo)
+    if not campos:
+        return False
+    texto = textos if isinstance(textos, str) else "\n".join(textos)
+    if not texto.strip():
+        return False
+    dados = PARSERS_POR_TIPO[tipo](texto)
+    return all(dados.get(c) for c in campos)
+
 # =======================================
 # PARSER INTELIGENTE (LLM + fallback)
 # =======================================
@@ -3,21 +3,15 @@
 # ====================================================================
 
 from functools import wraps
-from flask import Blueprint, request, jsonify, current_app, session
+from flask import Blueprint, request, jsonify, current_app, session, url_for
 from flask_login import current_user
 from werkzeug.utils import secure_filename
 from datetime import datetime
 import os
 
 from app.utils.storage import get_s3, get_bucket
-from app.services.ocr_pipeline import processar_documento
-from app.uploads.parsers import (
-    parse_craf,
-    parse_cr,
-    parse_cnh,
-    parse_rg,
-    parse_documento_ocr
-)
+from app.utils import upload_direto as direto
+from app.uploads.ocr_jobs import TIPOS as TIPOS_OCR, enfileirar_ocr, status_ocr
 from app.utils.datetime import now_local
 
 uploads_bp = Blueprint("uploads", __name__)
@@ -75,66 +69,80 @@ def _upload_autorizado(view):
 # Funções auxiliares
 # ==========================
 
+def _chave_cliente(cliente_id, subpasta, nome_arquivo):
+    """clientes/<id>/<subpasta>/<timestamp>_<nome seguro>"""
+    nome_seguro = secure_filename(nome_arquivo)
+    timestamp = now_local().strftime("%Y%m%d_%H%M%S")
+    return f"clientes/{cliente_id}/{subpasta}/{timestamp}_{nome_seguro}"
+
+
 def _upload_to_r2(file_storage, cliente_id, subpasta):
     """Envia arquivo para o bucket R2 e retorna o caminho da chave."""
     s3 = get_s3()
     bucket = get_bucket()
-    nome_seguro = secure_filename(file_storage.filename)
-    timestamp = now_local().strftime("%Y%m%d_%H%M%S")
-    key = f"clientes/{cliente_id}/{subpasta}/{timestamp}_{nome_seguro}"
+    key = _chave_cliente(cliente_id, subpasta, file_storage.filename)
     
     file_storage.seek(0)
     s3.upload_fileobj(file_storage, bucket, key)
     return key
 
 
-# ==========================
-# CRAF (ARMAS)
-# ==========================
-@uploads_bp.route("/<int:cliente_id>/craf", methods=["POST"])
-@_upload_autorizado
-def upload_craf(cliente_id):
+def _ocr_do_formulario(cliente_id, tipo, subpasta):
+    """
+    Grava o arquivo do formulário no R2 e põe o OCR na fila m4_ocr
+    (app/uploads/ocr_jobs.py) — o worker web não espera o Tesseract/Groq.
+
+    Com fila: 202 + {"status": "fila", "job_id", "status_url"}; o JS consulta
+    status_url até "concluido". Sem Redis, ou se o arquivo já estiver no
+    cache de OCR: 200 com o mesmo JSON de antes.
+    """
     file = request.files.get("file") or request.files.get("arquivo")
     erro_arquivo = _validar_arquivo_ocr(file)
     if erro_arquivo:
         return jsonify({"error": erro_arquivo}), 400
 
+    from app.services.ocr_cache import chave
+
+    file.seek(0)
+    sha256 = chave(file.read())
+    file.seek(0)
+
     try:
-        file.seek(0)
-        file_bytes = file.read()
-        file.seek(0)
-        
-        caminho_r2 = _upload_to_r2(file, cliente_id, "armas")
-        
-        resultado = processar_documento(file_bytes, file.filename)
-        dados_raw = resultado.get("resultado", {}) or {}
-        
-        current_app.logger.info(f"[DEBUG OCR CRAF] Resultado OCR bruto: {dados_raw}")
-
-        # ✅ Mapeamento para um dicionário plano
-        dados_mapeados = {
-            "tipo": dados_raw.get("tipo") or dados_raw.get("tipo_arma") or "",
-            "funcionamento": dados_raw.get("funcionamento") or "",
-            "marca": dados_raw.get("marca") or "",
-            "modelo": dados_raw.get("modelo") or "",
-            "calibre": dados_raw.get("calibre") or "",
-            "numero_serie": dados_raw.get("numero_serie") or "",
-            "numero_sigma": dados_raw.get("numero_sigma") or "",
-            "numero_documento": dados_raw.get("numero_documento") or "",
-            "emissor_craf": dados_raw.get("emissor") or "",
-            "categoria_adquirente": dados_raw.get("categoria_adquirente") or "",
-            "data_validade_craf": dados_raw.get("data_validade") or "",
-            "validade_indeterminada": dados_raw.get("validade_indeterminada", False),
-            "caminho_craf": caminho_r2,
-            "nome_original": secure_filename(file.filename),
-        }
-
-        current_app.logger.info(f"[DEBUG FLASK RESPONSE] Enviando JSON: {dados_mapeados}")
-        return jsonify(dados_mapeados)
+        caminho_r2 = _upload_to_r2(file, cliente_id, subpasta)
+        current_app.logger.info(f"[UPLOAD {tipo.upper()}] Arquivo enviado ao R2: {caminho_r2}")
+    except Exception as e:
+        current_app.logger.warning(f"[UPLOAD {tipo.upper()}] Falha ao enviar ao R2: {e}")
+        return jsonify({"error": "Falha na comunicação com o Storage R2."}), 500
 
+    try:
+        ocr = enfileirar_ocr(get_bucket(), caminho_r2, file.filename, tipo, cliente_id=cliente_id, sha256=sha256)
     except Exception as e:
-        current_app.logger.exception(f"[UPLOAD CRAF] Erro: {e}")
-        return jsonify({"error": f"Erro no upload do CRAF: {e}"}), 500
+        current_app.logger.exception(f"[UPLOAD {tipo.upper()}] Erro no OCR: {e}")
+        return jsonify({"error": f"Erro no processamento do documento: {e}"}), 500
+
+    if ocr["modo"] == "fila":
+        return jsonify(_resposta_fila(cliente_id, ocr["job_id"], caminho_r2, file.filename)), 202
+    return jsonify(ocr["resultado"])
+
+
+def _resposta_fila(cliente_id, job_id, caminho, nome_original):
+    return {
+        "status": "fila",
+        "job_id": job_id,
+        "status_url": url_for("uploads.status_ocr_job", cliente_id=cliente_id, job_id=job_id),
+        "caminho_arquivo": caminho,
+        "nome_original": secure_filename(nome_original or ""),
+    }
+
+
+# ==========================
+# CRAF (ARMAS)
+# ==========================
+@uploads_bp.route("/<int:cliente_id>/craf", methods=["POST"])
+@_upload_autorizado
+def upload_craf(cliente_id):
+    return _ocr_do_formulario(cliente_id, "craf", "armas")
+
 
 # ==========================
 # CR
@@ -142,32 +150,7 @@ def upload_craf(cliente_id):
 @uploads_bp.route("/<int:cliente_id>/cr", methods=["POST"])
 @_upload_autorizado
 def upload_cr(cliente_id):
-    file = request.files.get("file") or request.files.get("arquivo")
-    erro_arquivo = _validar_arquivo_ocr(file)
-    if erro_arquivo:
-        return jsonify({"error": erro_arquivo}), 400
-
-    try:
-        file.seek(0)
-        file_bytes = file.read()
-        file.seek(0)
-        
-        caminho_r2 = _upload_to_r2(file, cliente_id, "documentos")
-
-        resultado = processar_documento(file_bytes, file.filename)
-        dados = resultado.get("resultado", {})
-
-        if not dados.get("categoria") or dados.get("categoria") == "NÃO RECONHECIDO":
-            texto_bruto = "\n".join(resultado.get("resultado", {}).get("raw_text", []))
-            dados = parse_cr(texto_bruto)
-
-        dados["caminho"] = caminho_r2
-        dados["nome_original"] = secure_filename(file.filename)
-        return jsonify(dados)
-
-    except Exception as e:
-        current_app.logger.exception(f"[UPLOAD CR] Erro: {e}")
-        return jsonify({"error": f"Erro no upload do CR: {e}"}), 500
+    return _ocr_do_formulario(cliente_id, "cr", "documentos")
 
 
 # ==========================
@@ -176,32 +159,7 @@ def upload_cr(cliente_id):
 @uploads_bp.route("/<int:cliente_id>/cnh", methods=["POST"])
 @_upload_autorizado
 def upload_cnh(cliente_id):
-    file = request.files.get("file") or request.files.get("arquivo")
-    erro_arquivo = _validar_arquivo_ocr(file)
-    if erro_arquivo:
-        return jsonify({"error": erro_arquivo}), 400
-
-    try:
-        file.seek(0)
-        file_bytes = file.read()
-        file.seek(0)
-        
-        caminho_r2 = _upload_to_r2(file, cliente_id, "documentos")
-
-        resultado = processar_documento(file_bytes, file.filename)
-        dados = resultado.get("resultado", {})
-
-        if not dados.get("categoria") or dados.get("categoria") == "NÃO RECONHECIDO":
-            texto_bruto = "\n".join(resultado.get("resultado", {}).get("raw_text", []))
-            dados = parse_cnh(texto_bruto)
-
-        dados["caminho"] = caminho_r2
-        dados["nome_original"] = secure_filename(file.filename)
-        return jsonify(dados)
-
-    except Exception as e:
-        current_app.logger.exception(f"[UPLOAD CNH] Erro: {e}")
-        return jsonify({"error": f"Erro no upload da CNH: {e}"}), 500
+    return _ocr_do_formulario(cliente_id, "cnh", "documentos")
 
 
 # ==========================
@@ -210,32 +168,7 @@ def upload_cnh(cliente_id):
 @uploads_bp.route("/<int:cliente_id>/rg", methods=["POST"])
 @_upload_autorizado
 def upload_rg(cliente_id):
-    file = request.files.get("file") or request.files.get("arquivo")
-    erro_arquivo = _validar_arquivo_ocr(file)
-    if erro_arquivo:
-        return jsonify({"error": erro_arquivo}), 400
-
-    try:
-        file.seek(0)
-        file_bytes = file.read()
-        file.seek(0)
-        
-        caminho_r2 = _upload_to_r2(file, cliente_id, "documentos")
-
-        resultado = processar_documento(file_bytes, file.filename)
-        dados = resultado.get("resultado", {})
-
-        if not dados.get("categoria") or dados.get("categoria") == "NÃO RECONHECIDO":
-            texto_bruto = "\n".join(resultado.get("resultado", {}).get("raw_text", []))
-            dados = parse_rg(texto_bruto)
-
-        dados["caminho"] = caminho_r2
-        dados["nome_original"] = secure_filename(file.filename)
-        return jsonify(dados)
-
-    except Exception as e:
-        current_app.logger.exception(f"[UPLOAD RG] Erro: {e}")
-        return jsonify({"error": f"Erro no upload do RG: {e}"}), 500
+    return _ocr_do_formulario(cliente_id, "rg", "documentos")
 
 
 # ===============================
@@ -244,57 +177,80 @@ def upload_rg(cliente_id):
 @uploads_bp.route("/<int:cliente_id>/documento", methods=["POST"])
 @_upload_autorizado
 def upload_documento(cliente_id):
+    """Documento genérico: grava no R2 e classifica via OCR + IA na fila."""
+    return _ocr_do_formulario(cliente_id, "documento", "documentos")
+
+
+# ===============================
+# UPLOAD DIRETO AO R2 + OCR NA FILA
+# ===============================
+@uploads_bp.route("/<int:cliente_id>/direto/emitir", methods=["POST"])
+@_upload_autorizado
+def emitir_upload_direto(cliente_id):
     """
-    Refatorado M4: Lê direto da memória (RAM), processa via OCR 
-    e envia direto para o R2 sem tocar no disco efêmero do Render.
+    URL PUT pré-assinada para o navegador mandar o documento direto ao R2
+    (app/utils/upload_direto.py). Corpo JSON: {nome, content_type, tamanho, subpasta}.
     """
-    import traceback
-    from app.services import ocr_pipeline
-
-    file = request.files.get("arquivo") or request.files.get("file")
-    erro_arquivo = _validar_arquivo_ocr(file)
-    if erro_arquivo:
-        return jsonify({"error": erro_arquivo}), 400
+    dados = request.get_json(silent=True) or {}
+    subpasta = dados.get("subpasta") if dados.get("subpasta") in ("documentos", "armas") else "documentos"
+    nome = dados.get("nome") or ""
+    extensao = nome.rsplit(".", 1)[-1].lower() if "." in nome else ""
+    if extensao not in _ALLOWED_OCR_EXTENSIONS:
+        return jsonify({"error": "Formato não permitido. Use PDF, JPG ou PNG."}), 400
 
     try:
-        filename = secure_filename(file.filename)
-        
-        # 1. Leitura em Memória PRIMEIRO (Evita erro de arquivo fechado pelo Boto3)
-        file.seek(0)
-        file_bytes = file.read()
-        file.seek(0) # Reset para o upload
-
-        # 2. Envio ao R2
-        key_r2 = None
-        try:
-            key_r2 = _upload_to_r2(file, cliente_id, "documentos")
-            current_app.logger.info(f"[UPLOAD OCR] Arquivo enviado ao R2: {key_r2}")
-        except Exception as e:
-            current_app.logger.warning(f"[UPLOAD OCR] Falha ao enviar ao R2: {e}")
-            # Se falhar o R2, ainda podemos tentar retornar o OCR se for crítico, 
-            # mas aqui manteremos a consistência de erro.
-            return jsonify({"error": "Falha na comunicação com o Storage R2."}), 500
+        content_type, tamanho = direto.validar("documento", nome, dados.get("content_type"), dados.get("tamanho"))
+        upload = direto.emitir(
+            "documento", get_bucket(), _chave_cliente(cliente_id, subpasta, nome),
+            content_type, tamanho, nome=nome, cliente_id=cliente_id,
+        )
+    except direto.UploadInvalido as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        current_app.logger.exception(f"[UPLOAD DIRETO] Falha ao emitir URL: {e}")
+        return jsonify({"error": "Falha na comunicação com o Storage R2."}), 500
+    return jsonify(upload)
+
 
-        resultado = ocr_pipeline.processar_documento(file_bytes, filename)
-        if not resultado:
-            raise RuntimeError("Nenhum resultado retornado pelo pipeline OCR")
+@uploads_bp.route("/<int:cliente_id>/direto/confirmar", methods=["POST"])
+@_upload_autorizado
+def confirmar_upload_direto(cliente_id):
+    """
+    Confirma o PUT no R2 e, com "ocr" (documento, craf, cr, cnh, rg), põe o
+    OCR na fila. Corpo JSON: {ticket, ocr}. Responde na hora com o job_id
+    (ou com o resultado, se não houver Redis).
+    """
+    dados = request.get_json(silent=True) or {}
+    tipo_ocr = dados.get("ocr")
+    if tipo_ocr and tipo_ocr not in TIPOS_OCR:
+        return jsonify({"error": "Tipo de OCR inválido."}), 400
 
-        current_app.logger.info(f"[UPLOAD OCR] Resultado OCR: {resultado}")
+    try:
+        arquivo = direto.confirmar(dados.get("ticket"), "documento", cliente_id=cliente_id)
+    except direto.UploadInvalido as e:
+        return jsonify({"error": str(e)}), 400
 
-        resposta = {
-            "dados": resultado,
-            "ocr_engine": resultado.get("ocr_engine", "local"),
-            "ia_engine": resultado.get("engine", "llama-3.1-8b-instant"),
-            "caminho_arquivo": key_r2,
-            "nome_original": filename,
-        }
+    resposta = {"caminho_arquivo": arquivo["key"], "nome_original": arquivo["nome_original"]}
+    if tipo_ocr:
+        try:
+            resposta["ocr"] = enfileirar_ocr(
+                arquivo["bucket"], arquivo["key"], arquivo["nome_original"], tipo_ocr, cliente_id=cliente_id,
+            )
+            if resposta["ocr"]["modo"] == "fila":
+                resposta["ocr"]["status_url"] = url_for(
+                    "uploads.status_ocr_job", cliente_id=cliente_id, job_id=resposta["ocr"]["job_id"],
+                )
+        except Exception as e:
+            current_app.logger.exception(f"[UPLOAD DIRETO] Falha no OCR de {arquivo['key']}: {e}")
+            resposta["ocr"] = {"modo": "erro", "erro": str(e)}
+    return jsonify(resposta)
 
-        current_app.logger.info(f"[UPLOAD OCR] Retornando JSON: {resposta}")
-        return jsonify(resposta)
 
-    except Exception as e:
-        current_app.logger.error("[UPLOAD OCR] Falha no pipeline OCR:", exc_info=True)
-        return jsonify({
-            "error": str(e),
-            "traceback": traceback.format_exc(),
-        }), 500
\ No newline at end of file
+@uploads_bp.route("/<int:cliente_id>/ocr/<job_id>", methods=["GET"])
+@_upload_autorizado
+def status_ocr_job(cliente_id, job_id):
+    """Situação do OCR enfileirado na confirmação (o formulário consulta até concluir)."""
+    situacao = status_ocr(job_id, cliente_id=cliente_id)
+    if situacao is None:
+        return jsonify({"status": "desconhecido", "error": "Processamento não encontrado ou expirado."}), 404
+    return jsonify(situacao)
@@ -3,7 +3,8 @@ import pytesseract
 from PIL import Image
 from io import BytesIO
 from flask import current_app
-import boto3
+
+from app.utils import r2_gateway
 
 try:
     from app.uploads.ocr import extrair_texto as _ocr_extrair_texto
@@ -23,13 +24,8 @@ def extrair_texto(file_bytes: bytes, filename: str | None = None) -> str:
 # STORAGE (R2)
 # ======================
 def get_s3():
-    """Cria cliente S3 usando as configs do Flask."""
-    return boto3.client(
-        "s3",
-        endpoint_url=current_app.config["R2_ENDPOINT"],
-        aws_access_key_id=current_app.config["R2_ACCESS_KEY"],
-        aws_secret_access_key=current_app.config["R2_SECRET_KEY"],
-    )
+    """Cliente S3 compartilhado (app/utils/r2_gateway.py; aceita R2_ENDPOINT/R2_ACCESS_KEY/R2_SECRET_KEY)."""
+    return r2_gateway.cliente()
 
 
 def get_bucket():
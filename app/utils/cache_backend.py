@@ -0,0 +1,391 @@
+"""
+app/utils/cache_backend.py
+─────────────────────────────────────────────────────────────────────────────
+Backend de cache compartilhado para o Flask-Caching.
+
+Com o SimpleCache cada worker do gunicorn mantinha sua própria cópia de
+index_v9, prateleiras_home_v9, loja_data_v3, precos_v2_*... — a taxa de
+acerto caía a cada worker novo e a memória crescia junto.
+
+Este backend grava no Redis já configurado em app/utils/queue.py (o mesmo
+das filas RQ). Se o Redis estiver fora do ar, cai para um LRU local com
+limite de itens, e volta ao Redis sozinho depois de RETRY_REDIS_SEGUNDOS.
+
+Também mantém contadores de hit/miss por prefixo de chave (por processo),
+consultáveis via `estatisticas()`.
+
+Uso (app/__init__.py):
+    app.config['CACHE_TYPE'] = 'app.utils.cache_backend.RedisLRUCache'
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import pickle
+import re
+import threading
+import time
+import logging
+from collections import OrderedDict, defaultdict
+
+from flask_caching.backends.base import BaseCache
+
+logger = logging.getLogger(__name__)
+
+# Após uma falha de Redis, quanto tempo ficamos só no LRU local
+RETRY_REDIS_SEGUNDOS = 30
+
+# Limite padrão de itens do LRU local (sobrescrito por CACHE_LRU_MAX_ITEMS)
+MAX_ITENS_LOCAL = 512
+
+# Sufixos variáveis: ids numéricos (precos_v2_123) e hashes (img_cache_ab12cd34…)
+_SUFIXO_VARIAVEL = re.compile(r"(_(\d+|[0-9a-f]{8,}))+$")
+_HASH_QUERY_STRING = re.compile(r"[0-9a-f]{32}$")
+
+
+def _prefixo_da_chave(key: str) -> str:
+    """
+    Agrupa chaves de cache em famílias para os contadores de hit/miss.
+
+    Exemplos:
+        precos_v2_166                  → precos_v2
+        index_v9                       → index_v9
+        view//loja/produto/g2c-9mm     → /produto
+        /categoria/pistolas?page=2     → /categoria
+        /api/buscar-fuzzy<md5>         → /api/buscar-fuzzy
+    """
+    if key.startswith("view/"):
+        key = key[len("view/"):]
+
+    if key.startswith("/"):
+        caminho = _HASH_QUERY_STRING.sub("", key.split("?")[0])
+        partes = [p for p in caminho.split("/") if p]
+        if partes and partes[0] == "loja":
+            partes = partes[1:]
+        if not partes:
+            return "/"
+        if partes[0] == "api":
+            return "/" + "/".join(partes[:2])
+        return "/" + partes[0]
+
+    return _SUFIXO_VARIAVEL.sub("", key) or key
+
+
+class LRULocal:
+    """
+    LRU em memória com TTL por item e limite de itens (thread-safe).
+    Também usado fora do cache da loja (r2_gateway, llm_gateway); `agora`
+    é o relógio das expirações (testes trocam só o desta instância).
+
+    ao_descartar(key) roda dentro de `lock` para cada chave que sai por
+    expiração, despejo ou delete — quem mantém estruturas ligadas às chaves
+    (o índice de dependências do RedisLRUCache) usa o mesmo `lock`.
+    """
+
+    def __init__(self, max_itens=MAX_ITENS_LOCAL, agora=time.time, ao_descartar=None):
+        self.max_itens = max(1, int(max_itens))
+        self.agora = agora
+        self.ao_descartar = ao_descartar
+        self._itens = OrderedDict()
+        self.lock = self._lock = threading.RLock()
+
+    def _descartar(self, key):
+        if self.ao_descartar is not None:
+            self.ao_descartar(key)
+
+    def get(self, key):
+        with self._lock:
+            item = self._itens.get(key)
+            if item is None:
+                return None
+            expira_em, valor = item
+            if expira_em and expira_em <= self.agora():
+                del self._itens[key]
+                self._descartar(key)
+                return None
+            self._itens.move_to_end(key)
+            return valor
+
+    def set(self, key, valor, timeout):
+        expira_em = self.agora() + timeout if timeout else 0
+        with self._lock:
+            self._itens[key] = (expira_em, valor)
+            self._itens.move_to_end(key)
+            while len(self._itens) > self.max_itens:
+                despejada, _ = self._itens.popitem(last=False)
+                self._descartar(despejada)
+
+    def delete(self, key):
+        with self._lock:
+            if self._itens.pop(key, None) is None:
+                return False
+            self._descartar(key)
+            return True
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._itens
+
+    def clear(self):
+        with self._lock:
+            self._itens.clear()
+
+    def __len__(self):
+        return len(self._itens)
+
+
+class RedisLRUCache(BaseCache):
+    """
+    Cache do Flask-Caching sobre o Redis de app/utils/queue.py, com
+    fallback para LRU local limitado quando o Redis não responde.
+    """
+
+    def __init__(self, default_timeout=300, key_prefix="m4cache:",
+                 max_itens_local=MAX_ITENS_LOCAL, retry_segundos=RETRY_REDIS_SEGUNDOS):
+        super().__init__(default_timeout=default_timeout)
+        self.key_prefix = key_prefix or ""
+        self.retry_segundos = retry_segundos
+        self._local = LRULocal(max_itens_local, ao_descartar=self._desindexar_local)
+        self._redis_indisponivel_ate = 0.0
+        self._usando_fallback = False
+        # dependência → chaves e chave → dependências, só para o LRU local;
+        # protegidos pelo lock do LRU e podados quando a chave sai dele
+        self._indices_locais = defaultdict(set)
+        self._deps_locais = defaultdict(set)
+        self._stats = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(
+            key_prefix=config.get("CACHE_KEY_PREFIX") or "m4cache:",
+            max_itens_local=config.get("CACHE_LRU_MAX_ITEMS", MAX_ITENS_LOCAL),
+        )
+        return cls(*args, **kwargs)
+
+    # ── Conexão ───────────────────────────────────────────────────────────
+
+    def _redis(self):
+        """Retorna a conexão Redis ativa, ou None se estamos no fallback."""
+        if time.time() < self._redis_indisponivel_ate:
+            return None
+        from app.utils import queue
+        conn = queue.redis_conn
+        if conn is not None and self._usando_fallback:
+            # Redis voltou: o que ficou no LRU local pode estar velho
+            self._limpar_local()
+            self._usando_fallback = False
+            logger.info("[CACHE] Redis de volta; LRU local descartado.")
+        return conn
+
+    def _marcar_falha(self, erro):
+        if not self._usando_fallback:
+            logger.warning(f"[CACHE] Redis indisponível, usando LRU local: {erro}")
+        self._usando_fallback = True
+        self._redis_indisponivel_ate = time.time() + self.retry_segundos
+
+    @property
+    def backend_ativo(self):
+        return "redis" if self._redis() is not None else "lru_local"
+
+    # ── Serialização / contadores ─────────────────────────────────────────
+
+    def _k(self, key):
+        return self.key_prefix + key
+
+    @staticmethod
+    def _dump(valor):
+        return pickle.dumps(valor, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _load(dado):
+        if dado is None:
+            return None
+        try:
+            return pickle.loads(dado)
+        except (pickle.PickleError, EOFError, AttributeError, ImportError):
+            return None
+
+    def _contar(self, key, acertou):
+        prefixo = _prefixo_da_chave(key)
+        with self._stats_lock:
+            self._stats[prefixo]["hits" if acertou else "misses"] += 1
+
+    def estatisticas(self):
+        """Hits/misses por prefixo de chave neste processo."""
+        with self._stats_lock:
+            resultado = {}
+            for prefixo, c in sorted(self._stats.items()):
+                total = c["hits"] + c["misses"]
+                resultado[prefixo] = {
+                    "hits": c["hits"],
+                    "misses": c["misses"],
+                    "hit_rate": round(c["hits"] / total, 4) if total else 0.0,
+                }
+            return resultado
+
+    def zerar_estatisticas(self):
+        with self._stats_lock:
+            self._stats.clear()
+
+    # ── API do BaseCache ──────────────────────────────────────────────────
+
+    def get(self, key):
+        conn = self._redis()
+        if conn is not None:
+            try:
+                valor = self._load(conn.get(self._k(key)))
+                self._contar(key, valor is not None)
+                return valor
+            except Exception as e:
+                self._marcar_falha(e)
+        valor = self._load(self._local.get(key))
+        self._contar(key, valor is not None)
+        return valor
+
+    def get_many(self, *keys):
+        conn = self._redis()
+        if conn is not None and keys:
+            try:
+                valores = [self._load(v) for v in conn.mget([self._k(k) for k in keys])]
+                for key, valor in zip(keys, valores):
+                    self._contar(key, valor is not None)
+                return valores
+            except Exception as e:
+                self._marcar_falha(e)
+        return [self.get(k) for k in keys]
+
+    def set(self, key, value, timeout=None):
+        timeout = self._normalize_timeout(timeout)
+        dado = self._dump(value)
+        conn = self._redis()
+        if conn is not None:
+            try:
+                if timeout > 0:
+                    return bool(conn.setex(self._k(key), timeout, dado))
+                return bool(conn.set(self._k(key), dado))
+            except Exception as e:
+                self._marcar_falha(e)
+        self._local.set(key, dado, timeout)
+        return True
+
+    def add(self, key, value, timeout=None):
+        timeout = self._normalize_timeout(timeout)
+        dado = self._dump(value)
+        conn = self._redis()
+        if conn is not None:
+            try:
+                return bool(conn.set(self._k(key), dado, ex=timeout or None, nx=True))
+            except Exception as e:
+                self._marcar_falha(e)
+        if self._local.get(key) is not None:
+            return False
+        self._local.set(key, dado, timeout)
+        return True
+
+    def delete(self, key):
+        # Apaga dos dois lados: uma entrada local pode sobreviver a uma queda do Redis
+        apagou_local = self._local.delete(key)
+        conn = self._redis()
+        if conn is not None:
+            try:
+                return bool(conn.delete(self._k(key))) or apagou_local
+            except Exception as e:
+                self._marcar_falha(e)
+        return apagou_local
+
+    def delete_many(self, *keys):
+        if not keys:
+            return []
+        for key in keys:
+            self._local.delete(key)
+        conn = self._redis()
+        if conn is not None:
+            try:
+                conn.delete(*[self._k(k) for k in keys])
+            except Exception as e:
+                self._marcar_falha(e)
+        return list(keys)
+
+    def has(self, key):
+        conn = self._redis()
+        if conn is not None:
+            try:
+                return bool(conn.exists(self._k(key)))
+            except Exception as e:
+                self._marcar_falha(e)
+        return self._local.get(key) is not None
+
+    def clear(self):
+        self._limpar_local()
+        conn = self._redis()
+        if conn is not None:
+            try:
+                chaves = list(conn.scan_iter(match=self._k("*"), count=500))
+                if chaves:
+                    conn.delete(*chaves)
+            except Exception as e:
+                self._marcar_falha(e)
+                return False
+        return True
+
+    # ── Índice de dependências (usado por app/loja/cache_hooks.py) ────────
+
+    def _limpar_local(self):
+        with self._local.lock:
+            self._local.clear()
+            self._indices_locais.clear()
+            self._deps_locais.clear()
+
+    def _desindexar_local(self, key):
+        """Chave saiu do LRU local: tira das dependências (já dentro do lock)."""
+        for dependencia in self._deps_locais.pop(key, ()):
+            chaves = self._indices_locais.get(dependencia)
+            if chaves is not None:
+                chaves.discard(key)
+                if not chaves:
+                    del self._indices_locais[dependencia]
+
+    def indexar_chave(self, dependencia, key, timeout=None):
+        """Registra que `key` precisa ser apagada quando `dependencia` mudar."""
+        timeout = self._normalize_timeout(timeout)
+        conn = self._redis()
+        if conn is not None:
+            try:
+                nome = self._k(f"dep:{dependencia}")
+                pipe = conn.pipeline()
+                pipe.sadd(nome, key)
+                # O índice vive pelo menos tanto quanto a entrada mais longa
+                if timeout > 0:
+                    pipe.expire(nome, max(timeout, conn.ttl(nome) or 0))
+                else:
+                    pipe.persist(nome)
+                pipe.execute()
+                return
+            except Exception as e:
+                self._marcar_falha(e)
+        with self._local.lock:
+            if key in self._local:  # já despejada: nada a invalidar
+                self._indices_locais[dependencia].add(key)
+                self._deps_locais[key].add(dependencia)
+
+    def consumir_indice(self, dependencia):
+        """Retorna (e esquece) as chaves registradas para `dependencia`."""
+        with self._local.lock:
+            chaves = self._indices_locais.pop(dependencia, set())
+            for key in chaves:
+                deps = self._deps_locais.get(key)
+                if deps is not None:
+                    deps.discard(dependencia)
+                    if not deps:
+                        del self._deps_locais[key]
+        conn = self._redis()
+        if conn is not None:
+            try:
+                nome = self._k(f"dep:{dependencia}")
+                pipe = conn.pipeline()
+                pipe.smembers(nome)
+                pipe.delete(nome)
+                membros, _ = pipe.execute()
+                chaves |= {m.decode() if isinstance(m, bytes) else m for m in membros}
+            except Exception as e:
+                self._marcar_falha(e)
+        return chaves
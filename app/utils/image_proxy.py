@@ -10,31 +10,69 @@ e converte a imagem para JPEG se necessário, com caching para performance.
 
 Fluxo:
   1. Cliente requisita /catalogo/image-proxy/produtos/fotos/166/aa4.webp
-  2. Proxy verifica Accept header
-  3. Se não suporta WebP, baixa a imagem do CDN e converte para JPEG
-  4. Resultado é cacheado para próximas requisições
-  5. Imagem é servida ao cliente
+  2. Proxy verifica Accept header (quem aceita WebP é redirecionado ao CDN)
+  3. Se não suporta WebP, procura o JPEG convertido, nesta ordem:
+       a. cache em disco local, limitado em tamanho (LRU por mtime)
+       b. R2, ao lado do original: produtos/fotos/166/aa4.<versão>.fallback.jpg
+          (versão = ETag do original, então trocar o original gera outro JPEG)
+       c. conversão: baixa o original do CDN (requests.Session reutilizada),
+          converte e grava no R2 + disco
+  4. Conversões simultâneas da mesma imagem viram uma só (single-flight:
+     lock por imagem no processo + lock no Redis entre workers)
+  5. Resposta com ETag forte (hash do JPEG), Vary: Accept e 304 quando o
+     navegador já tem a imagem
+
+Antes o JPEG ficava no cache do Flask (SimpleCache por processo, 30 dias):
+a RAM crescia sem limite com o tráfego dos iPads antigos e cada worker
+convertia a mesma imagem de novo.
 ─────────────────────────────────────────────────────────────────────────────
 """
 
 import io
+import os
 import logging
 import hashlib
-from urllib.parse import quote
+import threading
+import time
 from pathlib import Path
 
 import requests
 from PIL import Image
-from flask import current_app, send_file, request
+from flask import current_app, request, redirect, Response
 from werkzeug.exceptions import BadRequest, NotFound
 
+from app.utils import r2_gateway
+from app.utils.cache_backend import LRULocal
+
 logger = logging.getLogger(__name__)
 
 # Configurações
 CDN_URL = "https://cdn.m4tatica.com.br"
-CACHE_TIMEOUT = 86400 * 30  # 30 dias
+BUCKET_PUBLICO = "m4-loja-publico"
 SUPPORTED_FORMATS = {'jpg', 'jpeg', 'png', 'gif', 'webp', 'avif'}
 FALLBACK_FORMAT = 'jpeg'  # Formato para conversão em navegadores antigos
+FALLBACK_SUFIXO = '.fallback.jpg'
+
+# Formatos que qualquer navegador abre: servidos direto do CDN, sem conversão
+FORMATOS_UNIVERSAIS = ('.jpg', '.jpeg', '.png', '.gif')
+
+# Cache em disco (por máquina): IMAGE_PROXY_CACHE_DIR, IMAGE_PROXY_CACHE_MB
+CACHE_MB_PADRAO = 256
+MAX_AGE = 86400 * 7  # navegador revalida com If-None-Match depois disso
+
+# Lock entre workers (Redis): quem não pegou espera o JPEG aparecer no R2
+_LOCK_PREFIXO = "m4:imgproxy:convertendo:"
+_LOCK_TTL = 60
+_ESPERA_MAX = 10.0
+_ESPERA_PASSO = 0.25
+
+# Versão (ETag) do original consultada no R2, lembrada por alguns minutos:
+# é o atraso máximo para um original trocado no mesmo caminho aparecer
+VERSAO_TTL = 300
+_versoes = LRULocal(4096)
+
+_sessao = None
+_sessao_lock = threading.Lock()
 
 
 def _accepts_webp(accept_header: str) -> bool:
@@ -51,20 +89,49 @@ def _accepts_webp(accept_header: str) -> bool:
     return 'image/webp' in accept_header.lower()
 
 
-def _get_cache_key(image_path: str, output_format: str) -> str:
+def _chave_fallback(image_path: str, versao: str = None) -> str:
     """
-    Gera uma chave de cache baseada no path da imagem e formato de saída.
-    
-    Args:
-        image_path: caminho da imagem, ex: "produtos/fotos/166/aa4.webp"
-        output_format: formato de saída, ex: "jpeg"
-    
-    Returns:
-        chave de cache única, ex: "img_cache_abc123def456"
+    Chave no R2 do JPEG convertido, ao lado do original e amarrada à versão
+    dele — o objeto é gravado como immutable, então a chave muda com o original.
+
+    Exemplo:
+        ("produtos/fotos/166/aa4_t280.webp", "9b2c") → "produtos/fotos/166/aa4_t280.9b2c.fallback.jpg"
     """
-    cache_str = f"{image_path}:{output_format}"
-    hash_digest = hashlib.md5(cache_str.encode()).hexdigest()[:12]
-    return f"img_cache_{hash_digest}"
+    raiz = image_path.lstrip('/').rsplit('.', 1)[0]
+    if versao:
+        return f"{raiz}.{versao}{FALLBACK_SUFIXO}"
+    return f"{raiz}{FALLBACK_SUFIXO}"
+
+
+def _versao_original(image_path: str):
+    """ETag (encurtado) do original no R2, ou None se não der para saber."""
+    if not r2_gateway.configurado():
+        return None
+    key = image_path.lstrip('/')
+    versao = _versoes.get(key)
+    if versao is None:
+        try:
+            meta = r2_gateway.head(BUCKET_PUBLICO, key)
+        except Exception as e:
+            logger.warning(f"[IMAGE_PROXY] Falha ao consultar a versão de {key} no R2: {e}")
+            return None
+        versao = (meta or {}).get("ETag", "").strip('"')[:16]
+        _versoes.set(key, versao, VERSAO_TTL)
+    return versao or None
+
+
+def _http():
+    """requests.Session do processo (reaproveita conexões keep-alive com o CDN)."""
+    global _sessao
+    if _sessao is None:
+        with _sessao_lock:
+            if _sessao is None:
+                sessao = requests.Session()
+                adaptador = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+                sessao.mount("https://", adaptador)
+                sessao.mount("http://", adaptador)
+                _sessao = sessao
+    return _sessao
 
 
 def _download_image_from_cdn(image_path: str) -> bytes:
@@ -85,7 +152,7 @@ def _download_image_from_cdn(image_path: str) -> bytes:
     
     try:
         logger.info(f"[IMAGE_PROXY] Baixando imagem do CDN: {url}")
-        response = requests.get(url, timeout=10)
+        response = _http().get(url, timeout=10)
         
         if response.status_code == 404:
             logger.warning(f"[IMAGE_PROXY] Imagem não encontrada no CDN: {url}")
@@ -150,62 +217,236 @@ def _convert_image_format(image_bytes: bytes, output_format: str = 'jpeg') -> by
         raise
 
 
+# ── Cache em disco (LRU limitado) ──────────────────────────────────────────
+
+class CacheDisco:
+    """
+    Arquivos em `pasta/ab/<hash>.jpg`, limitados a `max_bytes` no total.
+    Leitura atualiza o mtime; ao passar do limite, apaga os de mtime mais
+    antigo até voltar a 90% — vale entre processos da mesma máquina.
+    """
+
+    def __init__(self, pasta, max_bytes):
+        self.pasta = Path(pasta)
+        self.max_bytes = max_bytes
+        self._total = None
+        self._lock = threading.Lock()
+
+    def _caminho(self, chave):
+        nome = hashlib.sha1(chave.encode()).hexdigest()
+        return self.pasta / nome[:2] / f"{nome}.jpg"
+
+    def get(self, chave):
+        caminho = self._caminho(chave)
+        try:
+            dados = caminho.read_bytes()
+            os.utime(caminho)
+            return dados
+        except OSError:
+            return None
+
+    def set(self, chave, dados):
+        caminho = self._caminho(chave)
+        try:
+            caminho.parent.mkdir(parents=True, exist_ok=True)
+            temporario = caminho.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            temporario.write_bytes(dados)
+            os.replace(temporario, caminho)
+        except OSError as e:
+            logger.warning(f"[IMAGE_PROXY] Falha ao gravar cache em disco: {e}")
+            return
+        with self._lock:
+            if self._total is None:
+                self._total = self._medir()
+            else:
+                self._total += len(dados)
+            if self._total > self.max_bytes:
+                self._total = self._podar()
+
+    def _arquivos(self):
+        for caminho in self.pasta.glob("*/*.jpg"):
+            try:
+                info = caminho.stat()
+            except OSError:
+                continue
+            yield info.st_mtime, info.st_size, caminho
+
+    def _medir(self):
+        return sum(tamanho for _, tamanho, _ in self._arquivos())
+
+    def _podar(self):
+        arquivos = sorted(self._arquivos())
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        alvo = int(self.max_bytes * 0.9)
+        for _, tamanho, caminho in arquivos:
+            if total <= alvo:
+                break
+            try:
+                caminho.unlink()
+                total -= tamanho
+            except OSError:
+                pass
+        return total
+
+
+_cache_disco = None
+
+
+def _disco():
+    global _cache_disco
+    if _cache_disco is None:
+        pasta = current_app.config.get("IMAGE_PROXY_CACHE_DIR") or os.getenv("IMAGE_PROXY_CACHE_DIR") \
+            or os.path.join(current_app.instance_path, "image_proxy_cache")
+        megas = int(current_app.config.get("IMAGE_PROXY_CACHE_MB") or os.getenv("IMAGE_PROXY_CACHE_MB", CACHE_MB_PADRAO))
+        _cache_disco = CacheDisco(pasta, megas * 1024 * 1024)
+    return _cache_disco
+
+
+# ── Single-flight ────────────────────────────────────────────────────────
+
+class _SingleFlight:
+    """Chamadas simultâneas com a mesma chave esperam a primeira e recebem o mesmo resultado."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._em_voo = {}
+
+    def executar(self, chave, funcao):
+        with self._lock:
+            voo = self._em_voo.get(chave)
+            lider = voo is None
+            if lider:
+                voo = self._em_voo[chave] = {"evento": threading.Event()}
+        if not lider:
+            voo["evento"].wait()
+            if "erro" in voo:
+                raise voo["erro"]
+            return voo["resultado"]
+        try:
+            voo["resultado"] = funcao()
+            return voo["resultado"]
+        except BaseException as e:
+            voo["erro"] = e
+            raise
+        finally:
+            with self._lock:
+                self._em_voo.pop(chave, None)
+            voo["evento"].set()
+
+
+_voos = _SingleFlight()
+
+
+def _lock_redis(chave_r2):
+    """True se este worker pode converter (ou se não há Redis para coordenar)."""
+    from app.utils import queue
+    if queue.redis_conn is None:
+        return True
+    try:
+        return bool(queue.redis_conn.set(_LOCK_PREFIXO + chave_r2, os.getpid(), nx=True, ex=_LOCK_TTL))
+    except Exception as e:
+        logger.warning(f"[IMAGE_PROXY] Redis indisponível para o lock: {e}")
+        return True
+
+
+def _soltar_lock_redis(chave_r2):
+    from app.utils import queue
+    if queue.redis_conn is not None:
+        try:
+            queue.redis_conn.delete(_LOCK_PREFIXO + chave_r2)
+        except Exception:
+            pass
+
+
+def _ler_r2(chave_r2):
+    if not r2_gateway.configurado():
+        return None
+    try:
+        return r2_gateway.get(BUCKET_PUBLICO, chave_r2)
+    except Exception as e:
+        logger.warning(f"[IMAGE_PROXY] Falha ao ler {chave_r2} do R2: {e}")
+        return None
+
+
+def _converter_e_persistir(image_path, chave_r2, persistir=True):
+    image_bytes = _download_image_from_cdn(image_path)
+    convertido = _convert_image_format(image_bytes, FALLBACK_FORMAT)
+    if persistir and r2_gateway.configurado():
+        try:
+            r2_gateway.put(BUCKET_PUBLICO, chave_r2, convertido, content_type='image/jpeg',
+                           cache_control='public, max-age=31536000, immutable')
+            logger.info(f"[IMAGE_PROXY] JPEG persistido no R2: {chave_r2}")
+        except Exception as e:
+            logger.warning(f"[IMAGE_PROXY] Falha ao persistir {chave_r2} no R2: {e}")
+    return convertido
+
+
+def _obter_jpeg(image_path):
+    """JPEG convertido: disco → R2 → conversão (uma por imagem, entre threads e workers)."""
+    versao = _versao_original(image_path)
+    chave_r2 = _chave_fallback(image_path, versao)
+    # Sem versão conhecida o JPEG não vai para o R2: lá ele seria immutable
+    # e ficaria servindo o original antigo para sempre
+    persistir = versao is not None
+    disco = _disco()
+
+    dados = disco.get(chave_r2)
+    if dados is not None:
+        return dados
+
+    def buscar():
+        dados = _ler_r2(chave_r2) if persistir else None
+        if dados is None:
+            if not persistir:
+                dados = _converter_e_persistir(image_path, chave_r2, persistir=False)
+            elif _lock_redis(chave_r2):
+                try:
+                    dados = _converter_e_persistir(image_path, chave_r2)
+                finally:
+                    _soltar_lock_redis(chave_r2)
+            else:
+                # Outro worker está convertendo: espera o resultado aparecer no R2
+                limite = time.monotonic() + _ESPERA_MAX
+                while dados is None and time.monotonic() < limite:
+                    time.sleep(_ESPERA_PASSO)
+                    dados = _ler_r2(chave_r2)
+                if dados is None:
+                    dados = _converter_e_persistir(image_path, chave_r2)
+        disco.set(chave_r2, dados)
+        return dados
+
+    return _voos.executar(chave_r2, buscar)
+
+
+def _etag(dados: bytes) -> str:
+    return hashlib.sha1(dados).hexdigest()[:24]
+
+
 def get_image_with_fallback(image_path: str, accept_header: str = '') -> tuple:
     """
     Retorna a imagem com fallback automático para JPEG se necessário.
     
     Fluxo:
-      1. Se cliente aceita WebP, retorna a URL original do CDN (sem proxy)
-      2. Se não aceita, baixa a imagem, converte para JPEG e cachea
+      1. Se cliente aceita WebP (ou a imagem já é JPEG/PNG/GIF), retorna a
+         URL original do CDN (sem proxy)
+      2. Se não aceita, devolve o JPEG convertido (disco → R2 → conversão)
     
     Args:
         image_path: caminho da imagem, ex: "produtos/fotos/166/aa4.webp"
         accept_header: cabeçalho Accept da requisição
     
     Returns:
-        tuple (image_bytes, content_type, output_format)
+        tuple (image_bytes ou URL, content_type, output_format)
     """
     
     # Se cliente aceita WebP, retorna URL original (sem conversão)
-    if _accepts_webp(accept_header):
-        logger.debug(f"[IMAGE_PROXY] Cliente suporta WebP: {image_path}")
+    if _accepts_webp(accept_header) or image_path.lower().endswith(FORMATOS_UNIVERSAIS):
+        logger.debug(f"[IMAGE_PROXY] Sem conversão: {image_path}")
         url = f"{CDN_URL}/{image_path.lstrip('/')}"
         return url, 'image/webp', 'webp'
     
-    # Cliente não suporta WebP → converter para JPEG
-    logger.info(f"[IMAGE_PROXY] Cliente não suporta WebP, convertendo: {image_path}")
-    
-    output_format = FALLBACK_FORMAT
-    cache_key = _get_cache_key(image_path, output_format)
-    
-    # Tenta recuperar do cache
     try:
-        cache = current_app.extensions.get('cache')
-        
-        if cache:
-            cached_image = cache.get(cache_key)
-            if cached_image:
-                logger.info(f"[IMAGE_PROXY] Imagem recuperada do cache: {cache_key}")
-                return cached_image, f'image/{output_format}', output_format
-    except Exception as e:
-        logger.warning(f"[IMAGE_PROXY] Erro ao acessar cache: {e}")
-    
-    # Não estava em cache → baixar e converter
-    try:
-        image_bytes = _download_image_from_cdn(image_path)
-        converted_bytes = _convert_image_format(image_bytes, output_format)
-        
-        # Armazena no cache
-        try:
-            cache = current_app.extensions.get('cache')
-            if cache:
-                cache.set(cache_key, converted_bytes, timeout=CACHE_TIMEOUT)
-                logger.info(f"[IMAGE_PROXY] Imagem cacheada: {cache_key}")
-        except Exception as e:
-            logger.warning(f"[IMAGE_PROXY] Erro ao cachear imagem: {e}")
-        
-        return converted_bytes, f'image/{output_format}', output_format
-    
+        return _obter_jpeg(image_path), f'image/{FALLBACK_FORMAT}', FALLBACK_FORMAT
     except Exception as e:
         logger.error(f"[IMAGE_PROXY] Erro ao processar imagem {image_path}: {e}")
         raise
@@ -242,18 +483,20 @@ def serve_image_with_fallback(image_path: str) -> any:
         
         # Se for URL (cliente suporta WebP), redireciona
         if isinstance(result[0], str):
-            from flask import redirect
-            return redirect(result[0], code=307)
+            resposta = redirect(result[0], code=307)
+            resposta.vary.add('Accept')
+            return resposta
         
         # Se for bytes (cliente não suporta WebP), serve a imagem convertida
         image_bytes, content_type, output_format = result
         
-        return send_file(
-            io.BytesIO(image_bytes),
-            mimetype=content_type,
-            as_attachment=False,
-            download_name=f"image.{output_format}"
-        )
+        resposta = Response(image_bytes, mimetype=content_type)
+        resposta.set_etag(_etag(image_bytes))
+        resposta.vary.add('Accept')
+        resposta.cache_control.public = True
+        resposta.cache_control.max_age = MAX_AGE
+        # If-None-Match igual → 304 sem corpo
+        return resposta.make_conditional(request)
     
     except NotFound:
         logger.warning(f"[IMAGE_PROXY] Imagem não encontrada: {image_path}")
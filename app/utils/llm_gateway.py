@@ -0,0 +1,523 @@
+"""
+app/utils/llm_gateway.py
+─────────────────────────────────────────────────────────────────────────────
+Porta única para as chamadas de chat completion (Groq / API compatível com
+OpenAI).
+
+Antes cada integração fazia sua própria chamada bloqueante:
+ocr_inteligente.interpretar_documento e integracoes/llm.call_llm_model com
+requests.post (conexão TLS nova a cada documento), loja.routes com o SDK da
+Groq (cliente novo a cada comparação) e compras/llm_nf chamando o mesmo
+prompt duas vezes (verificação do modelo + chamada). Sem cache e sem limite:
+um lote de uploads estourava o rate limit da conta e todo mundo recebia 429.
+
+Agora todas passam por completar():
+
+    - requests.Session por processo, com pool de LLM_MAX_POOL conexões e
+      retentativa em 5xx; recriada após fork (gunicorn/RQ);
+    - cache da resposta pelo hash do prompt (endpoint, modelo, mensagens,
+      temperatura, max_tokens, formato) com TTL de LLM_CACHE_TTL segundos:
+      LRU local + Redis de app/utils/queue.py (compartilhado entre workers)
+      quando disponível; `validar` deixa o chamador recusar uma resposta
+      (JSON quebrado não fica 24 h no cache);
+    - coalescência: pedidos idênticos simultâneos esperam a mesma chamada —
+      no processo por um Event, entre processos por uma trava SET NX no
+      Redis enquanto os demais consultam o cache;
+    - token bucket de LLM_POR_MINUTO chamadas/min com rajada de LLM_RAJADA,
+      no Redis (script Lua, um balde para todos os workers web e RQ) ou, sem
+      Redis, por processo; quem não consegue ficha em LLM_ESPERA_MAX
+      segundos (ou no `espera_max` da chamada) recebe ErroLLM(429) sem
+      chegar à API.
+
+Prompts com dados de documentos (OCR de CNH/RG/CRAF, notas fiscais) passam
+cache_ttl=0: nem o texto nem a resposta ficam no Redis. A loja passa
+espera_max=0 e cai na análise local em vez de prender o worker web.
+
+Erros da API viram ErroLLM (RuntimeError) com status, código e mensagem do
+corpo de erro — quem precisa decidir fallback de modelo (llm_nf) olha neles.
+
+Testes e desenvolvimento offline: usar_stub() (ou LLM_BACKEND=stub) troca a
+API por um BackendStub em memória; resetar() volta ao HTTP e limpa caches.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from app.utils.cache_backend import LRULocal
+
+logger = logging.getLogger(__name__)
+
+GROQ_ENDPOINT = "https://api.groq.com/openai/v1/chat/completions"
+
+MAX_POOL = int(os.getenv("LLM_MAX_POOL", 8))
+CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 86400))
+MAX_ITENS_CACHE = int(os.getenv("LLM_CACHE_MAX_ITENS", 512))
+POR_MINUTO = float(os.getenv("LLM_POR_MINUTO", 30))
+RAJADA = int(os.getenv("LLM_RAJADA", 5))
+ESPERA_MAX = float(os.getenv("LLM_ESPERA_MAX", 20))
+
+_PREFIXO_REDIS = "m4llm:"
+_CHAVE_BALDE = _PREFIXO_REDIS + "balde"
+_INTERVALO_TRAVA = 0.2  # segundos entre consultas de quem espera outro processo
+
+_lock = threading.Lock()
+_sessao = None
+_pid = os.getpid()
+_stub = None
+_cache = LRULocal(MAX_ITENS_CACHE)
+_em_voo = {}
+_contadores = {"chamadas": 0, "cache": 0, "coalescidas": 0, "espera_ms": 0.0}
+
+
+class ErroLLM(RuntimeError):
+    """Falha da API (ou do limite local). status=None quando não houve resposta HTTP."""
+
+    def __init__(self, mensagem, status=None, codigo=""):
+        super().__init__(mensagem)
+        self.status = status
+        self.codigo = codigo or ""
+        self.mensagem = mensagem
+
+
+# ── Backend stub (testes / offline) ───────────────────────────────────────
+
+class BackendStub:
+    """
+    Responde sem rede. `responder(mensagens, modelo)` devolve str ou dict
+    (vira JSON); o padrão devolve "{}" em modo JSON e um texto fixo fora dele.
+    Cada corpo enviado fica em `chamadas`.
+    """
+
+    def __init__(self, responder=None):
+        self.responder = responder
+        self.chamadas = []
+        self._lock = threading.Lock()
+
+    def __call__(self, corpo):
+        with self._lock:
+            self.chamadas.append(corpo)
+        if self.responder is None:
+            return "{}" if corpo.get("response_format") else "Resposta do backend stub."
+        resposta = self.responder(corpo["messages"], corpo["model"])
+        return resposta if isinstance(resposta, str) else json.dumps(resposta, ensure_ascii=False)
+
+
+def usar_stub(responder=None):
+    """Instala um BackendStub no lugar da API e limpa os caches. Retorna o stub."""
+    global _stub
+    resetar()
+    _stub = BackendStub(responder)
+    return _stub
+
+
+def resetar():
+    """Volta ao backend HTTP e zera cache local, balde e contadores."""
+    global _stub, _balde, _balde_redis
+    _stub = None
+    _cache.clear()
+    _balde = _Balde(POR_MINUTO, RAJADA)
+    _balde_redis = None
+    with _lock:
+        _em_voo.clear()
+        _contadores.update(chamadas=0, cache=0, coalescidas=0, espera_ms=0.0)
+
+
+def _backend_stub():
+    global _stub
+    if _stub is None and os.getenv("LLM_BACKEND", "").lower() == "stub":
+        _stub = BackendStub()
+    return _stub
+
+
+def configurado(chave_api=None):
+    """Há como responder: stub ativo ou chave da API."""
+    return _backend_stub() is not None or bool(chave_api or os.getenv("GROQ_API_KEY"))
+
+
+# ── Sessão HTTP ───────────────────────────────────────────────────────────
+
+def _criar_sessao():
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retentativas = Retry(
+        total=2,
+        backoff_factor=0.5,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({"POST"}),
+        raise_on_status=False,
+    )
+    sessao = requests.Session()
+    sessao.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=MAX_POOL, max_retries=retentativas))
+    return sessao
+
+
+def sessao():
+    """requests.Session compartilhada do processo (recriada após fork)."""
+    global _sessao, _pid
+    if _sessao is not None and _pid == os.getpid():
+        return _sessao
+    with _lock:
+        if _sessao is None or _pid != os.getpid():
+            # Processo filho: o pool herdado aponta para sockets do pai
+            _sessao = _criar_sessao()
+            _pid = os.getpid()
+            logger.info(f"[LLM] Sessão HTTP criada (pool={MAX_POOL}, pid={_pid})")
+        return _sessao
+
+
+# ── Limite de taxa ────────────────────────────────────────────────────────
+
+class _Balde:
+    """Token bucket: `por_minuto` fichas/min, no máximo `rajada` acumuladas."""
+
+    def __init__(self, por_minuto, rajada):
+        self.taxa = por_minuto / 60.0
+        self.capacidade = max(1, rajada)
+        self.fichas = float(self.capacidade)
+        self.ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def retirar(self, espera_max=ESPERA_MAX):
+        """Espera uma ficha; ErroLLM(429) se ela não vier em `espera_max` s."""
+        if self.taxa <= 0:
+            return 0.0
+        inicio = time.monotonic()
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self.fichas = min(self.capacidade, self.fichas + (agora - self.ultimo) * self.taxa)
+                self.ultimo = agora
+                if self.fichas >= 1:
+                    self.fichas -= 1
+                    return agora - inicio
+                falta = (1 - self.fichas) / self.taxa
+            if agora + falta - inicio > espera_max:
+                raise ErroLLM("Limite local de chamadas ao LLM atingido; tente novamente.",
+                              status=429, codigo="limite_local")
+            time.sleep(falta)
+
+
+# KEYS[1] = balde; ARGV = taxa (fichas/s), capacidade. Retorna a espera em
+# segundos até a próxima ficha ("0" = ficha retirada). Relógio do Redis:
+# todos os processos enxergam o mesmo tempo.
+_LUA_BALDE = """
+local taxa, capacidade = tonumber(ARGV[1]), tonumber(ARGV[2])
+local t = redis.call('TIME')
+local agora = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local dados = redis.call('HMGET', KEYS[1], 'fichas', 'ultimo')
+local fichas = tonumber(dados[1]) or capacidade
+local ultimo = tonumber(dados[2]) or agora
+fichas = math.min(capacidade, fichas + math.max(0, agora - ultimo) * taxa)
+local falta = 0
+if fichas >= 1 then fichas = fichas - 1 else falta = (1 - fichas) / taxa end
+redis.call('HSET', KEYS[1], 'fichas', tostring(fichas), 'ultimo', tostring(agora))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacidade / taxa) + 60)
+return tostring(falta)
+"""
+
+
+class _BaldeRedis:
+    """O mesmo token bucket, guardado no Redis e compartilhado entre processos."""
+
+    def __init__(self, conn, por_minuto, rajada):
+        self.conn = conn
+        self.taxa = por_minuto / 60.0
+        self.capacidade = max(1, rajada)
+        self._script = conn.register_script(_LUA_BALDE)
+
+    def retirar(self, espera_max=ESPERA_MAX):
+        if self.taxa <= 0:
+            return 0.0
+        inicio = time.monotonic()
+        while True:
+            falta = float(self._script(keys=[_CHAVE_BALDE], args=[self.taxa, self.capacidade]))
+            agora = time.monotonic()
+            if falta <= 0:
+                return agora - inicio
+            if agora + falta - inicio > espera_max:
+                raise ErroLLM("Limite local de chamadas ao LLM atingido; tente novamente.",
+                              status=429, codigo="limite_local")
+            time.sleep(falta)
+
+
+_balde = _Balde(POR_MINUTO, RAJADA)
+_balde_redis = None
+
+
+def _retirar_ficha(espera_max=ESPERA_MAX):
+    """Ficha do balde do Redis; sem Redis (ou com ele fora do ar), do local."""
+    global _balde_redis
+    conn = _redis()
+    if conn is not None:
+        try:
+            if _balde_redis is None or _balde_redis.conn is not conn:
+                _balde_redis = _BaldeRedis(conn, POR_MINUTO, RAJADA)
+            return _balde_redis.retirar(espera_max)
+        except ErroLLM:
+            raise
+        except Exception as e:
+            logger.warning(f"[LLM] Balde no Redis indisponível, usando o local: {e}")
+    return _balde.retirar(espera_max)
+
+
+# ── Cache ─────────────────────────────────────────────────────────────────
+
+def _chave(corpo, endpoint):
+    bruto = json.dumps([endpoint, corpo], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+
+def _redis():
+    if _stub is not None:
+        return None  # stub não lê nem grava no cache compartilhado
+    from app.utils import queue
+    return queue.redis_conn
+
+
+def _ler_cache(chave):
+    resposta = _cache.get(chave)
+    if resposta is not None:
+        return resposta
+    conn = _redis()
+    if conn is None:
+        return None
+    try:
+        dado = conn.get(_PREFIXO_REDIS + chave)
+    except Exception as e:
+        logger.warning(f"[LLM] Falha ao ler cache no Redis: {e}")
+        return None
+    if dado is None:
+        return None
+    resposta = dado.decode("utf-8")
+    _cache.set(chave, resposta, CACHE_TTL)
+    return resposta
+
+
+def _esquecer(chave):
+    _cache.delete(chave)
+    conn = _redis()
+    if conn is None:
+        return
+    try:
+        conn.delete(_PREFIXO_REDIS + chave)
+    except Exception as e:
+        logger.warning(f"[LLM] Falha ao apagar cache no Redis: {e}")
+
+
+def _aceita(validar, resposta):
+    if validar is None:
+        return True
+    try:
+        return bool(validar(resposta))
+    except Exception:
+        return False
+
+
+def json_valido(resposta):
+    """Validador para completar(): a resposta é um JSON que decodifica."""
+    json.loads(resposta)
+    return True
+
+
+def _gravar_cache(chave, resposta, ttl):
+    _cache.set(chave, resposta, ttl)
+    conn = _redis()
+    if conn is None:
+        return
+    try:
+        conn.setex(_PREFIXO_REDIS + chave, ttl, resposta.encode("utf-8"))
+    except Exception as e:
+        logger.warning(f"[LLM] Falha ao gravar cache no Redis: {e}")
+
+
+# ── Coalescência entre processos ──────────────────────────────────────────
+
+def _travar(chave, prazo):
+    """
+    Trava SET NX da chamada no Redis. Retorna o token (quem chama a API),
+    None se outro processo já está chamando, ou "" sem Redis.
+    """
+    conn = _redis()
+    if conn is None:
+        return ""
+    token = uuid.uuid4().hex
+    try:
+        if conn.set(_PREFIXO_REDIS + "trava:" + chave, token, nx=True, ex=max(1, int(prazo))):
+            return token
+        return None
+    except Exception as e:
+        logger.warning(f"[LLM] Falha na trava do Redis: {e}")
+        return ""
+
+
+def _destravar(chave, token):
+    conn = _redis()
+    if not token or conn is None:
+        return
+    trava = _PREFIXO_REDIS + "trava:" + chave
+    try:
+        valor = conn.get(trava)
+        if valor is not None and valor.decode("utf-8") == token:
+            conn.delete(trava)
+    except Exception as e:
+        logger.warning(f"[LLM] Falha ao liberar trava do Redis: {e}")
+
+
+def _esperar_outro_processo(chave, prazo, validar):
+    """
+    Consulta o cache até a resposta do processo que tem a trava aparecer.
+    None se a trava sumir sem resposta (falhou ou foi recusada): aí quem
+    esperava chama a API por conta própria.
+    """
+    conn = _redis()
+    trava = _PREFIXO_REDIS + "trava:" + chave
+    limite = time.monotonic() + prazo
+    while time.monotonic() < limite:
+        time.sleep(_INTERVALO_TRAVA)
+        try:
+            dado = conn.get(_PREFIXO_REDIS + chave)
+            if dado is not None:
+                resposta = dado.decode("utf-8")
+                return resposta if _aceita(validar, resposta) else None
+            if not conn.exists(trava):
+                return None
+        except Exception as e:
+            logger.warning(f"[LLM] Falha aguardando outro processo: {e}")
+            return None
+    raise ErroLLM("Tempo esgotado aguardando resposta do LLM.")
+
+
+# ── Chamada ───────────────────────────────────────────────────────────────
+
+def _erro_http(resp):
+    try:
+        erro = resp.json().get("error") or {}
+    except Exception:
+        erro = {"message": resp.text or "Erro desconhecido"}
+    mensagem = erro.get("message") or resp.text or ""
+    falha = ErroLLM(f"Erro {resp.status_code}: {mensagem}", status=resp.status_code, codigo=erro.get("code") or "")
+    falha.mensagem = mensagem  # só o texto da API, para quem compara sinais de erro
+    return falha
+
+
+def _chamar(corpo, endpoint, chave_api, timeout, espera_max=ESPERA_MAX):
+    stub = _backend_stub()
+    if stub is not None:
+        return stub(corpo)
+
+    if not chave_api:
+        raise ErroLLM("GROQ_API_KEY não configurada no ambiente.")
+
+    espera = _retirar_ficha(espera_max)
+    with _lock:
+        _contadores["espera_ms"] += espera * 1000
+
+    import requests
+    headers = {"Authorization": f"Bearer {chave_api}", "Content-Type": "application/json"}
+    try:
+        resp = sessao().post(endpoint, headers=headers, json=corpo, timeout=timeout)
+    except requests.RequestException as e:
+        raise ErroLLM(f"Falha de conexão com o LLM: {e}") from e
+    if resp.status_code != 200:
+        raise _erro_http(resp)
+    return (resp.json().get("choices") or [{}])[0].get("message", {}).get("content", "") or ""
+
+
+def completar(mensagens, modelo, temperatura=0, max_tokens=None, json_obj=False,
+              chave_api=None, timeout=60, cache_ttl=None, endpoint=GROQ_ENDPOINT, validar=None,
+              espera_max=None):
+    """
+    Conteúdo da resposta do chat completion (str).
+
+    mensagens: [{"role": ..., "content": ...}]; json_obj=True pede
+    response_format json_object. cache_ttl=0 desliga o cache nesta chamada
+    (obrigatório para prompts com dados pessoais). espera_max: segundos que a
+    chamada aceita esperar por uma ficha do limite de taxa (padrão
+    LLM_ESPERA_MAX; 0 = falha na hora com ErroLLM(429)).
+    validar(resposta) → False (ou exceção) mantém a resposta fora do cache e
+    descarta uma já guardada (ex.: json_valido). Levanta ErroLLM em falha da
+    API, sem chave ou no limite local.
+    """
+    corpo = {"model": modelo, "messages": mensagens, "temperature": temperatura}
+    if max_tokens:
+        corpo["max_tokens"] = max_tokens
+    if json_obj:
+        corpo["response_format"] = {"type": "json_object"}
+    chave_api = chave_api or os.getenv("GROQ_API_KEY")
+    ttl = CACHE_TTL if cache_ttl is None else cache_ttl
+    espera_max = ESPERA_MAX if espera_max is None else espera_max
+
+    chave = _chave(corpo, endpoint)
+    if ttl:
+        resposta = _ler_cache(chave)
+        if resposta is not None:
+            if _aceita(validar, resposta):
+                with _lock:
+                    _contadores["cache"] += 1
+                return resposta
+            _esquecer(chave)
+
+    # Coalescência: o primeiro pedido chama a API; os idênticos esperam por ele
+    with _lock:
+        voo = _em_voo.get(chave)
+        lider = voo is None
+        if lider:
+            voo = _em_voo[chave] = {"evento": threading.Event(), "resposta": None, "erro": None}
+        else:
+            _contadores["coalescidas"] += 1
+
+    if not lider:
+        if not voo["evento"].wait(timeout + espera_max):
+            raise ErroLLM("Tempo esgotado aguardando resposta do LLM.")
+        if voo["erro"] is not None:
+            raise voo["erro"]
+        return voo["resposta"]
+
+    token = ""
+    try:
+        if ttl:
+            # Outro processo já está chamando com este prompt: espera o cache
+            token = _travar(chave, timeout + espera_max)
+            while token is None:
+                resposta = _esperar_outro_processo(chave, timeout + espera_max, validar)
+                if resposta is not None:
+                    with _lock:
+                        _contadores["coalescidas"] += 1
+                    voo["resposta"] = resposta
+                    return resposta
+                token = _travar(chave, timeout + espera_max)
+
+        with _lock:
+            _contadores["chamadas"] += 1
+        inicio = time.perf_counter()
+        resposta = _chamar(corpo, endpoint, chave_api, timeout, espera_max)
+        logger.info(f"[LLM] {modelo}: {len(resposta)} caracteres em {(time.perf_counter() - inicio) * 1000:.0f} ms")
+        voo["resposta"] = resposta
+        if ttl and _aceita(validar, resposta):
+            _gravar_cache(chave, resposta, ttl)
+        return resposta
+    except Exception as e:
+        voo["erro"] = e
+        raise
+    finally:
+        _destravar(chave, token)
+        with _lock:
+            _em_voo.pop(chave, None)
+        voo["evento"].set()
+
+
+def estatisticas():
+    """Contadores deste processo: chamadas à API, acertos de cache, coalescidas, espera no balde."""
+    with _lock:
+        dados = dict(_contadores)
+    dados["espera_ms"] = round(dados["espera_ms"], 1)
+    dados["cache_local_itens"] = len(_cache)
+    return dados
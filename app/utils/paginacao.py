@@ -0,0 +1,294 @@
+"""
+app/utils/paginacao.py
+─────────────────────────────────────────────────────────────────────────────
+Paginação por cursor (keyset) para listagens da loja e do admin.
+
+`.paginate()` faz COUNT(*) sobre o join filtrado + OFFSET: a página N lê e
+descarta (N-1)·per_page linhas, e robôs varrendo ?page=N caem justamente
+nesse caminho. Aqui a página seguinte é pedida "a partir da última linha
+vista":
+
+    WHERE (criado_em, id) < (:ultimo_criado_em, :ultimo_id)
+    ORDER BY criado_em DESC, id DESC LIMIT per_page + 1
+
+— custo constante em qualquer profundidade e sem COUNT.
+
+Uso:
+    ordem = ordem_por_data(Produto.criado_em, Produto.id)
+    pagina = paginar_keyset(query, ordem, request.args.get("cursor"), por_pagina=12)
+    pagina.itens, pagina.tem_proxima, pagina.url_proxima(), ...
+
+e no template, {% import "_paginacao.html" as paginacao %} +
+{{ paginacao.cursor(pagina) }}.
+
+A ordem é uma sequência de (expressão, descendente). A última chave precisa
+ser única (o id) e nenhuma pode ser NULL — use coalesce() nas que forem
+anuláveis. O cursor é opaco (JSON assinado com a SECRET_KEY) e carrega uma
+impressão da ordem: cursor de outra ordenação ou adulterado volta
+para a primeira página em vez de dar erro.
+
+O total (opcional) é aproximado, lido das estatísticas do Postgres
+(pg_class / estimativa do planejador), nunca um COUNT.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import hashlib
+import json
+import logging
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from flask import current_app, request, url_for
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import and_, func, or_, text
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+_SALT = "paginacao-keyset"
+_EPOCA = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _epoca(coluna):
+    """Data-sentinela com o mesmo tipo da coluna (timestamptz ou timestamp sem fuso)."""
+    return _EPOCA if getattr(coluna.type, "timezone", False) else _EPOCA.replace(tzinfo=None)
+
+
+# ── Ordens prontas ────────────────────────────────────────────────────────
+
+def ordem_por_data(coluna, id_coluna, descendente=True):
+    """(data, id) — mais recentes primeiro por padrão; data NULL vai para o fim."""
+    return ((func.coalesce(coluna, _epoca(coluna)), descendente), (id_coluna, descendente))
+
+
+def ordem_por_preco(coluna, id_coluna, descendente=False):
+    """(preço, id) — preço NULL conta como 0, como na vitrine."""
+    return ((func.coalesce(coluna, 0), descendente), (id_coluna, descendente))
+
+
+def ordem_por_nome(coluna, id_coluna, descendente=False):
+    """(nome, id) em ordem alfabética."""
+    return ((func.coalesce(coluna, ""), descendente), (id_coluna, descendente))
+
+
+# ── Cursor ────────────────────────────────────────────────────────────────
+
+def _serializador():
+    return URLSafeSerializer(current_app.secret_key or "m4", salt=_SALT)
+
+
+def _impressao(ordem):
+    """Identifica a ordenação para recusar cursores de outra ordem."""
+    assinatura = "|".join(f"{expr}:{int(desc)}" for expr, desc in ordem)
+    return hashlib.sha1(assinatura.encode()).hexdigest()[:8]
+
+
+def _para_json(valor):
+    if isinstance(valor, datetime):
+        return {"dt": valor.isoformat()}
+    if isinstance(valor, date):
+        return {"d": valor.isoformat()}
+    if isinstance(valor, Decimal):
+        return {"n": str(valor)}
+    return valor
+
+
+def _de_json(valor):
+    if isinstance(valor, dict):
+        if "dt" in valor:
+            return datetime.fromisoformat(valor["dt"])
+        if "d" in valor:
+            return date.fromisoformat(valor["d"])
+        if "n" in valor:
+            return Decimal(valor["n"])
+    return valor
+
+
+def codificar_cursor(ordem, valores, direcao="p"):
+    """Cursor opaco para continuar depois ('p') ou antes ('a') de `valores`."""
+    return _serializador().dumps({
+        "o": _impressao(ordem),
+        "d": direcao,
+        "v": [_para_json(v) for v in valores],
+    })
+
+
+def decodificar_cursor(ordem, cursor):
+    """(direção, valores) do cursor, ou None se inválido/de outra ordenação."""
+    if not cursor:
+        return None
+    try:
+        dados = _serializador().loads(cursor)
+    except (BadSignature, ValueError, json.JSONDecodeError):
+        return None
+    if not isinstance(dados, dict) or dados.get("o") != _impressao(ordem):
+        return None
+    valores = dados.get("v")
+    if dados.get("d") not in ("p", "a") or not isinstance(valores, list) or len(valores) != len(ordem):
+        return None
+    try:
+        return dados["d"], [_de_json(v) for v in valores]
+    except (TypeError, ValueError, ArithmeticError):
+        return None
+
+
+# ── Consulta ──────────────────────────────────────────────────────────────
+
+def _condicao_apos(ordem, valores):
+    """
+    Linhas estritamente depois de `valores` na ordem dada. Com direções
+    mistas não dá para usar (a, b) > (x, y), então vira a cadeia
+    a > x OR (a = x AND b > y) OR ...
+    """
+    alternativas = []
+    for i, (expr, descendente) in enumerate(ordem):
+        iguais = [e == v for (e, _), v in zip(ordem[:i], valores[:i])]
+        passo = expr < valores[i] if descendente else expr > valores[i]
+        alternativas.append(and_(*iguais, passo))
+    return or_(*alternativas)
+
+
+def _invertida(ordem):
+    return tuple((expr, not descendente) for expr, descendente in ordem)
+
+
+def _order_by(ordem):
+    return [expr.desc() if descendente else expr.asc() for expr, descendente in ordem]
+
+
+class PaginaKeyset:
+    """Resultado de paginar_keyset(); substitui o objeto de .paginate() nos templates."""
+
+    def __init__(self, itens, ordem, por_pagina, tem_proxima, tem_anterior,
+                 chaves_primeiro=None, chaves_ultimo=None, total_aproximado=None):
+        self.itens = itens
+        self.ordem = ordem
+        self.por_pagina = por_pagina
+        self.tem_proxima = tem_proxima
+        self.tem_anterior = tem_anterior
+        self.total_aproximado = total_aproximado
+        self._primeiro = chaves_primeiro
+        self._ultimo = chaves_ultimo
+
+    # Nomes de .paginate(), para templates que só iteram
+    @property
+    def items(self):
+        return self.itens
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+    @property
+    def cursor_proxima(self):
+        if not self.tem_proxima or self._ultimo is None:
+            return None
+        return codificar_cursor(self.ordem, self._ultimo, "p")
+
+    @property
+    def cursor_anterior(self):
+        if not self.tem_anterior or self._primeiro is None:
+            return None
+        return codificar_cursor(self.ordem, self._primeiro, "a")
+
+    def url_proxima(self, **extras):
+        return url_com_cursor(self.cursor_proxima, **extras) if self.tem_proxima else None
+
+    def url_anterior(self, **extras):
+        return url_com_cursor(self.cursor_anterior, **extras) if self.tem_anterior else None
+
+    def url_primeira(self, **extras):
+        return url_com_cursor(None, **extras)
+
+
+def paginar_keyset(query, ordem, cursor=None, por_pagina=20, total=False):
+    """
+    Página de `query` (Model.query... com uma entidade) na `ordem` dada,
+    continuando do `cursor` recebido na URL. `total=True` preenche
+    total_aproximado a partir das estatísticas do banco.
+    """
+    ordem = tuple(ordem)
+    decodificado = decodificar_cursor(ordem, cursor)
+    direcao, valores = decodificado if decodificado else ("p", None)
+
+    # Para voltar, percorre a ordem invertida a partir do primeiro item visto
+    efetiva = ordem if direcao == "p" else _invertida(ordem)
+    consulta = query
+    if valores is not None:
+        consulta = consulta.filter(_condicao_apos(efetiva, valores))
+    chaves = [expr.label(f"_chave_{i}") for i, (expr, _) in enumerate(ordem)]
+    linhas = consulta.add_columns(*chaves).order_by(None).order_by(*_order_by(efetiva))\
+        .limit(por_pagina + 1).all()
+
+    sobrou = len(linhas) > por_pagina
+    linhas = linhas[:por_pagina]
+    if direcao == "a":
+        linhas.reverse()
+        tem_anterior, tem_proxima = sobrou, True
+    else:
+        tem_anterior, tem_proxima = valores is not None, sobrou
+
+    return PaginaKeyset(
+        itens=[linha[0] for linha in linhas],
+        ordem=ordem,
+        por_pagina=por_pagina,
+        tem_proxima=tem_proxima and bool(linhas),
+        tem_anterior=tem_anterior and bool(linhas),
+        chaves_primeiro=list(linhas[0][1:]) if linhas else None,
+        chaves_ultimo=list(linhas[-1][1:]) if linhas else None,
+        total_aproximado=total_aproximado(query) if total else None,
+    )
+
+
+def url_com_cursor(cursor, **extras):
+    """URL da requisição atual trocando o cursor (e descartando ?page= legado)."""
+    args = request.args.to_dict(flat=False)
+    args.pop("page", None)
+    args.pop("cursor", None)
+    args.update(extras)
+    if cursor:
+        args["cursor"] = cursor
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+
+# ── Total aproximado ──────────────────────────────────────────────────────
+
+def total_tabela(tabela):
+    """Nº de linhas da tabela segundo pg_class.reltuples (ANALYZE/autovacuum)."""
+    conexao = db.session.connection()
+    if conexao.dialect.name != "postgresql":
+        return None
+    valor = conexao.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:tabela)"),
+        {"tabela": tabela},
+    ).scalar()
+    # -1 = tabela nunca analisada
+    return int(valor) if valor is not None and valor >= 0 else None
+
+
+def total_aproximado(query):
+    """
+    Estimativa de linhas de `query`: sem filtros, pg_class da tabela; com
+    filtros, o "Plan Rows" do EXPLAIN (que usa as mesmas estatísticas).
+    Fora do Postgres devolve None (o template simplesmente omite o total).
+    """
+    conexao = db.session.connection()
+    if conexao.dialect.name != "postgresql":
+        return None
+    try:
+        instrucao = query.order_by(None).statement
+        if instrucao.whereclause is None and len(instrucao.get_final_froms()) == 1:
+            return total_tabela(instrucao.get_final_froms()[0].name)
+        compilado = instrucao.compile(dialect=conexao.dialect)
+        # Savepoint: um EXPLAIN que falhe não pode abortar a transação da view
+        with db.session.begin_nested():
+            plano = conexao.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compilado}", compilado.params).scalar()
+        if isinstance(plano, str):
+            plano = json.loads(plano)
+        return int(plano[0]["Plan"]["Plan Rows"])
+    except Exception as e:
+        logger.warning(f"[PAGINACAO] Estimativa de total indisponível: {e}")
+        return None
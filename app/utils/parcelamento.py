@@ -1,22 +1,19 @@
 # app/utils/parcelamento.py
-from typing import List, Dict, Iterable
+from typing import List, Dict, Iterable, Optional
 
-def gerar_linhas_parcelas(valor_base: float, taxas: Iterable) -> List[Dict[str, float]]:
+
+def coeficientes_parcelas(taxas: Iterable) -> List[Dict]:
     """
-    Gera linhas de parcelamento com base em uma lista de taxas.
-    Cada taxa deve ter:
+    Vetor compacto de coeficientes, calculado uma vez por versão das taxas
+    (ver app/services/parcelamento.coeficientes_vigentes).
+
+    Cada item: {"rotulo", "parcelas", "coef"}; para um valor base,
+    total = base / coef e parcela = total / parcelas. O PIX vem primeiro
+    (coef 1, sempre o valor à vista). Cada taxa deve ter:
       - numero_parcelas (int)
       - juros (float, percentual)
     """
-    base = float(valor_base or 0.0)
-    linhas: List[Dict[str, float]] = []
-
-    # --- PIX fixo (sempre o valor à vista) ---
-    linhas.append({
-        "rotulo": "PIX",
-        "parcela": base,
-        "total": base
-    })
+    coeficientes: List[Dict] = [{"rotulo": "PIX", "parcelas": 1, "coef": 1.0, "pix": True}]
 
     # Ordena pelas parcelas
     taxas_ordenadas = sorted(
@@ -26,15 +23,12 @@ def gerar_linhas_parcelas(valor_base: float, taxas: Iterable) -> List[Dict[str,
 
     for t in taxas_ordenadas:
         n = int(getattr(t, "numero_parcelas", 1))
-        j_percent = float(getattr(t, "juros", 0.0))
+        j_percent = float(getattr(t, "juros", 0.0) or 0.0)
 
         # converte juros percentual em coeficiente
         j = j_percent / 100.0
         coef = max(1.0 - j, 1e-9)
 
-        total = base / coef
-        parcela = total / (n if n > 0 else 1)
-
         # Rótulos
         if n == 0:
             rotulo = "Débito"
@@ -43,10 +37,43 @@ def gerar_linhas_parcelas(valor_base: float, taxas: Iterable) -> List[Dict[str,
         else:
             rotulo = f"{n}x"
 
-        linhas.append({
-            "rotulo": rotulo,
-            "parcela": parcela,
-            "total": total
-        })
+        coeficientes.append({"rotulo": rotulo, "parcelas": n, "coef": coef})
+
+    return coeficientes
+
+
+def linhas_por_coeficientes(valor_base: float, coeficientes: Iterable[Dict]) -> List[Dict[str, float]]:
+    """Linhas de parcelamento de um valor a partir do vetor de coeficientes."""
+    base = float(valor_base or 0.0)
+    linhas: List[Dict[str, float]] = []
+
+    for c in coeficientes:
+        if c.get("pix"):
+            # --- PIX fixo (sempre o valor à vista) ---
+            linhas.append({"rotulo": c["rotulo"], "parcela": base, "total": base})
+            continue
+
+        n = c["parcelas"]
+        total = base / c["coef"]
+        parcela = total / (n if n > 0 else 1)
+        linhas.append({"rotulo": c["rotulo"], "parcela": parcela, "total": total})
 
     return linhas
+
+
+def parcela_por_coeficientes(valor_base: float, coeficientes: Iterable[Dict], parcelas: int = 12) -> Optional[float]:
+    """Valor da parcela em N vezes (ex.: linha "12x de R$…" dos cards), ou None."""
+    for c in coeficientes:
+        if not c.get("pix") and c["parcelas"] == parcelas:
+            return float(valor_base or 0.0) / c["coef"] / (parcelas if parcelas > 0 else 1)
+    return None
+
+
+def gerar_linhas_parcelas(valor_base: float, taxas: Iterable) -> List[Dict[str, float]]:
+    """
+    Gera linhas de parcelamento com base em uma lista de taxas.
+    Cada taxa deve ter:
+      - numero_parcelas (int)
+      - juros (float, percentual)
+    """
+    return linhas_por_coeficientes(valor_base, coeficientes_parcelas(taxas))
@@ -11,6 +11,9 @@ REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 # Inicializa variáveis como None para o caso de falha
 redis_conn = None
 fila_certidoes = None
+fila_precos = None  # reprecificação em lote (app/services/reprecificacao.py)
+fila_thumbs = None  # thumbnails/variantes de imagem (app/utils/thumb_hooks.py)
+fila_ocr = None  # OCR de documentos enviados direto ao R2 (app/uploads/ocr_jobs.py)
 
 try:
     # Tenta criar a conexão
@@ -21,16 +24,25 @@ try:
     
     # Se passou do ping, cria a fila
     fila_certidoes = Queue("m4_certidoes", connection=redis_conn)
+    fila_precos = Queue("m4_precos", connection=redis_conn)
+    fila_thumbs = Queue("m4_thumbs", connection=redis_conn)
+    fila_ocr = Queue("m4_ocr", connection=redis_conn)
     
     print(f"[QUEUE] Conectado ao Redis com sucesso: {REDIS_URL}")
 
 except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError):
     print(f"[QUEUE] AVISO: Não foi possível conectar ao Redis em {REDIS_URL}.")
-    print("[QUEUE] O sistema rodará em modo SÍNCRONO (sem fila) para Certidões.")
+    print("[QUEUE] O sistema rodará em modo SÍNCRONO (sem fila) para Certidões, Reprecificação, Thumbnails e OCR.")
     redis_conn = None
     fila_certidoes = None
+    fila_precos = None
+    fila_thumbs = None
+    fila_ocr = None
 
 except Exception as e:
     print(f"[QUEUE] Erro inesperado ao configurar Redis: {e}")
     redis_conn = None
-    fila_certidoes = None
\ No newline at end of file
+    fila_certidoes = None
+    fila_precos = None
+    fila_thumbs = None
+    fila_ocr = None
\ No newline at end of file
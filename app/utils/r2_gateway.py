@@ -0,0 +1,392 @@
+"""
+app/utils/r2_gateway.py
+─────────────────────────────────────────────────────────────────────────────
+Cliente único do R2 (S3) para o processo inteiro.
+
+Antes havia uma fábrica por módulo (utils/storage.get_s3,
+services/storage.get_s3_client, produtos.routes.utils._r2_client,
+thumbnail_utils._get_r2_client, uploads/services.get_s3...) e cada chamada
+criava um boto3.client novo: resolvia credenciais, montava o endpoint e
+jogava fora o pool HTTP — todo upload/presign pagava um handshake TLS.
+
+Agora todas delegam para cliente():
+
+    - um boto3.client por (endpoint, credenciais, região), criado sob lock
+      e reutilizado por todas as threads (clientes boto3 são thread-safe;
+      a criação a partir da sessão padrão é que não é);
+    - recriado após fork (gunicorn/RQ herdam o processo pai, mas não podem
+      compartilhar os sockets do pool);
+    - pool de R2_MAX_POOL conexões (padrão 32), retentativas "standard"
+      (R2_MAX_TENTATIVAS, padrão 4) e timeouts curtos de conexão.
+
+Operações usadas pelo app, com o bucket explícito:
+
+    put(bucket, key, corpo, content_type=...)   get(bucket, key) → bytes | None
+    head(bucket, key) → dict | None             delete(bucket, key)
+    presign(bucket, key, expira=3600)           listar(bucket, prefixo) → iterador
+    link_assinado(bucket, key, expira=3600)     presign GET reaproveitado (cache)
+
+Testes: usar_fake() instala um ArmazenamentoMemoria (ou em disco, com
+`pasta=`) no lugar do boto3 — todas as fábricas passam a devolvê-lo.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import hashlib
+import io
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+from flask import current_app, has_app_context
+
+from app.utils.cache_backend import LRULocal
+
+logger = logging.getLogger(__name__)
+
+MAX_POOL = int(os.getenv("R2_MAX_POOL", 32))
+MAX_TENTATIVAS = int(os.getenv("R2_MAX_TENTATIVAS", 4))
+MAX_LINKS = int(os.getenv("R2_MAX_LINKS", 2048))
+
+_lock = threading.Lock()
+_clientes = {}
+_pid = os.getpid()
+_fake = None
+
+# Nomes aceitos para cada credencial (config do Flask ou .env), na ordem
+_NOMES = {
+    "endpoint": ("R2_ENDPOINT_URL", "R2_ENDPOINT"),
+    "access_key": ("R2_ACCESS_KEY_ID", "R2_ACCESS_KEY"),
+    "secret_key": ("R2_SECRET_ACCESS_KEY", "R2_SECRET_KEY"),
+}
+
+
+def _valor(nomes):
+    for nome in nomes:
+        valor = current_app.config.get(nome) if has_app_context() else None
+        valor = valor or os.getenv(nome)
+        if valor:
+            return valor
+    return None
+
+
+def credenciais():
+    """(endpoint, access_key, secret_key, região) do app.config ou do .env."""
+    regiao = (current_app.config.get("R2_REGION_NAME") if has_app_context() else None) or "auto"
+    return (
+        _valor(_NOMES["endpoint"]),
+        _valor(_NOMES["access_key"]),
+        _valor(_NOMES["secret_key"]),
+        regiao,
+    )
+
+
+def configurado():
+    return _fake is not None or all(credenciais()[:3])
+
+
+def _criar(endpoint, access_key, secret_key, regiao):
+    import boto3
+    from botocore.config import Config
+
+    config = Config(
+        signature_version="s3v4",
+        max_pool_connections=MAX_POOL,
+        retries={"max_attempts": MAX_TENTATIVAS, "mode": "standard"},
+        connect_timeout=5,
+        read_timeout=60,
+        tcp_keepalive=True,
+    )
+    # Sessão própria: boto3.client() usa a sessão padrão global, que não é thread-safe
+    return boto3.session.Session().client(
+        "s3",
+        endpoint_url=endpoint,
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        region_name=regiao,
+        config=config,
+    )
+
+
+def cliente():
+    """
+    Cliente S3 compartilhado do processo, ou None se o R2 não estiver
+    configurado (ou o boto3 não estiver instalado).
+    """
+    global _pid
+    if _fake is not None:
+        return _fake
+
+    endpoint, access_key, secret_key, regiao = credenciais()
+    if not all([endpoint, access_key, secret_key]):
+        logger.debug("Credenciais R2 não configuradas — boto3 não iniciado.")
+        return None
+
+    chave = (endpoint, access_key, hashlib.sha1(secret_key.encode()).hexdigest(), regiao)
+    existente = _clientes.get(chave)
+    if existente is not None and _pid == os.getpid():
+        return existente
+
+    with _lock:
+        if _pid != os.getpid():
+            # Processo filho: o pool herdado aponta para sockets do pai
+            _clientes.clear()
+            _pid = os.getpid()
+        existente = _clientes.get(chave)
+        if existente is None:
+            try:
+                existente = _criar(endpoint, access_key, secret_key, regiao)
+            except ImportError:
+                logger.warning("boto3 não instalado — R2 indisponível.")
+                return None
+            _clientes[chave] = existente
+            logger.info(f"[R2] Cliente criado (pool={MAX_POOL}, tentativas={MAX_TENTATIVAS}, pid={_pid})")
+        return existente
+
+
+def _exigir_cliente():
+    s3 = cliente()
+    if s3 is None:
+        raise RuntimeError("⚠️ Variáveis R2_* não configuradas no ambiente.")
+    return s3
+
+
+def _nao_encontrado(erro):
+    resposta = getattr(erro, "response", None) or {}
+    codigo = str(resposta.get("Error", {}).get("Code", ""))
+    return codigo in ("404", "NoSuchKey", "NotFound")
+
+
+# ── Operações ─────────────────────────────────────────────────────────────
+
+def put(bucket, key, corpo, content_type=None, cache_control=None, **extras):
+    """Grava `corpo` (bytes ou arquivo) em bucket/key."""
+    parametros = {"Bucket": bucket, "Key": key, "Body": corpo, **extras}
+    if content_type:
+        parametros["ContentType"] = content_type
+    if cache_control:
+        parametros["CacheControl"] = cache_control
+    _exigir_cliente().put_object(**parametros)
+    return key
+
+
+def get(bucket, key, intervalo=None):
+    """
+    Conteúdo do objeto, ou None se ele não existir. `intervalo=(inicio, fim)`
+    lê só esses bytes (inclusive), ex.: (0, 15) para conferir a assinatura.
+    """
+    parametros = {"Bucket": bucket, "Key": key}
+    if intervalo:
+        parametros["Range"] = f"bytes={intervalo[0]}-{intervalo[1]}"
+    try:
+        resposta = _exigir_cliente().get_object(**parametros)
+    except Exception as e:
+        if _nao_encontrado(e):
+            return None
+        raise
+    return resposta["Body"].read()
+
+
+def head(bucket, key):
+    """Metadados do objeto (ContentLength, ContentType, ETag...), ou None."""
+    try:
+        return _exigir_cliente().head_object(Bucket=bucket, Key=key)
+    except Exception as e:
+        if _nao_encontrado(e):
+            return None
+        raise
+
+
+def delete(bucket, key):
+    """Remove o objeto (sem erro se ele já não existir)."""
+    _exigir_cliente().delete_object(Bucket=bucket, Key=key)
+    return True
+
+
+def presign(bucket, key, expira=3600, metodo="get_object", **parametros):
+    """URL assinada para `metodo` (get_object, put_object...) válida por `expira` s."""
+    return _exigir_cliente().generate_presigned_url(
+        metodo,
+        Params={"Bucket": bucket, "Key": key, **parametros},
+        ExpiresIn=expira,
+    )
+
+
+# ── Links assinados reaproveitados ────────────────────────────────────────
+#
+# Templates chamam gerar_link()/gerar_link_r2() a cada render: uma página de
+# cliente com dezenas de documentos/armas fazia dezenas de assinaturas HMAC,
+# e cada URL nova (X-Amz-Date diferente) anulava o cache do navegador.
+# A validade pedida é arredondada PARA BAIXO para um degrau de
+# _VALIDADES (nunca assina por mais tempo do que o pedido) e a mesma URL é
+# devolvida para (access key, bucket, key, degrau) por só 1/4 do degrau:
+# quem a recebe do cache ainda tem pelo menos 3/4 da validade, e o
+# navegador reaproveita o download. Trocar a credencial troca a chave.
+
+_VALIDADES = (60, 300, 900, 3600, 6 * 3600, 86400, 7 * 86400)
+
+_links = LRULocal(MAX_LINKS)
+
+
+def _degrau(expira):
+    """Maior degrau de _VALIDADES que não passa de `expira` (None se < 60 s)."""
+    return next((v for v in reversed(_VALIDADES) if v <= expira), None)
+
+
+def link_assinado(bucket, key, expira=3600):
+    """URL GET assinada de bucket/key, reaproveitada enquanto restar ≥ 3/4 da validade."""
+    validade = _degrau(int(expira))
+    if validade is None:
+        return presign(bucket, key, expira=int(expira))
+    access_key = "fake" if _fake is not None else credenciais()[1]
+    chave = (access_key, bucket, key, validade)
+    url = _links.get(chave)
+    if url is None:
+        url = presign(bucket, key, expira=validade)
+        _links.set(chave, url, validade // 4)
+    return url
+
+
+def listar(bucket, prefixo=""):
+    """Itera sobre os objetos (dicts Key/Size/LastModified/ETag) sob `prefixo`."""
+    paginador = _exigir_cliente().get_paginator("list_objects_v2")
+    for pagina in paginador.paginate(Bucket=bucket, Prefix=prefixo):
+        yield from pagina.get("Contents", [])
+
+
+# ── Fake para testes ──────────────────────────────────────────────────────
+
+def _erro_cliente(codigo, operacao):
+    try:
+        from botocore.exceptions import ClientError
+    except ImportError:  # pragma: no cover - boto3 é dependência do app
+        ClientError = None
+    resposta = {"Error": {"Code": codigo, "Message": codigo}, "ResponseMetadata": {"HTTPStatusCode": 404}}
+    if ClientError is None:
+        erro = Exception(codigo)
+        erro.response = resposta
+        return erro
+    return ClientError(resposta, operacao)
+
+
+class _Excecoes:
+    """Imita client.exceptions.NoSuchKey do boto3."""
+
+    def __init__(self):
+        try:
+            from botocore.exceptions import ClientError
+        except ImportError:  # pragma: no cover
+            ClientError = Exception
+        self.ClientError = ClientError
+        self.NoSuchKey = type("NoSuchKey", (ClientError,), {})
+
+
+class _Paginador:
+    def __init__(self, armazenamento):
+        self.armazenamento = armazenamento
+
+    def paginate(self, Bucket, Prefix="", **_):
+        yield self.armazenamento.list_objects_v2(Bucket=Bucket, Prefix=Prefix)
+
+
+class ArmazenamentoMemoria:
+    """
+    Subconjunto do cliente S3 do boto3 (put/get/head/delete/copy/list,
+    upload_fileobj, presign) guardando os objetos num dict — ou em disco,
+    em `pasta/<bucket>/<key>`, para inspecionar o resultado de scripts.
+    """
+
+    def __init__(self, pasta=None):
+        self.pasta = Path(pasta) if pasta else None
+        self.objetos = {}
+        self.exceptions = _Excecoes()
+
+    # Persistência
+    def _gravar(self, bucket, key, dados, meta):
+        if self.pasta:
+            destino = self.pasta / bucket / key
+            destino.parent.mkdir(parents=True, exist_ok=True)
+            destino.write_bytes(dados)
+        self.objetos[(bucket, key)] = (dados if not self.pasta else None, meta)
+
+    def _ler(self, bucket, key, operacao):
+        if (bucket, key) not in self.objetos:
+            raise _erro_cliente("NoSuchKey" if operacao == "GetObject" else "404", operacao)
+        dados, meta = self.objetos[(bucket, key)]
+        if dados is None:
+            dados = (self.pasta / bucket / key).read_bytes()
+        return dados, meta
+
+    # API do boto3
+    def put_object(self, Bucket, Key, Body=b"", ContentType=None, **extras):
+        dados = Body.read() if hasattr(Body, "read") else bytes(Body)
+        meta = {
+            "ContentLength": len(dados),
+            "ContentType": ContentType or "binary/octet-stream",
+            "ETag": f'"{hashlib.md5(dados).hexdigest()}"',
+            "LastModified": datetime.now(timezone.utc),
+            **{k: v for k, v in extras.items() if k in ("CacheControl", "Metadata")},
+        }
+        self._gravar(Bucket, Key, dados, meta)
+        return {"ETag": meta["ETag"]}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, **_):
+        self.put_object(Bucket=Bucket, Key=Key, Body=Fileobj, **(ExtraArgs or {}))
+
+    def get_object(self, Bucket, Key, Range=None, **_):
+        dados, meta = self._ler(Bucket, Key, "GetObject")
+        if Range:
+            inicio, fim = Range.split("=", 1)[1].split("-")
+            dados = dados[int(inicio):int(fim) + 1]
+        return {**meta, "ContentLength": len(dados), "Body": io.BytesIO(dados)}
+
+    def head_object(self, Bucket, Key, **_):
+        _, meta = self._ler(Bucket, Key, "HeadObject")
+        return dict(meta)
+
+    def delete_object(self, Bucket, Key, **_):
+        self.objetos.pop((Bucket, Key), None)
+        if self.pasta:
+            (self.pasta / Bucket / Key).unlink(missing_ok=True)
+        return {}
+
+    def copy_object(self, Bucket, Key, CopySource, **extras):
+        dados, meta = self._ler(CopySource["Bucket"], CopySource["Key"], "CopyObject")
+        return self.put_object(Bucket=Bucket, Key=Key, Body=dados,
+                               ContentType=extras.get("ContentType", meta["ContentType"]))
+
+    def list_objects_v2(self, Bucket, Prefix="", **_):
+        conteudo = [
+            {"Key": key, "Size": meta["ContentLength"], "ETag": meta["ETag"],
+             "LastModified": meta["LastModified"]}
+            for (bucket, key), (_, meta) in sorted(self.objetos.items())
+            if bucket == Bucket and key.startswith(Prefix)
+        ]
+        return {"Contents": conteudo, "KeyCount": len(conteudo), "IsTruncated": False}
+
+    def get_paginator(self, operacao):
+        if operacao != "list_objects_v2":
+            raise NotImplementedError(operacao)
+        return _Paginador(self)
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600, **_):
+        params = Params or {}
+        return f"memoria://{params.get('Bucket')}/{params.get('Key')}?metodo={ClientMethod}&expira={ExpiresIn}"
+
+
+def usar_fake(armazenamento=None, pasta=None):
+    """Substitui o R2 por um ArmazenamentoMemoria (devolvido) até resetar()."""
+    global _fake
+    _fake = armazenamento or ArmazenamentoMemoria(pasta=pasta)
+    _links.clear()
+    return _fake
+
+
+def resetar():
+    """Remove o fake e descarta os clientes criados (ex.: após trocar credenciais)."""
+    global _fake
+    with _lock:
+        _fake = None
+        _clientes.clear()
+    _links.clear()
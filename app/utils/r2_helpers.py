@@ -1,3 +1,4 @@
+from app.utils import r2_gateway
 from app.utils.storage import get_s3, get_bucket, upload_file
 from werkzeug.utils import secure_filename
 import logging
@@ -61,13 +62,8 @@ def gerar_link_r2(caminho_arquivo: str, expiracao: int = 3600) -> str:
             return f"{CDN_URL}/{caminho_arquivo}"
 
         # 🔒 SEGURANÇA: Links assinados para o que restou no bucket privado
-        s3 = get_s3()
-        url = s3.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": BUCKET_PRIVADO, "Key": caminho_arquivo},
-            ExpiresIn=expiracao,
-        )
-        return url
+        # (reaproveitados até perto de expirar — ver r2_gateway.link_assinado)
+        return r2_gateway.link_assinado(BUCKET_PRIVADO, caminho_arquivo, expiracao)
 
     except Exception as e:
         logging.error(f"[R2] Erro ao gerar link para {caminho_arquivo}: {e}")
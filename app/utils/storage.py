@@ -4,14 +4,14 @@
 """
 Utilitários centralizados para upload e leitura de arquivos
 usando o Cloudflare R2 (ou qualquer endpoint compatível S3).
-Permite reutilizar a conexão e padronizar prefixos de pastas.
+Reutiliza a conexão (cliente único do r2_gateway) e padronizar prefixos de pastas.
 
 Usado por: app/clientes/routes.py, app/uploads/routes.py, etc.
 """
 
-import boto3
 import os
-from botocore.client import Config
+
+from app.utils import r2_gateway
 
 
 # ========================================
@@ -20,27 +20,16 @@ from botocore.client import Config
 
 def get_s3():
     """
-    Retorna o cliente S3 configurado para Cloudflare R2.
+    Retorna o cliente S3 configurado para Cloudflare R2 (compartilhado
+    pelo processo — ver app/utils/r2_gateway.py).
     As credenciais e endpoint devem estar definidas no .env:
         R2_ENDPOINT_URL
         R2_ACCESS_KEY_ID
         R2_SECRET_ACCESS_KEY
     """
-    endpoint_url = os.getenv("R2_ENDPOINT_URL")
-    access_key = os.getenv("R2_ACCESS_KEY_ID")
-    secret_key = os.getenv("R2_SECRET_ACCESS_KEY")
-
-    if not all([endpoint_url, access_key, secret_key]):
+    s3 = r2_gateway.cliente()
+    if s3 is None:
         raise RuntimeError("⚠️ Variáveis R2_* não configuradas no ambiente.")
-
-    s3 = boto3.client(
-        "s3",
-        endpoint_url=endpoint_url,
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
-        config=Config(signature_version="s3v4"),
-        region_name="auto",  # Cloudflare usa região 'auto'
-    )
     return s3
 
 
@@ -74,17 +63,11 @@ def upload_file(file_obj, caminho_destino: str):
 def gerar_link_publico(caminho_arquivo: str, expira_segundos: int = 3600) -> str:
     """
     Gera um link pré-assinado (válido por tempo limitado)
-    para abrir o arquivo armazenado no R2.
+    para abrir o arquivo armazenado no R2. O mesmo link é reaproveitado
+    enquanto ainda tiver folga de validade (r2_gateway.link_assinado).
     """
-    s3 = get_s3()
-    bucket = get_bucket()
-
-    url = s3.generate_presigned_url(
-        "get_object",
-        Params={"Bucket": bucket, "Key": caminho_arquivo},
-        ExpiresIn=expira_segundos,
-    )
-    return url
+    get_s3()  # falha cedo se o R2 não estiver configurado
+    return r2_gateway.link_assinado(get_bucket(), caminho_arquivo, expira_segundos)
 
 
 def deletar_arquivo(caminho_arquivo: str) -> bool:
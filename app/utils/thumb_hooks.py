@@ -3,16 +3,43 @@ app/utils/thumb_hooks.py
 ─────────────────────────────────────────────────────────────────────────────
 Hooks SQLAlchemy para gerar thumbnails automaticamente.
 Atualizado para buscar bytes via Boto3 e rodar dentro do Application Context.
+
+Os hooks só anotam a URL na sessão; no after_commit cada imagem vira um job
+na fila RQ 'm4_thumbs' (app/utils/queue.py), processada pelo
+workers/worker_thumbs.py com concorrência limitada (THUMB_WORKERS):
+
+  - deduplicação por r2_key: a mesma imagem pendente não entra duas vezes
+    (salvar o produto 10 vezes num autosave gera 1 job)
+  - retentativas com espera crescente (falha de rede no R2 não perde o job)
+  - sobrevive a restart do web worker (o job está no Redis)
+
+Sem Redis (dev), o job roda síncrono no próprio processo, após o commit:
+erros aparecem no log do request e nada fica para trás se o processo cair.
+THUMBS_FALLBACK_THREAD=1 troca isso por um executor de uma thread (o
+request não espera o R2 nem o Pillow, mas o job morre com o processo).
 ─────────────────────────────────────────────────────────────────────────────
 """
 
 import logging
+import os
 import threading
+from concurrent.futures import ThreadPoolExecutor
+
 from sqlalchemy import event
+from sqlalchemy.orm import Session
 
 logger = logging.getLogger(__name__)
 
 _hooks_registered = False
+_INFO_KEY = "m4_thumbs_pendentes"
+_PREFIXO_PENDENTE = "m4:thumbs:pendente:"
+_PENDENTE_TTL = 3600
+_RETENTATIVAS = (30, 120, 600)  # segundos entre tentativas
+
+_FALLBACK_THREAD = os.environ.get("THUMBS_FALLBACK_THREAD", "").lower() in ("1", "true", "sim")
+
+_executor = None
+_executor_lock = threading.Lock()
 
 def _baixar_imagem_boto3(image_url: str):
     """
@@ -41,56 +68,149 @@ def _baixar_imagem_boto3(image_url: str):
         logger.error(f"thumb_hook: Falha ao baixar {key} via Boto3: {e}")
         return None
 
-def _gerar_thumbs_async(app, image_url: str, cdn_base: str):
-    """Gera thumbnails em thread separada DENTRO DO CONTEXTO DO FLASK."""
-    with app.app_context():
-        from app.utils.thumbnail_utils import (
-            generate_thumbnail, upload_thumb_to_r2, _strip_cdn_prefix
-        )
-        from pathlib import Path
+def gerar_thumbs_para_url(image_url: str) -> dict:
+    """
+    Job da fila m4_thumbs: baixa a imagem, gera thumbs (e a escada
+    responsiva, para fotos de produto) e envia ao R2. Levanta exceção em
+    falha para o RQ aplicar as retentativas.
+    """
+    from app.utils.thumbnail_utils import (
+        THUMB_SIZES, LARGURAS_VARIANTES, decodificar_imagem, gerar_thumbnails,
+        upload_thumb_to_r2, _strip_cdn_prefix, process_image_variants
+    )
+    from pathlib import Path
+
+    r2_key = _strip_cdn_prefix(image_url)
+    _liberar_pendente(r2_key)  # mudanças a partir daqui geram novo job
+
+    # Baixa a imagem com as credenciais do servidor (blindado contra 401)
+    image_bytes = _baixar_imagem_boto3(image_url)
+    if not image_bytes:
+        raise RuntimeError(f"thumb_hook: não foi possível obter bytes da imagem: {image_url}")
+
+    p = Path(r2_key)
+    base_key = str(p.parent / p.stem)
+
+    logo = 'logos' in r2_key or 'marcas' in r2_key
+    sizes = ['t80'] if logo else ['t280', 't160']
+
+    # Uma decodificação serve aos thumbs e à escada responsiva
+    maior_lado = max(max(THUMB_SIZES[s]) for s in sizes)
+    if not logo:
+        maior_lado = max(maior_lado, *LARGURAS_VARIANTES)
+    imagem = decodificar_imagem(image_bytes, maior_lado)
+    thumbs = gerar_thumbnails(sizes=sizes, imagem=imagem)
+
+    enviados = {}
+    for size_key, thumb_bytes in thumbs.items():
+        thumb_key = f"{base_key}_{size_key}.webp"
+        if upload_thumb_to_r2(thumb_bytes, thumb_key):
+            enviados[size_key] = thumb_key
+            logger.info(f"thumb_hook ✓ {size_key} gerado com sucesso.")
+    if len(enviados) < len(thumbs):
+        raise RuntimeError(f"thumb_hook: upload incompleto para {r2_key} ({sorted(enviados)})")
+
+    # Fotos de produto: escada responsiva AVIF/WebP para o <picture>
+    if not logo:
+        try:
+            process_image_variants(image_bytes, r2_key, imagem=imagem)
+        except Exception as e:
+            logger.error(f"thumb_hook ✗ erro nas variantes de {r2_key}: {e}")
+    return enviados
+
+
+# ── Fila ──────────────────────────────────────────────────────────────────
+
+def _liberar_pendente(r2_key: str):
+    from app.utils import queue
+    if queue.redis_conn is not None:
+        try:
+            queue.redis_conn.delete(_PREFIXO_PENDENTE + r2_key)
+        except Exception as e:
+            logger.warning(f"thumb_hook: falha ao liberar pendência de {r2_key}: {e}")
+
+
+def _executor_local():
+    """Executor de 1 thread do processo (fallback sem Redis, opt-in)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thumbs")
+        return _executor
+
+
+def _gerar_em_thread(app, image_url: str):
+    try:
+        if app is None:
+            gerar_thumbs_para_url(image_url)
+        else:
+            with app.app_context():
+                gerar_thumbs_para_url(image_url)
+    except Exception as e:
+        logger.error(f"thumb_hook ✗ {e}")
+
+
+def enfileirar_thumbs(image_url: str) -> str:
+    """
+    Agenda a geração dos thumbs de uma imagem.
+    Retorna 'fila', 'duplicado' (já pendente), 'sincrono' ou, sem Redis e
+    com THUMBS_FALLBACK_THREAD, 'thread'.
+    """
+    from app.utils import queue
+    from app.utils.thumbnail_utils import _strip_cdn_prefix
 
-        # Baixa a imagem com as credenciais do servidor (blindado contra 401)
-        image_bytes = _baixar_imagem_boto3(image_url)
-        if not image_bytes:
-            logger.warning(f"thumb_hook: não foi possível obter bytes da imagem: {image_url}")
-            return
+    if queue.fila_thumbs is not None:
+        from rq import Retry
 
         r2_key = _strip_cdn_prefix(image_url)
-        p = Path(r2_key)
-        base_key = str(p.parent / p.stem)
+        try:
+            if not queue.redis_conn.set(_PREFIXO_PENDENTE + r2_key, 1, nx=True, ex=_PENDENTE_TTL):
+                return "duplicado"
+            queue.fila_thumbs.enqueue(
+                gerar_thumbs_para_url, image_url,
+                retry=Retry(max=len(_RETENTATIVAS), interval=list(_RETENTATIVAS)),
+                job_timeout=300,
+                description=f"thumbs {r2_key}",
+            )
+            return "fila"
+        except Exception as e:
+            _liberar_pendente(r2_key)
+            logger.error(f"thumb_hook: falha ao enfileirar {r2_key}, gerando no processo: {e}")
+
+    if _FALLBACK_THREAD:
+        from flask import current_app, has_app_context
+
+        # A thread não herda o app context do request
+        app = current_app._get_current_object() if has_app_context() else None
+        _executor_local().submit(_gerar_em_thread, app, image_url)
+        return "thread"
 
-        if 'logos' in r2_key or 'marcas' in r2_key:
-            sizes = ['t80']
-        else:
-            sizes = ['t280', 't160']
-
-        for size_key in sizes:
-            try:
-                thumb_bytes = generate_thumbnail(image_bytes, size_key)
-                thumb_key = f"{base_key}_{size_key}.webp"
-                ok = upload_thumb_to_r2(thumb_bytes, thumb_key)
-                if ok:
-                    logger.info(f"thumb_hook ✓ {size_key} gerado com sucesso.")
-            except Exception as e:
-                logger.error(f"thumb_hook ✗ erro em {size_key} para {r2_key}: {e}")
-
-def _disparar_thumb(instance, url_field: str):
-    import os
-    from flask import current_app
-    
-    cdn_base = os.environ.get('CDN_BASE_URL', 'https://cdn.m4tatica.com.br')
-    url = getattr(instance, url_field, None)
-    if not url: return
+    try:
+        gerar_thumbs_para_url(image_url)
+    except Exception as e:
+        logger.error(f"thumb_hook ✗ {e}")
+    return "sincrono"
 
-    # Pega a instância real do app para passar para a thread
-    app = current_app._get_current_object()
 
-    t = threading.Thread(
-        target=_gerar_thumbs_async,
-        args=(app, url, cdn_base),
-        daemon=True,
-    )
-    t.start()
+# ── Hooks ─────────────────────────────────────────────────────────────────
+
+def _marcar(target, url_field: str):
+    """Anota a URL na sessão; o job só sai se a transação for confirmada."""
+    from sqlalchemy.orm import object_session
+
+    url = getattr(target, url_field, None)
+    sessao = object_session(target)
+    if url and sessao is not None:
+        sessao.info.setdefault(_INFO_KEY, set()).add(url)
+
+
+def _apos_commit(sessao):
+    for url in sorted(sessao.info.pop(_INFO_KEY, ())):
+        enfileirar_thumbs(url)
+
+
+def _apos_rollback(sessao):
+    sessao.info.pop(_INFO_KEY, None)
 
 def registrar_hooks():
     global _hooks_registered
@@ -102,25 +222,28 @@ def registrar_hooks():
 
         @event.listens_for(Produto, 'after_insert')
         def after_produto_insert(mapper, connection, target):
-            if target.foto_url: _disparar_thumb(target, 'foto_url')
+            if target.foto_url: _marcar(target, 'foto_url')
 
         @event.listens_for(Produto, 'after_update')
         def after_produto_update(mapper, connection, target):
             from sqlalchemy import inspect
             hist = inspect(target).attrs.foto_url.history
             if hist.has_changes() and target.foto_url:
-                _disparar_thumb(target, 'foto_url')
+                _marcar(target, 'foto_url')
 
         @event.listens_for(MarcaProduto, 'after_insert')
         def after_marca_insert(mapper, connection, target):
-            if target.logo_url: _disparar_thumb(target, 'logo_url')
+            if target.logo_url: _marcar(target, 'logo_url')
 
         @event.listens_for(MarcaProduto, 'after_update')
         def after_marca_update(mapper, connection, target):
             from sqlalchemy import inspect
             hist = inspect(target).attrs.logo_url.history
             if hist.has_changes() and target.logo_url:
-                _disparar_thumb(target, 'logo_url')
+                _marcar(target, 'logo_url')
+
+        event.listen(Session, 'after_commit', _apos_commit)
+        event.listen(Session, 'after_rollback', _apos_rollback)
 
         _hooks_registered = True
         logger.info("thumb_hooks: listeners registrados para Produto e MarcaProduto")
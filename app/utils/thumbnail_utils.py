@@ -3,6 +3,10 @@ app/utils/thumbnail_utils.py
 ─────────────────────────────────────────────────────────────────────────────
 Geração de thumbnails no servidor para resolver o problema de imagens
 oversized apontado pelo PageSpeed Insights.
+
+Além dos thumbs quadrados fixos (t280/t160/t80, cards e logos), gera uma
+escada de variantes responsivas (<stem>_w<largura>.avif/.webp) registrada
+em ImagemVariantes, usada por picture_tag()/get_srcset() nos templates.
 ─────────────────────────────────────────────────────────────────────────────
 """
 
@@ -13,7 +17,8 @@ import logging
 from pathlib import Path
 from urllib.parse import urlparse
 
-from PIL import Image, ImageOps
+from markupsafe import Markup, escape
+from PIL import Image, ImageOps, features
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +42,26 @@ THUMB_QUALITY = {
 }
 
 
+# ── Variantes responsivas (srcset) ────────────────────────────────────────
+# Larguras da escada (px); configurável por IMAGEM_LARGURAS="160,280,480,800,1200"
+LARGURAS_VARIANTES = tuple(sorted(
+    int(l) for l in os.environ.get('IMAGEM_LARGURAS', '160,280,480,800,1200').split(',') if l.strip()
+))
+
+# Ordem de preferência no <picture>: AVIF (menor) antes de WebP
+FORMATOS_VARIANTES = ('avif', 'webp')
+
+QUALIDADE_VARIANTES = {
+    'avif': 55,
+    'webp': 80,
+}
+
+CONTENT_TYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp',
+}
+
+
 # ── Helpers de URL ──────────────────────────────────────────────────────────
 
 def _strip_cdn_prefix(url: str) -> str:
@@ -120,81 +145,120 @@ def _split_ext(path: str):
 
 
 # ── Geração do thumbnail ────────────────────────────────────────────────────
+#
+# Uma decodificação por imagem: o original é aberto uma vez (JPEG já em
+# escala reduzida via Image.draft(), que decodifica a DCT em 1/2, 1/4 ou
+# 1/8), normalizado para RGB e cada tamanho sai do anterior, do maior para
+# o menor — o LANCZOS do t160 roda sobre o t280, não sobre os 12 MP.
 
-def generate_thumbnail(image_bytes: bytes, size_key: str) -> bytes:
+# Tags EXIF de orientação que giram 90° (largura ↔ altura)
+_ORIENTACOES_GIRADAS = (5, 6, 7, 8)
+
+
+def decodificar_imagem(image_bytes: bytes, maior_lado: int = None) -> Image.Image:
     """
-    Recebe os bytes da imagem original e retorna bytes do thumbnail WebP.
+    Decodifica a imagem UMA vez: orientação EXIF aplicada e alpha achatado
+    sobre branco (evita fundo preto no WebP/AVIF).
 
     Args:
         image_bytes: conteúdo binário da imagem original
-        size_key:    't280', 't160' ou 't80'
+        maior_lado:  maior dimensão que será gerada; com JPEG, permite ao
+                     decoder entregar direto uma versão reduzida (>= maior_lado)
 
     Returns:
-        bytes do WebP gerado
+        Image RGB; info['tamanho_original'] guarda (largura, altura) reais
     """
-    if size_key not in THUMB_SIZES:
-        raise ValueError(f"size_key inválido: {size_key}. Use: {list(THUMB_SIZES.keys())}")
-
-    width, height = THUMB_SIZES[size_key]
-    quality = THUMB_QUALITY[size_key]
-
     with Image.open(io.BytesIO(image_bytes)) as img:
-        # Converte para RGBA para preservar transparência (logos PNG)
-        if img.mode not in ('RGB', 'RGBA'):
-            img = img.convert('RGBA')
+        largura, altura = img.size
+        if img.getexif().get(0x0112) in _ORIENTACOES_GIRADAS:
+            largura, altura = altura, largura
 
-        # thumbnail() preserva aspect ratio e não faz upscale
-        img.thumbnail((width, height), Image.LANCZOS)
+        if maior_lado and img.format == 'JPEG':
+            img.draft('RGB', (maior_lado, maior_lado))
 
-        # Para WebP com fundo branco (evita fundo preto em imagens com alpha)
-        if img.mode == 'RGBA':
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ('RGBA', 'LA', 'P', 'PA'):
+            img = img.convert('RGBA')
             background = Image.new('RGB', img.size, (255, 255, 255))
             background.paste(img, mask=img.split()[3])
             img = background
         elif img.mode != 'RGB':
             img = img.convert('RGB')
+        else:
+            img.load()
+
+    img.info['tamanho_original'] = (largura, altura)
+    return img
+
+
+def _area(size_key: str) -> int:
+    width, height = THUMB_SIZES[size_key]
+    return width * height
 
+
+def gerar_thumbnails(image_bytes: bytes = None, sizes: list = None, imagem: Image.Image = None) -> dict:
+    """
+    Gera vários thumbnails WebP de uma vez, decodificando o original uma só vez.
+
+    Args:
+        image_bytes: conteúdo binário da imagem original
+        sizes:       lista de size_keys, padrão: todos os THUMB_SIZES
+        imagem:      imagem já decodificada (decodificar_imagem), para
+                     reaproveitar a mesma decodificação em outras saídas
+
+    Returns:
+        {'t280': bytes, 't160': bytes, ...}
+    """
+    sizes = list(sizes or THUMB_SIZES.keys())
+    invalidos = [s for s in sizes if s not in THUMB_SIZES]
+    if invalidos:
+        raise ValueError(f"size_key inválido: {invalidos}. Use: {list(THUMB_SIZES.keys())}")
+
+    if imagem is None:
+        imagem = decodificar_imagem(image_bytes, max(max(THUMB_SIZES[s]) for s in sizes))
+
+    resultados = {}
+    atual = imagem.copy()  # thumbnail() altera a imagem no lugar
+    for size_key in sorted(sizes, key=_area, reverse=True):
+        # thumbnail() preserva aspect ratio e não faz upscale
+        atual.thumbnail(THUMB_SIZES[size_key], Image.LANCZOS)
         buf = io.BytesIO()
-        img.save(buf, format='WEBP', quality=quality, method=4)
-        return buf.getvalue()
+        atual.save(buf, format='WEBP', quality=THUMB_QUALITY[size_key], method=4)
+        resultados[size_key] = buf.getvalue()
+    return resultados
+
+
+def generate_thumbnail(image_bytes: bytes, size_key: str) -> bytes:
+    """
+    Recebe os bytes da imagem original e retorna bytes do thumbnail WebP.
+    Para vários tamanhos da mesma imagem, use gerar_thumbnails().
+
+    Args:
+        image_bytes: conteúdo binário da imagem original
+        size_key:    't280', 't160' ou 't80'
+
+    Returns:
+        bytes do WebP gerado
+    """
+    return gerar_thumbnails(image_bytes, [size_key])[size_key]
 
 
 # ── Upload para R2 ─────────────────────────────────────────────────────────
 
 def _get_r2_client():
-    """Cria cliente S3-compatível para o R2 usando as variáveis de ambiente."""
-    try:
-        import boto3
-        from botocore.config import Config
-
-        endpoint = os.environ.get('R2_ENDPOINT_URL', '')
-        access_key = os.environ.get('R2_ACCESS_KEY_ID', '')
-        secret_key = os.environ.get('R2_SECRET_ACCESS_KEY', '')
-
-        if not all([endpoint, access_key, secret_key]):
-            logger.debug("Credenciais R2 não configuradas — boto3 não iniciado.")
-            return None
-
-        return boto3.client(
-            's3',
-            endpoint_url=endpoint,
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            config=Config(signature_version='s3v4'),
-            region_name='auto',
-        )
-    except ImportError:
-        logger.warning("boto3 não instalado — upload indisponível.")
-        return None
+    """Cliente S3 compartilhado do R2 (app/utils/r2_gateway.py); None se não configurado."""
+    from app.utils import r2_gateway
+    return r2_gateway.cliente()
 
 
-def upload_thumb_to_r2(thumb_bytes: bytes, r2_key: str) -> bool:
+def upload_thumb_to_r2(thumb_bytes: bytes, r2_key: str, content_type: str = 'image/webp', client=None) -> bool:
     """
     Faz upload do thumbnail para o bucket correto no R2.
 
     Args:
         thumb_bytes: bytes do WebP gerado
         r2_key:      caminho no bucket, ex: produtos/fotos/166/aa4258c_t280.webp
+        client:      cliente boto3 já criado; padrão: o compartilhado do r2_gateway
 
     Returns:
         True se sucesso, False se erro
@@ -202,14 +266,14 @@ def upload_thumb_to_r2(thumb_bytes: bytes, r2_key: str) -> bool:
     r2_key = _normalizar_key(r2_key)
     bucket = _bucket_para_key(r2_key)
 
-    client = _get_r2_client()
+    client = client or _get_r2_client()
     if client:
         try:
             client.put_object(
                 Bucket=bucket,
                 Key=r2_key,
                 Body=thumb_bytes,
-                ContentType='image/webp',
+                ContentType=content_type,
                 CacheControl='public, max-age=31536000, immutable',
             )
             logger.info(f"Thumbnail enviado → bucket={bucket} key={r2_key}")
@@ -247,19 +311,203 @@ def process_image_and_create_thumbs(
     p = Path(original_r2_key)
     base_key = str(p.parent / p.stem).replace('\\', '/')
 
+    try:
+        thumbs = gerar_thumbnails(image_bytes, sizes)
+    except Exception as e:
+        logger.error(f"Erro ao gerar thumbs para {original_r2_key}: {e}")
+        return {}
+
     results = {}
-    for size_key in sizes:
+    for size_key, thumb_bytes in thumbs.items():
+        thumb_key = f"{base_key}_{size_key}.webp"
+        ok = upload_thumb_to_r2(thumb_bytes, thumb_key)
+        if ok:
+            results[size_key] = thumb_key
+            logger.info(
+                f"Thumb {size_key} gerado: {len(thumb_bytes)/1024:.1f} KiB "
+                f"(original: {len(image_bytes)/1024:.1f} KiB)"
+            )
+
+    return results
+
+# ── Variantes responsivas: geração ────────────────────────────────────────
+
+def formatos_suportados(formatos=None) -> list:
+    """Formatos pedidos que o Pillow instalado consegue gravar (AVIF exige libavif)."""
+    return [f for f in (formatos or FORMATOS_VARIANTES) if features.check(f)]
+
+
+def variante_key(original_r2_key: str, largura: int, formato: str) -> str:
+    stem, _ = _split_ext(_normalizar_key(original_r2_key))
+    return f"{stem}_w{largura}.{formato}"
+
+
+def larguras_para(largura_original: int, larguras=None) -> list:
+    """Larguras da escada que cabem no original (sem upscale; ao menos uma)."""
+    escada = sorted(larguras or LARGURAS_VARIANTES)
+    cabem = [l for l in escada if l <= largura_original]
+    return cabem or [largura_original]
+
+
+def gerar_variantes(image_bytes: bytes = None, larguras=None, formatos=None, imagem: Image.Image = None):
+    """
+    Gera toda a escada a partir de UMA decodificação, da maior largura para
+    a menor (cada uma reduzida da anterior).
+
+    Returns:
+        ({(largura, formato): bytes}, (largura_original, altura_original))
+    """
+    formatos = formatos_suportados(formatos)
+    escada = sorted(larguras or LARGURAS_VARIANTES)
+    if imagem is None:
+        imagem = decodificar_imagem(image_bytes, escada[-1])
+    tamanho = imagem.info.get('tamanho_original', imagem.size)
+
+    variantes = {}
+    img = imagem
+    for largura in sorted(larguras_para(imagem.width, escada), reverse=True):
+        if largura != img.width:
+            altura = max(1, round(imagem.height * largura / imagem.width))
+            img = img.resize((largura, altura), Image.LANCZOS)
+        for formato in formatos:
+            buf = io.BytesIO()
+            if formato == 'avif':
+                img.save(buf, format='AVIF', quality=QUALIDADE_VARIANTES['avif'], speed=6)
+            else:
+                img.save(buf, format='WEBP', quality=QUALIDADE_VARIANTES['webp'], method=4)
+            variantes[(largura, formato)] = buf.getvalue()
+    return variantes, tamanho
+
+
+def registrar_variantes(original_r2_key: str, tamanho, larguras, formatos):
+    """
+    Grava/atualiza a linha de ImagemVariantes da imagem. Usa sessão própria:
+    pode rodar dentro do after_commit de outra sessão (thumb_hooks sem fila).
+    """
+    from sqlalchemy.orm import Session
+    from app.extensions import db
+    from app.models import ImagemVariantes
+
+    chave = _normalizar_key(original_r2_key)
+    with Session(db.engine, expire_on_commit=False) as sessao:
+        registro = sessao.query(ImagemVariantes).filter_by(chave=chave).first() or ImagemVariantes(chave=chave)
+        registro.largura, registro.altura = tamanho
+        registro.larguras = ",".join(str(l) for l in sorted(set(larguras)))
+        registro.formatos = ",".join(f for f in FORMATOS_VARIANTES if f in set(formatos))
+        sessao.add(registro)
+        sessao.commit()
+    return registro
+
+
+def process_image_variants(image_bytes: bytes, original_r2_key: str, larguras=None, formatos=None,
+                           imagem: Image.Image = None) -> dict:
+    """
+    Gera a escada responsiva, envia ao R2 e registra o que subiu.
+
+    Returns:
+        {(largura, formato): r2_key} das variantes enviadas
+    """
+    variantes, tamanho = gerar_variantes(image_bytes, larguras, formatos, imagem=imagem)
+
+    enviadas = {}
+    for (largura, formato), conteudo in variantes.items():
+        chave = variante_key(original_r2_key, largura, formato)
+        if upload_thumb_to_r2(conteudo, chave, CONTENT_TYPES[formato]):
+            enviadas[(largura, formato)] = chave
+
+    # Uma largura só conta se saiu em todos os formatos (o <source> de cada
+    # formato lista as mesmas larguras)
+    formatos_ok = {f for (_, f) in enviadas}
+    larguras_ok = [l for l in {l for (l, _) in enviadas} if all((l, f) in enviadas for f in formatos_ok)]
+    if larguras_ok:
+        registrar_variantes(original_r2_key, tamanho, larguras_ok, formatos_ok)
+        total = sum(len(variantes[k]) for k in enviadas)
+        logger.info(
+            f"Variantes de {original_r2_key}: {len(enviadas)} arquivos, {total/1024:.1f} KiB "
+            f"(original: {len(image_bytes)/1024:.1f} KiB)"
+        )
+    return enviadas
+
+
+# ── Variantes responsivas: templates ──────────────────────────────────────
+
+def _memo_variantes():
+    from flask import g, has_app_context
+    if not has_app_context():
+        return {}
+    if 'imagem_variantes' not in g:
+        g.imagem_variantes = {}
+    return g.imagem_variantes
+
+
+def precarregar_variantes(urls) -> None:
+    """Busca de uma vez as variantes de várias imagens (listas de produtos)."""
+    from app.models import ImagemVariantes
+
+    memo = _memo_variantes()
+    chaves = {_normalizar_key(_strip_cdn_prefix(u)) for u in urls if u} - set(memo)
+    if not chaves:
+        return
+    for chave in chaves:
+        memo[chave] = None
+    for registro in ImagemVariantes.query.filter(ImagemVariantes.chave.in_(sorted(chaves))):
+        memo[registro.chave] = registro
+
+
+def variantes_de(original_url: str):
+    """ImagemVariantes da imagem (memoizado por requisição) ou None."""
+    if not original_url:
+        return None
+    chave = _normalizar_key(_strip_cdn_prefix(original_url))
+    memo = _memo_variantes()
+    if chave not in memo:
         try:
-            thumb_bytes = generate_thumbnail(image_bytes, size_key)
-            thumb_key = f"{base_key}_{size_key}.webp"
-            ok = upload_thumb_to_r2(thumb_bytes, thumb_key)
-            if ok:
-                results[size_key] = thumb_key
-                logger.info(
-                    f"Thumb {size_key} gerado: {len(thumb_bytes)/1024:.1f} KiB "
-                    f"(original: {len(image_bytes)/1024:.1f} KiB)"
-                )
+            precarregar_variantes([original_url])
         except Exception as e:
-            logger.error(f"Erro ao gerar thumb {size_key} para {original_r2_key}: {e}")
+            logger.warning(f"Falha ao consultar variantes de {chave}: {e}")
+            memo[chave] = None
+    return memo.get(chave)
+
 
-    return results
\ No newline at end of file
+def get_srcset(original_url: str, formato: str = 'webp') -> str:
+    """
+    Valor de srcset ("url 160w, url 280w, ...") ou '' se não houver variantes.
+
+    Uso nos templates:
+        <img src="..." srcset="{{ get_srcset(produto.foto_url) }}" sizes="50vw">
+    """
+    registro = variantes_de(original_url)
+    if not registro or formato not in registro.lista_formatos:
+        return ''
+    return ", ".join(
+        f"{CDN_URL}/{variante_key(registro.chave, l, formato)} {l}w" for l in registro.lista_larguras
+    )
+
+
+def picture_tag(original_url: str, alt: str = '', sizes: str = '100vw', fallback: str = None, **attrs) -> Markup:
+    """
+    <picture> com um <source> por formato (AVIF, WebP) e <img> de fallback.
+    Sem variantes registradas, devolve só o <img> com `fallback` (ou a URL
+    original) — nunca quebra a página.
+
+    Uso nos templates:
+        {{ picture_tag(produto.foto_url, produto.nome, sizes="(min-width: 992px) 58vw, 100vw",
+                       fallback=gerar_link(produto.foto_url), loading="eager") }}
+    """
+    registro = variantes_de(original_url)
+    src = fallback or original_url or ''
+
+    atributos = {'src': src, 'alt': alt}
+    if registro and registro.largura and registro.altura:
+        atributos.update(width=registro.largura, height=registro.altura)
+    atributos.update({k.rstrip('_').replace('_', '-'): v for k, v in attrs.items() if v is not None})
+    img = "<img " + " ".join(f'{k}="{escape(v)}"' for k, v in atributos.items()) + ">"
+
+    if not registro:
+        return Markup(img)
+
+    fontes = [
+        f'<source type="{CONTENT_TYPES[f]}" srcset="{escape(get_srcset(original_url, f))}" sizes="{escape(sizes)}">'
+        for f in FORMATOS_VARIANTES if f in registro.lista_formatos
+    ]
+    return Markup("<picture>" + "".join(fontes) + img + "</picture>")
@@ -0,0 +1,234 @@
+"""
+app/utils/upload_direto.py
+─────────────────────────────────────────────────────────────────────────────
+Upload direto do navegador para o R2 (sem passar o arquivo pelo gunicorn).
+
+Antes, fotos de produto e scans de documentos eram recebidos inteiros pelo
+worker web (request.files) e só depois repassados ao R2 — um worker síncrono
+ficava preso durante todo o upload de um PDF de 15 MB numa conexão lenta.
+
+Fluxo:
+    1. POST .../emitir     {nome, content_type, tamanho}
+                           → {url, metodo: "PUT", headers, key, ticket}
+    2. navegador           PUT url  (corpo = arquivo, com os headers devolvidos)
+    3. POST .../confirmar  {ticket}
+                           → HEAD no R2 confere tamanho/tipo, os primeiros
+                             bytes conferem a assinatura do formato, e o
+                             pós-processamento (thumbnails, OCR) vai para a fila
+
+URL PUT e não POST com policy: o R2 não implementa o upload por formulário
+do S3. A URL PUT assina Content-Type e Content-Length, então o R2 recusa um
+corpo de tipo ou tamanho diferente do declarado (a mesma garantia do
+content-length-range), e o limite de tamanho é checado aqui ao emitir.
+
+O ticket é assinado com a SECRET_KEY (bucket, key, tamanho, tipo e o
+contexto da rota, ex. cliente_id) — a confirmação só aceita o que foi
+emitido pelo servidor. Cada ticket leva um nonce e vale para uma única
+confirmação: o nonce é marcado como usado no Redis (SET NX) ou, sem Redis,
+num LRU do processo.
+
+Requer CORS no bucket permitindo PUT (com Content-Type) a partir da origem
+do app; sem isso o JS (static/js/upload_direto.js) volta ao upload antigo.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import logging
+import os
+import uuid
+
+from flask import current_app
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from werkzeug.utils import secure_filename
+
+from app.utils import r2_gateway
+from app.utils.cache_backend import LRULocal
+
+logger = logging.getLogger(__name__)
+
+EXPIRACAO_URL = 900          # tempo para o navegador terminar o PUT
+EXPIRACAO_TICKET = 3600      # tempo para confirmar depois de emitido
+_SALT = "upload-direto"
+_PREFIXO_USADO = "m4:upload:ticket:"
+
+# Perfis de upload: tipos aceitos (→ extensão) e tamanho máximo
+PERFIS = {
+    "foto_produto": {
+        "tipos": {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp"},
+        "max_bytes": 15 * 1024 * 1024,
+        "cache_control": "private, max-age=31536000, immutable",
+    },
+    "documento": {
+        "tipos": {"application/pdf": ".pdf", "image/jpeg": ".jpg", "image/png": ".png"},
+        "max_bytes": 15 * 1024 * 1024,
+        "cache_control": None,
+    },
+}
+
+# Assinaturas (magic bytes) de cada tipo aceito
+_ASSINATURAS = {
+    "application/pdf": (b"%PDF",),
+    "image/jpeg": (b"\xff\xd8\xff",),
+    "image/png": (b"\x89PNG",),
+    "image/webp": (b"RIFF",),  # + "WEBP" no offset 8, ver _assinatura_confere
+}
+
+# Nonces já confirmados, quando não há Redis (vale só para este processo)
+_usados_local = LRULocal(10000)
+
+
+class UploadInvalido(ValueError):
+    """Pedido de upload ou confirmação recusado (mensagem exibível ao usuário)."""
+
+
+def _serializador():
+    if not current_app.secret_key:
+        raise RuntimeError("SECRET_KEY não configurada: os tickets de upload direto precisam dela.")
+    return URLSafeTimedSerializer(current_app.secret_key, salt=_SALT)
+
+
+def _assinatura_confere(tipo, inicio):
+    if not inicio.startswith(_ASSINATURAS[tipo]):
+        return False
+    # RIFF é o contêiner (também de WAV/AVI); o formato vem nos bytes 8-11
+    return tipo != "image/webp" or inicio[8:12] == b"WEBP"
+
+
+def _consumir_nonce(nonce):
+    """True na primeira confirmação do ticket; False se ele já foi usado."""
+    from app.utils import queue
+
+    if queue.redis_conn is not None:
+        try:
+            return bool(queue.redis_conn.set(_PREFIXO_USADO + nonce, 1, nx=True, ex=EXPIRACAO_TICKET))
+        except Exception as e:
+            logger.warning(f"[UPLOAD DIRETO] Redis indisponível para o nonce, usando o do processo: {e}")
+    with _usados_local.lock:
+        if _usados_local.get(nonce) is not None:
+            return False
+        _usados_local.set(nonce, True, EXPIRACAO_TICKET)
+        return True
+
+
+def _tipo_normalizado(content_type):
+    return (content_type or "").split(";")[0].strip().lower()
+
+
+def validar(perfil, nome, content_type, tamanho):
+    """Confere tipo, extensão e tamanho declarados; devolve (tipo, tamanho)."""
+    regras = PERFIS[perfil]
+    tipo = _tipo_normalizado(content_type)
+    if tipo == "image/jpg":
+        tipo = "image/jpeg"
+    if tipo not in regras["tipos"]:
+        raise UploadInvalido("Formato não permitido.")
+
+    nome_seguro = secure_filename(nome or "")
+    if not nome_seguro:
+        raise UploadInvalido("Nome de arquivo inválido.")
+
+    try:
+        tamanho = int(tamanho)
+    except (TypeError, ValueError):
+        raise UploadInvalido("Tamanho do arquivo não informado.")
+    if tamanho <= 0:
+        raise UploadInvalido("O arquivo enviado está vazio.")
+    if tamanho > regras["max_bytes"]:
+        raise UploadInvalido(f"O arquivo excede o limite de {regras['max_bytes'] // (1024 * 1024)} MB.")
+    return tipo, tamanho
+
+
+def extensao(perfil, content_type):
+    return PERFIS[perfil]["tipos"][_tipo_normalizado(content_type)]
+
+
+def nome_unico(nome):
+    """<8 hex>_<nome seguro> (evita sobrescrever um arquivo de mesmo nome)."""
+    return f"{uuid.uuid4().hex[:8]}_{secure_filename(nome or '') or 'arquivo'}"
+
+
+def emitir(perfil, bucket, key, content_type, tamanho, nome=None, **contexto):
+    """
+    URL PUT pré-assinada para o navegador enviar o arquivo direto ao R2.
+    `nome` é o nome original do arquivo; `contexto` (ids da rota) volta no
+    ticket e é conferido na confirmação.
+    """
+    regras = PERFIS[perfil]
+    parametros = {"ContentType": content_type, "ContentLength": tamanho}
+    headers = {"Content-Type": content_type}
+    if regras["cache_control"]:
+        parametros["CacheControl"] = regras["cache_control"]
+        headers["Cache-Control"] = regras["cache_control"]
+
+    url = r2_gateway.presign(bucket, key, expira=EXPIRACAO_URL, metodo="put_object", **parametros)
+    ticket = _serializador().dumps({
+        "p": perfil, "b": bucket, "k": key, "t": tamanho, "c": content_type,
+        "n": secure_filename(nome or "") or os.path.basename(key), "x": contexto,
+        "u": uuid.uuid4().hex,
+    })
+    return {
+        "url": url,
+        "metodo": "PUT",
+        "headers": headers,
+        "key": key,
+        "ticket": ticket,
+        "expira_em": EXPIRACAO_URL,
+    }
+
+
+def ler_ticket(ticket):
+    try:
+        return _serializador().loads(ticket or "", max_age=EXPIRACAO_TICKET)
+    except SignatureExpired:
+        raise UploadInvalido("O envio expirou. Selecione o arquivo novamente.")
+    except BadSignature:
+        raise UploadInvalido("Envio não reconhecido.")
+
+
+def confirmar(ticket, perfil, **contexto):
+    """
+    Confere que o objeto do ticket chegou ao R2 com o tamanho e tipo
+    emitidos e com a assinatura do formato. Objeto inválido é apagado.
+    O ticket só confirma uma vez; a segunda tentativa é recusada.
+    Devolve {"bucket", "key", "tamanho", "content_type", "nome_original", "contexto"}.
+    """
+    dados = ler_ticket(ticket)
+    if dados.get("p") != perfil:
+        raise UploadInvalido("Envio não reconhecido.")
+    for nome, valor in contexto.items():
+        if str(dados["x"].get(nome)) != str(valor):
+            raise UploadInvalido("Envio não pertence a esta tela.")
+
+    bucket, key = dados["b"], dados["k"]
+    meta = r2_gateway.head(bucket, key)
+    if meta is None:
+        raise UploadInvalido("O arquivo não chegou ao storage. Tente novamente.")
+
+    problema = None
+    if int(meta.get("ContentLength", -1)) != int(dados["t"]):
+        problema = "tamanho diferente do declarado"
+    elif _tipo_normalizado(meta.get("ContentType")) != dados["c"]:
+        problema = "tipo diferente do declarado"
+    else:
+        inicio = r2_gateway.get(bucket, key, intervalo=(0, 15)) or b""
+        if not _assinatura_confere(dados["c"], inicio):
+            problema = "conteúdo não corresponde ao formato"
+
+    if problema:
+        logger.warning(f"[UPLOAD DIRETO] {key} recusado: {problema}")
+        try:
+            r2_gateway.delete(bucket, key)
+        except Exception as e:
+            logger.warning(f"[UPLOAD DIRETO] Falha ao apagar {key}: {e}")
+        raise UploadInvalido("O conteúdo do arquivo é inválido ou está corrompido.")
+
+    if not _consumir_nonce(dados.get("u") or ticket):
+        raise UploadInvalido("Este envio já foi confirmado.")
+
+    return {
+        "bucket": bucket,
+        "key": key,
+        "tamanho": int(dados["t"]),
+        "content_type": dados["c"],
+        "nome_original": dados["n"],
+        "contexto": dados["x"],
+    }
@@ -10,6 +10,7 @@ from app.extensions import db
 from app.utils.format_helpers import br_money
 from app.services.venda_service import VendaService
 from app.utils.r2_helpers import upload_file_to_r2
+from app.utils.paginacao import ordem_por_data, paginar_keyset
 import json
 from sqlalchemy import extract, func
 from datetime import datetime, timedelta
@@ -57,7 +58,6 @@ def normalizar_calibre(texto):
 @login_required
 def vendas_lista():
     """Rota principal de Listagem de Vendas (migrada). Endpoint: sales_core.vendas_lista"""
-    page = request.args.get("page", 1, type=int)
     per_page = 50
     query = Venda.query.join(Cliente, isouter=True) 
 
@@ -88,7 +88,11 @@ def vendas_lista():
         except Exception:
             pass
 
-    vendas_paginadas = query.order_by(Venda.data_abertura.desc()).paginate(page=page, per_page=per_page)
+    # Cursor (data_abertura, id): sem COUNT extra — o resumo abaixo já conta
+    vendas_paginadas = paginar_keyset(
+        query, ordem_por_data(Venda.data_abertura, Venda.id),
+        request.args.get("cursor"), por_pagina=per_page,
+    )
 
     resumo_dados = query.with_entities(
         func.count(Venda.id).label('total'),
@@ -17,6 +17,11 @@ class Config:
     R2_SECRET_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
     R2_BUCKET = os.getenv("R2_BUCKET_NAME")
 
+    # Autocomplete: constrói o índice em memória já na subida. Só os processos
+    # web (gunicorn) devem ligar; workers RQ e `flask db upgrade` deixam vazio
+    # e, se um dia precisarem, o índice é montado no primeiro uso.
+    AUTOCOMPLETE_NA_SUBIDA = os.getenv("AUTOCOMPLETE_NA_SUBIDA", "").lower() in ("1", "true", "sim")
+
     # Timezone global
     TIMEZONE = "America/Fortaleza"
 
@@ -0,0 +1,114 @@
+"""Busca de produtos: tsvector com unaccent + índices de trigrama
+
+Revision ID: 20261017_busca_produtos
+Revises: 20261017_categoria_fechamento
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = '20261017_busca_produtos'
+down_revision = '20261017_categoria_fechamento'
+branch_labels = None
+depends_on = None
+
+# (nome do índice, tabela, coluna) — sempre sobre m4_unaccent(lower(coluna)),
+# a mesma expressão usada em app/services/busca_produtos.py
+INDICES_TRIGRAMA = (
+    ('idx_produtos_nome_busca_trgm', 'produtos', 'nome'),
+    ('idx_produtos_nome_comercial_busca_trgm', 'produtos', 'nome_comercial'),
+    ('idx_produtos_codigo_busca_trgm', 'produtos', 'codigo'),
+    ('idx_marca_produto_nome_busca_trgm', 'marca_produto', 'nome'),
+    ('idx_calibre_produto_nome_busca_trgm', 'calibre_produto', 'nome'),
+)
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    op.execute("CREATE EXTENSION IF NOT EXISTS unaccent;")
+
+    # unaccent() é STABLE; índices de expressão exigem IMMUTABLE (dicionário fixo)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION m4_unaccent(text) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT AS
+        $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$;
+    """)
+
+    op.add_column('produtos', sa.Column('busca_documento', postgresql.TSVECTOR(), nullable=True))
+
+    # Documento: nomes/código/marca/calibre (A), tags (B), descrições (C)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION produtos_busca_documento() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            v_marca text;
+            v_calibre text;
+        BEGIN
+            SELECT nome INTO v_marca FROM marca_produto WHERE id = NEW.marca_id;
+            SELECT nome INTO v_calibre FROM calibre_produto WHERE id = NEW.calibre_id;
+            NEW.busca_documento :=
+                setweight(to_tsvector('portuguese', m4_unaccent(lower(
+                    coalesce(NEW.nome, '') || ' ' || coalesce(NEW.nome_comercial, '')))), 'A') ||
+                setweight(to_tsvector('simple', m4_unaccent(lower(
+                    coalesce(NEW.codigo, '') || ' ' || coalesce(v_marca, '') || ' ' || coalesce(v_calibre, '')))), 'A') ||
+                setweight(to_tsvector('portuguese', m4_unaccent(lower(
+                    coalesce(NEW.tags_palavras_chave, '')))), 'B') ||
+                setweight(to_tsvector('portuguese', m4_unaccent(lower(
+                    coalesce(NEW.descricao_comercial, '') || ' ' || coalesce(NEW.descricao, '')))), 'C');
+            RETURN NEW;
+        END
+        $$;
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_produtos_busca_documento
+        BEFORE INSERT OR UPDATE OF nome, nome_comercial, codigo, tags_palavras_chave,
+            descricao, descricao_comercial, marca_id, calibre_id, busca_documento
+        ON produtos FOR EACH ROW EXECUTE FUNCTION produtos_busca_documento();
+    """)
+
+    # Renomear marca/calibre refaz o documento dos produtos ligados
+    for tabela, coluna in (('marca_produto', 'marca_id'), ('calibre_produto', 'calibre_id')):
+        op.execute(f"""
+            CREATE OR REPLACE FUNCTION {tabela}_busca_documento() RETURNS trigger
+            LANGUAGE plpgsql AS $$
+            BEGIN
+                UPDATE produtos SET busca_documento = NULL WHERE {coluna} = NEW.id;
+                RETURN NULL;
+            END
+            $$;
+        """)
+        op.execute(f"""
+            CREATE TRIGGER trg_{tabela}_busca_documento
+            AFTER UPDATE OF nome ON {tabela}
+            FOR EACH ROW WHEN (OLD.nome IS DISTINCT FROM NEW.nome)
+            EXECUTE FUNCTION {tabela}_busca_documento();
+        """)
+
+    # Backfill: o UPDATE dispara o trigger, que recalcula cada linha
+    op.execute("UPDATE produtos SET busca_documento = NULL;")
+
+    op.execute("CREATE INDEX IF NOT EXISTS idx_produtos_busca_documento ON produtos USING gin (busca_documento);")
+    for indice, tabela, coluna in INDICES_TRIGRAMA:
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS {indice} ON {tabela} "
+            f"USING gin (m4_unaccent(lower({coluna})) gin_trgm_ops);"
+        )
+
+
+def downgrade():
+    for indice, _, _ in INDICES_TRIGRAMA:
+        op.execute(f"DROP INDEX IF EXISTS {indice};")
+    op.execute("DROP INDEX IF EXISTS idx_produtos_busca_documento;")
+
+    for tabela in ('marca_produto', 'calibre_produto'):
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{tabela}_busca_documento ON {tabela};")
+        op.execute(f"DROP FUNCTION IF EXISTS {tabela}_busca_documento();")
+    op.execute("DROP TRIGGER IF EXISTS trg_produtos_busca_documento ON produtos;")
+    op.execute("DROP FUNCTION IF EXISTS produtos_busca_documento();")
+
+    op.drop_column('produtos', 'busca_documento')
+    op.execute("DROP FUNCTION IF EXISTS m4_unaccent(text);")
+    # Extensões ficam (pg_trgm já era usada antes desta revisão)
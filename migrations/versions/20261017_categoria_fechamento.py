@@ -0,0 +1,51 @@
+"""Closure table da árvore de categorias (categoria_produto_fechamento)
+
+Revision ID: 20261017_categoria_fechamento
+Revises: 20261017_prateleiras_home
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '20261017_categoria_fechamento'
+down_revision = '20261017_prateleiras_home'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'categoria_produto_fechamento',
+        sa.Column('ancestral_id', sa.Integer(), nullable=False),
+        sa.Column('descendente_id', sa.Integer(), nullable=False),
+        sa.Column('profundidade', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['ancestral_id'], ['categoria_produto.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['descendente_id'], ['categoria_produto.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('ancestral_id', 'descendente_id'),
+    )
+    op.create_index(
+        'ix_categoria_produto_fechamento_descendente_id',
+        'categoria_produto_fechamento',
+        ['descendente_id'],
+        unique=False,
+    )
+
+    # Backfill a partir de pai_id (qualquer profundidade)
+    op.execute("""
+        WITH RECURSIVE arvore(ancestral_id, descendente_id, profundidade) AS (
+            SELECT id, id, 0 FROM categoria_produto
+            UNION ALL
+            SELECT a.ancestral_id, c.id, a.profundidade + 1
+              FROM arvore a
+              JOIN categoria_produto c ON c.pai_id = a.descendente_id
+        )
+        INSERT INTO categoria_produto_fechamento (ancestral_id, descendente_id, profundidade)
+        SELECT ancestral_id, descendente_id, profundidade FROM arvore
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_categoria_produto_fechamento_descendente_id', table_name='categoria_produto_fechamento')
+    op.drop_table('categoria_produto_fechamento')
@@ -0,0 +1,35 @@
+"""Variantes responsivas de imagens (imagem_variantes)
+
+Revision ID: 20261017_imagem_variantes
+Revises: 20261017_busca_produtos
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '20261017_imagem_variantes'
+down_revision = '20261017_busca_produtos'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'imagem_variantes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('chave', sa.String(length=512), nullable=False),
+        sa.Column('largura', sa.Integer(), nullable=True),
+        sa.Column('altura', sa.Integer(), nullable=True),
+        sa.Column('larguras', sa.String(length=100), nullable=False, server_default=''),
+        sa.Column('formatos', sa.String(length=50), nullable=False, server_default=''),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_imagem_variantes_chave', 'imagem_variantes', ['chave'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_imagem_variantes_chave', table_name='imagem_variantes')
+    op.drop_table('imagem_variantes')
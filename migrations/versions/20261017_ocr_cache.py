@@ -0,0 +1,37 @@
+"""Cache de OCR por SHA-256 do arquivo (ocr_cache)
+
+Revision ID: 20261017_ocr_cache
+Revises: 20261017_imagem_variantes
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '20261017_ocr_cache'
+down_revision = '20261017_imagem_variantes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'ocr_cache',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('versao', sa.String(length=32), nullable=False),
+        sa.Column('categoria', sa.String(length=30), nullable=True),
+        sa.Column('resultado', sa.JSON(), nullable=False),
+        sa.Column('acertos', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('ultimo_acesso', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('sha256', 'versao', name='uq_ocr_cache_sha256_versao'),
+    )
+    op.create_index('ix_ocr_cache_sha256', 'ocr_cache', ['sha256'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_ocr_cache_sha256', table_name='ocr_cache')
+    op.drop_table('ocr_cache')
@@ -0,0 +1,34 @@
+"""Configuração das prateleiras da home (loja_prateleiras)
+
+Revision ID: 20261017_prateleiras_home
+Revises: aefc868
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '20261017_prateleiras_home'
+down_revision = 'aefc868'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'loja_prateleiras',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('titulo', sa.String(length=100), nullable=False),
+        sa.Column('categorias', sa.String(length=512), nullable=False),
+        sa.Column('limite', sa.Integer(), nullable=True),
+        sa.Column('ordenacao', sa.String(length=20), nullable=True),
+        sa.Column('ordem', sa.Integer(), nullable=True),
+        sa.Column('ativo', sa.Boolean(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade():
+    op.drop_table('loja_prateleiras')
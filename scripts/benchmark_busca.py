@@ -0,0 +1,125 @@
+"""
+scripts/benchmark_busca.py
+─────────────────────────────────────────────────────────────────────────────
+Compara a latência da busca de produtos antes/depois do índice dedicado
+(app/services/busca_produtos.py, migration 20261017_busca_produtos).
+
+  antes  → OR de ILIKE do antigo catalogo.api_buscar (variantes do termo
+           × nome, nome_comercial, codigo, descricao, tags, descricao_comercial
+           + marca/calibre/categoria via JOIN), sem índice utilizável
+  depois → consulta_busca: tsvector @@ tsquery OU trigrama, ordenada por
+           expressao_rank
+
+Como rodar:
+    python scripts/benchmark_busca.py
+    python scripts/benchmark_busca.py --repeticoes 50 --termos "glock,9mm,taurus g2c"
+    python scripts/benchmark_busca.py --explain      # EXPLAIN ANALYZE de cada termo
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import sys
+import os
+import argparse
+import statistics
+import time
+
+# Adiciona o root do projeto ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TERMOS_PADRAO = ["glock", "9mm", "9 mm", "taurus g2c", "pistola", "carabina 22", "munição 380", "cbc"]
+
+
+def consulta_antes(termo):
+    """Reprodução fiel do OR de ILIKE que o catálogo usava."""
+    from sqlalchemy import or_
+    from app.produtos.models import Produto
+    from app.produtos.categorias.models import CategoriaProduto
+    from app.produtos.configs.models import MarcaProduto, CalibreProduto
+    from app.services.busca_produtos import normalizar_termo
+
+    normalizado = normalizar_termo(termo)
+    variantes = {normalizado, normalizado.replace(' ', ''), normalizado.replace(' ', '-')}
+    condicoes = []
+    for v in variantes:
+        filtro = f"%{v}%"
+        condicoes.extend([
+            Produto.nome.ilike(filtro), Produto.nome_comercial.ilike(filtro),
+            Produto.codigo.ilike(filtro), Produto.descricao.ilike(filtro),
+            Produto.tags_palavras_chave.ilike(filtro), Produto.descricao_comercial.ilike(filtro),
+        ])
+    filtro_original = f"%{termo}%"
+    condicoes.extend([
+        Produto.nome.ilike(filtro_original), Produto.nome_comercial.ilike(filtro_original),
+        Produto.codigo.ilike(filtro_original), Produto.descricao.ilike(filtro_original),
+        Produto.tags_palavras_chave.ilike(filtro_original),
+        CalibreProduto.nome.ilike(filtro_original), MarcaProduto.nome.ilike(filtro_original),
+        CategoriaProduto.nome.ilike(filtro_original),
+    ])
+    return Produto.query.outerjoin(Produto.calibre_rel).outerjoin(Produto.marca_rel)\
+        .outerjoin(Produto.categoria)\
+        .filter(Produto.visivel_loja == True, or_(*condicoes))\
+        .order_by(Produto.destaque_home.desc(), Produto.criado_em.desc()).limit(20)
+
+
+def consulta_depois(termo):
+    from app.services.busca_produtos import consulta_busca
+    return consulta_busca(termo).limit(20)
+
+
+def medir(db, consulta, repeticoes):
+    """Tempos (ms) de `repeticoes` execuções + nº de linhas da última."""
+    tempos, linhas = [], 0
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        linhas = len(consulta.all())
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        db.session.expunge_all()
+    return tempos, linhas
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def explain(db, consulta):
+    conexao = db.session.connection()
+    compilado = consulta.statement.compile(dialect=conexao.dialect)
+    plano = conexao.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {compilado}", compilado.params).fetchall()
+    return "\n".join(f"      {linha[0]}" for linha in plano)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da busca de produtos (antes x depois)")
+    parser.add_argument("--termos", default=",".join(TERMOS_PADRAO), help="Termos separados por vírgula")
+    parser.add_argument("--repeticoes", type=int, default=20)
+    parser.add_argument("--explain", action="store_true", help="Mostra o EXPLAIN ANALYZE de cada consulta")
+    args = parser.parse_args()
+
+    from app import create_app, db
+    app = create_app()
+
+    termos = [t.strip() for t in args.termos.split(",") if t.strip()]
+    totais = {"antes": [], "depois": []}
+
+    with app.app_context():
+        print(f"{'termo':<16} {'versão':<7} {'p50 ms':>8} {'p95 ms':>8} {'linhas':>7}")
+        for termo in termos:
+            for versao, montar in (("antes", consulta_antes), ("depois", consulta_depois)):
+                consulta = montar(termo)
+                medir(db, consulta, 1)  # aquecimento (plano/cache do Postgres)
+                tempos, linhas = medir(db, consulta, args.repeticoes)
+                totais[versao].extend(tempos)
+                print(f"{termo:<16} {versao:<7} {statistics.median(tempos):>8.1f} "
+                      f"{percentil(tempos, 95):>8.1f} {linhas:>7}")
+                if args.explain:
+                    print(explain(db, consulta))
+
+        print("-" * 50)
+        for versao, tempos in totais.items():
+            if tempos:
+                print(f"{'TOTAL':<16} {versao:<7} {statistics.median(tempos):>8.1f} {percentil(tempos, 95):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
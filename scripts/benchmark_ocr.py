@@ -0,0 +1,201 @@
+"""
+scripts/benchmark_ocr.py
+─────────────────────────────────────────────────────────────────────────────
+Compara tempo e acerto de campos do OCR local nas duas estratégias de
+app/services/ocr_local.py:
+
+  fixa        → 300 dpi + OSD em toda página, todas as páginas lidas
+  adaptativa  → 1ª passada em OCR_DPI_INICIAL, só páginas fracas refeitas em
+                300 dpi, OSD dispensado quando a orientação já é conhecida e
+                parada assim que os campos obrigatórios do tipo aparecem
+
+O acerto é medido com os parsers de regex (parse_craf / parse_cr): quantos
+campos esperados saíram iguais do texto reconhecido. Sem LLM, sem rede.
+
+Corpus sintético: CRAF e CR fictícios (dados inventados) renderizados com
+PIL — página limpa em 300 dpi, scan em 150 dpi, foto girada com tag EXIF e
+PDF de 3 páginas com os campos na primeira.
+
+Corpus real (--pasta): cada arquivo PDF/JPG/PNG/TIFF com um <nome>.json ao
+lado: {"tipo": "craf" | "cr", "campos": {"numero_serie": "...", ...}}.
+Use documentos anonimizados — o script não grava nada além do relatório.
+
+Como rodar:
+    python scripts/benchmark_ocr.py                       # corpus sintético
+    python scripts/benchmark_ocr.py --pasta docs_anonimizados/
+    python scripts/benchmark_ocr.py --repeticoes 3 --dpi-inicial 150
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import sys
+import os
+import io
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+# Adiciona o root do projeto ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFont
+
+EXTENSOES = {'.pdf', '.jpg', '.jpeg', '.png', '.tif', '.tiff'}
+
+CRAF_FICTICIO = {
+    "tipo": "craf",
+    "linhas": [
+        "MINISTERIO DA DEFESA - EXERCITO BRASILEIRO",
+        "CERTIFICADO DE REGISTRO DE ARMA DE FOGO",
+        "ESPECIE: PISTOLA",
+        "MARCA: TAURUS",
+        "MODELO: G2C",
+        "CALIBRE: 9MM",
+        "N SERIE: ABC123456",
+        "N SIGMA: 1234567",
+        "VALIDADE: 10/10/2030",
+    ],
+    "campos": {"marca": "Taurus", "modelo": "G2C", "calibre": "9mm",
+               "numero_serie": "ABC123456", "numero_sigma": "1234567"},
+}
+
+CR_FICTICIO = {
+    "tipo": "cr",
+    "linhas": [
+        "CERTIFICADO DE REGISTRO",
+        "CR: 000123456",
+        "NOME: FULANO DE TAL",
+        "CPF: 123.456.789-09",
+        "VALIDADE: 01/02/2031",
+    ],
+    "campos": {"numero_cr": "000123456", "validade": "01/02/2031"},
+}
+
+
+def renderizar(linhas, dpi=300):
+    """Página A4 em tons de cinza com as linhas do documento."""
+    largura, altura = int(8.27 * dpi), int(11.69 * dpi)
+    pagina = Image.new('L', (largura, altura), 255)
+    desenho = ImageDraw.Draw(pagina)
+    fonte = ImageFont.load_default(size=max(12, dpi // 8))
+    y = dpi // 2
+    for linha in linhas:
+        desenho.text((dpi // 2, y), linha, fill=0, font=fonte)
+        y += dpi // 5
+    return pagina
+
+
+def salvar(img, formato, **kwargs):
+    buf = io.BytesIO()
+    img.save(buf, format=formato, **kwargs)
+    return buf.getvalue()
+
+
+def corpus_sintetico():
+    """[(nome, bytes, tipo, campos)]"""
+    craf, cr = CRAF_FICTICIO, CR_FICTICIO
+    limpa = renderizar(craf["linhas"])
+    scan_150 = renderizar(cr["linhas"], dpi=150)
+
+    # foto de celular: pixels girados + tag Orientation (a câmera não gira o JPEG)
+    foto = renderizar(craf["linhas"], dpi=200).rotate(90, expand=True).convert('RGB')
+    exif = foto.getexif()
+    exif[0x0112] = 6
+
+    pdf_paginas = [renderizar(craf["linhas"]).convert('RGB')] + [
+        renderizar([f"ANEXO {n}", "PAGINA SEM CAMPOS DO CRAF"]).convert('RGB') for n in (2, 3)
+    ]
+
+    return [
+        ('craf_300dpi.png', salvar(limpa, 'PNG', dpi=(300, 300)), craf["tipo"], craf["campos"]),
+        ('cr_scan_150dpi.jpg', salvar(scan_150, 'JPEG', quality=75, dpi=(150, 150)), cr["tipo"], cr["campos"]),
+        ('craf_foto_exif.jpg', salvar(foto, 'JPEG', quality=85, exif=exif, dpi=(200, 200)),
+         craf["tipo"], craf["campos"]),
+        ('craf_3_paginas.pdf', salvar(pdf_paginas[0], 'PDF', resolution=300, save_all=True,
+                                      append_images=pdf_paginas[1:]), craf["tipo"], craf["campos"]),
+    ]
+
+
+def corpus_pasta(pasta, limite):
+    documentos = []
+    for arquivo in sorted(p for p in Path(pasta).rglob('*') if p.suffix.lower() in EXTENSOES):
+        gabarito = arquivo.with_suffix('.json')
+        if not gabarito.exists():
+            print(f"(sem {gabarito.name}, ignorado) {arquivo.name}")
+            continue
+        esperado = json.loads(gabarito.read_text(encoding='utf-8'))
+        documentos.append((arquivo.name, arquivo.read_bytes(), esperado["tipo"], esperado["campos"]))
+    return documentos[:limite] if limite else documentos
+
+
+def acertos(tipo, textos, campos):
+    """Campos esperados que o parser de regex achou iguais no texto."""
+    from app.uploads.parsers import PARSERS_POR_TIPO
+    dados = PARSERS_POR_TIPO[tipo]("\n".join(textos))
+    normalizar = lambda v: str(v or "").strip().upper()  # noqa: E731
+    return sum(1 for campo, valor in campos.items() if normalizar(dados.get(campo)) == normalizar(valor))
+
+
+def rodar(dados, nome, tipo, estrategia, repeticoes):
+    """(mediana ms de parede, último resultado) de extract_text_local()."""
+    from app.services.ocr_local import extract_text_local
+    from app.uploads.parsers import campos_completos
+
+    parar_quando = lambda textos: campos_completos(tipo, textos)  # noqa: E731
+    tempos, resultado = [], None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = extract_text_local(dados, nome, try_pdf_textlayer=False,
+                                       estrategia=estrategia, parar_quando=parar_quando)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do OCR local (estratégia fixa x adaptativa)')
+    parser.add_argument('--pasta', help='Pasta com documentos anonimizados + <nome>.json (padrão: sintético)')
+    parser.add_argument('--limite', type=int, default=0, help='Máximo de documentos da pasta')
+    parser.add_argument('--repeticoes', type=int, default=1)
+    parser.add_argument('--dpi-inicial', type=int, help='Sobrescreve OCR_DPI_INICIAL')
+    args = parser.parse_args()
+
+    # parsers.py importa o cliente Groq; o benchmark não chama o LLM
+    os.environ.setdefault('GROQ_API_KEY', 'benchmark')
+    from app.services import ocr_local
+    if args.dpi_inicial:
+        ocr_local.OCR_DPI_INICIAL = args.dpi_inicial
+
+    documentos = corpus_pasta(args.pasta, args.limite) if args.pasta else corpus_sintetico()
+    if not documentos:
+        print("Nenhum documento encontrado.")
+        return
+
+    # Mede como o worker de OCR roda: com o pool de processos
+    ocr_local.iniciar_pool()
+
+    print(f"{'documento':<24} {'estratégia':<11} {'ms':>8} {'campos':>7} {'pág':>4} {'refeitas':>8} {'sem OSD':>7}")
+    totais = {}
+    for nome, dados, tipo, campos in documentos:
+        for estrategia in ('fixa', 'adaptativa'):
+            ms, resultado = rodar(dados, nome, tipo, estrategia, args.repeticoes)
+            certos = acertos(tipo, resultado["texts"], campos)
+            meta = resultado["meta"]
+            soma = totais.setdefault(estrategia, [0.0, 0, 0])
+            soma[0] += ms
+            soma[1] += certos
+            soma[2] += len(campos)
+            print(f"{nome[:24]:<24} {estrategia:<11} {ms:>8.0f} {certos:>3}/{len(campos):<3} "
+                  f"{resultado['pages']:>4} {meta['paginas_reprocessadas']:>8} {meta['osd_dispensado']:>7}")
+
+    print("-" * 76)
+    n = len(documentos)
+    for estrategia, (ms, certos, esperados) in totais.items():
+        print(f"{'MÉDIA/documento':<24} {estrategia:<11} {ms / n:>8.0f} "
+              f"{100 * certos / max(esperados, 1):>6.1f}% de acerto")
+    fixa, adaptativa = totais['fixa'][0], totais['adaptativa'][0]
+    print(f"Ganho de tempo da adaptativa: {fixa / max(adaptativa, 0.01):.2f}x")
+
+
+if __name__ == '__main__':
+    main()
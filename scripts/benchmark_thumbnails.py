@@ -0,0 +1,151 @@
+"""
+scripts/benchmark_thumbnails.py
+─────────────────────────────────────────────────────────────────────────────
+Compara o tempo de CPU por imagem da geração de thumbnails antes/depois do
+motor de decodificação única (app/utils/thumbnail_utils.py).
+
+  antes  → generate_thumbnail() antigo, uma chamada por tamanho: cada uma
+           reabre e decodifica o original inteiro, converte RGBA e roda o
+           LANCZOS a partir da resolução cheia
+  depois → gerar_thumbnails(): uma decodificação (JPEG com Image.draft()),
+           tamanhos gerados do maior para o menor
+
+Mede os thumbs de produto (t280 + t160) e, com --escada, também a escada
+responsiva (LARGURAS_VARIANTES em WebP).
+
+Como rodar:
+    python scripts/benchmark_thumbnails.py                     # imagens sintéticas
+    python scripts/benchmark_thumbnails.py --pasta fotos/      # JPEG/PNG/WebP reais
+    python scripts/benchmark_thumbnails.py --repeticoes 10 --escada
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import sys
+import os
+import io
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+# Adiciona o root do projeto ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+EXTENSOES = {'.jpg', '.jpeg', '.png', '.webp'}
+
+
+def thumbnail_antes(image_bytes, size_key):
+    """Reprodução fiel do generate_thumbnail() anterior (1 decodificação por tamanho)."""
+    from app.utils.thumbnail_utils import THUMB_SIZES, THUMB_QUALITY
+
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA')
+        img.thumbnail(THUMB_SIZES[size_key], Image.LANCZOS)
+        if img.mode == 'RGBA':
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[3])
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+        buf = io.BytesIO()
+        img.save(buf, format='WEBP', quality=THUMB_QUALITY[size_key], method=4)
+        return buf.getvalue()
+
+
+def escada_antes(image_bytes, larguras):
+    """Escada responsiva ingênua: cada largura decodifica e reduz do original."""
+    saidas = []
+    for largura in larguras:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            img = img.convert('RGB')
+            if largura < img.width:
+                img = img.resize((largura, round(img.height * largura / img.width)), Image.LANCZOS)
+            buf = io.BytesIO()
+            img.save(buf, format='WEBP', quality=80, method=4)
+            saidas.append(buf.getvalue())
+    return saidas
+
+
+def corpus_sintetico():
+    """Fotos de produto típicas: JPEG 12 MP e 4 MP de câmera, PNG com alpha."""
+    imagens = []
+    for nome, tamanho, formato in (
+        ('foto_12mp.jpg', (4000, 3000), 'JPEG'),
+        ('foto_4mp.jpg', (2400, 1600), 'JPEG'),
+        ('recorte_alpha.png', (1600, 1600), 'PNG'),
+    ):
+        img = Image.radial_gradient('L').resize(tamanho)
+        img = Image.merge('RGB', (img, img.rotate(90), img.rotate(180)))
+        if formato == 'PNG':
+            img = img.convert('RGBA')
+            img.putalpha(Image.linear_gradient('L').resize(tamanho))
+        buf = io.BytesIO()
+        img.save(buf, format=formato, quality=90)
+        imagens.append((nome, buf.getvalue()))
+    return imagens
+
+
+def corpus_pasta(pasta, limite):
+    arquivos = sorted(p for p in Path(pasta).rglob('*') if p.suffix.lower() in EXTENSOES)
+    if limite:
+        arquivos = arquivos[:limite]
+    return [(p.name, p.read_bytes()) for p in arquivos]
+
+
+def cpu_ms(funcao, repeticoes):
+    """Tempo de CPU (process_time) por execução, em ms."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.process_time()
+        funcao()
+        tempos.append((time.process_time() - inicio) * 1000)
+    return tempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de geração de thumbnails (antes x depois)')
+    parser.add_argument('--pasta', help='Pasta com imagens reais (padrão: corpus sintético)')
+    parser.add_argument('--limite', type=int, default=0, help='Máximo de imagens da pasta')
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--escada', action='store_true', help='Mede também a escada responsiva (WebP)')
+    args = parser.parse_args()
+
+    from app.utils.thumbnail_utils import gerar_thumbnails, gerar_variantes, LARGURAS_VARIANTES
+
+    imagens = corpus_pasta(args.pasta, args.limite) if args.pasta else corpus_sintetico()
+    if not imagens:
+        print("Nenhuma imagem encontrada.")
+        return
+
+    sizes = ['t280', 't160']
+    casos = [
+        ('thumbs', lambda dados: [thumbnail_antes(dados, s) for s in sizes],
+                   lambda dados: gerar_thumbnails(dados, sizes)),
+    ]
+    if args.escada:
+        casos.append(('escada', lambda dados: escada_antes(dados, LARGURAS_VARIANTES),
+                                lambda dados: gerar_variantes(dados, formatos=('webp',))))
+
+    print(f"{'imagem':<22} {'caso':<7} {'antes ms':>9} {'depois ms':>10} {'ganho':>7}")
+    totais = {}
+    for nome, dados in imagens:
+        for caso, antes, depois in casos:
+            t_antes = statistics.median(cpu_ms(lambda: antes(dados), args.repeticoes))
+            t_depois = statistics.median(cpu_ms(lambda: depois(dados), args.repeticoes))
+            soma = totais.setdefault(caso, [0.0, 0.0])
+            soma[0] += t_antes
+            soma[1] += t_depois
+            print(f"{nome[:22]:<22} {caso:<7} {t_antes:>9.1f} {t_depois:>10.1f} {t_antes / max(t_depois, 0.01):>6.1f}x")
+
+    print("-" * 58)
+    for caso, (t_antes, t_depois) in totais.items():
+        n = len(imagens)
+        print(f"{'MÉDIA/imagem':<22} {caso:<7} {t_antes / n:>9.1f} {t_depois / n:>10.1f} "
+              f"{t_antes / max(t_depois, 0.01):>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -20,20 +20,40 @@ Como rodar:
     # Limitar quantidade (para testar):
     python scripts/gerar_thumbnails.py --limite 10
 
+    # Também a escada responsiva AVIF/WebP das fotos de produto:
+    python scripts/gerar_thumbnails.py --tipo produtos --variantes
+
+    # Concorrência (threads de I/O no R2 / processos de encode):
+    python scripts/gerar_thumbnails.py --workers-io 16 --workers-cpu 4
+
 Correções aplicadas (v2):
   - Download autenticado via boto3 (get_object) para buckets privados no R2
   - Limpeza de fragmentos #hash duplicados nas URLs (ex: arquivo.webp#arquivo.webp)
   - URLs cdn.m4tatica.com.br/* traduzidas para r2_key e lidas diretamente do bucket
   - Fallback para HTTP público caso o cliente R2 não esteja disponível
+
+Pipeline paralelo (v3):
+  - Threads para download/upload no R2, processos para decode/encode (Pillow)
+  - Pula imagens cujas variantes já estão no R2 (listagem do bucket;
+    head_object se a listagem falhar) — use --forcar para regerar
+  - Checkpoint em scripts/.gerar_thumbnails.checkpoint: rodar de novo
+    retoma de onde parou (--recomecar zera); cada linha guarda o modo
+    (só thumbs ou thumbs + escada), então rodar com --variantes depois de
+    uma passada sem elas não pula nada
+  - Relatório de vazão (img/s) e bytes economizados
 ─────────────────────────────────────────────────────────────────────────────
 """
 
 import sys
 import os
 import argparse
+import re
+import threading
+import time
 import urllib.request
 import urllib.error
 import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 from urllib.parse import urlparse, urlunparse
 
@@ -47,6 +67,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+CHECKPOINT_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.gerar_thumbnails.checkpoint')
+
 
 # ── Helpers de URL ──────────────────────────────────────────────────────────
 
@@ -106,30 +128,9 @@ def url_para_r2_key(url: str, cdn_base: str) -> str | None:
 
 
 def _get_r2_client():
-    """Cria cliente S3-compatível para o R2. Retorna None se não configurado."""
-    try:
-        import boto3
-        from botocore.config import Config
-
-        endpoint = os.environ.get('R2_ENDPOINT_URL', '')
-        access_key = os.environ.get('R2_ACCESS_KEY_ID', '')
-        secret_key = os.environ.get('R2_SECRET_ACCESS_KEY', '')
-
-        if not all([endpoint, access_key, secret_key]):
-            logger.debug("Credenciais R2 não configuradas — boto3 não iniciado.")
-            return None
-
-        return boto3.client(
-            's3',
-            endpoint_url=endpoint,
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            config=Config(signature_version='s3v4'),
-            region_name='auto',
-        )
-    except ImportError:
-        logger.warning("boto3 não instalado — download autenticado indisponível.")
-        return None
+    """Cliente S3 compartilhado do R2 (app/utils/r2_gateway.py). None se não configurado."""
+    from app.utils import r2_gateway
+    return r2_gateway.cliente()
 
 
 # ── Download de imagem ───────────────────────────────────────────────────────
@@ -197,89 +198,313 @@ def baixar_imagem(url: str, r2_client, cdn_base: str) -> bytes | None:
     return baixar_imagem_http(url)
 
 
+# ── Checkpoint (retomada) ───────────────────────────────────────────────────
+
+MODO_THUMBS = 'thumbs'
+
+
+def modo_do_item(r2_key: str, variantes: bool) -> str:
+    """
+    O que "concluído" significa para a imagem: só os thumbs, ou thumbs +
+    a escada (com as larguras e formatos desta execução).
+    """
+    from app.utils.thumbnail_utils import LARGURAS_VARIANTES, formatos_suportados
+
+    if not variantes or 'logos' in r2_key or 'marcas' in r2_key:
+        return MODO_THUMBS
+    larguras = ','.join(str(l) for l in LARGURAS_VARIANTES)
+    return f"variantes:{larguras}:{','.join(formatos_suportados())}"
+
+
+class Checkpoint:
+    """
+    Arquivo texto com um "r2_key<TAB>modo" concluído por linha. Uma execução
+    interrompida (Ctrl+C, deploy, queda) retoma pulando o que já terminou
+    no mesmo modo. Linhas antigas, sem modo, valem como só thumbs.
+    """
+
+    def __init__(self, caminho: str | None):
+        self.caminho = caminho
+        self.feitos = set()
+        self._lock = threading.Lock()
+        if caminho and os.path.exists(caminho):
+            with open(caminho, encoding='utf-8') as f:
+                for linha in f:
+                    r2_key, _, modo = linha.strip().partition('\t')
+                    if r2_key:
+                        self.feitos.add((r2_key, modo or MODO_THUMBS))
+
+    def __contains__(self, item):
+        return item in self.feitos
+
+    def marcar(self, r2_key: str, modo: str = MODO_THUMBS):
+        if not self.caminho:
+            return
+        with self._lock:
+            self.feitos.add((r2_key, modo))
+            with open(self.caminho, 'a', encoding='utf-8') as f:
+                f.write(f"{r2_key}\t{modo}\n")
+
+
+# ── Pular variantes que já existem no R2 ────────────────────────────────────
+
+def listar_existentes(r2_client, keys) -> set | None:
+    """
+    Lista (list_objects_v2) só os diretórios das keys pedidas
+    (produtos/fotos/<id>/ de cada item selecionado) e devolve o conjunto
+    das que já existem. Uma página cobre até 1000 objetos, então é bem
+    mais barato que um head_object por variante — e um --limite pequeno
+    lista só o que vai processar, não o bucket inteiro.
+    Retorna None se a listagem falhar (aí cada item usa head_object).
+    """
+    from app.utils.thumbnail_utils import _bucket_para_key
+
+    por_bucket = {}
+    for key in keys:
+        prefixo = key.rsplit('/', 1)[0] + '/' if '/' in key else ''
+        por_bucket.setdefault(_bucket_para_key(key), set()).add(prefixo)
+
+    existentes = set()
+    try:
+        paginador = r2_client.get_paginator('list_objects_v2')
+        for bucket, prefixos in por_bucket.items():
+            for prefixo in sorted(prefixos):
+                for pagina in paginador.paginate(Bucket=bucket, Prefix=prefixo):
+                    existentes.update(obj['Key'] for obj in pagina.get('Contents', ()))
+    except Exception as e:
+        logger.warning(f"  Listagem do R2 indisponível ({e}) — usando head_object por variante.")
+        return None
+    return existentes
+
+
+_VARIANTE = re.compile(r'^(.+)_w(\d+)\.(\w+)$')
+
+
+def menores_variantes(existentes) -> dict:
+    """{(stem, formato): menor largura da escada presente na listagem}."""
+    menores = {}
+    for key in existentes:
+        casou = _VARIANTE.match(key)
+        if casou:
+            stem, largura, formato = casou.group(1), int(casou.group(2)), casou.group(3)
+            if largura < menores.get((stem, formato), largura + 1):
+                menores[(stem, formato)] = largura
+    return menores
+
+
+def larguras_registradas(app, r2_keys) -> dict:
+    """{r2_key: largura original} das imagens já em ImagemVariantes."""
+    from app.models import ImagemVariantes
+    from app.utils.thumbnail_utils import _normalizar_key
+
+    por_chave = {_normalizar_key(k): k for k in r2_keys}
+    if app is None or not por_chave:
+        return {}
+    try:
+        with app.app_context():
+            linhas = ImagemVariantes.query.with_entities(ImagemVariantes.chave, ImagemVariantes.largura)\
+                .filter(ImagemVariantes.chave.in_(sorted(por_chave))).all()
+    except Exception as e:
+        logger.warning(f"  Registro de variantes indisponível ({e}).")
+        return {}
+    return {por_chave[chave]: largura for chave, largura in linhas if largura}
+
+
+def existe_no_r2(r2_client, key: str) -> bool:
+    from app.utils.thumbnail_utils import _bucket_para_key
+    try:
+        r2_client.head_object(Bucket=_bucket_para_key(key), Key=key)
+        return True
+    except Exception:
+        return False
+
+
 # ── Processamento em lote ────────────────────────────────────────────────────
 
-def processar_lote(items, cdn_base, r2_client, dry_run=False):
+def chaves_do_item(r2_key: str, variantes: bool, largura_original: int | None = None) -> tuple[list, list]:
+    """(sizes, keys esperadas no R2) de uma imagem."""
+    from app.utils.thumbnail_utils import LARGURAS_VARIANTES, formatos_suportados, larguras_para, variante_key
+
+    base_key = str(Path(r2_key).parent / Path(r2_key).stem).replace('\\', '/')
+    logo = 'logos' in r2_key or 'marcas' in r2_key
+    sizes = ['t80'] if logo else ['t280', 't160']
+    keys = [f"{base_key}_{s}.webp" for s in sizes]
+    if variantes and not logo:
+        # Só a menor largura: é a última enviada, então se ela existe a
+        # escada inteira já subiu. Original mais estreito que a escada gera
+        # só _w<largura original> (larguras_para não amplia)
+        menor = larguras_para(largura_original)[0] if largura_original else LARGURAS_VARIANTES[0]
+        keys += [variante_key(r2_key, menor, f) for f in formatos_suportados()]
+    return sizes, keys
+
+
+def codificar(image_bytes: bytes, sizes: list, variantes: bool):
     """
-    Processa uma lista de (nome, url) gerando thumbnails.
+    Roda no pool de PROCESSOS (Pillow é CPU puro e segura o GIL no encode).
+    Retorna ({size_key: bytes}, {(largura, formato): bytes}, tamanho_original).
+    """
+    from app.utils.thumbnail_utils import LARGURAS_VARIANTES, THUMB_SIZES
+    from app.utils.thumbnail_utils import decodificar_imagem, gerar_thumbnails, gerar_variantes
+
+    maior_lado = max(max(THUMB_SIZES[s]) for s in sizes)
+    if variantes:
+        maior_lado = max(maior_lado, *LARGURAS_VARIANTES)
+    imagem = decodificar_imagem(image_bytes, maior_lado)
+    thumbs = gerar_thumbnails(sizes=sizes, imagem=imagem)
+    escada, tamanho = gerar_variantes(imagem=imagem) if variantes else ({}, imagem.info['tamanho_original'])
+    return thumbs, escada, tamanho
+
+
+class Estatisticas:
+    def __init__(self):
+        self.ok = self.erro = self.pulo = 0
+        self.bytes_originais = self.bytes_gerados = self.economia_card = 0
+        self.inicio = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def somar(self, **valores):
+        with self._lock:
+            for nome, valor in valores.items():
+                setattr(self, nome, getattr(self, nome) + valor)
+
+    def resumo(self) -> str:
+        duracao = max(time.perf_counter() - self.inicio, 0.001)
+        mib = 1024 * 1024
+        return (
+            f"{self.ok} imagens em {duracao:.1f}s ({self.ok / duracao:.2f} img/s) | "
+            f"originais {self.bytes_originais / mib:.1f} MiB → gerados {self.bytes_gerados / mib:.1f} MiB | "
+            f"economia média por card: {self.economia_card / max(self.ok, 1) / 1024:.0f} KiB"
+        )
+
+
+def processar_lote(items, cdn_base, r2_client, dry_run=False, workers_io=8, workers_cpu=None,
+                   checkpoint=None, pular_existentes=True, variantes=False, app=None):
+    """
+    Processa uma lista de (nome, url) gerando thumbnails, em pipeline:
+      - pool de THREADS (workers_io): download/HEAD/upload no R2
+      - pool de PROCESSOS (workers_cpu): decode + encode no Pillow
+    Cada imagem concluída vai para o checkpoint; já existentes são puladas.
 
     items:      lista de (nome: str, url: str)
     cdn_base:   base do CDN, ex: https://cdn.m4tatica.com.br
     r2_client:  cliente boto3 autenticado (ou None para usar só HTTP)
     dry_run:    se True, apenas simula sem fazer upload
     """
-    from app.utils.thumbnail_utils import generate_thumbnail, upload_thumb_to_r2, _strip_cdn_prefix
+    from app.utils.thumbnail_utils import upload_thumb_to_r2, _strip_cdn_prefix, CONTENT_TYPES, variante_key
 
-    ok = 0
-    erro = 0
-    pulo = 0
+    checkpoint = checkpoint or Checkpoint(None)
+    stats = Estatisticas()
 
+    # ── 1. Normaliza URLs e descarta o que já foi feito ──────────────────
+    fila = []
     for nome, url_original in items:
         if not url_original:
-            pulo += 1
+            stats.pulo += 1
             continue
-
-        # ── 1. Limpa fragmentos #hash da URL ──────────────────────────────
         url = limpar_url(url_original)
         if url != url_original:
             logger.info(f"  URL corrigida (fragment removido): {url_original!r} → {url!r}")
-
-        # ── 2. Garante URL completa ───────────────────────────────────────
         if not url.startswith('http'):
             url = f"{cdn_base}/{url.lstrip('/')}"
+        r2_key = _strip_cdn_prefix(url)
+        if (r2_key, modo_do_item(r2_key, variantes)) in checkpoint:
+            stats.pulo += 1
+            continue
+        fila.append((nome, url, r2_key))
+
+    existentes = menores = None
+    larguras = {}
+    if pular_existentes and r2_client and fila:
+        todas = [k for _, _, r2_key in fila for k in chaves_do_item(r2_key, variantes)[1]]
+        existentes = listar_existentes(r2_client, todas)
+        if existentes is not None:
+            menores = menores_variantes(existentes)
+        elif variantes:
+            # Sem listagem, a menor variante de cada imagem sai da largura
+            # original registrada (imagens estreitas não têm _w160)
+            larguras = larguras_registradas(app, [r2_key for _, _, r2_key in fila])
+
+    def na_listagem(key):
+        if key in existentes:
+            return True
+        casou = _VARIANTE.match(key)
+        if not casou or casou.group(3) not in CONTENT_TYPES:
+            return False
+        # Qualquer largura ≤ a pedida: a imagem é mais estreita que a escada
+        menor = menores.get((casou.group(1), casou.group(3)))
+        return menor is not None and menor <= int(casou.group(2))
+
+    def ja_existe(keys):
+        if not pular_existentes or not r2_client:
+            return False
+        if existentes is not None:
+            return all(na_listagem(k) for k in keys)
+        return all(existe_no_r2(r2_client, k) for k in keys)
+
+    logger.info(f"  {len(fila)} imagens na fila ({stats.pulo} já concluídas/sem URL)")
+
+    # ── 2. Pipeline por imagem ───────────────────────────────────────────
+    def processar(item, pool_cpu):
+        nome, url, r2_key = item
+        modo = modo_do_item(r2_key, variantes)
+        sizes, keys = chaves_do_item(r2_key, variantes, larguras.get(r2_key))
+        if ja_existe(keys):
+            checkpoint.marcar(r2_key, modo)
+            stats.somar(pulo=1)
+            return
 
-        logger.info(f"  Processando: {nome} → {url}")
-
-        # ── 3. Baixa a imagem (autenticado ou HTTP) ───────────────────────
         image_bytes = baixar_imagem(url, r2_client, cdn_base)
         if not image_bytes:
             logger.warning(f"  ✗ Falha ao obter imagem: {url}")
-            erro += 1
-            continue
-
-        original_size_kb = len(image_bytes) / 1024
-        r2_key = _strip_cdn_prefix(url)
-
-        p = Path(r2_key)
-        base_key = str(p.parent / p.stem)
-
-        # ── 4. Determina tamanhos a gerar ─────────────────────────────────
-        if 'logos' in r2_key or 'marcas' in r2_key:
-            sizes = ['t80']
-        else:
-            sizes = ['t280', 't160']
+            stats.somar(erro=1)
+            return
+
+        try:
+            thumbs, escada, tamanho = pool_cpu.submit(codificar, image_bytes, sizes, variantes).result()
+        except Exception as e:
+            logger.error(f"  ✗ Erro ao gerar {sizes} para {nome}: {e}")
+            stats.somar(erro=1)
+            return
+
+        base_key = str(Path(r2_key).parent / Path(r2_key).stem).replace('\\', '/')
+        envios = [(f"{base_key}_{s}.webp", dados, 'image/webp') for s, dados in thumbs.items()]
+        envios += [(variante_key(r2_key, l, f), dados, CONTENT_TYPES[f]) for (l, f), dados in escada.items()]
+
+        if not dry_run:
+            falhas = [k for k, dados, tipo in envios if not upload_thumb_to_r2(dados, k, tipo, client=r2_client)]
+            if falhas:
+                logger.error(f"  ✗ Falha no upload: {falhas}")
+                stats.somar(erro=1)
+                return
+            if escada and app is not None:
+                from app.utils.thumbnail_utils import registrar_variantes
+                with app.app_context():
+                    registrar_variantes(r2_key, tamanho, {l for l, _ in escada}, {f for _, f in escada})
+            checkpoint.marcar(r2_key, modo)
+
+        gerados = sum(len(dados) for _, dados, _ in envios)
+        card = len(thumbs.get('t280', thumbs.get('t80', b'')))
+        stats.somar(ok=1, bytes_originais=len(image_bytes), bytes_gerados=gerados,
+                    economia_card=len(image_bytes) - card)
+        logger.info(
+            f"  {'[DRY-RUN] ' if dry_run else ''}✓ {nome}: {len(image_bytes) / 1024:.0f} KiB → "
+            f"{len(envios)} arquivos, {gerados / 1024:.0f} KiB"
+        )
 
-        # ── 5. Gera e envia cada thumbnail ────────────────────────────────
-        for size_key in sizes:
+    with ProcessPoolExecutor(max_workers=workers_cpu) as pool_cpu, \
+            ThreadPoolExecutor(max_workers=workers_io) as pool_io:
+        futuros = [pool_io.submit(processar, item, pool_cpu) for item in fila]
+        for n, futuro in enumerate(as_completed(futuros), 1):
             try:
-                thumb_bytes = generate_thumbnail(image_bytes, size_key)
-                thumb_key = f"{base_key}_{size_key}.webp"
-                thumb_size_kb = len(thumb_bytes) / 1024
-                economia_kb = original_size_kb - thumb_size_kb
-
-                if dry_run:
-                    logger.info(
-                        f"  [DRY-RUN] {size_key}: {original_size_kb:.0f} KiB → "
-                        f"{thumb_size_kb:.0f} KiB (economia: {economia_kb:.0f} KiB)"
-                    )
-                    ok += 1
-                else:
-                    success = upload_thumb_to_r2(thumb_bytes, thumb_key)
-                    if success:
-                        logger.info(
-                            f"  ✓ {size_key}: {original_size_kb:.0f} KiB → "
-                            f"{thumb_size_kb:.0f} KiB (economia: {economia_kb:.0f} KiB)"
-                        )
-                        ok += 1
-                    else:
-                        logger.error(f"  ✗ Falha no upload: {thumb_key}")
-                        erro += 1
-
+                futuro.result()
             except Exception as e:
-                logger.error(f"  ✗ Erro ao gerar {size_key}: {e}")
-                erro += 1
+                logger.error(f"  ✗ Erro inesperado: {e}")
+                stats.somar(erro=1)
+            if n % 50 == 0:
+                logger.info(f"  … {n}/{len(futuros)} | {stats.resumo()}")
 
-    return ok, erro, pulo
+    logger.info(f"  {stats.resumo()}")
+    return stats.ok, stats.erro, stats.pulo
 
 
 # ── Entry point ──────────────────────────────────────────────────────────────
@@ -289,6 +514,12 @@ def main():
     parser.add_argument('--tipo', choices=['marcas', 'produtos', 'todos'], default='todos')
     parser.add_argument('--dry-run', action='store_true', help='Simula sem fazer upload')
     parser.add_argument('--limite', type=int, default=0, help='Limita o número de itens')
+    parser.add_argument('--workers-io', type=int, default=8, help='Threads de download/upload')
+    parser.add_argument('--workers-cpu', type=int, default=os.cpu_count() or 2, help='Processos de encode')
+    parser.add_argument('--variantes', action='store_true', help='Gera também a escada AVIF/WebP das fotos')
+    parser.add_argument('--forcar', action='store_true', help='Regera mesmo o que já existe no R2')
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PADRAO, help='Arquivo de retomada')
+    parser.add_argument('--recomecar', action='store_true', help='Ignora o checkpoint anterior')
     args = parser.parse_args()
 
     # Inicializa o app Flask para ter acesso ao banco
@@ -297,7 +528,9 @@ def main():
 
     cdn_base = os.environ.get('CDN_BASE_URL', 'https://cdn.m4tatica.com.br')
 
-    # Inicializa cliente R2 uma única vez (reutilizado em todos os itens)
+    # Cliente R2 único, com uma conexão no pool para cada thread de I/O
+    from app.utils import r2_gateway
+    r2_gateway.MAX_POOL = max(r2_gateway.MAX_POOL, args.workers_io)
     r2_client = _get_r2_client()
     if r2_client:
         logger.info("✓ Cliente R2 autenticado (boto3) pronto — download via bucket privado.")
@@ -308,6 +541,17 @@ def main():
             "habilitar download autenticado."
         )
 
+    if args.recomecar and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    checkpoint = Checkpoint(None if args.dry_run else args.checkpoint)
+    if checkpoint.feitos:
+        logger.info(f"↻ Retomando: {len(checkpoint.feitos)} imagens já concluídas em {args.checkpoint}")
+
+    opcoes = dict(
+        workers_io=args.workers_io, workers_cpu=args.workers_cpu, checkpoint=checkpoint,
+        pular_existentes=not args.forcar, app=app,
+    )
+
     with app.app_context():
         total_ok = total_erro = total_pulo = 0
 
@@ -320,7 +564,7 @@ def main():
             logger.info(f"  {len(marcas)} marcas encontradas")
 
             items = [(m.nome, m.logo_url) for m in marcas]
-            ok, erro, pulo = processar_lote(items, cdn_base, r2_client, args.dry_run)
+            ok, erro, pulo = processar_lote(items, cdn_base, r2_client, args.dry_run, **opcoes)
             total_ok += ok; total_erro += erro; total_pulo += pulo
 
         if args.tipo in ('produtos', 'todos'):
@@ -335,19 +579,21 @@ def main():
             logger.info(f"  {len(produtos)} produtos encontrados")
 
             items = [(p.nome, p.foto_url) for p in produtos]
-            ok, erro, pulo = processar_lote(items, cdn_base, r2_client, args.dry_run)
+            ok, erro, pulo = processar_lote(items, cdn_base, r2_client, args.dry_run,
+                                            variantes=args.variantes, **opcoes)
             total_ok += ok; total_erro += erro; total_pulo += pulo
 
         logger.info(f"""
 ══ RESULTADO FINAL ══════════════════════════════
-  ✓ Gerados com sucesso : {total_ok}
+  ✓ Imagens processadas : {total_ok}
   ✗ Erros               : {total_erro}
-  ○ Pulados (sem URL)   : {total_pulo}
+  ○ Puladas             : {total_pulo} (sem URL, já existentes ou no checkpoint)
   Modo                  : {'DRY-RUN (nada enviado)' if args.dry_run else 'REAL'}
   Download              : {'R2 autenticado (boto3)' if r2_client else 'HTTP público (fallback)'}
+  Concorrência          : {args.workers_io} threads de I/O, {args.workers_cpu} processos de encode
 ═════════════════════════════════════════════════
 """)
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
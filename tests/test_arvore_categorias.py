@@ -0,0 +1,42 @@
+from app.produtos.categorias.arvore import ArvoreCategorias
+
+# (id, nome, slug, pai_id, icone_loja, ordem_exibicao, exibir_no_menu)
+LINHAS = [
+    (1, "Armas", "armas", None, None, 0, True),
+    (2, "Pistolas", "pistolas", 1, None, 1, True),
+    (3, "Revólveres", "revolveres", 1, None, 0, False),
+    (4, "Pistolas 9mm", "pistolas-9mm", 2, None, 0, True),
+    (5, "Acessórios", "acessorios", None, None, 1, True),
+]
+
+
+def test_descendentes_e_ancestrais_em_qualquer_profundidade():
+    arvore = ArvoreCategorias(LINHAS)
+
+    assert arvore.descendentes(1) == frozenset({1, 2, 3, 4})
+    assert arvore.descendentes(2) == frozenset({2, 4})
+    assert arvore.descendentes(99) == frozenset({99})
+    assert arvore.ancestrais(4) == (1, 2)
+    assert arvore.por_slug("Pistolas-9mm").id == 4
+
+
+def test_filhos_ordenados_e_closure_table_equivalente():
+    arvore = ArvoreCategorias(LINHAS)
+    assert [r.slug for r in arvore.raizes] == ["armas", "acessorios"]
+    assert [s.slug for s in arvore.no(1).subcategorias] == ["revolveres", "pistolas"]
+
+    pares = [(1, 1, 0), (1, 2, 1), (1, 3, 1), (1, 4, 2), (2, 2, 0), (2, 4, 1),
+             (3, 3, 0), (4, 4, 0), (5, 5, 0)]
+    pela_tabela = ArvoreCategorias(LINHAS, pares)
+    assert all(pela_tabela.descendentes(c) == arvore.descendentes(c) for c in range(1, 6))
+
+
+def test_hooks_da_closure_table_toleram_migration_pendente(monkeypatch):
+    from types import SimpleNamespace
+    from sqlalchemy import create_engine
+    from app.produtos.categorias import models
+
+    monkeypatch.setattr(models, "_fechamento_existe", False)
+    with create_engine("sqlite://").connect() as conn:  # sem categoria_produto_fechamento
+        models.fechamento_apos_inserir(None, conn, SimpleNamespace(id=1, pai_id=None))
+        models.fechamento_apos_excluir(None, conn, SimpleNamespace(id=1, pai_id=None))
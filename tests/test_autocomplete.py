@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+from app.services.autocomplete import IndiceAutocomplete, documento_de_linha
+from app.services.precificacao_lote import COLUNAS_ENTRADA
+
+
+def _doc(pid, nome, codigo, marca="", calibre="", destaque=False):
+    linha = {
+        "id": pid, "slug": f"p{pid}", "nome": nome, "nome_comercial": None, "codigo": codigo,
+        "foto_url": None, "preco_a_vista": 100, "estoque_disponivel": 1,
+        "destaque_home": destaque, "criado_em": None,
+        "marca": marca, "calibre": calibre, "categoria": "",
+    }
+    linha.update({f"preco_{c}": None for c in COLUNAS_ENTRADA if c != "id"})
+    return documento_de_linha(SimpleNamespace(_mapping=linha))
+
+
+INDICE = IndiceAutocomplete([
+    _doc(1, "Pistola G2C", "TAU-G2C", "Taurus", "9mm Luger"),
+    _doc(2, "Pistola Glock 19 Gen5", "GLK-19", "Glock", "9 mm"),
+    _doc(3, "Revólver RT 856", "TAU-856", "Taurus", ".38 SPL", destaque=True),
+])
+
+
+def _ids(termo):
+    return [d.id for d in INDICE.buscar(termo)]
+
+
+def test_prefixo_acentos_e_variantes():
+    assert _ids("revol") == [3]
+    assert _ids("taurus") == [3, 1]          # destaque primeiro no empate
+    assert sorted(_ids("9 mm")) == [1, 2]    # "9mm" x "9 mm"
+    assert _ids("tau g2c") == [1]            # código, colado e separado
+
+
+def test_erro_de_digitacao_cai_nos_trigramas():
+    assert _ids("glok") == [2]
+    assert set(_ids("pistolla")) == {1, 2}
+    assert _ids("xyzw") == []
+
+
+def test_atualizacao_incremental():
+    indice = IndiceAutocomplete([_doc(1, "Coldre", "C1")])
+    indice.atualizar({1}, [_doc(1, "Bandoleira", "C1")])
+    assert [d.id for d in indice.buscar("band")] == [1]
+    assert indice.buscar("cold") == []
+    indice.atualizar({1}, [])                # ficou invisível / foi excluído
+    assert len(indice) == 0 and indice.buscar("c1") == []
+
+
+def test_indice_atrasado_reconstroi_em_vez_de_adotar_o_novo_token(monkeypatch):
+    from app.services import autocomplete
+
+    cache = {autocomplete.CHAVE_VERSAO: "token-de-outro-worker"}
+    monkeypatch.setattr(autocomplete, "_cache", lambda: SimpleNamespace(
+        get=cache.get, set=lambda chave, valor, timeout=None: cache.__setitem__(chave, valor)))
+    agendadas = []
+    monkeypatch.setattr(autocomplete, "agendar_construcao", lambda: agendadas.append(1))
+    monkeypatch.setitem(autocomplete._estado, "indice", IndiceAutocomplete())
+    monkeypatch.setitem(autocomplete._estado, "token", "token-velho")
+
+    autocomplete._ao_invalidar({"produto:1"})
+
+    assert autocomplete._estado["token"] is None and agendadas == [1]
+    assert cache[autocomplete.CHAVE_VERSAO] != "token-de-outro-worker"
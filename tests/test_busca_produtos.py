@@ -0,0 +1,18 @@
+from app.services.busca_produtos import escapar_like, normalizar_termo, texto_tsquery
+
+
+def test_normalizar_termo_remove_acentos_e_separadores():
+    assert normalizar_termo("  Munição 9-MM_Luger ") == "municao 9 mm luger"
+
+
+def test_texto_tsquery_prefixo_e_variante_colada():
+    assert texto_tsquery("Glock") == "glock:*"
+    assert texto_tsquery("9 mm") == "(9:* & mm:*) | 9mm:*"
+    # Operadores do tsquery digitados pelo usuário não passam
+    assert texto_tsquery("a & b | !c") == "(a:* & b:* & c:*) | abc:*"
+    assert texto_tsquery("!!") == ""
+
+
+def test_curingas_do_usuario_sao_escapados_no_like():
+    assert escapar_like("50%_off") == r"50\%\_off"
+    assert escapar_like("a\\b") == r"a\\b"
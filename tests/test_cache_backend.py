@@ -0,0 +1,61 @@
+from app.utils import queue
+from app.utils.cache_backend import RedisLRUCache, _prefixo_da_chave
+
+
+class RedisQuebrado:
+    def __getattr__(self, nome):
+        def falha(*args, **kwargs):
+            raise ConnectionError("redis fora do ar")
+        return falha
+
+
+def test_prefixo_da_chave():
+    assert _prefixo_da_chave("precos_v2_166") == "precos_v2"
+    assert _prefixo_da_chave("index_v9") == "index_v9"
+    assert _prefixo_da_chave("img_cache_abc123def456") == "img_cache"
+    assert _prefixo_da_chave("view//loja/produto/g2c-9mm") == "/produto"
+    assert _prefixo_da_chave("/categoria/pistolas?page=2") == "/categoria"
+    assert _prefixo_da_chave("/api/buscar-fuzzy" + "a" * 32) == "/api/buscar-fuzzy"
+
+
+def test_fallback_lru_sem_redis(monkeypatch):
+    monkeypatch.setattr(queue, "redis_conn", None)
+    cache = RedisLRUCache(max_itens_local=2)
+
+    assert cache.backend_ativo == "lru_local"
+    cache.set("precos_v2_1", {"preco_a_vista": 10})
+    cache.set("precos_v2_2", {"preco_a_vista": 20})
+    assert cache.get("precos_v2_1") == {"preco_a_vista": 10}
+
+    # Terceiro item expulsa o menos usado recentemente (precos_v2_2)
+    cache.set("precos_v2_3", {"preco_a_vista": 30})
+    assert cache.get("precos_v2_2") is None
+    assert cache.get("precos_v2_3") == {"preco_a_vista": 30}
+
+    stats = cache.estatisticas()["precos_v2"]
+    assert stats == {"hits": 2, "misses": 1, "hit_rate": 0.6667}
+
+
+def test_redis_com_erro_cai_para_lru(monkeypatch):
+    monkeypatch.setattr(queue, "redis_conn", RedisQuebrado())
+    cache = RedisLRUCache()
+
+    assert cache.set("loja_data_v3", [1, 2, 3]) is True
+    assert cache.get("loja_data_v3") == [1, 2, 3]
+    assert cache.backend_ativo == "lru_local"
+    assert cache.delete("loja_data_v3") is True
+    assert cache.get("loja_data_v3") is None
+
+
+def test_indice_local_esquece_chaves_despejadas(monkeypatch):
+    monkeypatch.setattr(queue, "redis_conn", None)
+    cache = RedisLRUCache(max_itens_local=2)
+
+    for n in (1, 2, 3):  # a 3ª despeja a 1ª
+        cache.set(f"/produto/{n}", n)
+        cache.indexar_chave("vitrine", f"/produto/{n}")
+    assert cache._indices_locais["vitrine"] == {"/produto/2", "/produto/3"}
+    assert "/produto/1" not in cache._deps_locais
+
+    assert cache.consumir_indice("vitrine") == {"/produto/2", "/produto/3"}
+    assert not cache._indices_locais and not cache._deps_locais
@@ -0,0 +1,54 @@
+from werkzeug.datastructures import MultiDict
+
+from app.loja.facetas import args_da_selecao, contar_facetas, ler_selecao, teto_preco_max
+
+# (marca, calibre, tipo, funcionamento, faixa, total)
+CUBO = {
+    "linhas": [
+        (1, 10, None, None, "2000-5000", 3),
+        (1, 11, None, None, "5000-10000", 1),
+        (2, 10, None, None, "2000-5000", 2),
+        (3, None, None, None, "ate-500", 4),
+    ],
+    "rotulos": {
+        "marca": {1: "Taurus", 2: "Glock", 3: "CBC"},
+        "calibre": {10: "9mm", 11: ".40"},
+        "tipo": {}, "funcionamento": {},
+    },
+}
+
+
+def _totais(facetas, dimensao):
+    faceta = next(f for f in facetas if f["dimensao"] == dimensao)
+    return {o["valor"]: o["total"] for o in faceta["opcoes"]}
+
+
+def test_sem_filtro_conta_tudo():
+    facetas = contar_facetas(CUBO, ler_selecao(MultiDict()))
+    assert _totais(facetas, "marca") == {1: 4, 2: 2, 3: 4}
+    assert _totais(facetas, "calibre") == {10: 5, 11: 1}
+    assert [f["dimensao"] for f in facetas] == ["faixa", "marca", "calibre"]
+
+
+def test_contagem_disjuntiva_com_selecao_multipla():
+    selecao = ler_selecao(MultiDict([("marca", "1"), ("marca", "2"), ("calibre", "10")]))
+    facetas = contar_facetas(CUBO, selecao)
+    # Marcas contam com o filtro de calibre, não com o próprio
+    assert _totais(facetas, "marca") == {1: 3, 2: 2}
+    # Calibres contam com as marcas 1 e 2
+    assert _totais(facetas, "calibre") == {10: 5, 11: 1}
+    assert _totais(facetas, "faixa") == {"2000-5000": 5}
+
+
+def test_alternar_valor_na_url():
+    selecao = ler_selecao(MultiDict([("marca", "1"), ("faixa", "ate-500"), ("faixa", "xpto")]))
+    assert args_da_selecao(selecao) == {"faixa": ["ate-500"], "marca": [1]}
+    assert args_da_selecao(selecao, "marca", 2) == {"faixa": ["ate-500"], "marca": [1, 2]}
+    assert args_da_selecao(selecao, "marca", 1) == {"faixa": ["ate-500"]}
+
+
+def test_preco_max_legado_vira_teto_fixo():
+    assert teto_preco_max(1234.56) == teto_preco_max(1500) == 1500
+    assert teto_preco_max(99) == 100
+    assert teto_preco_max(0) is None and teto_preco_max(None) is None
+    assert teto_preco_max(999999) is None  # acima do último teto: sem filtro
@@ -0,0 +1,49 @@
+from scripts import gerar_thumbnails
+from app.utils.thumbnail_utils import formatos_suportados
+
+CDN = "https://cdn.m4tatica.com.br"
+
+
+class PaginadorFake:
+    def __init__(self, existentes, listados):
+        self.existentes, self.listados = existentes, listados
+
+    def paginate(self, Bucket, Prefix):
+        self.listados.append(Prefix)
+        return [{"Contents": [{"Key": k} for k in sorted(self.existentes) if k.startswith(Prefix)]}]
+
+
+class R2Fake:
+    def __init__(self, existentes):
+        self.existentes, self.listados = set(existentes), []
+
+    def get_paginator(self, nome):
+        return PaginadorFake(self.existentes, self.listados)
+
+    def get_object(self, **kwargs):
+        raise AssertionError("baixou uma imagem que já estava no R2")
+
+
+def test_chaves_do_item_produto_logo_e_imagem_estreita():
+    sizes, keys = gerar_thumbnails.chaves_do_item("produtos/fotos/166/aa4.jpg", variantes=False)
+    assert sizes == ["t280", "t160"]
+    assert keys == ["produtos/fotos/166/aa4_t280.webp", "produtos/fotos/166/aa4_t160.webp"]
+
+    assert gerar_thumbnails.chaves_do_item("marcas/logos/taurus.png", variantes=True)[1] == \
+        ["marcas/logos/taurus_t80.webp"]
+
+    # Original de 120 px: a menor variante é _w120, não _w160
+    _, keys = gerar_thumbnails.chaves_do_item("produtos/fotos/166/aa4.jpg", True, largura_original=120)
+    assert keys[2:] == [f"produtos/fotos/166/aa4_w120.{f}" for f in formatos_suportados()]
+
+
+def test_pula_o_que_ja_existe_listando_so_o_diretorio_do_item():
+    existentes = {"produtos/fotos/166/aa4_t280.webp", "produtos/fotos/166/aa4_t160.webp"}
+    existentes |= {f"produtos/fotos/166/aa4_w120.{f}" for f in formatos_suportados()}
+    r2 = R2Fake(existentes)
+
+    ok, erro, pulo = gerar_thumbnails.processar_lote(
+        [("G2C", f"{CDN}/produtos/fotos/166/aa4.jpg#aa4.jpg")], CDN, r2, variantes=True)
+
+    assert (ok, erro, pulo) == (0, 0, 1)
+    assert r2.listados == ["produtos/fotos/166/"]
@@ -0,0 +1,98 @@
+import io
+import threading
+import time
+
+from flask import Flask
+from PIL import Image
+
+from app.utils import image_proxy, queue, r2_gateway
+from app.utils.cache_backend import LRULocal
+
+CAMINHO = "produtos/fotos/166/aa4_t280.webp"
+
+
+def _webp():
+    buf = io.BytesIO()
+    Image.new("RGBA", (40, 30), (200, 10, 10, 128)).save(buf, format="WEBP")
+    return buf.getvalue()
+
+
+def _app(tmp_path):
+    app = Flask(__name__)
+    app.config["IMAGE_PROXY_CACHE_DIR"] = str(tmp_path / "cache")
+    app.add_url_rule("/img/<path:image_path>", "img", image_proxy.serve_image_with_fallback)
+    return app
+
+
+def test_conversoes_simultaneas_viram_uma_e_persistem_no_r2(monkeypatch, tmp_path):
+    downloads = []
+
+    def baixar(caminho):
+        downloads.append(caminho)
+        time.sleep(0.05)
+        return _webp()
+
+    monkeypatch.setattr(image_proxy, "_download_image_from_cdn", baixar)
+    monkeypatch.setattr(image_proxy, "_cache_disco", None)
+    monkeypatch.setattr(image_proxy, "_versoes", LRULocal(16))
+    monkeypatch.setattr(queue, "redis_conn", None)
+    fake = r2_gateway.usar_fake()
+    try:
+        etag = fake.put_object(Bucket="m4-loja-publico", Key=CAMINHO, Body=_webp())["ETag"].strip('"')
+        app, resultados = _app(tmp_path), []
+
+        def pedir():
+            with app.app_context():
+                resultados.append(image_proxy._obter_jpeg(CAMINHO))
+
+        threads = [threading.Thread(target=pedir) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(downloads) == 1
+        assert len(set(resultados)) == 1 and resultados[0][:2] == b"\xff\xd8"
+        chave = f"produtos/fotos/166/aa4_t280.{etag[:16]}.fallback.jpg"
+        assert fake.head_object(Bucket="m4-loja-publico", Key=chave)["ContentType"] == "image/jpeg"
+    finally:
+        r2_gateway.resetar()
+
+
+def test_original_trocado_gera_outro_fallback(monkeypatch, tmp_path):
+    monkeypatch.setattr(image_proxy, "_download_image_from_cdn", lambda caminho: _webp())
+    monkeypatch.setattr(image_proxy, "_cache_disco", None)
+    monkeypatch.setattr(image_proxy, "_versoes", LRULocal(16))
+    monkeypatch.setattr(queue, "redis_conn", None)
+    fake = r2_gateway.usar_fake()
+    try:
+        with _app(tmp_path).app_context():
+            fake.put_object(Bucket="m4-loja-publico", Key=CAMINHO, Body=b"v1")
+            image_proxy._obter_jpeg(CAMINHO)
+            fake.put_object(Bucket="m4-loja-publico", Key=CAMINHO, Body=b"v2")
+            image_proxy._versoes.delete(CAMINHO)  # passado o VERSAO_TTL
+            image_proxy._obter_jpeg(CAMINHO)
+
+        fallbacks = [k for _, k in fake.objetos if k.endswith(".fallback.jpg")]
+        assert len(fallbacks) == 2
+    finally:
+        r2_gateway.resetar()
+
+
+def test_etag_forte_e_304(monkeypatch, tmp_path):
+    monkeypatch.setattr(image_proxy, "_download_image_from_cdn", lambda caminho: _webp())
+    monkeypatch.setattr(image_proxy, "_cache_disco", None)
+    monkeypatch.setattr(queue, "redis_conn", None)
+    monkeypatch.setattr(r2_gateway, "configurado", lambda: False)
+    cliente = _app(tmp_path).test_client()
+
+    resposta = cliente.get(f"/img/{CAMINHO}", headers={"Accept": "image/jpeg"})
+    assert resposta.status_code == 200 and resposta.mimetype == "image/jpeg"
+    etag, fraca = resposta.get_etag()
+    assert etag and not fraca
+    assert "Accept" in resposta.headers["Vary"]
+
+    revalidada = cliente.get(f"/img/{CAMINHO}", headers={"Accept": "image/jpeg", "If-None-Match": f'"{etag}"'})
+    assert revalidada.status_code == 304 and revalidada.data == b""
+
+    assert cliente.get(f"/img/{CAMINHO}", headers={"Accept": "image/webp,*/*"}).status_code == 307
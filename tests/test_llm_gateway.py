@@ -0,0 +1,144 @@
+import importlib
+import threading
+import time
+
+import pytest
+
+from app.utils import llm_gateway
+
+MENSAGENS = [{"role": "user", "content": "CRAF nº 123"}]
+
+
+@pytest.fixture
+def stub():
+    yield llm_gateway.usar_stub(lambda mensagens, modelo: {"categoria": "CRAF"})
+    llm_gateway.resetar()
+
+
+def test_mesmo_prompt_sai_do_cache(stub):
+    primeira = llm_gateway.completar(MENSAGENS, "modelo-x")
+    assert llm_gateway.completar(MENSAGENS, "modelo-x") == primeira == '{"categoria": "CRAF"}'
+    assert len(stub.chamadas) == 1
+
+    llm_gateway.completar(MENSAGENS, "modelo-x", temperatura=0.3)  # prompt diferente
+    llm_gateway.completar(MENSAGENS, "modelo-x", cache_ttl=0)
+    assert len(stub.chamadas) == 3
+    assert llm_gateway.estatisticas()["cache"] == 1
+
+
+def test_pedidos_identicos_simultaneos_viram_uma_chamada(stub):
+    liberar = threading.Event()
+
+    def lento(mensagens, modelo):
+        liberar.wait(2)
+        return "ok"
+
+    stub.responder = lento
+    respostas = []
+    threads = [threading.Thread(target=lambda: respostas.append(llm_gateway.completar(MENSAGENS, "m")))
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    while llm_gateway.estatisticas()["coalescidas"] < 3:
+        time.sleep(0.01)
+    liberar.set()
+    for t in threads:
+        t.join()
+
+    assert respostas == ["ok"] * 4 and len(stub.chamadas) == 1
+
+
+def test_balde_limita_rajada():
+    balde = llm_gateway._Balde(por_minuto=60, rajada=2)
+    assert balde.retirar() < 0.01 and balde.retirar() < 0.01  # rajada sem espera
+    with pytest.raises(llm_gateway.ErroLLM) as erro:
+        balde.retirar(espera_max=0.1)  # próxima ficha só em ~1 s
+    assert erro.value.status == 429
+
+
+def test_espera_max_zero_falha_na_hora_sem_ficha(monkeypatch):
+    from app.utils import queue
+    monkeypatch.setattr(queue, "redis_conn", None)
+    llm_gateway.resetar()
+    monkeypatch.setattr(llm_gateway, "_balde", llm_gateway._Balde(por_minuto=1, rajada=1))
+    llm_gateway._balde.retirar()  # esvazia: próxima ficha só em ~60 s
+    inicio = time.monotonic()
+    with pytest.raises(llm_gateway.ErroLLM) as erro:
+        llm_gateway.completar(MENSAGENS, "m", chave_api="chave", cache_ttl=0, espera_max=0)
+    assert erro.value.status == 429 and time.monotonic() - inicio < 0.5
+    llm_gateway.resetar()
+
+
+def test_ocr_inteligente_importa_sem_chave(monkeypatch):
+    monkeypatch.delenv("GROQ_API_KEY", raising=False)
+    monkeypatch.delenv("LLM_BACKEND", raising=False)
+    llm_gateway.resetar()
+    from app.services import ocr_inteligente
+    importlib.reload(ocr_inteligente)
+
+    resultado = ocr_inteligente.interpretar_documento("CERTIFICADO DE REGISTRO DE ARMA DE FOGO nº 123")
+    assert "GROQ_API_KEY" in resultado["observacoes"]
+
+
+def test_resposta_recusada_pelo_validador_nao_fica_no_cache(stub):
+    respostas = iter(["não é JSON", '{"ok": true}'])
+    stub.responder = lambda mensagens, modelo: next(respostas)
+
+    assert llm_gateway.completar(MENSAGENS, "m", validar=llm_gateway.json_valido) == "não é JSON"
+    assert llm_gateway.completar(MENSAGENS, "m", validar=llm_gateway.json_valido) == '{"ok": true}'
+    assert llm_gateway.completar(MENSAGENS, "m", validar=llm_gateway.json_valido) == '{"ok": true}'
+    assert len(stub.chamadas) == 2
+
+
+class RedisMemoria:
+    def __init__(self):
+        self.dados = {}
+
+    def set(self, chave, valor, nx=False, ex=None):
+        if nx and chave in self.dados:
+            return None
+        self.dados[chave] = valor.encode() if isinstance(valor, str) else valor
+        return True
+
+    def setex(self, chave, ttl, valor):
+        self.dados[chave] = valor
+
+    def get(self, chave):
+        return self.dados.get(chave)
+
+    def exists(self, chave):
+        return int(chave in self.dados)
+
+    def delete(self, chave):
+        self.dados.pop(chave, None)
+
+    def register_script(self, lua):
+        raise ConnectionError("sem Lua no fake")
+
+
+def test_outro_processo_com_a_trava_responde_pelo_cache(monkeypatch):
+    from app.utils import queue
+
+    redis = RedisMemoria()
+    monkeypatch.setattr(queue, "redis_conn", redis)
+    monkeypatch.setattr(llm_gateway, "_INTERVALO_TRAVA", 0.01)
+    monkeypatch.setattr(llm_gateway, "_chamar", lambda *a: pytest.fail("chamou a API com a trava de outro"))
+    llm_gateway.resetar()
+    try:
+        chave = llm_gateway._chave({"model": "m", "messages": MENSAGENS, "temperature": 0}, llm_gateway.GROQ_ENDPOINT)
+        redis.set("m4llm:trava:" + chave, "outro-processo", nx=True)
+        threading.Timer(0.05, lambda: redis.setex("m4llm:" + chave, 60, b"resposta do outro")).start()
+
+        assert llm_gateway.completar(MENSAGENS, "m", chave_api="x") == "resposta do outro"
+        assert llm_gateway.estatisticas()["coalescidas"] == 1
+    finally:
+        llm_gateway.resetar()
+
+
+def test_sem_lua_no_redis_o_balde_local_assume(monkeypatch):
+    from app.utils import queue
+
+    monkeypatch.setattr(queue, "redis_conn", RedisMemoria())
+    llm_gateway.resetar()
+    assert llm_gateway._retirar_ficha() < 0.01  # register_script falhou: balde do processo
+    llm_gateway.resetar()
@@ -0,0 +1,59 @@
+import pytest
+from flask import Flask
+
+from app.extensions import db
+from app.models import OcrCache
+from app.services import ocr_cache
+
+CRAF = b"%PDF-1.4 craf escaneado"
+
+
+@pytest.fixture
+def app_db(tmp_path, monkeypatch):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'ocr.db'}"
+    db.init_app(app)
+    chamadas = []
+
+    def processar_falso(file_bytes, filename, tempos=None, tipo=None):
+        chamadas.append(filename)
+        return {"ocr_engine": "local", "resultado": {"categoria": "CRAF", "numero_serie": "ABC123"}}
+
+    from app.services import ocr_pipeline
+    monkeypatch.setattr(ocr_pipeline, "processar_documento", processar_falso)
+
+    with app.app_context():
+        OcrCache.__table__.create(db.engine)
+        yield chamadas
+
+
+def test_mesmo_arquivo_nao_paga_ocr_de_novo(app_db):
+    primeiro, do_cache = ocr_cache.processar_com_cache(CRAF, "craf.pdf")
+    assert not do_cache
+
+    tempos = {}
+    segundo, do_cache = ocr_cache.processar_com_cache(CRAF, "craf (1).pdf", tempos=tempos)
+    assert do_cache and segundo == primeiro and "cache" in tempos
+    assert app_db == ["craf.pdf"]
+    assert ocr_cache.resumo()[0]["acertos"] == 1
+
+
+def test_nova_versao_do_pipeline_e_invalidacao(app_db, monkeypatch):
+    ocr_cache.processar_com_cache(CRAF, "craf.pdf")
+
+    monkeypatch.setattr(ocr_cache, "VERSAO_PIPELINE", "teste.2")
+    ocr_cache.processar_com_cache(CRAF, "craf.pdf")
+    assert len(app_db) == 2  # parser mudou: processa de novo
+
+    assert [v["versao"] for v in ocr_cache.resumo()] == ["teste.2", "2026.10.2"]
+    assert ocr_cache.invalidar(somente_antigas=True) == 1
+    assert ocr_cache.invalidar(sha256=ocr_cache.chave(CRAF)) == 1
+    assert ocr_cache.resumo() == []
+
+
+def test_erro_do_pipeline_nao_vai_para_o_cache(app_db):
+    assert not ocr_cache.gravar("a" * 64, {"erro": "Nenhum texto pôde ser extraído pelo OCR"})
+    assert not ocr_cache.gravar("b" * 64, {"resultado": {"observacoes": "Erro no processamento via Groq: 503"}})
+    # Leitura parcial (parou nos campos de um tipo) não serve a outro tipo
+    assert not ocr_cache.gravar("c" * 64, {"resultado": {"categoria": "CRAF"}, "parada_antecipada": True})
+    assert ocr_cache.resumo() == []
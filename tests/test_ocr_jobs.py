@@ -0,0 +1,47 @@
+import pytest
+
+from app.utils import r2_gateway
+
+
+@pytest.fixture
+def ocr_jobs(monkeypatch):
+    from app.services import ocr_pipeline
+    from app.services.ocr_local import medir
+    from app.uploads import ocr_jobs
+    from app.utils import queue
+
+    def processar_falso(file_bytes, filename, tempos=None, tipo=None):
+        with medir(tempos, "tesseract"):
+            assert file_bytes.startswith(b"%PDF")
+        with medir(tempos, "llm"):
+            pass
+        return {"resultado": {"tipo": "Pistola", "marca": "TAURUS", "numero_serie": "ABC123"}}
+
+    monkeypatch.setattr(ocr_pipeline, "processar_documento", processar_falso)
+    monkeypatch.setattr(queue, "fila_ocr", None)
+    fake = r2_gateway.usar_fake()
+    fake.put_object(Bucket="m4-clientes-docs", Key="clientes/7/armas/craf.pdf", Body=b"%PDF-1.7\n0")
+    yield ocr_jobs
+    r2_gateway.resetar()
+
+
+def test_sem_fila_roda_sincrono_com_resposta_de_sempre(ocr_jobs):
+    resposta = ocr_jobs.enfileirar_ocr("m4-clientes-docs", "clientes/7/armas/craf.pdf", "craf.pdf", "craf", cliente_id=7)
+
+    assert resposta["modo"] == "sincrono"
+    assert resposta["resultado"]["marca"] == "TAURUS"
+    assert resposta["resultado"]["caminho_craf"] == "clientes/7/armas/craf.pdf"
+
+
+def test_tempos_por_etapa_vao_para_o_job(ocr_jobs, monkeypatch):
+    registrados = {}
+    monkeypatch.setattr(ocr_jobs, "_registrar_tempos", registrados.update)
+
+    ocr_jobs.executar_ocr("m4-clientes-docs", "clientes/7/armas/craf.pdf", "craf.pdf", "craf")
+    assert {"download", "tesseract", "llm", "total"} <= set(registrados)
+
+    # falha também registra o que já foi medido
+    registrados.clear()
+    with pytest.raises(FileNotFoundError):
+        ocr_jobs.executar_ocr("m4-clientes-docs", "clientes/7/armas/sumiu.pdf", "sumiu.pdf", "craf")
+    assert set(registrados) == {"download", "total"}
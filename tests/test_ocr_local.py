@@ -0,0 +1,117 @@
+import io
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from app.services import ocr_local
+
+
+feitas = []
+
+
+def _ocr_falso(img, tempos=None, **kwargs):
+    # largura da imagem = número da página
+    with ocr_local.medir(tempos, "tesseract"):
+        time.sleep(random.uniform(0, 0.01))
+    feitas.append(img.width)
+    return f"pagina {img.width}", None
+
+
+def test_paginas_voltam_em_ordem_e_geracao_sob_demanda(monkeypatch):
+    pool = ThreadPoolExecutor(3)
+    monkeypatch.setattr(ocr_local, "OCR_WORKERS", 3)
+    monkeypatch.setattr(ocr_local, "_get_pool", lambda: pool)
+    monkeypatch.setattr(ocr_local, "_ocr_image", _ocr_falso)
+
+    feitas.clear()
+    pendentes_max = []
+
+    def paginas():
+        for n in range(1, 16):
+            pendentes_max.append(n - 1 - len(feitas))
+            yield Image.new("L", (n, 4)), True
+
+    tempos = {}
+    resultados, parou = ocr_local._ocr_paginas(paginas(), "por", False, tempos)
+    pool.shutdown()
+
+    assert [t for t, _ in resultados] == [f"pagina {n}" for n in range(1, 16)] and not parou
+    assert "tesseract" in tempos
+    assert max(pendentes_max) <= 2 * 3  # nunca mais que 2 × workers páginas em memória
+
+
+def test_pdf_rasterizado_em_lotes_ate_max_pages(monkeypatch):
+    chamadas = []
+
+    def rasterizar(file_bytes, dpi=300, first_page=None, last_page=None):
+        chamadas.append((first_page, last_page))
+        return [Image.new("L", (n, 4)) for n in range(first_page, last_page + 1)]
+
+    monkeypatch.setattr(ocr_local, "OCR_WORKERS", 1)
+    monkeypatch.setattr(ocr_local, "OCR_LOTE_PAGINAS", 2)
+    monkeypatch.setattr(ocr_local, "_pdf_page_count", lambda b: 5)
+    monkeypatch.setattr(ocr_local, "_pdf_to_images", rasterizar)
+    monkeypatch.setattr(ocr_local, "_ocr_image", _ocr_falso)
+
+    resultado = ocr_local.extract_text_local(
+        b"%PDF-1.4", "craf.pdf", max_pages=4, try_pdf_textlayer=False, estrategia="fixa"
+    )
+
+    assert chamadas == [(1, 2), (3, 4)]
+    assert resultado["texts"] == ["pagina 1", "pagina 2", "pagina 3", "pagina 4"]
+    assert resultado["meta"]["truncated"] is True
+
+
+def test_adaptativa_refaz_so_paginas_fracas_e_para_quando_campos_completos(monkeypatch):
+    dpis = []
+
+    def rasterizar(file_bytes, dpi=300, first_page=None, last_page=None):
+        dpis.append((dpi, first_page, last_page))
+        return [Image.new("L", (n, 4)) for n in range(first_page, last_page + 1)]
+
+    def ocr_por_dpi(img, tempos=None, **kwargs):
+        # página 2 é ilegível a 200 dpi; lida na 2ª passada (300 dpi)
+        if img.width == 2 and dpis[-1][0] == 200:
+            return "", 20.0
+        return f"pagina {img.width} " + "x" * 100, 90.0
+
+    monkeypatch.setattr(ocr_local, "OCR_WORKERS", 1)
+    monkeypatch.setattr(ocr_local, "OCR_LOTE_PAGINAS", 4)
+    monkeypatch.setattr(ocr_local, "_pdf_page_count", lambda b: 3)
+    monkeypatch.setattr(ocr_local, "_pdf_to_images", rasterizar)
+    monkeypatch.setattr(ocr_local, "_ocr_image", ocr_por_dpi)
+
+    resultado = ocr_local.extract_text_local(b"%PDF-1.4", "craf.pdf", try_pdf_textlayer=False)
+    assert [dpi for dpi, _, _ in dpis] == [200, 300] and dpis[-1][1:] == (2, 2)
+    assert resultado["texts"][1].startswith("pagina 2")
+    assert resultado["meta"]["paginas_reprocessadas"] == 1
+
+    # campos completos na página 1: as demais nem são lidas
+    dpis.clear()
+    resultado = ocr_local.extract_text_local(
+        b"%PDF-1.4", "craf.pdf", try_pdf_textlayer=False, parar_quando=lambda textos: "pagina 1" in textos[0]
+    )
+    assert resultado["pages"] == 1 and resultado["meta"]["parada_antecipada"] is True
+
+
+def test_orientacao_exif_dispensa_osd(monkeypatch):
+    osds = []
+    monkeypatch.setattr(ocr_local, "_ocr_image", lambda img, osd=True, **kw: (osds.append(osd), ("texto", 90.0))[1])
+
+    buf = io.BytesIO()
+    img = Image.new("RGB", (40, 20))
+    exif = img.getexif()
+    exif[0x0112] = 6  # girada 90°
+    img.save(buf, "JPEG", exif=exif, dpi=(300, 300))
+
+    resultado = ocr_local.extract_text_local(buf.getvalue(), "cr.jpg")
+    assert osds == [False] and resultado["meta"]["osd_dispensado"] == 1
+
+
+def test_sem_iniciar_pool_ocr_roda_no_proprio_processo(monkeypatch):
+    # Worker web (OCR síncrono sem Redis) não abre o pool de processos
+    monkeypatch.setattr(ocr_local, "OCR_WORKERS", 4)
+    monkeypatch.setattr(ocr_local, "_pool_habilitado", False)
+    assert ocr_local._get_pool() is None
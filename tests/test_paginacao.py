@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from flask import Flask
+from sqlalchemy import column
+
+from app.utils.paginacao import codificar_cursor, decodificar_cursor, ordem_por_data, ordem_por_preco
+
+
+def _app():
+    app = Flask(__name__)
+    app.secret_key = "teste"
+    return app
+
+
+def test_cursor_ida_e_volta_preserva_tipos():
+    ordem = ordem_por_data(column("criado_em"), column("id"))
+    valores = [datetime(2026, 10, 17, 9, 30, tzinfo=timezone.utc), 42]
+    with _app().app_context():
+        cursor = codificar_cursor(ordem, valores, "a")
+        assert decodificar_cursor(ordem, cursor) == ("a", valores)
+
+        ordem_preco = ordem_por_preco(column("preco"), column("id"))
+        cursor = codificar_cursor(ordem_preco, [Decimal("1999.90"), 7])
+        assert decodificar_cursor(ordem_preco, cursor) == ("p", [Decimal("1999.90"), 7])
+
+
+def test_cursor_invalido_ou_de_outra_ordem_volta_ao_inicio():
+    data = ordem_por_data(column("criado_em"), column("id"))
+    preco = ordem_por_preco(column("preco"), column("id"))
+    with _app().app_context():
+        cursor = codificar_cursor(preco, [Decimal("10"), 1])
+        assert decodificar_cursor(data, cursor) is None
+        assert decodificar_cursor(preco, cursor[:-2] + "xx") is None
+        assert decodificar_cursor(preco, "lixo") is None
+        assert decodificar_cursor(preco, None) is None
+
+
+def test_sentinela_de_data_nula_segue_o_fuso_da_coluna():
+    from sqlalchemy import Column, DateTime, Integer, MetaData, Table
+    from app.utils.paginacao import ordem_por_data
+
+    t = Table("t", MetaData(), Column("id", Integer), Column("com_fuso", DateTime(timezone=True)),
+              Column("sem_fuso", DateTime))
+    epoca = lambda coluna: ordem_por_data(coluna, t.c.id)[0][0].clauses.clauses[1].value  # noqa: E731
+    assert epoca(t.c.com_fuso).tzinfo is not None
+    assert epoca(t.c.sem_fuso).tzinfo is None
@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+
+from app.utils.parcelamento import (
+    coeficientes_parcelas, gerar_linhas_parcelas, parcela_por_coeficientes,
+)
+from app.utils.parcelamento_helpers import montar_parcelas
+
+TAXAS = [
+    SimpleNamespace(numero_parcelas=12, juros=12.0),
+    SimpleNamespace(numero_parcelas=0, juros=1.5),
+    SimpleNamespace(numero_parcelas=1, juros=3.0),
+]
+
+
+def test_linhas_a_partir_dos_coeficientes():
+    linhas = gerar_linhas_parcelas(1000, TAXAS)
+
+    assert [l["rotulo"] for l in linhas] == ["PIX", "Débito", "1x", "12x"]
+    assert linhas[0] == {"rotulo": "PIX", "parcela": 1000.0, "total": 1000.0}
+    assert linhas[3]["total"] == 1000 / 0.88
+    assert linhas[3]["parcela"] == 1000 / 0.88 / 12
+
+
+def test_cards_e_montar_parcelas_usam_o_mesmo_vetor():
+    coeficientes = coeficientes_parcelas(TAXAS)
+    linha_12x = gerar_linhas_parcelas(1000, TAXAS)[-1]
+
+    assert parcela_por_coeficientes(1000, coeficientes, 12) == linha_12x["parcela"]
+    assert parcela_por_coeficientes(1000, coeficientes, 10) is None
+
+    opcoes = montar_parcelas(1000, None, coeficientes=coeficientes)
+    assert opcoes[-1]["parcela"] == linha_12x["parcela"]
+    assert opcoes[-1]["diferenca"] == linha_12x["total"] - 1000
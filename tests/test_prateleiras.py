@@ -0,0 +1,21 @@
+from app.loja.prateleiras import resolver_categorias
+from app.produtos.categorias.arvore import ArvoreCategorias
+
+# (id, nome, slug, pai_id, icone_loja, ordem_exibicao, exibir_no_menu)
+ARVORE = ArvoreCategorias([
+    (1, "Pistolas", "pistolas", None, None, 0, True),
+    (2, "Revólveres", "revolveres", None, None, 1, True),
+    (4, "Pistolas 9mm", "pistolas-9mm", 1, None, 0, True),
+    (5, "Compactas", "compactas", 4, None, 0, True),
+    (6, "Munições", "municoes", None, None, 2, True),
+])
+
+
+def test_slug_exato_traz_descendentes_em_qualquer_profundidade():
+    assert resolver_categorias(["pistolas-9mm"], ARVORE) == {4, 5}
+    assert resolver_categorias(["Pistolas"], ARVORE) == {1, 4, 5}
+
+
+def test_termo_parcial_como_o_antigo_get_smart_cat():
+    assert resolver_categorias(["muni"], ARVORE) == {6}
+    assert resolver_categorias(["revolver", "rifle"], ARVORE) == {2}
@@ -0,0 +1,62 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+from app.produtos.models import Produto
+from app.services.precificacao_lote import (
+    calcular_precos_lote, colunas_de_produtos, linha_de_precos,
+)
+from app.utils.datetime import now_local
+
+
+def _dec(valor):
+    return Decimal(f"{valor:.2f}")
+
+
+def _produto_aleatorio(rng, pid):
+    agora = now_local()
+    promo = rng.random() < 0.3
+    return SimpleNamespace(
+        id=pid,
+        codigo=f"SKU{pid}",
+        nome=f"Produto {pid}",
+        preco_fornecedor=_dec(rng.uniform(0, 15000)),
+        desconto_fornecedor=_dec(rng.choice([0, 0, 3, 5.5, 12])),
+        frete=_dec(rng.uniform(0, 300)),
+        margem=_dec(rng.choice([0, 18, 25, 32.5])),
+        ipi=_dec(rng.choice([0, 5, 10, 45.3])),
+        ipi_tipo=rng.choice(["%", "%_dentro", "R$", None, " % "]),
+        difal=_dec(rng.choice([0, 4, 7.2])),
+        imposto_venda=_dec(rng.choice([0, 6, 11.33])),
+        lucro_alvo=rng.choice([None, _dec(0), _dec(rng.uniform(50, 900))]),
+        preco_final=rng.choice([None, None, None, _dec(rng.uniform(100, 20000))]),
+        promo_ativada=promo,
+        promo_preco_fornecedor=_dec(rng.uniform(0, 12000)) if promo else None,
+        promo_data_inicio=agora - timedelta(days=rng.choice([-2, 1])) if promo else None,
+        promo_data_fim=agora + timedelta(days=rng.choice([-1, 3])) if promo else None,
+        custo_total=None, preco_a_vista=None, lucro_liquido_real=None,
+        visivel_loja=True, categoria_id=None,
+    )
+
+
+def test_lote_identico_ao_calculo_escalar():
+    rng = random.Random(42)
+    produtos = [_produto_aleatorio(rng, i) for i in range(1, 1501)]
+
+    resultado = calcular_precos_lote(colunas_de_produtos(produtos))
+
+    for i, p in enumerate(produtos):
+        esperado = Produto.calcular_precos(p)
+        assert resultado["valido"][i]
+        assert linha_de_precos(resultado, i) == esperado, p.id
+
+
+def test_divisao_por_zero_marca_invalido():
+    p = _produto_aleatorio(random.Random(1), 1)
+    p.preco_final, p.lucro_alvo, p.margem = None, None, Decimal("100")
+
+    resultado = calcular_precos_lote(colunas_de_produtos([p]))
+
+    assert resultado["valido"] == [False]
+    assert resultado["preco_a_vista"] == [None]
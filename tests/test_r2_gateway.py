@@ -0,0 +1,69 @@
+import io
+import threading
+import time
+
+from app.utils import r2_gateway
+from app.utils.storage import get_s3
+
+
+def test_cliente_unico_entre_threads(monkeypatch):
+    monkeypatch.setenv("R2_ENDPOINT_URL", "https://conta.r2.cloudflarestorage.com")
+    monkeypatch.setenv("R2_ACCESS_KEY_ID", "chave")
+    monkeypatch.setenv("R2_SECRET_ACCESS_KEY", "segredo")
+    r2_gateway.resetar()
+    try:
+        vistos = []
+        threads = [threading.Thread(target=lambda: vistos.append(r2_gateway.cliente())) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len({id(c) for c in vistos}) == 1
+        assert get_s3() is vistos[0]
+        assert vistos[0].meta.config.max_pool_connections == r2_gateway.MAX_POOL
+    finally:
+        r2_gateway.resetar()
+
+
+def test_fake_em_memoria_cobre_as_operacoes():
+    fake = r2_gateway.usar_fake()
+    try:
+        r2_gateway.put("m4-loja-publico", "produtos/fotos/1/a.webp", b"RIFF", content_type="image/webp")
+        fake.upload_fileobj(io.BytesIO(b"%PDF"), "m4-clientes-docs", "docs/x.pdf")
+
+        assert get_s3() is fake
+        assert r2_gateway.get("m4-loja-publico", "produtos/fotos/1/a.webp") == b"RIFF"
+        assert r2_gateway.head("m4-loja-publico", "produtos/fotos/1/a.webp")["ContentType"] == "image/webp"
+        assert [o["Key"] for o in r2_gateway.listar("m4-loja-publico", "produtos/")] == ["produtos/fotos/1/a.webp"]
+        assert "docs/x.pdf" in r2_gateway.presign("m4-clientes-docs", "docs/x.pdf", expira=60)
+
+        r2_gateway.delete("m4-loja-publico", "produtos/fotos/1/a.webp")
+        assert r2_gateway.get("m4-loja-publico", "produtos/fotos/1/a.webp") is None
+        assert r2_gateway.head("m4-loja-publico", "produtos/fotos/1/a.webp") is None
+    finally:
+        r2_gateway.resetar()
+
+
+def test_link_assinado_reaproveitado_ate_perto_de_expirar(monkeypatch):
+    fake = r2_gateway.usar_fake()
+    assinaturas = []
+    original = fake.generate_presigned_url
+    monkeypatch.setattr(fake, "generate_presigned_url",
+                        lambda *a, **k: assinaturas.append(k) or original(*a, **k))
+    try:
+        primeiro = r2_gateway.link_assinado("m4-clientes-docs", "docs/rg.pdf", 3600)
+        # 4000 s cai no mesmo degrau (3600): mesma URL
+        assert r2_gateway.link_assinado("m4-clientes-docs", "docs/rg.pdf", 4000) == primeiro
+        r2_gateway.link_assinado("m4-clientes-docs", "docs/cnh.pdf", 3600)
+        r2_gateway.link_assinado("m4-clientes-docs", "docs/rg.pdf", 600)
+        assert len(assinaturas) == 3
+        assert assinaturas[-1]["ExpiresIn"] == 300  # arredonda para baixo, nunca para cima
+
+        # Passado 1/4 da validade, assina de novo (quem recebe tem ≥ 3/4)
+        relogio = time.time() + 3600 // 4 + 1
+        monkeypatch.setattr(r2_gateway._links, "agora", lambda: relogio)
+        r2_gateway.link_assinado("m4-clientes-docs", "docs/rg.pdf", 3600)
+        assert len(assinaturas) == 4
+    finally:
+        r2_gateway.resetar()
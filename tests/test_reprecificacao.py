@@ -0,0 +1,39 @@
+from decimal import Decimal
+
+import pytest
+
+from app.services.reprecificacao import RegraInvalida, _aplicar_regras, interpretar_regra
+
+
+def test_interpretar_regra():
+    assert interpretar_regra("marca=Taurus: desconto_fornecedor +3%") == {
+        "marca": "Taurus", "categoria": None,
+        "campo": "desconto_fornecedor", "operacao": "somar", "valor": 3.0,
+    }
+    assert interpretar_regra("categoria pistolas: margem 28%")["operacao"] == "definir"
+    assert interpretar_regra("marca Glock: preco_fornecedor -5%")["operacao"] == "percentual"
+
+    with pytest.raises(RegraInvalida):
+        interpretar_regra("marca=Taurus: nome 10")
+
+
+def test_aplicar_regras_em_ordem():
+    colunas = {
+        "id": [1, 2, 3],
+        "categoria_id": [10, 11, 10],
+        "desconto_fornecedor": [Decimal("5.00"), Decimal("5.00"), None],
+        "margem": [Decimal("20.00"), Decimal("28.00"), Decimal("20.00")],
+    }
+    marcas = [7, 7, 8]
+    regras = [
+        {"marca_ids": {7}, "categoria_ids": None, "campo": "desconto_fornecedor", "operacao": "somar", "valor": 3},
+        {"marca_ids": None, "categoria_ids": {10, 11}, "campo": "margem", "operacao": "definir", "valor": 28},
+    ]
+
+    novas, alteracoes = _aplicar_regras(colunas, marcas, regras)
+
+    assert novas["desconto_fornecedor"] == [8.0, 8.0, None]
+    assert novas["margem"] == [28.0, 28.0, 28.0]
+    # Produto 2 já tinha margem 28: só o desconto entra no diff
+    assert alteracoes[1] == {"desconto_fornecedor": (Decimal("5.00"), 8.0)}
+    assert alteracoes[2] == {"margem": (Decimal("20.00"), 28.0)}
@@ -0,0 +1,40 @@
+from datetime import datetime, timezone, timedelta
+
+from app.loja.sitemap import _ordem_segmento, _url, _utc
+
+
+def test_segmentos_em_ordem_paginas_categorias_produtos_numericos():
+    nomes = ["produtos-10", "categorias", "produtos-2", "paginas"]
+    assert sorted(nomes, key=_ordem_segmento) == ["paginas", "categorias", "produtos-2", "produtos-10"]
+
+
+def test_url_escapa_loc_e_normaliza_lastmod_para_utc():
+    local = datetime(2026, 10, 17, 9, 30, 15, 123456)  # naive = UTC-3 (now_local)
+    assert _utc(local) == datetime(2026, 10, 17, 12, 30, 15, tzinfo=timezone.utc)
+    assert _utc(datetime(2026, 1, 1, tzinfo=timezone(timedelta(hours=2)))).hour == 22
+
+    xml = _url("https://loja/produto/a&b", _utc(local), "weekly")
+    assert "<loc>https://loja/produto/a&amp;b</loc>" in xml
+    assert "<lastmod>2026-10-17T12:30:15+00:00</lastmod>" in xml
+    assert "<priority>" not in xml
+
+
+def test_indice_responde_200_com_etag_e_304_na_revalidacao(monkeypatch):
+    from flask import Flask
+    from app.loja import sitemap
+
+    monkeypatch.setattr(sitemap, "segmentos", lambda: {
+        "paginas": {"lastmod": datetime(2026, 10, 17, 12, tzinfo=timezone.utc), "total": 2, "assinatura": "0"},
+        "produtos-0": {"lastmod": datetime(2026, 10, 16, tzinfo=timezone.utc), "total": 3, "assinatura": "3:6"},
+    })
+    app = Flask(__name__)
+    app.add_url_rule("/sitemap.xml", "sitemap", sitemap.resposta_indice)
+    cliente = app.test_client()
+
+    resposta = cliente.get("/sitemap.xml")
+    etag, _ = resposta.get_etag()
+    assert resposta.status_code == 200 and etag
+    assert "/sitemap-produtos-0.xml</loc>" in resposta.get_data(as_text=True)
+
+    revalidada = cliente.get("/sitemap.xml", headers={"If-None-Match": f'"{etag}"'})
+    assert revalidada.status_code == 304 and revalidada.get_etag()[0] == etag
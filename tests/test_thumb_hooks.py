@@ -0,0 +1,73 @@
+import threading
+
+from app.utils import queue, thumb_hooks
+
+
+class RedisMemoria:
+    def __init__(self):
+        self.dados = {}
+
+    def set(self, chave, valor, nx=False, ex=None):
+        if nx and chave in self.dados:
+            return None
+        self.dados[chave] = valor
+        return True
+
+    def delete(self, chave):
+        self.dados.pop(chave, None)
+
+
+class FilaMemoria:
+    def __init__(self):
+        self.jobs = []
+
+    def enqueue(self, funcao, *args, **kwargs):
+        self.jobs.append((funcao, args, kwargs))
+
+
+URL = "https://cdn.m4tatica.com.br/produtos/fotos/166/aa4.webp"
+
+
+def test_mesma_imagem_pendente_entra_uma_vez_na_fila(monkeypatch):
+    redis, fila = RedisMemoria(), FilaMemoria()
+    monkeypatch.setattr(queue, "redis_conn", redis)
+    monkeypatch.setattr(queue, "fila_thumbs", fila)
+
+    assert thumb_hooks.enfileirar_thumbs(URL) == "fila"
+    assert thumb_hooks.enfileirar_thumbs(URL) == "duplicado"
+    assert len(fila.jobs) == 1
+    funcao, args, kwargs = fila.jobs[0]
+    assert funcao is thumb_hooks.gerar_thumbs_para_url and args == (URL,)
+    assert kwargs["retry"].max == 3
+
+    # O job libera a pendência ao começar: nova alteração volta à fila
+    thumb_hooks._liberar_pendente("produtos/fotos/166/aa4.webp")
+    assert thumb_hooks.enfileirar_thumbs(URL) == "fila"
+
+
+def test_sem_redis_gera_no_proprio_processo(monkeypatch):
+    monkeypatch.setattr(queue, "redis_conn", None)
+    monkeypatch.setattr(queue, "fila_thumbs", None)
+    chamadas = []
+    monkeypatch.setattr(thumb_hooks, "gerar_thumbs_para_url", chamadas.append)
+
+    assert thumb_hooks.enfileirar_thumbs(URL) == "sincrono"
+    assert chamadas == [URL]
+
+
+def test_fallback_em_thread_so_quando_pedido(monkeypatch):
+    monkeypatch.setattr(queue, "redis_conn", None)
+    monkeypatch.setattr(queue, "fila_thumbs", None)
+    monkeypatch.setattr(thumb_hooks, "_FALLBACK_THREAD", True)
+    liberar, threads = threading.Event(), []
+
+    def gerar(url):
+        threads.append(threading.current_thread().name)
+        liberar.wait(2)
+
+    monkeypatch.setattr(thumb_hooks, "gerar_thumbs_para_url", gerar)
+
+    assert thumb_hooks.enfileirar_thumbs(URL) == "thread"  # não espera a geração
+    liberar.set()
+    thumb_hooks._executor_local().submit(lambda: None).result(2)
+    assert len(threads) == 1 and threads[0].startswith("thumbs")
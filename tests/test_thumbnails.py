@@ -0,0 +1,40 @@
+import io
+
+from PIL import Image
+
+from app.utils.thumbnail_utils import (
+    decodificar_imagem, gerar_thumbnails, gerar_variantes, larguras_para, variante_key,
+)
+
+
+def _png(largura, altura):
+    buf = io.BytesIO()
+    Image.new("RGBA", (largura, altura), (10, 20, 30, 128)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def test_escada_nao_amplia_e_nomeia_ao_lado_do_original():
+    assert larguras_para(1000, (160, 280, 480, 800, 1200)) == [160, 280, 480, 800]
+    assert larguras_para(120, (160, 280)) == [120]
+    assert variante_key("produtos\\fotos\\166\\aa4.JPG", 480, "avif") == "produtos/fotos/166/aa4_w480.avif"
+
+
+def test_gerar_variantes_mantem_proporcao_em_todos_os_formatos():
+    variantes, tamanho = gerar_variantes(_png(600, 300), larguras=(160, 280, 1200), formatos=("webp",))
+    assert tamanho == (600, 300)
+    assert set(variantes) == {(160, "webp"), (280, "webp")}
+    with Image.open(io.BytesIO(variantes[(280, "webp")])) as img:
+        assert img.size == (280, 140) and img.format == "WEBP"
+
+
+def test_decodificacao_unica_reduz_jpeg_e_gera_todos_os_tamanhos():
+    buf = io.BytesIO()
+    Image.new("RGB", (4000, 3000), (200, 10, 10)).save(buf, format="JPEG")
+
+    imagem = decodificar_imagem(buf.getvalue(), maior_lado=280)
+    assert imagem.info["tamanho_original"] == (4000, 3000)
+    assert 280 <= imagem.height < 3000  # draft() decodificou em escala reduzida
+
+    thumbs = gerar_thumbnails(sizes=["t160", "t280", "t80"], imagem=imagem)
+    tamanhos = {k: Image.open(io.BytesIO(v)).size for k, v in thumbs.items()}
+    assert tamanhos == {"t280": (280, 210), "t160": (160, 120), "t80": (80, 60)}
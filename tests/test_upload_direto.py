@@ -0,0 +1,71 @@
+import pytest
+from flask import Flask
+
+from app.utils import upload_direto as direto
+from app.utils import queue, r2_gateway
+from app.utils.cache_backend import LRULocal
+
+PDF = b"%PDF-1.7\n" + b"0" * 500
+
+
+@pytest.fixture
+def app_fake(monkeypatch):
+    monkeypatch.setattr(queue, "redis_conn", None)
+    monkeypatch.setattr(direto, "_usados_local", LRULocal(16))
+    app = Flask(__name__)
+    app.secret_key = "teste"
+    fake = r2_gateway.usar_fake()
+    with app.app_context():
+        yield fake
+    r2_gateway.resetar()
+
+
+def _emitir(nome="craf.pdf", tamanho=len(PDF), **contexto):
+    tipo, tamanho = direto.validar("documento", nome, "application/pdf", tamanho)
+    return direto.emitir("documento", "m4-clientes-docs", f"clientes/7/armas/{nome}", tipo, tamanho,
+                         nome=nome, **contexto)
+
+
+def test_emitir_e_confirmar_upload_do_navegador(app_fake):
+    upload = _emitir(cliente_id=7)
+    assert upload["metodo"] == "PUT" and upload["headers"] == {"Content-Type": "application/pdf"}
+
+    # PUT do navegador direto no R2
+    app_fake.put_object(Bucket="m4-clientes-docs", Key=upload["key"], Body=PDF, ContentType="application/pdf")
+
+    arquivo = direto.confirmar(upload["ticket"], "documento", cliente_id=7)
+    assert arquivo["key"] == "clientes/7/armas/craf.pdf" and arquivo["nome_original"] == "craf.pdf"
+
+    with pytest.raises(direto.UploadInvalido):
+        direto.confirmar(upload["ticket"], "documento", cliente_id=8)
+
+    # O mesmo ticket não confirma duas vezes
+    with pytest.raises(direto.UploadInvalido, match="já foi confirmado"):
+        direto.confirmar(upload["ticket"], "documento", cliente_id=7)
+
+
+def test_webp_exige_a_marca_do_formato_e_secret_key_obrigatoria(app_fake):
+    assert direto._assinatura_confere("image/webp", b"RIFF\x10\x00\x00\x00WEBPVP8 ")
+    assert not direto._assinatura_confere("image/webp", b"RIFF\x10\x00\x00\x00WAVEfmt ")
+
+    app = Flask(__name__)
+    with app.app_context(), pytest.raises(RuntimeError):
+        _emitir(cliente_id=7)
+
+
+def test_recusa_tamanho_tipo_e_conteudo_divergentes(app_fake):
+    with pytest.raises(direto.UploadInvalido):
+        direto.validar("documento", "x.pdf", "application/pdf", 16 * 1024 * 1024)
+    with pytest.raises(direto.UploadInvalido):
+        direto.validar("documento", "x.exe", "application/x-msdownload", 10)
+
+    upload = _emitir(cliente_id=7)
+    with pytest.raises(direto.UploadInvalido, match="não chegou"):
+        direto.confirmar(upload["ticket"], "documento", cliente_id=7)
+
+    # Corpo que não é PDF: recusado e apagado do bucket
+    falso = b"MZ" + b"0" * (len(PDF) - 2)
+    app_fake.put_object(Bucket="m4-clientes-docs", Key=upload["key"], Body=falso, ContentType="application/pdf")
+    with pytest.raises(direto.UploadInvalido):
+        direto.confirmar(upload["ticket"], "documento", cliente_id=7)
+    assert r2_gateway.head("m4-clientes-docs", upload["key"]) is None
@@ -11,7 +11,7 @@ if BASE_DIR not in sys.path:
 
 from app import create_app
 
-listen = ["m4_certidoes"]
+listen = ["m4_certidoes", "m4_precos"]
 
 if __name__ == "__main__":
     redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
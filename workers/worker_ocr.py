@@ -0,0 +1,47 @@
+# workers/worker_ocr.py
+# Worker da fila m4_ocr (app/uploads/ocr_jobs.py): OCR + IA dos documentos
+# enviados direto ao R2 rodam aqui, fora dos workers web.
+# SimpleWorker: os jobs rodam neste processo (sem work-horse por job), então
+# o pool de processos do Tesseract (app/services/ocr_local.py) sobe uma vez
+# e é encerrado quando o worker para.
+import sys
+import os
+import redis
+from rq import SimpleWorker, Queue, Connection
+
+# Adiciona a raiz do projeto ao PYTHONPATH
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from app import create_app
+
+listen = ["m4_ocr"]
+
+if __name__ == "__main__":
+    redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+    try:
+        conn = redis.from_url(redis_url)
+        # Tenta conectar para falhar rápido se não houver Redis
+        conn.ping()
+    except Exception as e:
+        print(f"[WORKER ERROR] Não foi possível conectar ao Redis: {e}")
+        sys.exit(1)
+
+    app = create_app()
+
+    # O contexto da aplicação é obrigatório para acessar BD e Models
+    with app.app_context():
+        print(f" [WORKER] M4 OCR iniciado.")
+        print(f" [WORKER] Escutando filas: {listen}")
+        print(f" [WORKER] Redis: {redis_url}")
+
+        from app.services import ocr_local
+        ocr_local.iniciar_pool()
+        try:
+            with Connection(conn):
+                worker = SimpleWorker(list(map(Queue, listen)))
+                worker.work()
+        finally:
+            ocr_local.encerrar_pool()
@@ -0,0 +1,55 @@
+# workers/worker_thumbs.py
+# Worker da fila m4_thumbs (app/utils/thumb_hooks.py): THUMB_WORKERS processos
+# RQ em paralelo (padrão 2) — download do R2 + encode WebP/AVIF saem do web
+# worker e a concorrência fica limitada, mesmo numa importação em massa.
+import sys
+import os
+import multiprocessing
+import redis
+from rq import Worker, Queue, Connection
+
+# Adiciona a raiz do projeto ao PYTHONPATH
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+listen = ["m4_thumbs"]
+
+
+def trabalhar(redis_url, numero):
+    from app import create_app
+
+    conn = redis.from_url(redis_url)
+    app = create_app()
+
+    # O contexto da aplicação é obrigatório para acessar BD e Models
+    with app.app_context():
+        print(f" [WORKER] M4 Thumbs #{numero} iniciado (pid {os.getpid()}).")
+        with Connection(conn):
+            worker = Worker(list(map(Queue, listen)))
+            worker.work(with_scheduler=(numero == 1))  # scheduler: retentativas com espera
+
+
+if __name__ == "__main__":
+    redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    total = max(1, int(os.getenv("THUMB_WORKERS", 2)))
+
+    try:
+        conn = redis.from_url(redis_url)
+        # Tenta conectar para falhar rápido se não houver Redis
+        conn.ping()
+    except Exception as e:
+        print(f"[WORKER ERROR] Não foi possível conectar ao Redis: {e}")
+        sys.exit(1)
+
+    print(f" [WORKER] Escutando filas: {listen} com {total} processo(s)")
+    print(f" [WORKER] Redis: {redis_url}")
+
+    processos = [
+        multiprocessing.Process(target=trabalhar, args=(redis_url, n), daemon=False)
+        for n in range(1, total + 1)
+    ]
+    for p in processos:
+        p.start()
+    for p in processos:
+        p.join()